@@ -972,23 +972,118 @@ static void PrintProcessStateMachineReadable(const ProcessState& process_state)
 
 void usage() {
   fprintf(stderr, "Usage: stackwalker [options] <minidump> [<symbol paths]\n");
+  fprintf(stderr, "       stackwalker --server [<symbol paths]\n");
   fprintf(stderr, "Options:\n");
   fprintf(stderr, "\t--pretty\tPretty-print JSON output.\n");
   fprintf(stderr, "\t--pipe-dump\tProduce pipe-delimited output in addition to JSON output\n");
   fprintf(stderr, "\t--raw-json\tAn input file with the raw annotations as JSON\n");
+  fprintf(stderr, "\t--server\tPrint READY, then read jobs from stdin, one per\n"
+                  "\t\t\tline, in the form <minidump>[<TAB><raw json>].\n"
+                  "\t\t\tFor each job, one line of JSON is written to\n"
+                  "\t\t\tstdout.  Symbols stay loaded between jobs.\n");
   fprintf(stderr, "\t--help\tDisplay this help text.\n");
 }
 
+// Process one minidump and write its JSON (and optionally the pipe dump)
+// to stdout.  The symbol supplier and source line resolver are passed in
+// so that server mode can keep the symbols that they have loaded from one
+// minidump to the next.
+static void ProcessMinidump(const char* minidump_path,
+                            const char* json_path,
+                            SymbolSupplier* symbol_supplier,
+                            SourceLineResolverInterface* resolver,
+                            bool pretty,
+                            bool pipe)
+{
+  Minidump minidump(minidump_path);
+  minidump.Read();
+  // process minidump
+  // bug 950710 - Bad symbol files are causing the stackwalker to
+  // run amok. Disabling this until we get an upstream fix.
+  //Stackwalker::set_max_frames(UINT32_MAX);
+  Json::Value root;
+  // the symbolizer remembers CodeModule pointers that belong to this
+  // minidump's ProcessState, so it must not outlive this function.
+  StackFrameSymbolizerForward symbolizer(symbol_supplier, resolver);
+  MinidumpProcessor minidump_processor(&symbolizer, true);
+  ProcessState process_state;
+  ProcessResult result =
+    minidump_processor.Process(&minidump, &process_state);
+
+  if (pipe) {
+    if (result == google_breakpad::PROCESS_OK) {
+      PrintProcessStateMachineReadable(process_state);
+    }
+    printf("====PIPE DUMP ENDS===\n");
+  }
+
+  Json::Value raw_root(Json::objectValue);
+  if (json_path) {
+    Json::Reader reader;
+    ifstream raw_stream(json_path);
+    reader.parse(raw_stream, raw_root);
+  }
+
+  root["status"] = ResultString(result);
+  root["sensitive"] = Json::Value(Json::objectValue);
+  if (result == google_breakpad::PROCESS_OK) {
+    ConvertProcessStateToJSON(process_state, symbolizer, root);
+  }
+  ConvertMemoryInfoToJSON(minidump, raw_root, root);
+  Json::Writer* writer;
+  if (pretty)
+    writer = new Json::StyledWriter();
+  else
+    writer = new Json::FastWriter();
+  // the writers end their output with a newline.  Server mode relies on
+  // FastWriter output having no other newlines in it.
+  printf("%s", writer->write(root).c_str());
+
+  delete writer;
+}
+
+// Server mode: announce readiness with a "READY" line, then read
+// "<minidump>[<TAB><raw json>]" lines from stdin until EOF, answering each
+// with exactly one line of JSON on stdout.
+static int Serve(SymbolSupplier* symbol_supplier,
+                 SourceLineResolverInterface* resolver)
+{
+  printf("READY\n");
+  fflush(stdout);
+  string line;
+  while (std::getline(std::cin, line)) {
+    if (line.empty())
+      continue;
+    string minidump_path = line;
+    string json_path;
+    string::size_type tab = line.find('\t');
+    if (tab != string::npos) {
+      minidump_path = line.substr(0, tab);
+      json_path = line.substr(tab + 1);
+    }
+    ProcessMinidump(minidump_path.c_str(),
+                    json_path.empty() ? nullptr : json_path.c_str(),
+                    symbol_supplier,
+                    resolver,
+                    false,
+                    false);
+    fflush(stdout);
+  }
+  return 0;
+}
+
 } // namespace
 int main(int argc, char** argv)
 {
   bool pretty = false;
   bool pipe = false;
+  bool server = false;
   char* json_path = nullptr;
   static struct option long_options[] = {
     {"pretty", no_argument, nullptr, 'p'},
     {"pipe-dump", no_argument, nullptr, 'i'},
     {"raw-json", required_argument, nullptr, 'r'},
+    {"server", no_argument, nullptr, 's'},
     {"help", no_argument, nullptr, 'h'},
     {nullptr, 0, nullptr, 0}
   };
@@ -1010,6 +1105,9 @@ int main(int argc, char** argv)
     case 'r':
       json_path = optarg;
       break;
+    case 's':
+      server = true;
+      break;
     case 'h':
       usage();
       return 0;
@@ -1022,59 +1120,25 @@ int main(int argc, char** argv)
     }
   }
 
-  if (optind >= argc) {
+  if (!server && optind >= argc) {
     usage();
     return 1;
   }
 
-  Minidump minidump(argv[optind]);
   vector<string> symbol_paths;
   // allow symbol paths to be passed on the commandline.
-  for (int i = optind + 1; i < argc; i++) {
+  for (int i = server ? optind : optind + 1; i < argc; i++) {
     symbol_paths.push_back(argv[i]);
   }
-
-  minidump.Read();
-  // process minidump
-  // bug 950710 - Bad symbol files are causing the stackwalker to
-  // run amok. Disabling this until we get an upstream fix.
-  //Stackwalker::set_max_frames(UINT32_MAX);
-  Json::Value root;
   SimpleSymbolSupplier symbol_supplier(symbol_paths);
   BasicSourceLineResolver resolver;
-  StackFrameSymbolizerForward symbolizer(&symbol_supplier, &resolver);
-  MinidumpProcessor minidump_processor(&symbolizer, true);
-  ProcessState process_state;
-  ProcessResult result =
-    minidump_processor.Process(&minidump, &process_state);
-
-  if (pipe) {
-    if (result == google_breakpad::PROCESS_OK) {
-      PrintProcessStateMachineReadable(process_state);
-    }
-    printf("====PIPE DUMP ENDS===\n");
-  }
 
-  Json::Value raw_root(Json::objectValue);
-  if (json_path) {
-    Json::Reader reader;
-    ifstream raw_stream(json_path);
-    reader.parse(raw_stream, raw_root);
+  if (server) {
+    return Serve(&symbol_supplier, &resolver);
   }
 
-  root["status"] = ResultString(result);
-  root["sensitive"] = Json::Value(Json::objectValue);
-  if (result == google_breakpad::PROCESS_OK) {
-    ConvertProcessStateToJSON(process_state, symbolizer, root);
-  }
-  ConvertMemoryInfoToJSON(minidump, raw_root, root);
-  Json::Writer* writer;
-  if (pretty)
-    writer = new Json::StyledWriter();
-  else
-    writer = new Json::FastWriter();
-  printf("%s\n", writer->write(root).c_str());
-
-  delete writer;
+  ProcessMinidump(argv[optind], json_path, &symbol_supplier, &resolver,
+                  pretty, pipe);
+  printf("\n");
   exit(0);
 }
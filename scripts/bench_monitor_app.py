@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Drain a synthetic backlog of new crashes into the jobs table of a local
+Postgres, once for each of a list of batch sizes, and report how long the
+monitor takes to assign them.  A batch size of 1 is the old one transaction
+per crash behavior.
+
+The benchmark registers its own processors, named 'bench-monitor-N', and
+removes them and their jobs when it is done.  It refuses to run if other
+processors are alive, as they would be assigned some of the jobs: point it
+at a scratch database made by setupdb_app.py.  The monitor logs every
+assignment at INFO, so run it with a logging level of WARNING or higher to
+measure the database rather than the logging.
+"""
+
+import time
+
+from configman import Namespace
+from configman.converters import class_converter
+
+from socorro.app import generic_app
+from socorro.external.postgresql.dbapi2_util import (
+    execute_no_results,
+    single_value_sql,
+)
+from socorro.lib.ooid import createNewOoid
+from socorro.monitor.monitor_app import MonitorApp
+
+
+#==============================================================================
+class SyntheticNewCrashSource(object):
+    """a new crash source of 'number_of_crashes' made up crash_ids"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config, name, quit_check_callback=None):
+        self.config = config
+
+    #--------------------------------------------------------------------------
+    def __call__(self):
+        for x in xrange(self.config.number_of_crashes):
+            yield createNewOoid()
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        pass
+
+
+#==============================================================================
+class BenchMonitorApp(MonitorApp):
+    """time the assignment of a backlog of crashes to processors"""
+
+    app_name = 'bench-monitor'
+    app_version = '1.0'
+    app_description = __doc__
+
+    required_config = Namespace()
+    required_config.namespace('new_crash_source')
+    required_config.new_crash_source.add_option(
+        'new_crash_source_class',
+        doc='an iterable that will stream crash_ids needing processing',
+        default=SyntheticNewCrashSource,
+        from_string_converter=class_converter
+    )
+    required_config.new_crash_source.add_option(
+        'number_of_crashes',
+        doc='the size of the synthetic backlog',
+        default=1000000,
+    )
+    required_config.add_option(
+        'number_of_processors',
+        doc='the number of processors to register for the benchmark',
+        default=10,
+    )
+    required_config.add_option(
+        'batch_sizes',
+        doc='a comma delimited list of the batch sizes to try',
+        default='1, 100, 1000',
+        from_string_converter=lambda x: [
+            int(y) for y in x.split(',') if y.strip()
+        ],
+        to_string_converter=lambda x: ', '.join(str(y) for y in x)
+    )
+
+    #--------------------------------------------------------------------------
+    def _register_processors_transaction(self, connection):
+        live_processors = single_value_sql(
+            connection,
+            "select count(*) from processors "
+            "where lastSeenDateTime > now() - %s",
+            (self.config.registrar.check_in_frequency,)
+        )
+        if live_processors:
+            raise Exception(
+                'there are %d live processors in this database' %
+                live_processors
+            )
+        for x in range(self.config.number_of_processors):
+            execute_no_results(
+                connection,
+                "insert into processors (name, startDateTime, "
+                "                        lastSeenDateTime) "
+                "values (%s, now(), now())",
+                ('bench-monitor-%d' % x,)
+            )
+
+    #--------------------------------------------------------------------------
+    def _remove_jobs_transaction(self, connection):
+        execute_no_results(
+            connection,
+            "delete from jobs where owner in "
+            "    (select id from processors where name like %s)",
+            ('bench-monitor-%',)
+        )
+
+    #--------------------------------------------------------------------------
+    def _remove_processors_transaction(self, connection):
+        self._remove_jobs_transaction(connection)
+        execute_no_results(
+            connection,
+            "delete from processors where name like %s",
+            ('bench-monitor-%',)
+        )
+
+    #--------------------------------------------------------------------------
+    def _drain(self):
+        processor_iter = self._balanced_processor_iter()
+        start = time.time()
+        for crash_ids in self._batches_of_new_crashes():
+            processor_iter = self._queue_standard_jobs(
+                crash_ids,
+                processor_iter
+            )
+        return time.time() - start
+
+    #--------------------------------------------------------------------------
+    def main(self):
+        try:
+            self.job_manager_transaction(
+                self._register_processors_transaction
+            )
+        except Exception, x:
+            self.config.logger.error('cannot run the benchmark: %s', x)
+            return 1
+        try:
+            number_of_crashes = self.config.new_crash_source.number_of_crashes
+            for a_batch_size in self.config.batch_sizes:
+                self.config.job_manager.batch_size = a_batch_size
+                elapsed = self._drain()
+                print 'batch size %5d: %d crashes in %.3fs, %.1f crashes/s' % (
+                    a_batch_size,
+                    number_of_crashes,
+                    elapsed,
+                    number_of_crashes / elapsed if elapsed else 0
+                )
+                self.job_manager_transaction(self._remove_jobs_transaction)
+        finally:
+            self.job_manager_transaction(
+                self._remove_processors_transaction
+            )
+        return 0
+
+
+if __name__ == '__main__':
+    generic_app.main(BenchMonitorApp)
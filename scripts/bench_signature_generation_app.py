@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Replay a corpus of stackwalker output through the signature generation
+rule, with and without the frame normalization cache, and report the time
+spent in the rule.
+
+The corpus is a directory tree of .json files.  Each file is either a
+processed crash with a 'json_dump' key or the 'json_dump' itself, as written
+by the stackwalker.
+"""
+
+import os
+import time
+import ujson
+
+from configman import Namespace
+
+from socorro.app import generic_app
+from socorro.lib.util import DotDict
+from socorro.processor.signature_utilities import SignatureGenerationRule
+
+
+#==============================================================================
+class BenchSignatureGenerationApp(generic_app.App):
+    """time the signature generation rule with and without the normalization
+    cache"""
+
+    app_name = 'bench-signature-generation'
+    app_version = '1.0'
+    app_description = __doc__
+
+    required_config = Namespace()
+    required_config.add_option(
+        'corpus_path',
+        doc='a directory of json_dump or processed crash .json files',
+        default='.',
+    )
+    required_config.add_option(
+        'passes',
+        doc='the number of times to replay the corpus for each mode',
+        default=5,
+    )
+    required_config.signature = SignatureGenerationRule.get_required_config()
+
+    #--------------------------------------------------------------------------
+    def _load_corpus(self):
+        corpus = []
+        for path, dirs, files in os.walk(self.config.corpus_path):
+            for a_file_name in sorted(files):
+                if not a_file_name.endswith('.json'):
+                    continue
+                with open(os.path.join(path, a_file_name)) as f:
+                    a_crash = ujson.load(f)
+                json_dump = a_crash.get('json_dump', a_crash)
+                if isinstance(json_dump, dict) and 'threads' in json_dump:
+                    corpus.append(json_dump)
+        return corpus
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _forget_normalization(json_dump):
+        """the rule writes the normalized signature into each frame, which
+        would short circuit normalization on the next pass"""
+        for a_thread in json_dump.get('threads', []):
+            for a_frame in a_thread.get('frames', []):
+                a_frame.pop('normalized', None)
+
+    #--------------------------------------------------------------------------
+    def _replay(self, corpus, cache_size):
+        self.config.signature.c_signature.normalization_cache_size = \
+            cache_size
+        rule = SignatureGenerationRule(self.config.signature)
+        signatures = []
+        elapsed = 0.0
+        for x in range(self.config.passes):
+            for a_json_dump in corpus:
+                self._forget_normalization(a_json_dump)
+                processed_crash = DotDict({'json_dump': a_json_dump})
+                processor_meta = DotDict({'processor_notes': []})
+                start = time.time()
+                rule.act({}, {}, processed_crash, processor_meta)
+                elapsed += time.time() - start
+                signatures.append(processed_crash.signature)
+        return (
+            elapsed,
+            rule.c_signature_tool.normalization_cache.stats(),
+            signatures
+        )
+
+    #--------------------------------------------------------------------------
+    def main(self):
+        corpus = self._load_corpus()
+        if not corpus:
+            self.config.logger.error(
+                'no stacks found in %s',
+                self.config.corpus_path
+            )
+            return 1
+        number_of_crashes = len(corpus) * self.config.passes
+        cache_size = self.config.signature.c_signature.normalization_cache_size
+        results = {}
+        for mode, size in (('cache off', 0), ('cache on', cache_size)):
+            elapsed, stats, signatures = self._replay(corpus, size)
+            results[mode] = signatures
+            print '%-9s: %d crashes in %.3fs, %.1f crashes/s, %s' % (
+                mode,
+                number_of_crashes,
+                elapsed,
+                number_of_crashes / elapsed if elapsed else 0,
+                stats
+            )
+        if results['cache off'] != results['cache on']:
+            self.config.logger.error('the signatures differ between modes')
+            return 1
+        return 0
+
+
+if __name__ == '__main__':
+    generic_app.main(BenchSignatureGenerationApp)
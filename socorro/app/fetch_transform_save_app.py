@@ -75,7 +75,8 @@ class FetchTransformSaveApp(App):
     required_config.producer_consumer = Namespace()
     required_config.producer_consumer.add_option(
       'producer_consumer_class',
-      doc='the class implements a threaded producer consumer queue',
+      doc='the class implements a threaded or multiprocess producer consumer '
+          'queue',
       default='socorro.lib.threaded_task_manager.ThreadedTaskManager',
       from_string_converter=class_converter
     )
@@ -207,6 +208,14 @@ class FetchTransformSaveApp(App):
             )
             raise
 
+    #--------------------------------------------------------------------------
+    def _setup_worker_process(self):
+        """task managers that run 'transform' in separate worker processes
+        call this in each of their workers before the first job.  The
+        crashstorage instances inherited from the parent process share its
+        connections, so each worker replaces them with its own."""
+        FetchTransformSaveApp._setup_source_and_destination(self)
+
     #--------------------------------------------------------------------------
     def _setup_task_manager(self):
         """instantiate the threaded task manager to run the producer/consumer
@@ -223,11 +232,38 @@ class FetchTransformSaveApp(App):
               job_source_iterator=self.source_iterator,
               task_func=self.transform
             )
+        if hasattr(self.task_manager, 'worker_setup_func'):
+            self.task_manager.worker_setup_func = self._setup_worker_process
+            self.task_manager.worker_cleanup_func = \
+                self._cleanup_worker_process
         self.config.executor_identity = self.task_manager.executor_identity
 
+    #--------------------------------------------------------------------------
+    def _close_source_and_destination(self):
+        """close the crashstorage systems.  Some implementations buffer their
+        work and only finish it when closed."""
+        for a_store_name in ('source', 'destination'):
+            a_store = getattr(self, a_store_name, None)
+            if a_store is None:
+                continue
+            try:
+                a_store.close()
+            except Exception:
+                self.config.logger.error(
+                    'failed to close the %s crashstorage',
+                    a_store_name,
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    def _cleanup_worker_process(self):
+        """the counterpart of '_setup_worker_process', called in each worker
+        after its last job"""
+        self._close_source_and_destination()
+
     #--------------------------------------------------------------------------
     def _cleanup(self):
-        pass
+        self._close_source_and_destination()
 
     #--------------------------------------------------------------------------
     def main(self):
@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""the collector recieves crashes from the field, holding the uploads of
+many slow clients at once"""
+
+# This app can be invoked like this:
+#     .../socorro/collector/async_collector_app.py --help
+# replace the ".../" with something that makes sense for your environment
+# set both socorro and configman in your PYTHONPATH
+
+from socorro.app.generic_app import App, main
+
+from configman import Namespace
+from configman.converters import class_converter
+
+
+#==============================================================================
+class AsyncCollectorApp(App):
+    """a collector served by a single threaded AsyncCollectorServer rather
+    than by a WSGI web server.  It uses the same collector, throttler and
+    crash storage classes as the CollectorApp.  Each open connection needs a
+    file descriptor, the limit on open files must be raised to match the
+    'maximum_connections' of the server."""
+
+    app_name = 'async_collector'
+    app_version = '1.0'
+    app_description = __doc__
+
+    #--------------------------------------------------------------------------
+    # in this section, define any configuration requirements
+    required_config = Namespace()
+
+    #--------------------------------------------------------------------------
+    # collector namespace
+    #     the namespace is for config parameters about how to interpret
+    #     crash submissions
+    #--------------------------------------------------------------------------
+    required_config.namespace('collector')
+    required_config.collector.add_option(
+        'collector_class',
+        default='socorro.collector.wsgi_breakpad_collector'
+                '.StreamingBreakpadCollector',
+        doc='the name of the class that handles collection, it must have a '
+            'collect_multipart method',
+        from_string_converter=class_converter
+    )
+
+    #--------------------------------------------------------------------------
+    # throttler namespace
+    #     the namespace is for config parameters for the throttler system
+    #--------------------------------------------------------------------------
+    required_config.namespace('throttler')
+    required_config.throttler.add_option(
+        'throttler_class',
+        default='socorro.collector.throttler.LegacyThrottler',
+        doc='the class that implements the throttling action',
+        from_string_converter=class_converter
+    )
+
+    #--------------------------------------------------------------------------
+    # storage namespace
+    #     the namespace is for config parameters crash storage
+    #--------------------------------------------------------------------------
+    required_config.namespace('storage')
+    required_config.storage.add_option(
+        'crashstorage_class',
+        doc='the source storage class',
+        default='socorro.external.fs.crashstorage'
+                '.FSLegacyDatedRadixTreeStorage',
+        from_string_converter=class_converter
+    )
+
+    #--------------------------------------------------------------------------
+    # server namespace
+    #     the namespace is for config parameters of the server
+    #--------------------------------------------------------------------------
+    required_config.namespace('server')
+    required_config.server.add_option(
+        'server_class',
+        doc='the class of the server accepting the submissions',
+        default='socorro.collector.async_server.AsyncCollectorServer',
+        from_string_converter=class_converter
+    )
+
+    #--------------------------------------------------------------------------
+    def main(self):
+        self.config.crash_storage = self.config.storage.crashstorage_class(
+            self.config.storage
+        )
+        self.config.throttler = self.config.throttler.throttler_class(
+            self.config.throttler
+        )
+        collector = self.config.collector.collector_class(self.config)
+        self.server = self.config.server.server_class(
+            self.config.server,
+            collector,
+            collector.uri
+        )
+        try:
+            self.server.serve()
+        except KeyboardInterrupt:
+            self.config.logger.info('the async collector is stopping')
+        finally:
+            self.server.close()
+            self.config.crash_storage.close()
+
+
+if __name__ == '__main__':
+    main(AsyncCollectorApp)
@@ -0,0 +1,489 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""a collector server that receives the uploads of many clients at once in a
+single thread, with asyncore, and hands each completed submission to a
+fixed number of worker threads that throttle it and save it to crash
+storage.
+
+A slow client costs an open connection and a spooled request body, not a
+thread.  The request bodies are kept in memory up to 'body_spool_size'
+bytes each and in temporary files beyond that.
+
+When all the workers are busy and their queue is full, the completed
+uploads wait in the server and no new connection is accepted until they
+have all been taken by the workers.  The clients that have not connected
+wait in the listen backlog of the socket.
+
+Only what a breakpad client sends is understood: a POST of a
+multipart/form-data body with a Content-Length.  Each connection takes a
+single request and is closed after its response."""
+
+import asynchat
+import asyncore
+import cgi
+import collections
+import Queue
+import socket
+import tempfile
+import threading
+import time
+
+from configman import Namespace, RequiredConfig
+
+
+#------------------------------------------------------------------------------
+RESPONSE_STATUSES = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    411: 'Length Required',
+    413: 'Request Entity Too Large',
+    500: 'Internal Server Error',
+}
+
+
+#==============================================================================
+class SubmissionChannel(asynchat.async_chat):
+    """the connection of one client.  It reads the request headers, then the
+    body into a spooled temporary file, and waits for the server to give it
+    the response."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, server, a_socket):
+        asynchat.async_chat.__init__(self, a_socket, map=server.socket_map)
+        self.server = server
+        self.config = server.config
+        self.headers_buffer = []
+        self.headers_size = 0
+        self.body = None
+        self.boundary = None
+        self.content_length = None
+        self.reading = True
+        self.submitted = False
+        self.closed = False
+        self.last_activity = time.time()
+        self.set_terminator('\r\n\r\n')
+
+    #--------------------------------------------------------------------------
+    def readable(self):
+        return self.reading
+
+    #--------------------------------------------------------------------------
+    def collect_incoming_data(self, data):
+        self.last_activity = time.time()
+        if not self.reading:
+            # the rest of a request already answered
+            return
+        if self.body is not None:
+            self.body.write(data)
+            return
+        self.headers_size += len(data)
+        if self.headers_size > self.config.maximum_header_size:
+            self.respond(400, 'the request headers are too large\n')
+            return
+        self.headers_buffer.append(data)
+
+    #--------------------------------------------------------------------------
+    def found_terminator(self):
+        if not self.reading:
+            return
+        if self.body is None:
+            self._headers_received(''.join(self.headers_buffer))
+            self.headers_buffer = None
+        else:
+            self._body_received()
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _parse_headers(headers_block):
+        lines = headers_block.split('\r\n')
+        request_line = lines[0].split()
+        headers = {}
+        for a_line in lines[1:]:
+            if ':' in a_line:
+                name, value = a_line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return request_line, headers
+
+    #--------------------------------------------------------------------------
+    def _headers_received(self, headers_block):
+        request_line, headers = self._parse_headers(headers_block)
+        if len(request_line) != 3:
+            self.respond(400, 'bad request line\n')
+            return
+        method, uri, version = request_line
+        if uri.split('?', 1)[0] != self.server.uri:
+            self.respond(404, 'not found\n')
+            return
+        if method != 'POST':
+            self.respond(405, 'only POST is supported\n')
+            return
+        if 'transfer-encoding' in headers:
+            self.respond(411, 'a Content-Length is required\n')
+            return
+        try:
+            self.content_length = int(headers['content-length'])
+            if self.content_length < 0:
+                raise ValueError(self.content_length)
+        except (KeyError, ValueError):
+            self.respond(411, 'a Content-Length is required\n')
+            return
+        if self.content_length > self.config.maximum_content_length:
+            self.respond(413, 'the submission is too large\n')
+            return
+        content_type, parameters = cgi.parse_header(
+            headers.get('content-type', '')
+        )
+        if (
+            content_type != 'multipart/form-data' or
+            'boundary' not in parameters
+        ):
+            self.respond(400, 'a multipart/form-data body is required\n')
+            return
+        self.boundary = parameters['boundary']
+        if headers.get('expect', '').lower() == '100-continue':
+            self.push('HTTP/1.1 100 Continue\r\n\r\n')
+        self.body = tempfile.SpooledTemporaryFile(
+            max_size=self.config.body_spool_size,
+            dir=self.config.temporary_file_system_storage_path
+        )
+        if self.content_length:
+            self.set_terminator(self.content_length)
+        else:
+            self._body_received()
+
+    #--------------------------------------------------------------------------
+    def _body_received(self):
+        self.reading = False
+        self.submitted = True
+        self.body.seek(0)
+        self.server.submit(self)
+
+    #--------------------------------------------------------------------------
+    def respond(self, status, response):
+        """send the response and close the connection once it is sent"""
+        self.reading = False
+        if self.closed:
+            return
+        self.push(
+            'HTTP/1.1 %d %s\r\n'
+            'Content-Type: text/plain\r\n'
+            'Content-Length: %d\r\n'
+            'Connection: close\r\n'
+            '\r\n'
+            '%s' % (status, RESPONSE_STATUSES[status], len(response), response)
+        )
+        self.close_when_done()
+
+    #--------------------------------------------------------------------------
+    def handle_close(self):
+        self.close()
+
+    #--------------------------------------------------------------------------
+    def handle_error(self):
+        self.config.logger.warning(
+            'error on the connection from %s',
+            self.addr,
+            exc_info=True
+        )
+        self.close()
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        asynchat.async_chat.close(self)
+        if self.body is not None and not self.submitted:
+            # an upload given up on
+            self.body.close()
+        self.server.channel_closed(self)
+
+
+#==============================================================================
+class _Wakeup(asyncore.dispatcher):
+    """one end of a socket pair, for the worker threads to wake up the
+    server when there are responses to send"""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, socket_map, logger):
+        self.writer, reader = socket.socketpair()
+        self.writer.setblocking(False)
+        asyncore.dispatcher.__init__(self, reader, map=socket_map)
+        self.logger = logger
+        self.callbacks = []
+
+    #--------------------------------------------------------------------------
+    def wake(self):
+        try:
+            self.writer.send('x')
+        except socket.error:
+            # the socket buffer is full, the server is already awoken
+            pass
+
+    #--------------------------------------------------------------------------
+    def writable(self):
+        return False
+
+    #--------------------------------------------------------------------------
+    def handle_read(self):
+        self.recv(4096)
+        for a_callback in self.callbacks:
+            a_callback()
+
+    #--------------------------------------------------------------------------
+    def handle_error(self):
+        self.logger.error('error sending the responses', exc_info=True)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        asyncore.dispatcher.close(self)
+        self.writer.close()
+
+
+#==============================================================================
+class AsyncCollectorServer(asyncore.dispatcher, RequiredConfig):
+    """the listening socket, the connections of the clients and the workers
+    saving their submissions.  'collector' is a StreamingBreakpadCollector,
+    its 'collect_multipart' is called by the workers."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'ip_address',
+        doc='the IP address from which to accept submissions',
+        default='127.0.0.1'
+    )
+    required_config.add_option(
+        'port',
+        doc='the port to listen to for submissions',
+        default=8882
+    )
+    required_config.add_option(
+        'listen_backlog',
+        doc='the number of connections the operating system holds for the '
+            'server when it is not accepting',
+        default=1024
+    )
+    required_config.add_option(
+        'maximum_connections',
+        doc='the most client connections to hold open at once',
+        default=20000
+    )
+    required_config.add_option(
+        'connection_timeout',
+        doc='the seconds a client may send nothing before its connection is '
+            'closed',
+        default=300
+    )
+    required_config.add_option(
+        'maximum_header_size',
+        doc='the largest request headers, in bytes',
+        default=16384
+    )
+    required_config.add_option(
+        'maximum_content_length',
+        doc='the largest submission, in bytes',
+        default=100 * 1024 * 1024
+    )
+    required_config.add_option(
+        'body_spool_size',
+        doc='the largest request body, in bytes, to hold in memory; larger '
+            'bodies are spooled to temporary files',
+        default=262144
+    )
+    required_config.add_option(
+        'temporary_file_system_storage_path',
+        doc='a local filesystem path where request bodies are spooled',
+        default='/tmp'
+    )
+    required_config.add_option(
+        'number_of_workers',
+        doc='the number of threads saving submissions',
+        default=8
+    )
+    required_config.add_option(
+        'worker_queue_size',
+        doc='the number of completed submissions that may wait for a worker '
+            'before the server stops accepting connections',
+        default=64
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config, collector, uri='/submit'):
+        self.socket_map = {}
+        asyncore.dispatcher.__init__(self, map=self.socket_map)
+        self.config = config
+        self.collector = collector
+        self.uri = uri
+        self.channels = set()
+        # completed uploads for which the worker queue had no room
+        self.waiting = collections.deque()
+        self.responses = Queue.Queue()
+        self.submissions = Queue.Queue(config.worker_queue_size)
+        self.stopping = False
+        self.idle_checked_at = time.time()
+
+        self.wakeup = _Wakeup(self.socket_map, config.logger)
+        self.wakeup.callbacks.append(self._send_responses)
+        self.wakeup.callbacks.append(self._submit_waiting)
+
+        self.workers = []
+        for i in range(config.number_of_workers):
+            a_thread = threading.Thread(
+                name='collector-worker-%d' % i,
+                target=self._work
+            )
+            a_thread.daemon = True
+            a_thread.start()
+            self.workers.append(a_thread)
+
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((config.ip_address, config.port))
+        self.listen(config.listen_backlog)
+        config.logger.info(
+            'the async collector is listening at %s:%d',
+            config.ip_address,
+            config.port
+        )
+
+    #--------------------------------------------------------------------------
+    def readable(self):
+        """new connections are accepted only while there is room for them
+        and the workers keep up"""
+        return (
+            not self.stopping and
+            not self.waiting and
+            len(self.channels) < self.config.maximum_connections
+        )
+
+    #--------------------------------------------------------------------------
+    def writable(self):
+        return False
+
+    #--------------------------------------------------------------------------
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return
+        a_socket, address = pair
+        self.channels.add(SubmissionChannel(self, a_socket))
+
+    #--------------------------------------------------------------------------
+    def handle_error(self):
+        # running out of file descriptors must not close the server
+        self.config.logger.error(
+            'error accepting a connection',
+            exc_info=True
+        )
+
+    #--------------------------------------------------------------------------
+    def channel_closed(self, channel):
+        self.channels.discard(channel)
+
+    #--------------------------------------------------------------------------
+    def submit(self, channel):
+        """hand a completed upload to the workers"""
+        if self.waiting:
+            self.waiting.append(channel)
+            return
+        try:
+            self.submissions.put_nowait(channel)
+        except Queue.Full:
+            self.waiting.append(channel)
+
+    #--------------------------------------------------------------------------
+    def _submit_waiting(self):
+        while self.waiting:
+            try:
+                self.submissions.put_nowait(self.waiting[0])
+            except Queue.Full:
+                return
+            self.waiting.popleft()
+
+    #--------------------------------------------------------------------------
+    def _work(self):
+        while True:
+            channel = self.submissions.get()
+            if channel is None:
+                return
+            try:
+                response = self.collector.collect_multipart(
+                    channel.body,
+                    channel.boundary,
+                    channel.content_length
+                )
+                status = 200
+            except Exception:
+                self.config.logger.error(
+                    'the submission from %s could not be collected',
+                    channel.addr,
+                    exc_info=True
+                )
+                status, response = 500, 'the submission failed\n'
+            finally:
+                channel.body.close()
+            self.responses.put((channel, status, response))
+            self.wakeup.wake()
+
+    #--------------------------------------------------------------------------
+    def _send_responses(self):
+        while True:
+            try:
+                channel, status, response = self.responses.get_nowait()
+            except Queue.Empty:
+                return
+            channel.respond(status, response)
+
+    #--------------------------------------------------------------------------
+    def _close_idle_channels(self):
+        now = time.time()
+        if now - self.idle_checked_at < 1.0:
+            return
+        self.idle_checked_at = now
+        oldest_allowed = now - self.config.connection_timeout
+        for a_channel in list(self.channels):
+            if a_channel.reading and a_channel.last_activity < oldest_allowed:
+                self.config.logger.info(
+                    'closing the idle connection from %s',
+                    a_channel.addr
+                )
+                a_channel.respond(408, 'the request timed out\n')
+
+    #--------------------------------------------------------------------------
+    def serve(self, quit_check=lambda: False):
+        """run until 'stop' is called or 'quit_check' returns True"""
+        while not self.stopping and not quit_check():
+            # poll rather than select, which is limited to 1024 descriptors
+            asyncore.loop(
+                timeout=1.0,
+                use_poll=True,
+                map=self.socket_map,
+                count=1
+            )
+            self._close_idle_channels()
+
+    #--------------------------------------------------------------------------
+    def stop(self):
+        self.stopping = True
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop listening and stop the workers once they have saved the
+        submissions already given to them"""
+        self.stopping = True
+        asyncore.dispatcher.close(self)
+        for a_thread in self.workers:
+            self.submissions.put(None)
+        for a_thread in self.workers:
+            a_thread.join()
+        self._send_responses()
+        while self.waiting:
+            self.waiting.popleft().body.close()
+        for a_channel in list(self.channels):
+            a_channel.close()
+        self.wakeup.close()
@@ -0,0 +1,179 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""an incremental parser of multipart/form-data request bodies.  Unlike
+cgi.FieldStorage, it never holds more than a block of the body in memory:
+each part is handed out as soon as its headers have been read and its
+contents are read, block by block, by the caller."""
+
+import cgi
+
+
+#==============================================================================
+class MultipartParseError(Exception):
+    pass
+
+
+#==============================================================================
+class MultipartPart(object):
+    """one part of a multipart body.  Its contents must be read, through
+    'iter_contents' or 'read', before the next part is asked for; whatever
+    is left unread is skipped."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, reader, headers):
+        self.reader = reader
+        self.headers = headers
+        disposition, parameters = cgi.parse_header(
+            headers.get('content-disposition', '')
+        )
+        self.name = parameters.get('name')
+        self.filename = parameters.get('filename')
+        self.content_type = headers.get('content-type')
+        self.finished = False
+
+    #--------------------------------------------------------------------------
+    def iter_contents(self):
+        """yield the contents of the part a block at a time"""
+        if self.finished:
+            return
+        for a_block in self.reader._read_contents():
+            yield a_block
+        self.finished = True
+
+    #--------------------------------------------------------------------------
+    def read(self):
+        """return all the contents of the part"""
+        return ''.join(self.iter_contents())
+
+    #--------------------------------------------------------------------------
+    def skip(self):
+        for a_block in self.iter_contents():
+            pass
+
+
+#==============================================================================
+class MultipartReader(object):
+    """read the parts of a multipart body from a file-like 'stream'.  If
+    'content_length' is given, no more than that is read from the stream."""
+
+    #--------------------------------------------------------------------------
+    def __init__(
+        self,
+        stream,
+        boundary,
+        content_length=None,
+        block_size=65536,
+        maximum_header_size=16384
+    ):
+        self.stream = stream
+        self.delimiter = '--' + boundary
+        # the delimiter that ends the contents of a part
+        self.contents_delimiter = '\r\n' + self.delimiter
+        self.remaining = content_length
+        self.block_size = block_size
+        self.maximum_header_size = maximum_header_size
+        self.buffer = ''
+        self.exhausted = False
+
+    #--------------------------------------------------------------------------
+    def _fill(self):
+        """add a block from the stream to the buffer.  Returns False if there
+        is nothing more to read."""
+        if self.exhausted:
+            return False
+        size = self.block_size
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        a_block = self.stream.read(size) if size else ''
+        if not a_block:
+            self.exhausted = True
+            return False
+        if self.remaining is not None:
+            self.remaining -= len(a_block)
+        self.buffer += a_block
+        return True
+
+    #--------------------------------------------------------------------------
+    def _read_through(self, marker, limit):
+        """return the buffered input up to 'marker' and drop both from the
+        buffer"""
+        while True:
+            index = self.buffer.find(marker)
+            if index != -1:
+                found = self.buffer[:index]
+                self.buffer = self.buffer[index + len(marker):]
+                return found
+            if len(self.buffer) > limit:
+                raise MultipartParseError('%r not found' % marker)
+            if not self._fill():
+                raise MultipartParseError('truncated multipart body')
+
+    #--------------------------------------------------------------------------
+    def _read_exactly(self, size):
+        while len(self.buffer) < size:
+            if not self._fill():
+                raise MultipartParseError('truncated multipart body')
+        found, self.buffer = self.buffer[:size], self.buffer[size:]
+        return found
+
+    #--------------------------------------------------------------------------
+    def _read_contents(self):
+        """yield the contents of the current part up to the delimiter.  The
+        tail of the buffer that could be the start of a delimiter is kept
+        back until more input shows that it is not."""
+        delimiter = self.contents_delimiter
+        while True:
+            index = self.buffer.find(delimiter)
+            if index != -1:
+                if index:
+                    yield self.buffer[:index]
+                self.buffer = self.buffer[index + len(delimiter):]
+                return
+            safe_length = len(self.buffer) - len(delimiter) + 1
+            if safe_length > 0:
+                yield self.buffer[:safe_length]
+                self.buffer = self.buffer[safe_length:]
+            if not self._fill():
+                raise MultipartParseError('truncated multipart body')
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _parse_headers(header_block):
+        headers = {}
+        for a_line in header_block.split('\r\n'):
+            if not a_line.strip():
+                continue
+            try:
+                name, value = a_line.split(':', 1)
+            except ValueError:
+                raise MultipartParseError('bad header line %r' % a_line)
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+    #--------------------------------------------------------------------------
+    def parts(self):
+        """yield the parts, in the order they appear in the body"""
+        # anything before the first delimiter is a preamble to be ignored
+        self._read_through(self.delimiter, self.maximum_header_size)
+        while True:
+            following = self._read_exactly(2)
+            if following == '--':
+                # the closing delimiter, the epilogue is ignored
+                return
+            if following != '\r\n':
+                # transport padding may follow the delimiter
+                self.buffer = following + self.buffer
+                padding = self._read_through('\r\n', self.maximum_header_size)
+                if padding.strip():
+                    raise MultipartParseError('bad delimiter line')
+            # the line break is put back so that a part without headers is
+            # found by the same search for the blank line
+            self.buffer = '\r\n' + self.buffer
+            headers = self._parse_headers(
+                self._read_through('\r\n\r\n', self.maximum_header_size)
+            )
+            a_part = MultipartPart(self, headers)
+            yield a_part
+            a_part.skip()
@@ -5,6 +5,8 @@
 import types
 import re
 import random
+import threading
+import time
 
 from configman import Namespace, RequiredConfig
 
@@ -90,39 +92,45 @@ class LegacyThrottler(RequiredConfig):
             return an_object == x
         return generic_handler
 
+    #--------------------------------------------------------------------------
+    def interpret_condition(self, condition_str):
+        """a condition given as a string is python code if it evaluates,
+        otherwise it is a literal for an equality test"""
+        if not isinstance(condition_str, basestring):
+            return condition_str
+        try:
+            condition = eval(condition_str)
+            self.config.logger.info(
+              '%s interprets "%s" as python code' %
+              (self.__class__, condition_str)
+            )
+        except Exception:
+            self.config.logger.info(
+              '%s interprets "%s" as a literal for an equality test' %
+              (self.__class__, condition_str)
+            )
+            condition = condition_str
+        return condition
+
+    #--------------------------------------------------------------------------
+    def handler_for_condition(self, condition):
+        if isinstance(condition, Compiled_Regular_Expression_Type):
+            return self.regexp_handler_factory(condition)
+        elif isinstance(condition, bool):
+            return self.bool_handler_factory(condition)
+        elif isinstance(condition, types.FunctionType):
+            return condition
+        else:
+            return self.generic_handler_factory(condition)
+
     #--------------------------------------------------------------------------
     def preprocess_throttle_conditions(self, original_throttle_conditions):
         new_throttle_conditions = []
         for key, condition_str, percentage in original_throttle_conditions:
-            #print "preprocessing %s %s %d" % (key, condition, percentage)
-            if isinstance(condition_str, basestring):
-                try:
-                    condition = eval(condition_str)
-                    self.config.logger.info(
-                      '%s interprets "%s" as python code' %
-                      (self.__class__, condition_str)
-                    )
-                except Exception:
-                    self.config.logger.info(
-                      '%s interprets "%s" as a literal for an equality test' %
-                      (self.__class__, condition_str)
-                    )
-                    condition = condition_str
-            else:
-                condition = condition_str
-            if isinstance(condition, Compiled_Regular_Expression_Type):
-                #print "reg exp"
-                new_condition = self.regexp_handler_factory(condition)
-                #print newCondition
-            elif isinstance(condition, bool):
-                #print "bool"
-                new_condition = self.bool_handler_factory(condition)
-                #print newCondition
-            elif isinstance(condition, types.FunctionType):
-                new_condition = condition
-            else:
-                new_condition = self.generic_handler_factory(condition)
-            new_throttle_conditions.append((key, new_condition, percentage))
+            condition = self.interpret_condition(condition_str)
+            new_throttle_conditions.append(
+                (key, self.handler_for_condition(condition), percentage)
+            )
         return new_throttle_conditions
 
     #--------------------------------------------------------------------------
@@ -202,3 +210,203 @@ class LegacyThrottler(RequiredConfig):
               raw_crash.Version
             )
             return ACCEPT, percentage
+
+
+#==============================================================================
+class CompiledThrottler(LegacyThrottler):
+    """a throttler that gives the same answers as the LegacyThrottler from
+    the same throttle_conditions, but that compiles them into a decision
+    table when it starts.
+
+    Consecutive rules that test the same field for equality with a literal
+    become a single dictionary lookup.  The other rules are applied as the
+    LegacyThrottler applies them.  The rules are never reordered: the first
+    one to match decides and its percentage is applied.
+
+    The number of crashes matched by each rule is counted.  The counts are
+    returned by 'hit_statistics' and logged every 'hit_log_interval'
+    seconds, as a guide to ordering the throttle_conditions."""
+
+    required_config = Namespace()
+    required_config.add_option(
+      'hit_log_interval',
+      doc='the seconds between logs of the number of crashes matched by '
+          'each throttle condition (0 for never)',
+      default=3600,
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        self.config = config
+        interpreted_conditions = [
+            (key, self.interpret_condition(condition_str), percentage)
+            for key, condition_str, percentage in config.throttle_conditions
+        ]
+        self.processed_throttle_conditions = [
+            (key, self.handler_for_condition(condition), percentage)
+            for key, condition, percentage in interpreted_conditions
+        ]
+        self.decision_table = self.compile_throttle_conditions(
+            interpreted_conditions
+        )
+        self.hits = [0] * len(self.processed_throttle_conditions)
+        self.misses = 0
+        self.hits_lock = threading.Lock()
+        self.hits_logged_at = time.time()
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _is_equality_literal(key, condition):
+        if key in ('*', None):
+            return False
+        if isinstance(
+            condition,
+            (Compiled_Regular_Expression_Type, bool, types.FunctionType)
+        ):
+            return False
+        try:
+            hash(condition)
+        except TypeError:
+            return False
+        return True
+
+    #--------------------------------------------------------------------------
+    def compile_throttle_conditions(self, interpreted_conditions):
+        """return a list of steps of the form (key, table, rules).  For a run
+        of equality tests on a key, 'table' maps each literal to the index of
+        the first rule testing for it and 'rules' is a tuple of (index,
+        literal).  For any other rule, 'table' is None and 'rules' is the
+        tuple (index, handler)."""
+        decision_table = []
+        for index, (key, condition, percentage) in enumerate(
+            interpreted_conditions
+        ):
+            if self._is_equality_literal(key, condition):
+                if (
+                    decision_table and
+                    decision_table[-1][0] == key and
+                    decision_table[-1][1] is not None
+                ):
+                    unused_key, table, rules = decision_table.pop()
+                else:
+                    table, rules = {}, ()
+                # the first of two rules testing for the same literal wins
+                table.setdefault(condition, index)
+                decision_table.append(
+                    (key, table, rules + ((index, condition),))
+                )
+            else:
+                decision_table.append(
+                    (
+                        key,
+                        None,
+                        (index, self.processed_throttle_conditions[index][1])
+                    )
+                )
+        return decision_table
+
+    #--------------------------------------------------------------------------
+    def _first_match(self, raw_crash):
+        """return the index of the first throttle condition to match the
+        raw_crash or None"""
+        for key, table, rules in self.decision_table:
+            if table is not None:
+                try:
+                    value = raw_crash[key]
+                except KeyError:
+                    continue
+                try:
+                    index = table.get(value)
+                except TypeError:
+                    # an unhashable value is compared to each literal
+                    index = None
+                    for an_index, a_literal in rules:
+                        if a_literal == value:
+                            index = an_index
+                            break
+                if index is not None:
+                    return index
+                continue
+            index, condition = rules
+            throttle_match = False
+            try:
+                if key == '*':
+                    throttle_match = condition(raw_crash)
+                else:
+                    throttle_match = condition(raw_crash[key])
+            except KeyError:
+                if key == None:
+                    throttle_match = condition(None)
+                else:
+                    continue
+            except IndexError:
+                pass
+            if throttle_match:
+                return index
+        return None
+
+    #--------------------------------------------------------------------------
+    def apply_throttle_conditions(self, raw_crash):
+        """returns the same tuple as LegacyThrottler.apply_throttle_conditions
+        """
+        index = self._first_match(raw_crash)
+        self._record_hit(index)
+        if index is None:
+            # nothing matched, reject
+            return True, 0
+        percentage = self.processed_throttle_conditions[index][2]
+        if percentage is None:
+            return None, None
+        random_real_percent = random.random() * 100.0
+        return random_real_percent > percentage, percentage
+
+    #--------------------------------------------------------------------------
+    def _record_hit(self, index):
+        with self.hits_lock:
+            if index is None:
+                self.misses += 1
+            else:
+                self.hits[index] += 1
+            interval = self.config.hit_log_interval
+            if (
+                not interval or
+                time.time() - self.hits_logged_at < interval
+            ):
+                return
+            self.hits_logged_at = time.time()
+        self._log_hits()
+
+    #--------------------------------------------------------------------------
+    def hit_statistics(self):
+        """returns a list of mappings of each throttle condition to the
+        number of crashes it matched, in the order of the conditions.  The
+        crashes that no condition matched are counted in a last mapping with
+        the condition '(no match)'."""
+        with self.hits_lock:
+            statistics = [
+                {
+                    'key': key,
+                    'condition': condition_str,
+                    'percentage': percentage,
+                    'hits': self.hits[index],
+                }
+                for index, (key, condition_str, percentage) in enumerate(
+                    self.config.throttle_conditions
+                )
+            ]
+            statistics.append({
+                'key': None,
+                'condition': '(no match)',
+                'percentage': 0,
+                'hits': self.misses,
+            })
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def _log_hits(self):
+        for a_hit in self.hit_statistics():
+            self.config.logger.info(
+                'throttle condition %(key)r %(condition)r '
+                '(%(percentage)s%%): %(hits)d hits',
+                a_hit
+            )
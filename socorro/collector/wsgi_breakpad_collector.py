@@ -2,12 +2,17 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import cgi
+import os
+import tempfile
 import web
 import time
 
 from socorro.lib.ooid import createNewOoid
 from socorro.lib.util import DotDict
+from socorro.collector.multipart import MultipartReader
 from socorro.collector.throttler import DISCARD, IGNORE
+from socorro.external.crashstorage_base import FileDumpsMapping
 from socorro.lib.datetimeutil import utc_now
 
 from configman import RequiredConfig, Namespace
@@ -70,10 +75,9 @@ class BreakpadCollector(RequiredConfig):
         return raw_crash, dumps
 
     #--------------------------------------------------------------------------
-    def POST(self, *args):
-        raw_crash, dumps = \
-            self._make_raw_crash_and_dumps(web.webapi.rawinput())
-
+    def _process_metadata(self, raw_crash):
+        """stamp, name and throttle a crash.  Returns the crash_id and, if
+        the crash is not to be kept, the response to give the client."""
         current_timestamp = utc_now()
         raw_crash.submitted_timestamp = current_timestamp.isoformat()
         # legacy - ought to be removed someday
@@ -100,10 +104,20 @@ class BreakpadCollector(RequiredConfig):
 
         if raw_crash.legacy_processing == DISCARD:
             self.logger.info('%s discarded', crash_id)
-            return "Discarded=1\n"
+            return crash_id, "Discarded=1\n"
         if raw_crash.legacy_processing == IGNORE:
             self.logger.info('%s ignored', crash_id)
-            return "Unsupported=1\n"
+            return crash_id, "Unsupported=1\n"
+        return crash_id, None
+
+    #--------------------------------------------------------------------------
+    def POST(self, *args):
+        raw_crash, dumps = \
+            self._make_raw_crash_and_dumps(web.webapi.rawinput())
+
+        crash_id, rejection = self._process_metadata(raw_crash)
+        if rejection is not None:
+            return rejection
 
         self.config.crash_storage.save_raw_crash(
           raw_crash,
@@ -112,3 +126,163 @@ class BreakpadCollector(RequiredConfig):
         )
         self.logger.info('%s accepted', crash_id)
         return "CrashID=%s%s\n" % (self.dump_id_prefix, crash_id)
+
+
+#==============================================================================
+class StreamingBreakpadCollector(BreakpadCollector):
+    """a collector that parses multipart submissions as they arrive rather
+    than through web.py, which holds each dump in memory several times.
+
+    The metadata fields precede the dumps in a breakpad submission, so the
+    crash is throttled when the first dump is reached: a crash that is not
+    kept is answered before its dumps are read.  Fields that come after a
+    dump are saved but play no part in the throttling.
+
+    A dump is kept in memory up to 'dump_spool_size' bytes and spooled to a
+    temporary file beyond that.  When any dump of a crash is in a file, the
+    crash storage gets all of them as files, through
+    'save_raw_crash_with_file_dumps', and the files are removed once it is
+    done."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'dump_spool_size',
+        doc='the largest dump, in bytes, to hold in memory; larger dumps '
+            'are spooled to temporary files',
+        default=1048576,
+    )
+    required_config.add_option(
+        'temporary_file_system_storage_path',
+        doc='a local filesystem path where dumps are spooled',
+        default='/tmp',
+    )
+    required_config.add_option(
+        'read_block_size',
+        doc='the number of bytes to read from the client at a time',
+        default=65536,
+    )
+
+    #--------------------------------------------------------------------------
+    def _spool(self, a_part):
+        """read the contents of a dump part.  Returns the dump and None if it
+        fit in memory or None and the pathname of its temporary file."""
+        spool_size = self.config.collector.dump_spool_size
+        blocks = []
+        size = 0
+        temporary_file = None
+        try:
+            for a_block in a_part.iter_contents():
+                if temporary_file is not None:
+                    temporary_file.write(a_block)
+                    continue
+                blocks.append(a_block)
+                size += len(a_block)
+                if size > spool_size:
+                    temporary_file = self._temporary_file()
+                    temporary_file.writelines(blocks)
+                    blocks = None
+        except Exception:
+            if temporary_file is not None:
+                temporary_file.close()
+                self._remove_files([temporary_file.name])
+            raise
+        if temporary_file is None:
+            return ''.join(blocks), None
+        temporary_file.close()
+        return None, temporary_file.name
+
+    #--------------------------------------------------------------------------
+    def _temporary_file(self):
+        return tempfile.NamedTemporaryFile(
+            dir=self.config.collector.temporary_file_system_storage_path,
+            prefix='collector-',
+            suffix='.dump',
+            delete=False
+        )
+
+    #--------------------------------------------------------------------------
+    def _remove_files(self, pathnames):
+        for a_pathname in pathnames:
+            try:
+                os.unlink(a_pathname)
+            except OSError:
+                self.logger.warning(
+                    'could not remove the temporary file %s',
+                    a_pathname,
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    def POST(self, *args):
+        environment = web.ctx.env
+        content_type, parameters = cgi.parse_header(
+            environment.get('CONTENT_TYPE', '')
+        )
+        if content_type != 'multipart/form-data' or \
+                'boundary' not in parameters:
+            return super(StreamingBreakpadCollector, self).POST(*args)
+        try:
+            content_length = int(environment.get('CONTENT_LENGTH'))
+        except (TypeError, ValueError):
+            content_length = None
+        return self.collect_multipart(
+            environment['wsgi.input'],
+            parameters['boundary'],
+            content_length
+        )
+
+    #--------------------------------------------------------------------------
+    def collect_multipart(self, stream, boundary, content_length=None):
+        """collect the crash in the multipart body read from 'stream' and
+        return the response to give the client"""
+        reader = MultipartReader(
+            stream,
+            boundary,
+            content_length,
+            self.config.collector.read_block_size
+        )
+
+        raw_crash = DotDict()
+        dumps = DotDict()
+        file_dumps = FileDumpsMapping()
+        crash_id = None
+        try:
+            for a_part in reader.parts():
+                if a_part.filename is None:
+                    raw_crash[a_part.name] = a_part.read()
+                    continue
+                if crash_id is None:
+                    crash_id, rejection = self._process_metadata(raw_crash)
+                    if rejection is not None:
+                        return rejection
+                contents, pathname = self._spool(a_part)
+                if pathname is None:
+                    dumps[a_part.name] = contents
+                else:
+                    file_dumps[a_part.name] = pathname
+            if crash_id is None:
+                # a crash without dumps
+                crash_id, rejection = self._process_metadata(raw_crash)
+                if rejection is not None:
+                    return rejection
+
+            if file_dumps:
+                for a_dump_name, contents in dumps.iteritems():
+                    with self._temporary_file() as f:
+                        file_dumps[a_dump_name] = f.name
+                        f.write(contents)
+                self.config.crash_storage.save_raw_crash_with_file_dumps(
+                    raw_crash,
+                    file_dumps,
+                    crash_id
+                )
+            else:
+                self.config.crash_storage.save_raw_crash(
+                    raw_crash,
+                    dumps,
+                    crash_id
+                )
+        finally:
+            self._remove_files(file_dumps.values())
+        self.logger.info('%s accepted', crash_id)
+        return "CrashID=%s%s\n" % (self.dump_id_prefix, crash_id)
@@ -202,10 +202,8 @@ class AutomaticEmailsCronApp(BaseCronApp, ElasticSearchBase):
             urls=self.config.elasticsearch.elasticsearch_urls,
             timeout=self.config.elasticsearch.elasticsearch_timeout,
         )
-        search = (
-            connection.indexes(*indexes).doctypes(
-                self.config.elasticsearch.elasticsearch_doctype
-            ).order_by('processed_crash.email')
+        search = connection.indexes(*indexes).doctypes(
+            self.config.elasticsearch.elasticsearch_doctype
         )
 
         # Create filters.
@@ -222,8 +220,6 @@ class AutomaticEmailsCronApp(BaseCronApp, ElasticSearchBase):
         filters &= ~elasticutils.F(**args_not)
 
         search = search.filter(filters)
-        count = search.count()  # Total number of results.
-        search = search[:count]
 
         # Get the recently sent emails
         emails = self.get_list_of_emails(params, connection)
@@ -251,10 +247,15 @@ class AutomaticEmailsCronApp(BaseCronApp, ElasticSearchBase):
             ),
         ))
 
+        # The crash reports are scrolled through rather than read all at
+        # once, there can be many of them. The emails are only sent once
+        # the scroll is over: sending a whole batch of them could take
+        # longer than elasticsearch keeps the scroll open.
+        reports_to_email = []
         for hit in search.values_dict(
             'processed_crash.email',
             'processed_crash.classifications.support.classification',
-        ):
+        ).scroll():
             res = validation_rules.apply_until_predicate_fails(hit)
 
             if res is None:  # All predicates succeeded!
@@ -268,11 +269,15 @@ class AutomaticEmailsCronApp(BaseCronApp, ElasticSearchBase):
                     # no generic email will be sent anymore.
                     continue
 
-                email = hit['processed_crash.email']
-                self.send_email(hit)
-                self.update_user(email, run_datetime, connection.get_es())
-                emails[email] = run_datetime
-                # logger.info('Automatic Email sent to %s', email)
+                # Later reports with the same address fail the validation.
+                emails[hit['processed_crash.email']] = run_datetime
+                reports_to_email.append(hit)
+
+        for report in reports_to_email:
+            email = report['processed_crash.email']
+            self.send_email(report)
+            self.update_user(email, run_datetime, connection.get_es())
+            # logger.info('Automatic Email sent to %s', email)
 
         # Make sure the next run will have updated data, to avoid sending an
         # email several times.
@@ -406,9 +411,8 @@ class AutomaticEmailsCronApp(BaseCronApp, ElasticSearchBase):
 
         emails = {}
         try:
-            res = search.execute()
-            for hit in res.results:
-                emails[hit['_id']] = hit['_source']['last_sending']
+            for hit in search.scroll():
+                emails[hit._id] = hit['last_sending']
         except ElasticHttpNotFoundError:
             # If the emails index does not exist, that means it's the first
             # time this script runs, and we should create the index.
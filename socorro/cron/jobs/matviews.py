@@ -4,6 +4,8 @@
 
 import datetime
 
+from configman import Namespace
+from configman.converters import class_converter
 from crontabber.base import BaseCronApp
 from crontabber.mixins import (
     as_backfill_cron_app,
@@ -14,7 +16,7 @@ from crontabber.mixins import (
 
 @with_postgres_transactions()
 @with_single_postgres_transaction()
-class _MatViewBase(BaseCronApp):
+class _MatViewProcBase(BaseCronApp):
 
     app_version = '1.0'  # default
     app_description = "Run certain matview stored procedures"
@@ -44,6 +46,40 @@ class _MatViewBase(BaseCronApp):
         self.run_proc(connection)
 
 
+class _MatViewBase(_MatViewProcBase):
+    """once its transaction is committed, a matview job forgets the results
+    that the middleware cached for the services in 'invalidates'"""
+
+    invalidates = ()
+
+    required_config = Namespace()
+    required_config.namespace('result_cache')
+    required_config.result_cache.add_option(
+        'result_cache_class',
+        doc='the class of the result cache of the middleware; set both to '
+            'the same MemcachedResultCache, nothing else can be invalidated '
+            'from another process',
+        default='socorro.middleware.result_cache.NoResultCache',
+        from_string_converter=class_converter
+    )
+
+    def _run_proxy(self, *args, **kwargs):
+        result = super(_MatViewBase, self)._run_proxy(*args, **kwargs)
+        if self.invalidates:
+            self.invalidate_result_cache()
+        return result
+
+    def invalidate_result_cache(self):
+        result_cache = self.config.result_cache.result_cache_class(
+            self.config.result_cache
+        )
+        result_cache.invalidate(self.invalidates)
+        self.config.logger.debug(
+            'invalidated the cached results of %s',
+            ', '.join(self.invalidates)
+        )
+
+
 @as_backfill_cron_app
 class _MatViewBackfillBase(_MatViewBase):
 
@@ -76,6 +112,7 @@ class TCBSCronApp(_MatViewBackfillBase):
         'signatures-matview',
         'reports-clean',
     )
+    invalidates = ('Crashes',)
 
 
 class ADUCronApp(_MatViewBackfillBase):
@@ -88,6 +125,7 @@ class NightlyBuildsCronApp(_MatViewBackfillBase):
     proc_name = 'update_nightly_builds'
     app_name = 'nightly-builds-matview'
     depends_on = ('reports-clean',)
+    invalidates = ('CrashTrends',)
 
 
 class BuildADUCronApp(_MatViewBackfillBase):
@@ -103,6 +141,7 @@ class CrashesByUserCronApp(_MatViewBackfillBase):
         'adu-matview',
         'reports-clean',
     )
+    invalidates = ('Crashes',)
 
 
 class CrashesByUserBuildCronApp(_MatViewBackfillBase):
@@ -112,6 +151,7 @@ class CrashesByUserBuildCronApp(_MatViewBackfillBase):
         'build-adu-matview',
         'reports-clean'
     )
+    invalidates = ('Crashes',)
 
 
 class HomePageGraphCronApp(_MatViewBackfillBase):
@@ -121,6 +161,7 @@ class HomePageGraphCronApp(_MatViewBackfillBase):
         'adu-matview',
         'reports-clean',
     )
+    invalidates = ('Crashes',)
 
 
 class HomePageGraphBuildCronApp(_MatViewBackfillBase):
@@ -130,12 +171,14 @@ class HomePageGraphBuildCronApp(_MatViewBackfillBase):
         'build-adu-matview',
         'reports-clean',
     )
+    invalidates = ('Crashes',)
 
 
 class TCBSBuildCronApp(_MatViewBackfillBase):
     proc_name = 'update_tcbs_build'
     app_name = 'tcbs-build-matview'
     depends_on = ('reports-clean',)
+    invalidates = ('Crashes',)
 
 
 class ExplosivenessCronApp(_MatViewBackfillBase):
@@ -185,6 +228,7 @@ class ExploitabilityCronApp(_MatViewBackfillBase):
         'tcbs-matview',
         'reports-clean'
     )
+    invalidates = ('Crashes',)
 
 
 class SignatureSummaryProductsCronApp(_MatViewBackfillBase):
@@ -194,6 +238,7 @@ class SignatureSummaryProductsCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryInstallationsCronApp(_MatViewBackfillBase):
@@ -203,6 +248,7 @@ class SignatureSummaryInstallationsCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryUptimeCronApp(_MatViewBackfillBase):
@@ -212,6 +258,7 @@ class SignatureSummaryUptimeCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryOsCronApp(_MatViewBackfillBase):
@@ -221,6 +268,7 @@ class SignatureSummaryOsCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryProcessTypeCronApp(_MatViewBackfillBase):
@@ -230,6 +278,7 @@ class SignatureSummaryProcessTypeCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryArchitectureCronApp(_MatViewBackfillBase):
@@ -239,6 +288,7 @@ class SignatureSummaryArchitectureCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryFlashVersionCronApp(_MatViewBackfillBase):
@@ -248,6 +298,7 @@ class SignatureSummaryFlashVersionCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryDeviceCronApp(_MatViewBackfillBase):
@@ -257,6 +308,7 @@ class SignatureSummaryDeviceCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class SignatureSummaryGraphicsCronApp(_MatViewBackfillBase):
@@ -266,6 +318,7 @@ class SignatureSummaryGraphicsCronApp(_MatViewBackfillBase):
         'reports-clean',
         'product-versions-matview'
     )
+    invalidates = ('SignatureSummary',)
 
 
 class AndroidDevicesCronApp(_MatViewBackfillBase):
@@ -287,6 +340,7 @@ class CrashAduByBuildSignatureCronApp(_MatViewBackfillBase):
         'reports-clean',
         'build-adu-matview',
     )
+    invalidates = ('Crashes',)
 
 
 class GCCrashes(_MatViewBackfillBase):
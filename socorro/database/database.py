@@ -148,6 +148,20 @@ class LoggingCursor(psycopg2.extensions.cursor):
     super(LoggingCursor,self).executemany(sql,args)
 
 
+#-----------------------------------------------------------------------------------------------------------------
+def databaseDsn (config):
+  """the dsn of the database described by 'config', its port is 5432 if 'config' has none"""
+  port = config.get('database_port', '')
+  if port == '':
+    port = 5432
+  return "host=%s port=%s dbname=%s user=%s password=%s" % (
+    config['database_hostname'],
+    port,
+    config['database_name'],
+    config['database_username'],
+    config['database_password'],
+  )
+
 #=================================================================================================================
 class Database(object):
   """a simple factory for creating connections for a database.  It doesn't track what it gives out"""
@@ -156,7 +170,7 @@ class Database(object):
     super(Database, self).__init__()
     if 'database_port' not in config or config.get('database_port') == '':
       config['database_port'] = 5432
-    self.dsn = "host=%(database_hostname)s port=%(database_port)s dbname=%(database_name)s user=%(database_username)s password=%(database_password)s" % config
+    self.dsn = databaseDsn(config)
     self.logger = config.setdefault('logger', None)
     if logger:
       self.logger = logger
@@ -210,3 +224,231 @@ class DatabaseConnectionPool(dict):
       except:
         util.reportExceptionAndContinue(self.logger)
 
+
+#=================================================================================================================
+class PooledConnection(object):
+  """a stand in for a connection handed out by a PooledDatabase.  It behaves just like the connection that it wraps,
+  except that 'close' gives the connection back to the pool rather than closing it."""
+  #-----------------------------------------------------------------------------------------------------------------
+  def __init__(self, pool, connection):
+    self._pool = pool
+    self._connection = connection
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def __getattr__(self, name):
+    if self._connection is None:
+      raise psycopg2.InterfaceError('connection already given back to the pool')
+    return getattr(self._connection, name)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def close(self):
+    """give the connection back to the pool.  Closing more than once does nothing."""
+    connection, self._connection = self._connection, None
+    if connection is not None:
+      self._pool.checkin(connection)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def __enter__(self):
+    return self
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+#=================================================================================================================
+class PooledDatabase(Database):
+  """a thread safe pool of connections to one database.  It is a drop in replacement for Database: 'connection'
+  returns a connection from the pool and closing that connection gives it back.
+
+  At most 'maximumSize' connections are open at once; when they are all in use, 'connection' waits up to
+  'waitTimeout' seconds for one to be given back before raising CannotConnectToDatabase.  A connection that has
+  been idle for more than 'healthCheckInterval' seconds is tested with a trivial query before being handed out, and
+  one idle for more than 'idleTimeout' seconds is closed.  Connections are given back with their transaction rolled
+  back, so callers must commit anything that they want to keep, as they already do with Database."""
+  #-----------------------------------------------------------------------------------------------------------------
+  def __init__(self, config, logger=None, maximumSize=10, idleTimeout=300, healthCheckInterval=30, waitTimeout=10):
+    super(PooledDatabase, self).__init__(config, logger)
+    self.maximumSize = maximumSize
+    self.idleTimeout = idleTimeout
+    self.healthCheckInterval = healthCheckInterval
+    self.waitTimeout = waitTimeout
+    self.description = "%(database_hostname)s:%(database_port)s/%(database_name)s as %(database_username)s" % config
+    self._condition = threading.Condition()
+    self._idle = []  # (connection, time given back) pairs, the most recently used last
+    self._numberOfConnections = 0  # in use and idle
+    self._statistics = {
+      'checkouts': 0,
+      'waits': 0,
+      'wait_seconds_total': 0.0,
+      'wait_seconds_maximum': 0.0,
+      'timeouts': 0,
+      'connections_opened': 0,
+      'connections_discarded': 0,
+    }
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def connection (self, databaseModule=psycopg2):
+    while True:
+      aConnection, givenBackAt = self._reserve()
+      if aConnection is None:
+        try:
+          aConnection = super(PooledDatabase, self).connection(databaseModule)
+        except:
+          self._forget(None)
+          raise
+        with self._condition:
+          self._statistics['connections_opened'] += 1
+        return PooledConnection(self, aConnection)
+      if time.time() - givenBackAt < self.healthCheckInterval or self._isHealthy(aConnection):
+        return PooledConnection(self, aConnection)
+      self.logger.info("%s - discarding a broken pooled connection", self.description)
+      self._forget(aConnection)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _reserve (self):
+    """take an idle connection or the right to open a new one, waiting if the pool is at its maximum size.  Returns
+    a (connection, time given back) pair; the connection is None if a new one should be opened."""
+    start = time.time()
+    waited = False
+    evicted = []
+    try:
+      with self._condition:
+        evicted = self._takeExpired(start)
+        while True:
+          if self._idle:
+            reserved = self._idle.pop()
+            break
+          if self._numberOfConnections < self.maximumSize:
+            self._numberOfConnections += 1
+            reserved = (None, None)
+            break
+          remaining = start + self.waitTimeout - time.time()
+          if remaining <= 0:
+            self._statistics['timeouts'] += 1
+            raise CannotConnectToDatabase("%s - no connection was free within %s seconds" %
+                                          (self.description, self.waitTimeout))
+          waited = True
+          self._condition.wait(remaining)
+        self._statistics['checkouts'] += 1
+        if waited:
+          waitSeconds = time.time() - start
+          self._statistics['waits'] += 1
+          self._statistics['wait_seconds_total'] += waitSeconds
+          self._statistics['wait_seconds_maximum'] = max(self._statistics['wait_seconds_maximum'], waitSeconds)
+        return reserved
+    finally:
+      self._closeAll(evicted)
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _takeExpired (self, now):
+    """remove from the pool the connections that have been idle for too long.  The lock must be held; the caller
+    closes the returned connections."""
+    expired = [aConnection for aConnection, givenBackAt in self._idle if now - givenBackAt > self.idleTimeout]
+    if expired:
+      self._idle = [x for x in self._idle if now - x[1] <= self.idleTimeout]
+      self._numberOfConnections -= len(expired)
+      self._statistics['connections_discarded'] += len(expired)
+      self._condition.notify(len(expired))
+    return expired
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _closeAll (self, connections):
+    for aConnection in connections:
+      try:
+        aConnection.close()
+      except Exception:
+        pass
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _forget (self, aConnection):
+    """a connection reserved from the pool will never come back, make room for another"""
+    if aConnection is not None:
+      self._closeAll([aConnection])
+    with self._condition:
+      self._numberOfConnections -= 1
+      if aConnection is not None:
+        self._statistics['connections_discarded'] += 1
+      self._condition.notify()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def _isHealthy (self, aConnection):
+    try:
+      cursor = aConnection.cursor()
+      cursor.execute('select 1')
+      cursor.fetchall()
+      aConnection.rollback()
+      return True
+    except Exception:
+      return False
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def checkin (self, aConnection):
+    """take back a connection handed out by 'connection'.  Its transaction, if any, is rolled back.  A connection
+    that is closed or that fails to roll back is discarded."""
+    try:
+      if aConnection.closed:
+        raise psycopg2.InterfaceError('connection closed')
+      aConnection.rollback()
+    except Exception:
+      self._forget(aConnection)
+      return
+    with self._condition:
+      self._idle.append((aConnection, time.time()))
+      self._condition.notify()
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def statistics (self):
+    """returns a mapping of the size of the pool and of the time spent waiting for connections"""
+    with self._condition:
+      result = dict(self._statistics)
+      result['size'] = self._numberOfConnections
+      result['idle'] = len(self._idle)
+      result['in_use'] = self._numberOfConnections - len(self._idle)
+      result['maximum_size'] = self.maximumSize
+      result['wait_seconds_average'] = (
+        result['wait_seconds_total'] / result['waits'] if result['waits'] else 0.0
+      )
+      return result
+
+  #-----------------------------------------------------------------------------------------------------------------
+  def cleanup (self):
+    """close the idle connections.  Connections in use are closed as they are given back."""
+    with self._condition:
+      idle = [aConnection for aConnection, givenBackAt in self._idle]
+      self._idle = []
+      self._numberOfConnections -= len(idle)
+      self._condition.notify_all()
+    self._closeAll(idle)
+
+#-----------------------------------------------------------------------------------------------------------------
+# the pools of the process, one for each database
+_pooledDatabases = {}
+_pooledDatabasesLock = threading.Lock()
+
+#-----------------------------------------------------------------------------------------------------------------
+def getPooledDatabase (config, logger=None):
+  """return the process wide PooledDatabase for the database described by 'config', creating it on first use.  The
+  pool is sized by the optional 'database_pool_size', 'database_pool_idle_timeout',
+  'database_pool_health_check_interval' and 'database_pool_wait_timeout' entries of 'config'.  Those are only read
+  when the pool is created."""
+  dsn = databaseDsn(config)
+  with _pooledDatabasesLock:
+    try:
+      return _pooledDatabases[dsn]
+    except KeyError:
+      pool = _pooledDatabases[dsn] = PooledDatabase(
+        config,
+        logger,
+        maximumSize=config.get('database_pool_size', 10),
+        idleTimeout=config.get('database_pool_idle_timeout', 300),
+        healthCheckInterval=config.get('database_pool_health_check_interval', 30),
+        waitTimeout=config.get('database_pool_wait_timeout', 10),
+      )
+      return pool
+
+#-----------------------------------------------------------------------------------------------------------------
+def pooledDatabaseStatistics ():
+  """returns a mapping of the description of each pool of the process to its statistics"""
+  with _pooledDatabasesLock:
+    pools = _pooledDatabases.values()
+  return dict((pool.description, pool.statistics()) for pool in pools)
@@ -68,3 +68,12 @@ class ServiceUnavailable(Exception):
     """When a service is requested but cannot be found"""
     pass
 
+
+
+class StreamedResult(tuple):
+    """The result of a service that is sent as it is produced instead of
+    being serialized as JSON: an iterable of strings and their content type.
+    It can only be read once, so it is never cached. """
+
+    def __new__(cls, body, content_type):
+        return super(StreamedResult, cls).__new__(cls, (body, content_type))
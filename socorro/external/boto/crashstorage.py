@@ -7,10 +7,15 @@ import boto.s3.connection
 import boto.exception
 import json
 import os
+import Queue
 import socket
+import sys
+import threading
 import datetime
 import contextlib
 
+from cStringIO import StringIO
+
 from socorro.external.crashstorage_base import (
     CrashStorageBase,
     CrashIDNotFound
@@ -21,6 +26,19 @@ from configman import Namespace
 from configman.converters import class_converter
 
 
+#==============================================================================
+class _PendingUpload(object):
+    """an object to be uploaded by an upload thread.  The thread that
+    submitted it waits on 'done'."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, key, thing):
+        self.key = key
+        self.thing = thing
+        self.exc_info = None
+        self.done = threading.Event()
+
+
 #==============================================================================
 class BotoS3CrashStorage(CrashStorageBase):
     """This class sends processed crash reports to an end point reachable
@@ -96,6 +114,33 @@ class BotoS3CrashStorage(CrashStorageBase):
         reference_value_from='resource.boto',
         likely_to_be_changed=True,
     )
+    required_config.add_option(
+        'secure',
+        doc="use https (turn off for a local S3 stand-in)",
+        default=True,
+        reference_value_from='resource.boto',
+    )
+    required_config.add_option(
+        'number_of_upload_threads',
+        doc="the number of threads uploading the objects of the crashes in "
+            "parallel (0 to upload them one at a time)",
+        default=0,
+        reference_value_from='resource.boto',
+    )
+    required_config.add_option(
+        'multipart_threshold',
+        doc="the size, in bytes, beyond which an object is sent with a "
+            "multipart upload (0 for never)",
+        default=16 * 1024 * 1024,
+        reference_value_from='resource.boto',
+    )
+    required_config.add_option(
+        'multipart_chunk_size',
+        doc="the size, in bytes, of the parts of a multipart upload (S3 "
+            "requires at least 5MB)",
+        default=8 * 1024 * 1024,
+        reference_value_from='resource.boto',
+    )
 
     operational_exceptions = (
         socket.timeout,
@@ -129,6 +174,15 @@ class BotoS3CrashStorage(CrashStorageBase):
         self._S3ResponseError = boto.exception.S3ResponseError
         self._open = open
 
+        # the upload threads have connections of their own, made again when
+        # the generation changes in 'force_reconnect'
+        self._connection_generation = 0
+        self._upload_thread_local = threading.local()
+        self._upload_queue = None
+        self._upload_threads = []
+        if config.get('number_of_upload_threads'):
+            self._start_upload_threads(config.number_of_upload_threads)
+
     #--------------------------------------------------------------------------
     @staticmethod
     def build_s3_dirs(prefix, name_of_thing, crash_id):
@@ -145,23 +199,18 @@ class BotoS3CrashStorage(CrashStorageBase):
         raw_crash_as_string = boto_s3_store._convert_mapping_to_string(
             raw_crash
         )
-        boto_s3_store._submit_to_boto_s3(
-            crash_id,
-            "raw_crash",
-            raw_crash_as_string
-        )
         dump_names_as_string = boto_s3_store._convert_list_to_string(
             dumps.keys()
         )
-        boto_s3_store._submit_to_boto_s3(
-            crash_id,
-            "dump_names",
-            dump_names_as_string
-        )
+        things = [
+            ("raw_crash", raw_crash_as_string),
+            ("dump_names", dump_names_as_string),
+        ]
         for dump_name, dump in dumps.iteritems():
             if dump_name in (None, '', 'upload_file_minidump'):
                 dump_name = 'dump'
-            boto_s3_store._submit_to_boto_s3(crash_id, dump_name, dump)
+            things.append((dump_name, dump))
+        boto_s3_store._submit_all_to_boto_s3(crash_id, things)
 
     #--------------------------------------------------------------------------
     def save_raw_crash(self, raw_crash, dumps, crash_id):
@@ -348,8 +397,106 @@ class BotoS3CrashStorage(CrashStorageBase):
 
         key = self.build_s3_dirs(self.config.prefix, name_of_thing, crash_id)
 
-        storage_key = bucket.new_key(key)
-        storage_key.set_contents_from_string(thing)
+        self._set_contents(bucket, key, thing)
+
+    #--------------------------------------------------------------------------
+    def _submit_all_to_boto_s3(self, crash_id, things):
+        """submit a list of (name_of_thing, thing) to boto, in parallel when
+        there are upload threads.  The first failure is raised once all the
+        uploads are done."""
+        if self._upload_queue is None:
+            for name_of_thing, thing in things:
+                self._submit_to_boto_s3(crash_id, name_of_thing, thing)
+            return
+        for name_of_thing, thing in things:
+            if not isinstance(thing, basestring):
+                raise Exception('can only submit strings to boto')
+        # the bucket is found or created once, the upload threads only name
+        # it
+        self._get_or_create_bucket(self._connect(), self.config.bucket_name)
+        pending_uploads = []
+        for name_of_thing, thing in things:
+            key = self.build_s3_dirs(
+                self.config.prefix,
+                name_of_thing,
+                crash_id
+            )
+            pending_upload = _PendingUpload(key, thing)
+            self._upload_queue.put(pending_upload)
+            pending_uploads.append(pending_upload)
+        for pending_upload in pending_uploads:
+            pending_upload.done.wait()
+        for pending_upload in pending_uploads:
+            if pending_upload.exc_info is not None:
+                raise pending_upload.exc_info[0], \
+                    pending_upload.exc_info[1], \
+                    pending_upload.exc_info[2]
+
+    #--------------------------------------------------------------------------
+    def _set_contents(self, bucket, key, thing):
+        threshold = self.config.get('multipart_threshold')
+        if not threshold or len(thing) <= threshold:
+            storage_key = bucket.new_key(key)
+            storage_key.set_contents_from_string(thing)
+            return
+        chunk_size = self.config.multipart_chunk_size
+        multipart_upload = bucket.initiate_multipart_upload(key)
+        try:
+            for part_number, offset in enumerate(
+                xrange(0, len(thing), chunk_size),
+                1
+            ):
+                multipart_upload.upload_part_from_file(
+                    StringIO(thing[offset:offset + chunk_size]),
+                    part_number
+                )
+            multipart_upload.complete_upload()
+        except Exception:
+            multipart_upload.cancel_upload()
+            raise
+
+    #--------------------------------------------------------------------------
+    def _start_upload_threads(self, number_of_threads):
+        # a bounded queue, a save waits for room rather than piling up
+        self._upload_queue = Queue.Queue(number_of_threads * 4)
+        for i in range(number_of_threads):
+            a_thread = threading.Thread(
+                name='boto-upload-%d' % i,
+                target=self._upload_loop
+            )
+            a_thread.daemon = True
+            a_thread.start()
+            self._upload_threads.append(a_thread)
+
+    #--------------------------------------------------------------------------
+    def _upload_loop(self):
+        while True:
+            pending_upload = self._upload_queue.get()
+            if pending_upload is None:
+                return
+            try:
+                self._set_contents(
+                    self._upload_thread_bucket(),
+                    pending_upload.key,
+                    pending_upload.thing
+                )
+            except BaseException:
+                pending_upload.exc_info = sys.exc_info()
+                # the connection of this thread may be the trouble
+                self._upload_thread_local.__dict__.clear()
+            finally:
+                pending_upload.done.set()
+
+    #--------------------------------------------------------------------------
+    def _upload_thread_bucket(self):
+        """the bucket, through a connection of the calling upload thread"""
+        local = self._upload_thread_local
+        if getattr(local, 'generation', None) != self._connection_generation:
+            local.generation = self._connection_generation
+            local.bucket = self._connect_to_endpoint(
+                **self._connection_kwargs()
+            ).get_bucket(self.config.bucket_name, validate=False)
+        return local.bucket
 
     #--------------------------------------------------------------------------
     def _fetch_from_boto_s3(self, crash_id, name_of_thing):
@@ -365,24 +512,40 @@ class BotoS3CrashStorage(CrashStorageBase):
             raise CrashIDNotFound('%s not found, no value returned' % crash_id)
         return storage_key.get_contents_as_string()
 
+    #--------------------------------------------------------------------------
+    def _connection_kwargs(self):
+        kwargs = {
+            "aws_access_key_id": self.config.access_key,
+            "aws_secret_access_key": self.config.secret_access_key,
+            "is_secure": self.config.get('secure', True),
+            "calling_format": self._calling_format(),
+        }
+        if self.config.host:
+            kwargs["host"] = self.config.host
+        if self.config.port:
+            kwargs["port"] = self.config.port
+        return kwargs
+
     #--------------------------------------------------------------------------
     def _connect(self):
         try:
             return self.connection
         except AttributeError:
-            kwargs = {
-                "aws_access_key_id": self.config.access_key,
-                "aws_secret_access_key": self.config.secret_access_key,
-                "is_secure": True,
-                "calling_format": self._calling_format(),
-            }
-            if self.config.host:
-                kwargs["host"] = self.config.host
-            if self.config.port:
-                kwargs["port"] = self.config.port
-            self.connection = self._connect_to_endpoint(**kwargs)
+            self.connection = self._connect_to_endpoint(
+                **self._connection_kwargs()
+            )
             return self.connection
 
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the upload threads"""
+        for a_thread in self._upload_threads:
+            self._upload_queue.put(None)
+        for a_thread in self._upload_threads:
+            a_thread.join()
+        self._upload_threads = []
+        self._upload_queue = None
+
     #--------------------------------------------------------------------------
     def _convert_mapping_to_string(self, a_mapping):
         self._stringify_dates_in_dict(a_mapping)
@@ -441,6 +604,9 @@ class BotoS3CrashStorage(CrashStorageBase):
     #--------------------------------------------------------------------------
     def force_reconnect(self):
         del self.connection
+        # the cached bucket belongs to the old connection
+        self.__dict__.pop('_bucket_cache', None)
+        self._connection_generation += 1
 
 
 #==============================================================================
@@ -9,12 +9,18 @@ saving, fetching and iterating over raw crashes, dumps and processed crashes.
 import sys
 import collections
 import datetime
+import threading
+import time
+import Queue
 
 from configman import Namespace,  RequiredConfig
 from configman.converters import classes_in_namespaces_converter, \
                                  class_converter
 from configman.dotdict import DotDict
 
+from socorro.lib.context_tools import memory_file_context
+
+
 #==============================================================================
 class Redactor(RequiredConfig):
     """This class is the implementation of a functor for in situ redacting
@@ -67,6 +73,34 @@ class CrashIDNotFound(Exception):
     pass
 
 
+#==============================================================================
+class FileDumpsMapping(dict):
+    """a mapping of dump names to the pathnames of the files that hold the
+    dumps, as given to 'save_raw_crash_with_file_dumps'"""
+
+    #--------------------------------------------------------------------------
+    def as_memory_dumps_mapping(self):
+        """return a mapping of the dump names to the dumps themselves, as
+        'save_raw_crash' expects them"""
+        memory_dumps = {}
+        for a_dump_name, a_pathname in self.iteritems():
+            with open(a_pathname, 'rb') as f:
+                memory_dumps[a_dump_name] = f.read()
+        return memory_dumps
+
+
+#==============================================================================
+class MemoryDumpsMapping(dict):
+    """a mapping of dump names to the dumps themselves, for a consumer that
+    needs a dump as a file only now and then"""
+
+    #--------------------------------------------------------------------------
+    def as_file(self, dump_name, directory):
+        """return a context manager yielding a pathname from which another
+        process can read the dump, see 'memory_file_context'"""
+        return memory_file_context(self[dump_name], directory)
+
+
 #==============================================================================
 class CrashStorageBase(RequiredConfig):
     """the base class for all crash storage classes"""
@@ -137,6 +171,24 @@ class CrashStorageBase(RequiredConfig):
             crash_id - the crash key to use for this crash"""
         pass
 
+    #--------------------------------------------------------------------------
+    def save_raw_crash_with_file_dumps(self, raw_crash, dumps, crash_id):
+        """this method saves a raw_crash whose dumps are in files rather than
+        in memory.  Implementations that can copy from a file to their
+        storage ought to override it, this default reads the dumps into
+        memory and calls 'save_raw_crash'.  The files belong to the caller,
+        they must be left in place.
+
+        parameters:
+            raw_crash - a mapping containing the raw crash meta data.
+            dumps - a FileDumpsMapping of dump names to pathnames
+            crash_id - the crash key to use for this crash"""
+        self.save_raw_crash(
+            raw_crash,
+            dumps.as_memory_dumps_mapping(),
+            crash_id
+        )
+
     #--------------------------------------------------------------------------
     def save_processed(self, processed_crash):
         """this method saves the processed_crash and must be overridden in
@@ -336,6 +388,91 @@ class PolyStorageError(Exception, collections.MutableSequence):
         self.exceptions.__setitem__(index, value)
 
 
+#==============================================================================
+class _PendingSave(object):
+    """a call to the save method of a crash store, waiting to be run by a
+    _StoreExecutor.  The thread that submitted it waits on 'done'."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.exc_info = None
+        self.elapsed = None
+        self.done = threading.Event()
+
+    #--------------------------------------------------------------------------
+    def run(self):
+        start_time = time.time()
+        try:
+            self.function(*self.args)
+        except BaseException:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.elapsed = time.time() - start_time
+            self.done.set()
+
+
+#==============================================================================
+class _StoreExecutor(object):
+    """a fixed number of threads running the saves to one crash store.  At
+    most as many saves as there are threads may wait for a free thread;
+    'submit' blocks beyond that."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, name, number_of_threads):
+        self.queue = Queue.Queue(number_of_threads)
+        self.threads = []
+        for i in range(number_of_threads):
+            a_thread = threading.Thread(
+                name='%s-%d' % (name, i),
+                target=self._work
+            )
+            a_thread.daemon = True
+            a_thread.start()
+            self.threads.append(a_thread)
+
+    #--------------------------------------------------------------------------
+    def submit(self, function, *args):
+        pending_save = _PendingSave(function, args)
+        self.queue.put(pending_save)
+        return pending_save
+
+    #--------------------------------------------------------------------------
+    def _work(self):
+        while True:
+            pending_save = self.queue.get()
+            if pending_save is None:
+                return
+            pending_save.run()
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the threads once they have run the saves already
+        submitted"""
+        for a_thread in self.threads:
+            self.queue.put(None)
+        for a_thread in self.threads:
+            a_thread.join()
+
+
+#------------------------------------------------------------------------------
+def _copy_for_store(a_value):
+    """return a copy of a crash, or of a part of one, that a crash store can
+    change without the other crash stores seeing it.  The mappings and lists
+    are copied, keeping their classes, and everything else, immutable in a
+    crash, is shared.  'copy.deepcopy' can't be used, some of the mappings
+    that crashes are made of don't support it."""
+    if isinstance(a_value, collections.Mapping):
+        a_copy = a_value.__class__()
+        for a_key, a_sub_value in a_value.iteritems():
+            a_copy[a_key] = _copy_for_store(a_sub_value)
+        return a_copy
+    if isinstance(a_value, list):
+        return [_copy_for_store(x) for x in a_value]
+    return a_value
+
+
 #==============================================================================
 class PolyCrashStorage(CrashStorageBase):
     """a crashstorage implementation that encapsulates a collection of other
@@ -352,6 +489,14 @@ class PolyCrashStorage(CrashStorageBase):
     requirements within the class 'store' will be isolated within the local
     namespace.  That allows multiple instances of the same storageclass to
     avoid name collisions.
+
+    By default, a save is applied to each crashstorage in turn.  With
+    'concurrent_saves', each crashstorage gets threads of its own and a save
+    is applied to all of them at once, so that a save takes as long as the
+    slowest crashstorage rather than the sum of them all.  As some
+    crashstorages change the crashes that they save, each of them but the
+    last is then given a copy of its own.  Either way, the time that each
+    crashstorage takes is logged every 'latency_log_interval' seconds.
     """
     required_config = Namespace()
     required_config.add_option(
@@ -366,6 +511,23 @@ class PolyCrashStorage(CrashStorageBase):
       ),
       likely_to_be_changed=True,
     )
+    required_config.add_option(
+      'concurrent_saves',
+      doc='save to all the storage classes at once rather than in turn',
+      default=False,
+    )
+    required_config.add_option(
+      'number_of_threads_per_store',
+      doc='with concurrent_saves, the most saves running at once in each '
+          'storage class',
+      default=4,
+    )
+    required_config.add_option(
+      'latency_log_interval',
+      doc='the seconds between logs of the time taken by each storage class '
+          '(0 for never)',
+      default=300,
+    )
 
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
@@ -380,6 +542,8 @@ class PolyCrashStorage(CrashStorageBase):
             self.storage_namespaces - the list of the namespaces inwhich the
                                       subordinate instances are stored.
             self.stores - instances of the subordinate crash stores
+            self.executors - with concurrent_saves, the threads saving to
+                             each of the subordinate crash stores
 
         """
         super(PolyCrashStorage, self).__init__(config, quit_check_callback)
@@ -392,6 +556,19 @@ class PolyCrashStorage(CrashStorageBase):
                                       config[a_namespace],
                                       quit_check_callback
                                  )
+        self.executors = {}
+        if config.concurrent_saves:
+            for a_namespace in self.storage_namespaces:
+                self.executors[a_namespace] = _StoreExecutor(
+                    'PolyCrashStorage-%s' % a_namespace,
+                    config.number_of_threads_per_store
+                )
+        self.latencies = dict(
+            (a_namespace, {'count': 0, 'total': 0.0, 'maximum': 0.0})
+            for a_namespace in self.storage_namespaces
+        )
+        self.latencies_lock = threading.Lock()
+        self.latencies_logged_at = time.time()
 
     #--------------------------------------------------------------------------
     def close(self):
@@ -405,6 +582,9 @@ class PolyCrashStorage(CrashStorageBase):
           PolyStorageError - an exception container holding a list of the
                              exceptions raised by the subordinate storage
                              systems"""
+        for an_executor in self.executors.itervalues():
+            an_executor.close()
+        self._log_latencies()
         storage_exception = PolyStorageError()
         for a_store in self.stores.itervalues():
             try:
@@ -416,6 +596,115 @@ class PolyCrashStorage(CrashStorageBase):
         if storage_exception.has_exceptions():
             raise storage_exception
 
+    #--------------------------------------------------------------------------
+    def _save_to_all_stores(self, method_name, *args):
+        """call the save method 'method_name' of all the subordinate crash
+        stores, in turn or all at once.  Any exceptions that were raised are
+        reraised together in a PolyStorageError once all are done."""
+        storage_exception = PolyStorageError()
+        if self.executors:
+            pending_saves = []
+            last_namespace = self.storage_namespaces[-1]
+            for a_namespace in self.storage_namespaces:
+                self.quit_check()
+                if a_namespace == last_namespace:
+                    store_args = args
+                else:
+                    store_args = [_copy_for_store(x) for x in args]
+                pending_saves.append((
+                    a_namespace,
+                    self.executors[a_namespace].submit(
+                        getattr(self.stores[a_namespace], method_name),
+                        *store_args
+                    )
+                ))
+            for a_namespace, a_pending_save in pending_saves:
+                # waiting with a timeout keeps the quit check going
+                while not a_pending_save.done.wait(1.0):
+                    self.quit_check()
+                self._record_latency(a_namespace, a_pending_save.elapsed)
+                exc_info = a_pending_save.exc_info
+                if exc_info is None:
+                    continue
+                if not isinstance(exc_info[1], Exception):
+                    # KeyboardInterrupt from a quit check is not a failure
+                    # of the store, it stops everything
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                self.logger.error(
+                    '%s failure: %s',
+                    self.stores[a_namespace].__class__,
+                    str(exc_info[1]),
+                    exc_info=exc_info
+                )
+                storage_exception.exceptions.append(exc_info)
+        else:
+            for a_namespace in self.storage_namespaces:
+                self.quit_check()
+                a_store = self.stores[a_namespace]
+                start_time = time.time()
+                try:
+                    getattr(a_store, method_name)(*args)
+                except Exception, x:
+                    self.logger.error('%s failure: %s', a_store.__class__,
+                                      str(x), exc_info=True)
+                    storage_exception.gather_current_exception()
+                finally:
+                    self._record_latency(
+                        a_namespace,
+                        time.time() - start_time
+                    )
+        if storage_exception.has_exceptions():
+            raise storage_exception
+
+    #--------------------------------------------------------------------------
+    def _record_latency(self, a_namespace, elapsed):
+        with self.latencies_lock:
+            latency = self.latencies[a_namespace]
+            latency['count'] += 1
+            latency['total'] += elapsed
+            latency['maximum'] = max(latency['maximum'], elapsed)
+            interval = self.config.latency_log_interval
+            if (
+                not interval or
+                time.time() - self.latencies_logged_at < interval
+            ):
+                return
+            self.latencies_logged_at = time.time()
+        self._log_latencies()
+
+    #--------------------------------------------------------------------------
+    def latency_statistics(self):
+        """returns a list of mappings of the number of saves to each
+        subordinate crash store and their average and longest duration in
+        seconds, the slowest store first"""
+        with self.latencies_lock:
+            statistics = []
+            for a_namespace in self.storage_namespaces:
+                latency = self.latencies[a_namespace]
+                statistics.append({
+                    'namespace': a_namespace,
+                    'store': self.stores[a_namespace].__class__.__name__,
+                    'count': latency['count'],
+                    'average': (
+                        latency['total'] / latency['count']
+                        if latency['count'] else 0.0
+                    ),
+                    'maximum': latency['maximum'],
+                })
+        statistics.sort(key=lambda x: x['average'], reverse=True)
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def _log_latencies(self):
+        for a_latency in self.latency_statistics():
+            if not a_latency['count']:
+                continue
+            self.logger.info(
+                '%(namespace)s (%(store)s): %(count)d saves, '
+                'average %(average).3fs, maximum %(maximum).3fs',
+                a_latency
+            )
+
     #--------------------------------------------------------------------------
     def save_raw_crash(self, raw_crash, dumps, crash_id):
         """iterate through the subordinate crash stores saving the raw_crash
@@ -425,17 +714,18 @@ class PolyCrashStorage(CrashStorageBase):
             raw_crash - the meta data mapping
             dumps - a mapping of dump name keys to dump binary values
             crash_id - the id of the crash to use"""
-        storage_exception = PolyStorageError()
-        for a_store in self.stores.itervalues():
-            self.quit_check()
-            try:
-                a_store.save_raw_crash(raw_crash, dumps, crash_id)
-            except Exception, x:
-                self.logger.error('%s failure: %s', a_store.__class__,
-                                  str(x))
-                storage_exception.gather_current_exception()
-        if storage_exception.has_exceptions():
-            raise storage_exception
+        self._save_to_all_stores('save_raw_crash', raw_crash, dumps, crash_id)
+
+    #--------------------------------------------------------------------------
+    def save_raw_crash_with_file_dumps(self, raw_crash, dumps, crash_id):
+        """each subordinate crash store reads the dumps from the files in its
+        own way"""
+        self._save_to_all_stores(
+            'save_raw_crash_with_file_dumps',
+            raw_crash,
+            dumps,
+            crash_id
+        )
 
     #--------------------------------------------------------------------------
     def save_processed(self, processed_crash):
@@ -444,28 +734,18 @@ class PolyCrashStorage(CrashStorageBase):
 
         parameters:
             processed_crash - a mapping containing the processed crash"""
-        storage_exception = PolyStorageError()
-        for a_store in self.stores.itervalues():
-            self.quit_check()
-            try:
-                a_store.save_processed(processed_crash)
-            except Exception, x:
-                self.logger.error('%s failure: %s', a_store.__class__,
-                                  str(x), exc_info=True)
-                storage_exception.gather_current_exception()
-        if storage_exception.has_exceptions():
-            raise storage_exception
+        self._save_to_all_stores('save_processed', processed_crash)
 
     #--------------------------------------------------------------------------
     def save_raw_and_processed(self, raw_crash, dump, processed_crash,
                                crash_id):
-        for a_store in self.stores.itervalues():
-            a_store.save_raw_and_processed(
-              raw_crash,
-              dump,
-              processed_crash,
-              crash_id
-            )
+        self._save_to_all_stores(
+            'save_raw_and_processed',
+            raw_crash,
+            dump,
+            processed_crash,
+            crash_id
+        )
 
 
 #==============================================================================
@@ -3,8 +3,11 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import contextlib
+import datetime
 import json
 import os
+import re
+import threading
 import pyelasticsearch
 from pyelasticsearch.exceptions import IndexAlreadyExistsError
 
@@ -12,6 +15,7 @@ from socorro.external.crashstorage_base import (
     CrashStorageBase,
     CrashIDNotFound
 )
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.external.elasticsearch.supersearch import SuperSearch
 from socorro.lib import datetimeutil
 
@@ -21,6 +25,16 @@ from configman.converters import class_converter
 
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
+# elasticsearch 0.90 reports the failed items of a '_bulk' request with an
+# 'error' but no 'status'.  These are the errors among them that go away
+# when the cluster is less busy or has recovered, all others are permanent.
+TRANSIENT_BULK_ERRORS_RE = re.compile(
+    r'EsRejectedExecutionException|UnavailableShardsException|'
+    r'NoShardAvailableActionException|NodeNotConnectedException|'
+    r'NodeDisconnectedException|ConnectTransportException|'
+    r'\w*TimeoutException'
+)
+
 
 #==============================================================================
 class ElasticSearchCrashStorage(CrashStorageBase):
@@ -73,6 +87,29 @@ class ElasticSearchCrashStorage(CrashStorageBase):
             'otherwise',
         reference_value_from='resource.elasticsearch',
     )
+    required_config.add_option(
+        'elasticsearch_indices_cache_ttl',
+        default=60,
+        doc='the seconds for which the list of existing elasticsearch '
+            'indices is reused before it is listed again',
+        reference_value_from='resource.elasticsearch',
+    )
+    required_config.add_option(
+        'elasticsearch_mapping_cache_ttl',
+        default=600,
+        doc='the seconds for which the mapping of new indices is reused '
+            'before it is loaded again',
+        reference_value_from='resource.elasticsearch',
+    )
+    required_config.add_option(
+        'elasticsearch_indices_precreation_days',
+        default=1,
+        doc='the number of days ahead of the crash reports for which the '
+            'date-based indices are created in advance (0 to create them '
+            'only when the first crash report comes in); the mapping of an '
+            'index is fixed when it is created',
+        reference_value_from='resource.elasticsearch',
+    )
 
     operational_exceptions = (
         pyelasticsearch.exceptions.ConnectionError,
@@ -81,8 +118,6 @@ class ElasticSearchCrashStorage(CrashStorageBase):
 
     conditional_exceptions = ()
 
-    indices_cache = set()
-
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
         super(ElasticSearchCrashStorage, self).__init__(
@@ -101,6 +136,8 @@ class ElasticSearchCrashStorage(CrashStorageBase):
             )
         else:
             config.logger.warning('elasticsearch crash storage is disabled.')
+        # the last day of crash reports whose upcoming indices were created
+        self._upcoming_indices_day = None
 
     #--------------------------------------------------------------------------
     def save_processed(self, processed_crash):
@@ -165,11 +202,7 @@ class ElasticSearchCrashStorage(CrashStorageBase):
         try:
             # We first need to ensure that the index already exists in ES.
             # If it doesn't, we create it and put its mapping.
-            if es_index not in self.indices_cache:
-                self.create_socorro_index(es_index)
-
-                # Cache the list of existing indices to avoid HTTP requests
-                self.indices_cache.add(es_index)
+            self.ensure_socorro_index(es_index)
 
             self.es.index(
                 es_index,
@@ -198,6 +231,8 @@ class ElasticSearchCrashStorage(CrashStorageBase):
                                  exc_info=True)
             raise
 
+        self.create_upcoming_indices(crash_date)
+
     #--------------------------------------------------------------------------
     def get_index_for_crash(self, crash_date):
         """return the submission URL for a crash, based on the submission URL
@@ -211,6 +246,69 @@ class ElasticSearchCrashStorage(CrashStorageBase):
 
         return index
 
+    #--------------------------------------------------------------------------
+    def get_index_registry(self):
+        return IndexRegistry.for_cluster(self.config.elasticsearch_urls)
+
+    #--------------------------------------------------------------------------
+    def list_existing_indices(self):
+        return self.es.aliases().keys()
+
+    #--------------------------------------------------------------------------
+    def ensure_socorro_index(self, es_index):
+        """create the index that receives crash reports unless the index
+        registry, shared by the whole process, knows it exists"""
+        self.get_index_registry().ensure_index(
+            es_index,
+            self.create_socorro_index,
+            self.list_existing_indices,
+            self.config.elasticsearch_indices_cache_ttl
+        )
+
+    #--------------------------------------------------------------------------
+    def get_upcoming_indices(self, crash_date):
+        """return the date-based indices that will receive the crash reports
+        of the next 'elasticsearch_indices_precreation_days' days, besides
+        the index of 'crash_date'"""
+        current_index = self.get_index_for_crash(crash_date)
+        if not current_index or '%' not in self.config.elasticsearch_index:
+            return ()
+        upcoming_indices = []
+        for days in range(
+            1,
+            self.config.elasticsearch_indices_precreation_days + 1
+        ):
+            an_index = self.get_index_for_crash(
+                crash_date + datetime.timedelta(days=days)
+            )
+            if an_index != current_index and an_index not in upcoming_indices:
+                upcoming_indices.append(an_index)
+        return tuple(upcoming_indices)
+
+    #--------------------------------------------------------------------------
+    def create_upcoming_indices(self, crash_date):
+        """create the indices of the days following 'crash_date' ahead of
+        time, so that the first crash report of a new week or month is not
+        held up by the creation of its index.  The indices are checked once
+        per day of crash reports.  A failure is only logged: the next crash
+        report tries again, and an index is still created when its first
+        crash report comes in if need be."""
+        day = crash_date.date()
+        if day == self._upcoming_indices_day:
+            return
+        upcoming_indices = self.get_upcoming_indices(crash_date)
+        try:
+            for an_index in upcoming_indices:
+                self.ensure_socorro_index(an_index)
+        except Exception:
+            self.logger.warning(
+                'unable to create the upcoming elasticsearch indices %s',
+                ', '.join(upcoming_indices),
+                exc_info=True
+            )
+            return
+        self._upcoming_indices_day = day
+
     # TODO: Kill these connection-like methods.
     # What are they doing in a crash storage?
     #--------------------------------------------------------------------------
@@ -248,17 +346,37 @@ class ElasticSearchCrashStorage(CrashStorageBase):
     #--------------------------------------------------------------------------
     def create_socorro_index(self, es_index):
         """Create an index that will receive crash reports. """
+        if self.config.use_mapping_file:
+            source = (
+                'mapping file',
+                self.config.elasticsearch_base_settings,
+                self.config.elasticsearch_doctype,
+            )
+        else:
+            source = (
+                'supersearch fields',
+                self.config.elasticsearch_default_index,
+                self.config.elasticsearch_doctype,
+            )
+        es_settings = self.get_index_registry().index_settings(
+            source,
+            self.load_socorro_index_settings,
+            self.config.elasticsearch_mapping_cache_ttl
+        )
+        self.create_index(es_index, es_settings)
+
+    #--------------------------------------------------------------------------
+    def load_socorro_index_settings(self):
+        """Return the settings and mapping of the indices that receive
+        crash reports. """
         if self.config.use_mapping_file:
             # Load the mapping from a file.
             with open(self.config.elasticsearch_base_settings) as f:
-                es_settings = json.loads(
+                return json.loads(
                     f.read() % self.config.elasticsearch_doctype
                 )
-        else:
-            # Load the mapping from a database.
-            es_settings = SuperSearch(config=self.config).get_mapping()
-
-        self.create_index(es_index, es_settings)
+        # Load the mapping from a database.
+        return SuperSearch(config=self.config).get_mapping()
 
     #--------------------------------------------------------------------------
     def create_emails_index(self):
@@ -291,3 +409,258 @@ class ElasticSearchCrashStorage(CrashStorageBase):
             # If this index already exists or another processor concurrently
             # created it, swallow the error.
             pass
+
+
+#==============================================================================
+class BulkIndexingError(Exception):
+    """raised when some of the documents of a bulk request were not indexed
+    for reasons that may be temporary.  Only those documents are retried."""
+
+
+#==============================================================================
+class ElasticSearchBulkCrashStorage(ElasticSearchCrashStorage):
+    """This class sends processed crash reports to elasticsearch in batches
+    using the '_bulk' API, rather than in one request per crash.
+
+    Crashes are held in a buffer that is sent when it holds
+    'bulk_max_documents' crashes or 'bulk_max_bytes' bytes of json, and at
+    least every 'bulk_max_latency' seconds.  Whatever is left is sent when
+    the crash storage is closed.
+
+    Saving a crash returns as soon as the crash is in the buffer, so a
+    failure to index it is logged rather than raised to the caller.  This
+    class is meant for use as one of the destinations of a PolyCrashStorage,
+    not as the only home of processed crashes.
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        'bulk_max_documents',
+        default=100,
+        doc='the number of crashes to gather before sending them to '
+            'elasticsearch',
+    )
+    required_config.add_option(
+        'bulk_max_bytes',
+        default=10 * 1024 * 1024,
+        doc='the size of the gathered crashes, in bytes of json, at which '
+            'they are sent to elasticsearch',
+    )
+    required_config.add_option(
+        'bulk_max_latency',
+        default=5.0,
+        doc='the longest time, in seconds, that a crash waits before it is '
+            'sent to elasticsearch',
+    )
+
+    operational_exceptions = (
+        ElasticSearchCrashStorage.operational_exceptions +
+        (BulkIndexingError,)
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config, quit_check_callback=None):
+        super(ElasticSearchBulkCrashStorage, self).__init__(
+            config,
+            quit_check_callback
+        )
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_lock = threading.Lock()
+        self._flusher_stop = threading.Event()
+        self._flusher = None
+        if not config.elasticsearch_urls:
+            # nothing is ever buffered, see '_buffer_crash'
+            return
+        self._flusher = threading.Thread(
+            name='ElasticSearchBulkFlusher',
+            target=self._flusher_loop
+        )
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    #--------------------------------------------------------------------------
+    def save_processed(self, processed_crash):
+        crash_id = processed_crash['uuid']
+        self._buffer_crash(
+            crash_id,
+            {
+                'crash_id': crash_id,
+                'processed_crash': processed_crash,
+                'raw_crash': None
+            }
+        )
+
+    #--------------------------------------------------------------------------
+    def save_raw_and_processed(self, raw_crash, dumps, processed_crash,
+                               crash_id):
+        self._buffer_crash(
+            crash_id,
+            {
+                'crash_id': crash_id,
+                'processed_crash': processed_crash,
+                'raw_crash': raw_crash,
+            }
+        )
+
+    #--------------------------------------------------------------------------
+    def _buffer_crash(self, crash_id, crash_document):
+        """encode a crash as the two lines of a bulk request and add it to
+        the buffer.  If that fills the buffer, send the buffer from this
+        thread."""
+        if not self.config.elasticsearch_urls:
+            return
+
+        crash_date = datetimeutil.string_to_datetime(
+            crash_document['processed_crash']['date_processed']
+        )
+        es_index = self.get_index_for_crash(crash_date)
+        # the encoding is done now, in the caller's thread, so later changes
+        # to the crash by the caller are not seen
+        bulk_lines = '%s\n%s\n' % (
+            self.es._encode_json({
+                'index': {
+                    '_index': es_index,
+                    '_type': self.config.elasticsearch_doctype,
+                    '_id': crash_id,
+                }
+            }),
+            self.es._encode_json(crash_document),
+        )
+
+        documents = None
+        with self._buffer_lock:
+            self._buffer.append((crash_id, es_index, bulk_lines))
+            self._buffer_bytes += len(bulk_lines)
+            if (
+                len(self._buffer) >= self.config.bulk_max_documents or
+                self._buffer_bytes >= self.config.bulk_max_bytes
+            ):
+                documents = self._take_buffer()
+        if documents:
+            self._send_documents(documents)
+        self.create_upcoming_indices(crash_date)
+
+    #--------------------------------------------------------------------------
+    def _take_buffer(self):
+        """empty the buffer, returning what it held.  The caller must hold
+        the buffer lock."""
+        documents = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        return documents
+
+    #--------------------------------------------------------------------------
+    def flush(self):
+        """send whatever is in the buffer now"""
+        with self._buffer_lock:
+            documents = self._take_buffer()
+        if documents:
+            self._send_documents(documents)
+
+    #--------------------------------------------------------------------------
+    def _send_documents(self, documents):
+        """send a list of buffered documents to elasticsearch with retries.
+        Crashes that are still not indexed when the retries run out, or when
+        the quit check stops the retries, are logged and dropped."""
+        try:
+            # see the comment in 'save_processed' of the base class about
+            # why the function is unbound
+            self.transaction(
+                self.__class__._submit_bulk_to_elasticsearch,
+                documents
+            )
+        except KeyboardInterrupt:
+            # the documents still in the list are the ones not yet indexed
+            self.logger.critical(
+                'the app is shutting down, %d crashes were not submitted to '
+                'elasticsearch: %s',
+                len(documents),
+                ', '.join(x[0] for x in documents)
+            )
+            raise
+        except Exception:
+            self.logger.critical(
+                'bulk submission to elasticsearch failed',
+                exc_info=True
+            )
+            for crash_id, es_index, bulk_lines in documents:
+                self.logger.critical(
+                    '%s was not submitted to elasticsearch',
+                    crash_id
+                )
+
+    #--------------------------------------------------------------------------
+    def _submit_bulk_to_elasticsearch(self, documents):
+        """submit a list of buffered documents in a single '_bulk' request.
+
+        The documents that failed for reasons that may be temporary are left
+        in 'documents' and BulkIndexingError is raised.  That tells the
+        transaction executor to try again, and the next try sends only those
+        documents.  Documents that elasticsearch refused outright are logged
+        and not retried.  A failure is temporary if its status is 429 or 5xx
+        or, when there is no status, if its error is one of
+        TRANSIENT_BULK_ERRORS_RE."""
+        for es_index in set(x[1] for x in documents):
+            self.ensure_socorro_index(es_index)
+
+        response = self.es.send_request(
+            'POST',
+            ['_bulk'],
+            ''.join(x[2] for x in documents),
+            encode_body=False
+        )
+
+        failed_documents = []
+        for a_document, an_item in zip(documents, response['items']):
+            result = an_item.values()[0]
+            if 'error' not in result:
+                continue
+            status = result.get('status')
+            if status is None:
+                transient = bool(
+                    TRANSIENT_BULK_ERRORS_RE.search(result['error'])
+                )
+            else:
+                transient = status == 429 or status >= 500
+            if transient:
+                failed_documents.append(a_document)
+            else:
+                self.logger.critical(
+                    '%s was refused by elasticsearch: %s',
+                    a_document[0],
+                    result['error']
+                )
+        documents[:] = failed_documents
+        if failed_documents:
+            raise BulkIndexingError(
+                '%d documents were not indexed' % len(failed_documents)
+            )
+
+    #--------------------------------------------------------------------------
+    def _flusher_loop(self):
+        """the target of the flusher thread: send the buffer at least every
+        'bulk_max_latency' seconds"""
+        while not self._flusher_stop.wait(self.config.bulk_max_latency):
+            try:
+                self.flush()
+            except KeyboardInterrupt:
+                # the quit_check_callback says that the app is shutting down,
+                # 'close' will send the rest
+                break
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the flusher thread and send whatever is left in the buffer"""
+        self._flusher_stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        # the app is shutting down, the quit check must not stop this last
+        # transaction.  It still stops the sleeps between its retries, and
+        # then the crashes that are left are logged and dropped rather than
+        # stopping the closing of the other crash stores.
+        self.transaction.do_quit_check = False
+        try:
+            self.flush()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,128 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+
+
+class IndexRegistry(object):
+    """The names of the indices that exist in an elasticsearch cluster,
+    shared by everything in a process that uses the same cluster.
+
+    The names are listed with a single request, and listed again once the
+    list is older than the time to live. In between, indices that are
+    found to exist or to be missing can be added to or discarded from the
+    list.
+
+    The registry also keeps the settings that new crash report indices are
+    created with, and makes sure only one thread of the process creates
+    indices at a time.
+    """
+
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    @classmethod
+    def for_cluster(cls, urls):
+        """Return the registry of the elasticsearch cluster at `urls`. """
+        key = tuple(urls)
+        with cls._registries_lock:
+            try:
+                return cls._registries[key]
+            except KeyError:
+                registry = cls._registries[key] = cls()
+                return registry
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indices = None
+        self.listed_at = 0.0
+        # the indices that were expected but found missing since the list
+        # was last made because of its ttl
+        self.missing = set()
+        self.creation_lock = threading.Lock()
+        # the settings of new crash report indices, and the time they were
+        # built at, by where they come from
+        self.settings = {}
+
+    def existing_indices(self, list_indices, ttl, expected=()):
+        """Return the set of the names of the existing indices, calling
+        `list_indices` to list them again if needed. With a `ttl` of 0,
+        they are listed every time.
+
+        If one of the `expected` indices is not in the list, the indices
+        are listed again once, so that an index created since the last
+        listing is found without waiting for the ttl. An index that is
+        still missing does not cause another listing until the ttl passes.
+        """
+        with self.lock:
+            if (
+                self.indices is None or
+                time.time() - self.listed_at >= ttl
+            ):
+                self.indices = set(list_indices())
+                self.listed_at = time.time()
+                self.missing = set()
+            elif any(
+                x not in self.indices and x not in self.missing
+                for x in expected
+            ):
+                self.indices = set(list_indices())
+                self.listed_at = time.time()
+            self.missing.update(x for x in expected if x not in self.indices)
+            return frozenset(self.indices)
+
+    def ensure_index(self, index, create_index, list_indices, ttl):
+        """Call `create_index` to create `index` unless it is known to exist.
+
+        Returns True if `create_index` was called. The threads that find an
+        index missing while another thread creates it wait for it, and do
+        not try to create it again. `create_index` must not fail if the
+        index was created by another process in the meantime.
+        """
+        if index in self.existing_indices(list_indices, ttl):
+            return False
+        with self.creation_lock:
+            with self.lock:
+                if self.indices is not None and index in self.indices:
+                    return False
+            create_index(index)
+            self.add(index)
+            return True
+
+    def index_settings(self, source, build_settings, ttl):
+        """Return the settings of new crash report indices, calling
+        `build_settings` to build them again once they are older than
+        `ttl` seconds. The settings are shared and must not be modified.
+
+        `source` is a hashable description of where `build_settings` gets
+        the settings from, for example a mapping file and a document type.
+        The stores of a cluster that build their settings differently do not
+        share them.
+        """
+        with self.lock:
+            try:
+                settings, built_at = self.settings[source]
+                if time.time() - built_at < ttl:
+                    return settings
+            except KeyError:
+                pass
+        # building the settings may take round trips to elasticsearch, the
+        # registry is not locked in the meantime
+        settings = build_settings()
+        with self.lock:
+            self.settings[source] = (settings, time.time())
+        return settings
+
+    def add(self, index):
+        with self.lock:
+            self.missing.discard(index)
+            if self.indices is not None:
+                self.indices.add(index)
+
+    def discard(self, index):
+        with self.lock:
+            self.missing.add(index)
+            if self.indices is not None:
+                self.indices.discard(index)
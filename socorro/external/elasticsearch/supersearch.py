@@ -4,8 +4,11 @@
 
 import datetime
 import re
+import threading
+import time
+import ujson
 
-from elasticutils import F, S
+from elasticutils import DictResult, F, S, decorate_with_metadata
 from pyelasticsearch.exceptions import (
     ElasticHttpError,
     ElasticHttpNotFoundError,
@@ -16,8 +19,10 @@ from socorro.external import (
     InsertionError,
     MissingArgumentError,
     ResourceNotFound,
+    StreamedResult,
 )
 from socorro.external.elasticsearch.base import ElasticSearchBase
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.lib import datetimeutil, external_common
 from socorro.lib.search_common import SearchBase
 
@@ -38,6 +43,146 @@ class SuperS(S):
             }
         }
 
+    def _do_search(self):
+        """Send the search only once, the results, total and facets all
+        come from that one response. elasticutils would search again when
+        the page of results is empty, as empty results are false. """
+        if self._results_cache is None:
+            self._results_cache = super(SuperS, self)._do_search()
+        return self._results_cache
+
+    def scroll(self, batch_size=500, keep_alive='5m'):
+        """Yield all the results of the search, however many, through a scan
+        and scroll of elasticsearch: the results are read `batch_size` per
+        shard at a time and only one batch is held in memory.
+
+        A scan returns the results in no particular order, and ignores
+        slicing and facets. `keep_alive` is how long elasticsearch keeps the
+        scroll open between two batches.
+        """
+        es = self.get_es()
+        query = self._build_query()
+        for key in ('sort', 'from', 'size', 'facets'):
+            query.pop(key, None)
+        key = 'fields' if self.fields else '_source'
+
+        response = es.search(
+            query,
+            index=self.get_indexes(),
+            doc_type=self.get_doctypes(),
+            size=batch_size,
+            es_search_type='scan',
+            es_scroll=keep_alive,
+        )
+        scroll_id = response['_scroll_id']
+        try:
+            while True:
+                response = es.send_request(
+                    'GET',
+                    ['_search', 'scroll'],
+                    scroll_id,
+                    query_params={'scroll': keep_alive},
+                    encode_body=False,
+                )
+                scroll_id = response['_scroll_id']
+                hits = response['hits']['hits']
+                if not hits:
+                    break
+                for hit in hits:
+                    yield decorate_with_metadata(
+                        DictResult(hit.get(key, {})),
+                        hit
+                    )
+        finally:
+            # The scroll would expire by itself, but it holds resources in
+            # elasticsearch until then.
+            try:
+                es.send_request(
+                    'DELETE',
+                    ['_search', 'scroll'],
+                    scroll_id,
+                    encode_body=False,
+                )
+            except Exception:
+                pass
+
+
+class SuperSearchFieldDefinitions(object):
+    """The fields of Super Search as read from the database, and what is
+    derived from them to set up a search. """
+
+    def __init__(self, all_fields, version):
+        self.all_fields = all_fields
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.database_name_to_field_name_map = dict(
+            (x['in_database_name'], x['name'])
+            for x in all_fields.values()
+        )
+        self.returned_fields = [
+            '%s.%s' % (x['namespace'], x['in_database_name'])
+            for x in all_fields.values()
+            if x['is_returned']
+        ]
+        self.filters = SearchBase.get_filters(all_fields)
+
+
+class SuperSearchFieldsCache(object):
+    """The field definitions of Super Search, shared by all the SuperSearch
+    instances of a process that read them from the same index.
+
+    A SuperSearch is created for every request, and reading the fields costs
+    two round trips to elasticsearch. Instead, the definitions are read
+    again only once they are older than the time to live, or once their
+    version is behind: creating, updating or deleting a field bumps the
+    version. Other processes only see such changes when the time to live
+    runs out.
+    """
+
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    @classmethod
+    def for_index(cls, urls, index):
+        """Return the cache for the fields stored in `index` of the
+        elasticsearch cluster at `urls`. """
+        key = (tuple(urls), index)
+        with cls._caches_lock:
+            try:
+                return cls._caches[key]
+            except KeyError:
+                cache = cls._caches[key] = cls()
+                return cache
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.definitions = None
+
+    def get(self, load_fields, ttl):
+        """Return the current SuperSearchFieldDefinitions, calling
+        `load_fields` to read the fields again if needed. With a `ttl` of 0,
+        the fields are read every time. """
+        with self.lock:
+            definitions = self.definitions
+            if (
+                definitions is None or
+                definitions.version != self.version or
+                time.time() - definitions.loaded_at >= ttl
+            ):
+                definitions = SuperSearchFieldDefinitions(
+                    load_fields(),
+                    self.version
+                )
+                self.definitions = definitions
+            return definitions
+
+    def invalidate(self):
+        """Make the next `get` read the fields again. """
+        with self.lock:
+            self.version += 1
+
 
 class SuperSearch(SearchBase, ElasticSearchBase):
 
@@ -52,17 +197,29 @@ class SuperSearch(SearchBase, ElasticSearchBase):
         config = kwargs.get('config')
         ElasticSearchBase.__init__(self, config=config)
 
-        self.all_fields = self.get_fields()
-
-        self.database_name_to_field_name_map = dict(
-            (x['in_database_name'], x['name'])
-            for x in self.all_fields.values()
+        # The fields and the maps derived from them are shared with the
+        # other instances and must not be modified.
+        definitions = self.get_fields_cache().get(
+            self.get_fields,
+            self.config.get('supersearch_fields_cache_ttl', 300),
+        )
+        self.all_fields = definitions.all_fields
+        self.database_name_to_field_name_map = (
+            definitions.database_name_to_field_name_map
         )
+        self.returned_fields = definitions.returned_fields
 
         # We have multiple inheritance here, explicitly calling superclasses's
         # init is mandatory.
         # See http://freshfoo.com/blog/object__init__takes_no_parameters
-        SearchBase.__init__(self, config=config, fields=self.all_fields)
+        SearchBase.__init__(self, config=config)
+        self.filters = definitions.filters
+
+    def get_fields_cache(self):
+        return SuperSearchFieldsCache.for_index(
+            self.config.elasticsearch_urls,
+            self.config.elasticsearch_default_index,
+        )
 
     def get_connection(self):
         return SuperS().es(
@@ -82,6 +239,94 @@ class SuperSearch(SearchBase, ElasticSearchBase):
         # Find the indexes to use to optimize the elasticsearch query.
         indexes = self.get_indexes(params['date'])
 
+        search, filters = self.build_search(params, indexes)
+
+        # Pagination.
+        results_from = params['_results_offset'][0].value[0]
+        results_number = params['_results_number'][0].value[0]
+        results_to = results_from + results_number
+        search = search[results_from:results_to]
+
+        # Create facets.
+        processed_filters = search._process_filters(filters.filters)
+
+        for param in params['_facets']:
+            for value in param.value:
+                try:
+                    field_ = self.all_fields[value]
+                except KeyError:
+                    # That is not a known field, we can't facet on it.
+                    raise BadArgumentError(
+                        value,
+                        msg='Unknown field "%s", cannot facet on it' % value
+                    )
+
+                field_name = '%s.%s' % (
+                    field_['namespace'],
+                    field_['in_database_name']
+                )
+
+                if field_['has_full_version']:
+                    # If the param has a full version, that means what matters
+                    # is the full string, and not its individual terms.
+                    field_name += '.full'
+
+                args = {
+                    value: {
+                        'terms': {
+                            'field': field_name,
+                            'size': self.config.facets_max_number,
+                        },
+                        'facet_filter': processed_filters,
+                    }
+                }
+                search = search.facet_raw(**args)
+
+        # Query and compute results.
+        if params['_return_query'][0].value[0]:
+            # Return only the JSON query that would be sent to elasticsearch.
+            return {
+                'query': search._build_query(),
+                'indices': indexes,
+            }
+
+        search = search.values_dict(*self.returned_fields)
+
+        # We call elasticsearch with a computed list of indices, based on
+        # the date range. However, if that list contains indices that do not
+        # exist in elasticsearch, an error will be raised. We thus remove
+        # the indices that are known to be missing beforehand, and then
+        # remove any failing index that is left until we either have a
+        # valid list, or an empty list in which case we return no result.
+        indexes = self.remove_missing_indexes(indexes)
+        while indexes:
+            search = search.indexes(*indexes)
+            try:
+                # The hits, the total and the facets all come from the
+                # same response.
+                results = search.execute()
+                return {
+                    'hits': [self.format_field_names(x) for x in results],
+                    'total': results.count,
+                    'facets': search.facet_counts(),
+                }
+            except ElasticHttpNotFoundError, e:
+                if not self.discard_missing_index(e, indexes):
+                    # Wait what? An error caused by an index that was not
+                    # in the request? That should never happen, but in case
+                    # it does, better know it.
+                    raise
+
+        # There is no index left in the list, return an empty result.
+        return {
+            'hits': [],
+            'total': 0,
+            'facets': {},
+        }
+
+    def build_search(self, params, indexes):
+        """Return the search of the indexes for the parameters, without
+        pagination nor facets, and the filters it uses. """
         # Create and configure the search object.
         search = self.get_connection()
         search = search.indexes(*indexes)
@@ -95,10 +340,6 @@ class SuperSearch(SearchBase, ElasticSearchBase):
             for param in sub_params:
 
                 if param.name.startswith('_'):
-                    if param.name == '_results_offset':
-                        results_from = param.value[0]
-                    elif param.name == '_results_number':
-                        results_number = param.value[0]
                     # Don't use meta parameters in the query.
                     continue
 
@@ -195,99 +436,87 @@ class SuperSearch(SearchBase, ElasticSearchBase):
 
         search = search.filter(filters)
 
-        # Pagination.
-        results_to = results_from + results_number
-        search = search[results_from:results_to]
-
-        # Create facets.
-        processed_filters = search._process_filters(filters.filters)
-
-        for param in params['_facets']:
-            for value in param.value:
-                try:
-                    field_ = self.all_fields[value]
-                except KeyError:
-                    # That is not a known field, we can't facet on it.
-                    raise BadArgumentError(
-                        value,
-                        msg='Unknown field "%s", cannot facet on it' % value
-                    )
-
-                field_name = '%s.%s' % (
-                    field_['namespace'],
-                    field_['in_database_name']
-                )
-
-                if field_['has_full_version']:
-                    # If the param has a full version, that means what matters
-                    # is the full string, and not its individual terms.
-                    field_name += '.full'
-
-                args = {
-                    value: {
-                        'terms': {
-                            'field': field_name,
-                            'size': self.config.facets_max_number,
-                        },
-                        'facet_filter': processed_filters,
-                    }
-                }
-                search = search.facet_raw(**args)
-
-        # Query and compute results.
-        hits = []
-        fields = [
-            '%s.%s' % (x['namespace'], x['in_database_name'])
-            for x in self.all_fields.values()
-            if x['is_returned']
-        ]
-
-        if params['_return_query'][0].value[0]:
-            # Return only the JSON query that would be sent to elasticsearch.
-            return {
-                'query': search._build_query(),
-                'indices': indexes,
-            }
+        return search, filters
 
-        # We call elasticsearch with a computed list of indices, based on
-        # the date range. However, if that list contains indices that do not
-        # exist in elasticsearch, an error will be raised. We thus want to
-        # remove all failing indices until we either have a valid list, or
-        # an empty list in which case we return no result.
-        while True:
+    def _export_hits(self, **kwargs):
+        """Yield all the crash reports that match the parameters, in no
+        particular order, without holding more than a batch of them in
+        memory. The parameters are those of `get`, but for the pagination
+        and facets ones, which are ignored. """
+        params = self.get_parameters(**kwargs)
+        indexes = self.remove_missing_indexes(
+            self.get_indexes(params['date'])
+        )
+        if not indexes:
+            return
+
+        search, filters = self.build_search(params, indexes)
+        search = search.values_dict(*self.returned_fields)
+
+        # As in `get`, the indices that turn out to be missing are removed
+        # until the scroll can start. Once hits were sent, it can't be
+        # started again without sending them twice.
+        while indexes:
+            search = search.indexes(*indexes)
+            started = False
             try:
-                for hit in search.values_dict(*fields):
-                    hits.append(self.format_field_names(hit))
-
-                total = search.count()
-                facets = search.facet_counts()
-                break  # Yay! Results!
+                for hit in search.scroll():
+                    started = True
+                    yield self.format_field_names(hit)
+                return
             except ElasticHttpNotFoundError, e:
-                missing_index = re.findall(BAD_INDEX_REGEX, e.error)[0]
-                if missing_index in indexes:
-                    del indexes[indexes.index(missing_index)]
-                else:
-                    # Wait what? An error caused by an index that was not
-                    # in the request? That should never happen, but in case
-                    # it does, better know it.
+                if started or not self.discard_missing_index(e, indexes):
                     raise
 
-                if indexes:
-                    # Update the list of indices and try again.
-                    search = search.indexes(*indexes)
-                else:
-                    # There is no index left in the list, return an empty
-                    # result.
-                    hits = []
-                    total = 0
-                    facets = {}
-                    break
+    def get_export(self, **kwargs):
+        """Return all the crash reports that match the parameters as
+        newline delimited JSON, streamed as they are read from
+        elasticsearch. """
+        # Find errors in the parameters before anything is sent.
+        self.get_parameters(**kwargs)
+
+        def lines():
+            for hit in self._export_hits(**kwargs):
+                yield ujson.dumps(hit) + '\n'
+
+        return StreamedResult(lines(), 'application/x-ndjson')
+
+    def get_index_registry(self):
+        return IndexRegistry.for_cluster(self.config.elasticsearch_urls)
+
+    def discard_missing_index(self, error, indexes):
+        """Remove the index that elasticsearch reported missing with `error`
+        from the list `indexes` and from the registry of the existing
+        indices. Return False if that index is not in the list. """
+        missing_index = re.findall(BAD_INDEX_REGEX, error.error)[0]
+        if missing_index not in indexes:
+            return False
+        del indexes[indexes.index(missing_index)]
+        self.get_index_registry().discard(missing_index)
+        return True
 
-        return {
-            'hits': hits,
-            'total': total,
-            'facets': facets,
-        }
+    def remove_missing_indexes(self, indexes):
+        """Return the indexes of the list that exist in elasticsearch, as
+        far as the registry of the existing indices knows. An index that is
+        not in the registry is looked for again once before it is dropped,
+        it may have been created since the indices were listed. If the
+        indices cannot be listed, the list is returned as is. """
+        try:
+            existing_indexes = self.get_index_registry().existing_indices(
+                self.list_existing_indexes,
+                self.config.get('elasticsearch_indices_cache_ttl', 60),
+                expected=indexes,
+            )
+        except Exception:
+            self.config.logger.warning(
+                'unable to list the existing elasticsearch indices',
+                exc_info=True
+            )
+            return indexes
+        return [x for x in indexes if x in existing_indexes]
+
+    def list_existing_indexes(self):
+        return self.get_connection().get_es().aliases().keys()
 
     def get_indexes(self, dates):
         """Return the list of indexes to use for given dates. """
@@ -395,6 +624,8 @@ class SuperSearch(SearchBase, ElasticSearchBase):
             # Else this is an unexpected error and we want to know about it.
             raise
 
+        self.get_fields_cache().invalidate()
+
         if params.get('storage_mapping'):
             # If we made a change to the storage_mapping, log that change.
             self.config.logger.info(
@@ -474,6 +705,8 @@ class SuperSearch(SearchBase, ElasticSearchBase):
             refresh=True,
         )
 
+        self.get_fields_cache().invalidate()
+
         if 'storage_mapping' in params:
             # If we made a change to the storage_mapping, log that change.
             self.config.logger.info(
@@ -511,6 +744,8 @@ class SuperSearch(SearchBase, ElasticSearchBase):
             refresh=True,
         )
 
+        self.get_fields_cache().invalidate()
+
     def get_missing_fields(self):
         """Return a list of all missing fields in our database.
 
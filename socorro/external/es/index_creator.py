@@ -9,6 +9,7 @@ import os
 from configman import Namespace, RequiredConfig
 from configman.converters import class_converter
 
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.external.es.super_search_fields import SuperSearchFields
 
 
@@ -30,6 +31,12 @@ class IndexCreator(RequiredConfig):
         doc='the index that handles data about email addresses for '
             'the automatic-emails cron job',
     )
+    required_config.add_option(
+        'elasticsearch_mapping_cache_ttl',
+        default=600,
+        doc='the seconds for which the mapping of new indices is reused '
+            'before it is loaded again',
+    )
 
     required_config.elasticsearch = Namespace()
     required_config.elasticsearch.add_option(
@@ -50,9 +57,25 @@ class IndexCreator(RequiredConfig):
         with self.es_context() as conn:
             return elasticsearch.client.IndicesClient(conn)
 
+    def get_index_registry(self):
+        return IndexRegistry.for_cluster(
+            self.config.elasticsearch.elasticsearch_urls
+        )
+
     def create_socorro_index(self, es_index):
-        """Create an index that will receive crash reports. """
-        es_settings = SuperSearchFields(config=self.config).get_mapping()
+        """Create an index that will receive crash reports. The mapping is
+        shared with the other index creators of the process, and built again
+        from the Super Search fields once it is older than
+        `elasticsearch_mapping_cache_ttl` seconds. """
+        es_settings = self.get_index_registry().index_settings(
+            (
+                'es supersearch fields',
+                self.config.elasticsearch.elasticsearch_default_index,
+                self.config.elasticsearch.elasticsearch_doctype,
+            ),
+            SuperSearchFields(config=self.config).get_mapping,
+            self.config.elasticsearch_mapping_cache_ttl,
+        )
         self.create_index(es_index, es_settings)
 
     def create_emails_index(self):
@@ -176,6 +176,21 @@ class FSRadixTreeStorage(CrashStorageBase):
                 with open(os.sep.join([parent_dir, fn]), 'wb') as f:
                     f.write(contents)
 
+    def _copy_files(self, crash_id, pathnames):
+        """like '_save_files', but 'pathnames' maps the file names to the
+        files to copy.  The copies are made a block at a time."""
+        parent_dir = self._get_radixed_parent_directory(crash_id)
+
+        with using_umask(self.config.umask):
+            try:
+                os.makedirs(parent_dir)
+            except OSError:
+                # probably already created, ignore
+                pass
+
+            for fn, a_pathname in pathnames.iteritems():
+                shutil.copyfile(a_pathname, os.sep.join([parent_dir, fn]))
+
     def save_processed(self, processed_crash):
         crash_id = processed_crash['uuid']
         processed_crash = processed_crash.copy()
@@ -194,6 +209,15 @@ class FSRadixTreeStorage(CrashStorageBase):
                           for fn, dump in dumps.iteritems()))
         self._save_files(crash_id, files)
 
+    def save_raw_crash_with_file_dumps(self, raw_crash, dumps, crash_id):
+        # the dumps go first, so that a crash found through the raw crash
+        # file, or the symlinks of the dated storage, is complete
+        self._copy_files(crash_id, dict(
+            (self._get_dump_file_name(crash_id, fn), a_pathname)
+            for fn, a_pathname in dumps.iteritems()
+        ))
+        self.save_raw_crash(raw_crash, {}, crash_id)
+
     def save_raw_and_processed(self, raw_crash, dumps, processed_crash, crash_id):
         """ bug 866973 - do not try to save dumps=None into the Filesystem
             We are doing this in lieu of a queuing solution that could allow
@@ -53,10 +53,19 @@ class PostgreSQLBase(object):
                 self.context.database.database_username
             self.context.database['database_password'] = \
                 self.context.database.database_password
-            self.database = db.Database(self.context.database)
+            self.database = self._get_database(self.context.database)
         else:
             # the old middleware
-            self.database = db.Database(self.context)
+            self.database = self._get_database(self.context)
+
+    @staticmethod
+    def _get_database(database_config):
+        """Return the process wide connection pool for the database if
+        'database_pool_size' is configured, otherwise a plain connection
+        factory. """
+        if database_config.get('database_pool_size'):
+            return db.getPooledDatabase(database_config)
+        return db.Database(database_config)
 
     @contextlib.contextmanager
     def get_connection(self):
@@ -4,6 +4,10 @@
 
 import datetime
 import json
+import sys
+import threading
+import time
+import Queue
 
 from socorro.external.crashstorage_base import (
     CrashStorageBase,
@@ -15,6 +19,7 @@ from configman import (
 )
 from socorro.external.postgresql.connection_context import ConnectionContext
 from socorro.lib.datetimeutil import uuid_to_date, JsonDTEncoder
+from socorro.lib.lru_cache import LRUCache
 from socorro.external.postgresql.dbapi2_util import (
     SQLDidNotReturnSingleValue,
     single_value_sql,
@@ -46,6 +51,12 @@ class PostgreSQLCrashStorage(CrashStorageBase):
         doc='the class responsible for connecting to Postgres',
         reference_value_from='resource.postgresql',
     )
+    required_config.add_option(
+        'plugin_id_cache_size',
+        default=10000,
+        doc='the number of (filename, name) to plugin id mappings to '
+            'remember (0 to look up the id for every crash)',
+    )
 
     _reports_table_mappings = (
         # processed name, reports table name
@@ -100,6 +111,12 @@ class PostgreSQLCrashStorage(CrashStorageBase):
             self.database,
             quit_check_callback=quit_check_callback
         )
+        # rows in the plugins table are never changed or removed, so the id
+        # of a plugin, once seen, is good for the life of the process.  This
+        # cache is shared by all the threads using this instance.
+        self.plugin_id_cache = LRUCache(
+            config.setdefault('plugin_id_cache_size', 10000)
+        )
 
     #--------------------------------------------------------------------------
     def save_raw_crash(self, raw_crash, dumps, crash_id):
@@ -343,26 +360,15 @@ class PostgreSQLCrashStorage(CrashStorageBase):
                     'the crash is missing a required field: %s', str(x)
                 )
                 return
-            find_plugin_sql = ('select id from plugins '
-                               'where filename = %s '
-                               'and name = %s')
-            try:
-                plugin_id = single_value_sql(connection,
-                                             find_plugin_sql,
-                                             (plugin_filename,
-                                              plugin_name))
-            except SQLDidNotReturnSingleValue:
-                insert_plugsins_sql = ("insert into plugins (filename, name) "
-                                       "values (%s, %s) returning id")
-                plugin_id = single_value_sql(connection,
-                                             insert_plugsins_sql,
-                                             (plugin_filename,
-                                              plugin_name))
+            plugin_id = self._get_plugin_id(
+                connection,
+                plugin_filename,
+                plugin_name
+            )
             crash_id = processed_crash['uuid']
             table_suffix = self._table_suffix_for_crash_id(crash_id)
             plugin_reports_table_name = 'plugins_reports_%s' % table_suffix
 
-
             # why are we deleting first?  This might be a reprocessing job and
             # the plugins_reports data might already be in the table: a
             # straight insert might fail.  Why not check to see if there is
@@ -370,33 +376,53 @@ class PostgreSQLCrashStorage(CrashStorageBase):
             # We may be reprocessing to deal with missing plugin_reports data,
             # so just because there is already data there doesn't mean that we
             # can skip this. What about using "upsert" sql - that would be fine
-            # and result in one fewer round trip between client and database,
             # but "upsert" sql is opaque and not easy to understand at a
-            # glance.  This was faster to implement.  What about using
-            # "transaction check points"?  Too many round trips between the
-            # client and the server.
-            plugins_reports_delete_sql = (
-                'delete from %s where report_id = %%s'
-                % plugin_reports_table_name
-            )
-            execute_no_results(connection,
-                               plugins_reports_delete_sql,
-                               (report_id,))
-
-            plugins_reports_insert_sql = (
+            # glance.  The delete and the insert are sent together in one
+            # round trip to the server.
+            plugins_reports_replace_sql = (
+                'delete from %s where report_id = %%s; '
                 'insert into %s '
                 '    (report_id, plugin_id, date_processed, version) '
                 'values '
-                '    (%%s, %%s, %%s, %%s)' % plugin_reports_table_name
+                '    (%%s, %%s, %%s, %%s)'
+                % (plugin_reports_table_name, plugin_reports_table_name)
             )
             values_tuple = (report_id,
+                            report_id,
                             plugin_id,
                             processed_crash['date_processed'],
                             plugin_version)
             execute_no_results(connection,
-                               plugins_reports_insert_sql,
+                               plugins_reports_replace_sql,
                                values_tuple)
 
+    #--------------------------------------------------------------------------
+    def _get_plugin_id(self, connection, plugin_filename, plugin_name):
+        """return the id of a plugin from the plugins table, inserting it if
+        it is new.  Only ids that were found by the select are cached: the
+        transaction that inserts a new plugin could still be rolled back."""
+        cache_key = (plugin_filename, plugin_name)
+        plugin_id = self.plugin_id_cache.get(cache_key)
+        if plugin_id is not None:
+            return plugin_id
+        find_plugin_sql = ('select id from plugins '
+                           'where filename = %s '
+                           'and name = %s')
+        try:
+            plugin_id = single_value_sql(connection,
+                                         find_plugin_sql,
+                                         (plugin_filename,
+                                          plugin_name))
+            self.plugin_id_cache.put(cache_key, plugin_id)
+        except SQLDidNotReturnSingleValue:
+            insert_plugsins_sql = ("insert into plugins (filename, name) "
+                                   "values (%s, %s) returning id")
+            plugin_id = single_value_sql(connection,
+                                         insert_plugsins_sql,
+                                         (plugin_filename,
+                                          plugin_name))
+        return plugin_id
+
     #--------------------------------------------------------------------------
     def _save_extensions(self, connection, processed_crash, report_id):
         extensions = processed_crash['addons']
@@ -405,40 +431,47 @@ class PostgreSQLCrashStorage(CrashStorageBase):
         crash_id = processed_crash['uuid']
         table_suffix = self._table_suffix_for_crash_id(crash_id)
         extensions_table_name = 'extensions_%s' % table_suffix
-        extensions_insert_sql = (
-            "insert into %s "
-            "    (report_id, date_processed, extension_key, extension_id, "
-            "     extension_version)"
-            "values (%%s, %%s, %%s, %%s, %%s)" % extensions_table_name
-        )
+        date_processed = processed_crash['date_processed']
+        values_list = []
+        for i, x in enumerate(extensions):
+            try:
+                values_list.extend(
+                    (report_id, date_processed, i, x[0][:100], x[1])
+                )
+            except IndexError:
+                self.config.logger.warning(
+                    '"%s" is deficient as a name and version for an addon',
+                    str(x[0])
+                )
         # why are we deleting first?  This might be a reprocessing job and
         # the extensions data might already be in the table: a straight insert
         # might fail.  Why not check to see if there is data already there
         # and then just not insert if data is there?  We may be reprocessing
         # to deal with missing extensions data, so just because there is
         # already data there doesn't mean that we can skip this.
-        # What about using "upsert" sql - that would be fine and result in one
-        # fewer round trip between client and database, but "upsert" sql is
-        # opaque and not easy to understand at a glance.  This was faster to
-        # implement.  What about using "transaction check points"?
-        # too many round trips between the client and the server.
-        clear_extensions_sql = (
+        # What about using "upsert" sql - that would be fine, but "upsert" sql
+        # is opaque and not easy to understand at a glance.  Instead, the
+        # delete and a single multi-row insert of all the addons are sent to
+        # the server together in one round trip.
+        replace_extensions_sql = (
             "delete from %s where report_id = %%s" % extensions_table_name
         )
-        execute_no_results(connection, clear_extensions_sql, (report_id,))
-        for i, x in enumerate(extensions):
-            try:
-                execute_no_results(connection, extensions_insert_sql,
-                                   (report_id,
-                                    processed_crash['date_processed'],
-                                    i,
-                                    x[0][:100],
-                                    x[1]))
-            except IndexError:
-                self.config.logger.warning(
-                    '"%s" is deficient as a name and version for an addon',
-                    str(x[0])
+        number_of_rows = len(values_list) / 5
+        if number_of_rows:
+            replace_extensions_sql += (
+                "; insert into %s "
+                "    (report_id, date_processed, extension_key, extension_id, "
+                "     extension_version)"
+                "values %s" % (
+                    extensions_table_name,
+                    ', '.join(['(%s, %s, %s, %s, %s)'] * number_of_rows)
                 )
+            )
+        execute_no_results(
+            connection,
+            replace_extensions_sql,
+            [report_id] + values_list
+        )
 
     #--------------------------------------------------------------------------
     @staticmethod
@@ -451,3 +484,230 @@ class PostgreSQLCrashStorage(CrashStorageBase):
         return '%4d%02d%02d' % (previous_monday_date.year,
                                 previous_monday_date.month,
                                 previous_monday_date.day)
+
+
+#==============================================================================
+class BatchWriterStopped(Exception):
+    """the writer thread of a PostgreSQLBatchingCrashStorage is gone, the
+    crash waiting for it will never be saved"""
+    pass
+
+
+#==============================================================================
+class _PendingCrash(object):
+    """a processed crash waiting in PostgreSQLBatchingCrashStorage for its
+    batch to be committed.  The thread that saved it waits on 'done'."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, processed_crash):
+        self.processed_crash = processed_crash
+        self.exc_info = None
+        self.done = threading.Event()
+
+    #--------------------------------------------------------------------------
+    def succeed(self):
+        self.done.set()
+
+    #--------------------------------------------------------------------------
+    def fail(self, exc_info):
+        self.exc_info = exc_info
+        self.done.set()
+
+
+#==============================================================================
+class PostgreSQLBatchingCrashStorage(PostgreSQLCrashStorage):
+    """a PostgreSQLCrashStorage that saves the processed crashes from all
+    the threads that use it in batches, one transaction per batch rather
+    than one per crash.
+
+    A thread calling 'save_processed' waits until the batch holding its crash
+    has been committed, so anything that the caller does afterward, like
+    acknowledging the crash to its queue, happens only once the crash is
+    safely in the database.  The writer thread gathers up to
+    'batch_max_crashes' crashes, waiting no longer than 'batch_max_wait'
+    seconds after the first one arrives, and writes the crashes of each
+    weekly partition in a transaction of their own.  As each thread has at
+    most one crash waiting, the batch is closed as soon as every thread that
+    saves crashes through this storage has its crash in it.
+
+    A batch can hold no more crashes than there are threads saving them.
+    With a single saving thread, as with the ProcessPoolTaskManager or a
+    ThreadedTaskManager with one thread, every batch is one crash and
+    batching does not help: use PostgreSQLCrashStorage there.
+
+    If a transaction fails, its crashes are split in two and each half is
+    tried again, until the crash at fault is alone.  The exception is then
+    raised to the thread that saved that crash, just as if it had been
+    saved by itself."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'batch_max_crashes',
+        default=50,
+        doc='the largest number of processed crashes to save in one '
+            'transaction',
+    )
+    required_config.add_option(
+        'batch_max_wait',
+        default=0.1,
+        doc='the longest time, in seconds, to wait for more crashes to join '
+            'a batch, it is not waited once every saving thread has its '
+            'crash in the batch',
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config, quit_check_callback=None):
+        super(PostgreSQLBatchingCrashStorage, self).__init__(
+            config,
+            quit_check_callback=quit_check_callback
+        )
+        self._pending_queue = Queue.Queue()
+        # the threads that save crashes through this storage, a batch can't
+        # get any larger once all of them are waiting on it
+        self._saving_threads = set()
+        self._saving_threads_lock = threading.Lock()
+        self._writer_stop = threading.Event()
+        self._writer = threading.Thread(
+            name='PostgreSQLBatchWriter',
+            target=self._writer_loop
+        )
+        self._writer.daemon = True
+        self._writer.start()
+
+    #--------------------------------------------------------------------------
+    def save_processed(self, processed_crash):
+        """add the crash to the next batch and wait for that batch to be
+        committed.  Raises the exception that stopped this crash from being
+        saved, if any, or BatchWriterStopped if the writer thread is gone
+        without having saved it."""
+        if self._writer_stop.is_set():
+            # closed already, there is no writer to do the work
+            super(PostgreSQLBatchingCrashStorage, self).save_processed(
+                processed_crash
+            )
+            return
+        pending_crash = _PendingCrash(processed_crash)
+        with self._saving_threads_lock:
+            self._saving_threads.add(threading.current_thread())
+        self._pending_queue.put(pending_crash)
+        # waiting with a timeout keeps the wait interruptible and lets the
+        # app shut down, or notice the writer is gone, in the meantime
+        while not pending_crash.done.wait(1.0):
+            self.quit_check()
+            if not self._writer.is_alive() and not pending_crash.done.is_set():
+                raise BatchWriterStopped(
+                    'the batch writer stopped before saving %s'
+                    % processed_crash.get('uuid')
+                )
+        if pending_crash.exc_info:
+            raise pending_crash.exc_info[0], \
+                pending_crash.exc_info[1], \
+                pending_crash.exc_info[2]
+
+    #--------------------------------------------------------------------------
+    def _count_saving_threads(self):
+        """the number of live threads that have saved crashes through this
+        storage"""
+        with self._saving_threads_lock:
+            self._saving_threads = set(
+                x for x in self._saving_threads if x.is_alive()
+            )
+            return len(self._saving_threads)
+
+    #--------------------------------------------------------------------------
+    def _next_batch(self):
+        """wait for a crash to arrive, then gather more until the batch is
+        full, every saving thread has its crash in it, or 'batch_max_wait'
+        has passed.  Returns an empty list if nothing arrived within a
+        second."""
+        try:
+            batch = [self._pending_queue.get(True, 1.0)]
+        except Queue.Empty:
+            return []
+        deadline = time.time() + self.config.batch_max_wait
+        while (
+            len(batch) < self.config.batch_max_crashes and
+            len(batch) < self._count_saving_threads()
+        ):
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self._pending_queue.get(True, remaining))
+                else:
+                    batch.append(self._pending_queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    #--------------------------------------------------------------------------
+    def _writer_loop(self):
+        """the target of the writer thread.  It runs until 'close' is called
+        and the queue is empty."""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._writer_stop.is_set():
+                    return
+                continue
+            self._write_batch(batch)
+
+    #--------------------------------------------------------------------------
+    def _write_batch(self, batch):
+        """save a batch of pending crashes, one transaction for each weekly
+        partition"""
+        by_partition = {}
+        for a_pending_crash in batch:
+            try:
+                crash_id = a_pending_crash.processed_crash['uuid']
+                table_suffix = self._table_suffix_for_crash_id(crash_id)
+            except Exception:
+                a_pending_crash.fail(sys.exc_info())
+                continue
+            by_partition.setdefault(table_suffix, []).append(a_pending_crash)
+        for table_suffix in sorted(by_partition):
+            self._write_pending_crashes(by_partition[table_suffix])
+
+    #--------------------------------------------------------------------------
+    def _write_pending_crashes(self, pending_crashes):
+        """save a list of pending crashes in one transaction.  On failure,
+        split the list and try each half on its own."""
+        try:
+            self.transaction(
+                self._save_processed_batch_transaction,
+                [x.processed_crash for x in pending_crashes]
+            )
+        except KeyboardInterrupt:
+            # the quit check says that the app is shutting down.  Pass that
+            # on to the waiting threads, too.
+            exc_info = sys.exc_info()
+            for a_pending_crash in pending_crashes:
+                a_pending_crash.fail(exc_info)
+            return
+        except Exception:
+            if len(pending_crashes) == 1:
+                pending_crashes[0].fail(sys.exc_info())
+                return
+            self.config.logger.warning(
+                'a batch of %d processed crashes failed, splitting it',
+                len(pending_crashes),
+                exc_info=True
+            )
+            middle = len(pending_crashes) / 2
+            self._write_pending_crashes(pending_crashes[:middle])
+            self._write_pending_crashes(pending_crashes[middle:])
+            return
+        for a_pending_crash in pending_crashes:
+            a_pending_crash.succeed()
+
+    #--------------------------------------------------------------------------
+    def _save_processed_batch_transaction(self, connection, processed_crashes):
+        for a_processed_crash in processed_crashes:
+            self._save_processed_transaction(connection, a_processed_crash)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the writer thread once it has saved everything that is already
+        waiting"""
+        self._writer_stop.set()
+        self._writer.join()
+        super(PostgreSQLBatchingCrashStorage, self).close()
@@ -0,0 +1,24 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import socorro.database.database as db
+from socorro.external.postgresql.base import PostgreSQLBase
+
+
+class DatabasePool(PostgreSQLBase):
+    """Implement the /database_pool service with PostgreSQL. """
+
+    def get(self, **kwargs):
+        """Return the size of the connection pools of this process and the
+        time spent waiting for their connections. """
+        statistics = db.pooledDatabaseStatistics()
+        hits = []
+        for database in sorted(statistics):
+            pool = dict(statistics[database])
+            pool['database'] = database
+            hits.append(pool)
+        return {
+            'hits': hits,
+            'total': len(hits)
+        }
@@ -2,6 +2,8 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import collections
+
 import pika
 from Queue import (
     Queue,
@@ -18,6 +20,43 @@ from socorro.external.rabbitmq.connection_context import (
 from socorro.external.crashstorage_base import (
     CrashStorageBase,
 )
+from socorro.lib.lru_cache import LRUCache
+
+
+#------------------------------------------------------------------------------
+def weights_from_string(weights_str):
+    """'priority: 4, standard: 2' becomes [('priority', 4), ('standard', 2)]
+    """
+    weights = []
+    for an_item in weights_str.split(','):
+        if not an_item.strip():
+            continue
+        name, weight = an_item.split(':')
+        weights.append((name.strip(), int(weight)))
+    return weights
+
+
+#------------------------------------------------------------------------------
+def weights_to_string(weights):
+    return ', '.join('%s: %s' % (name, weight) for name, weight in weights)
+
+
+#------------------------------------------------------------------------------
+def weighted_schedule(weights):
+    """spread the names over a list, each as many times as its weight, as
+    evenly as possible: [('a', 3), ('b', 1)] becomes ['a', 'a', 'b', 'a'].
+    This is the smooth weighted round robin of nginx."""
+    total = sum(weight for name, weight in weights)
+    current = dict((name, 0) for name, weight in weights)
+    schedule = []
+    for i in range(total):
+        for name, weight in weights:
+            current[name] += weight
+        # the first of the largest wins ties
+        chosen = max(weights, key=lambda x: current[x[0]])[0]
+        current[chosen] -= total
+        schedule.append(chosen)
+    return schedule
 
 
 #==============================================================================
@@ -66,6 +105,32 @@ class RabbitMQCrashStorage(CrashStorageBase):
         doc='toggle for using or ignoring the throttling flag',
         reference_value_from='resource.rabbitmq',
     )
+    required_config.add_option(
+        'use_basic_consume',
+        default=False,
+        doc='have RabbitMQ push crashes to the consumer rather than polling '
+            'for each one',
+    )
+    required_config.add_option(
+        'prefetch_count',
+        default=50,
+        doc='with use_basic_consume, the most crashes that RabbitMQ sends '
+            'ahead before they are acknowledged',
+    )
+    required_config.add_option(
+        'queue_weights',
+        default='priority: 4, standard: 2, reprocessing: 1',
+        doc='with use_basic_consume, the share of crashes taken from each '
+            'queue while more than one has crashes waiting',
+        from_string_converter=weights_from_string,
+        to_string_converter=weights_to_string,
+    )
+    required_config.add_option(
+        'acknowledgement_token_cache_size',
+        default=10000,
+        doc='the most crashes waiting to be acknowledged to remember; the '
+            'crashes forgotten are no longer acknowledged on their own',
+    )
 
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
@@ -76,10 +141,19 @@ class RabbitMQCrashStorage(CrashStorageBase):
 
         self.config = config
 
-        # Note: this may continue to grow if we aren't acking certain UUIDs.
-        # We should find a way to time out UUIDs after a certain time.
-        self.acknowledgement_token_cache = {}
+        # crash_id -> the list of the method frames that brought it.  When
+        # full, the crashes waiting the longest to be acknowledged are
+        # forgotten.
+        self.acknowledgement_token_cache = LRUCache(
+            config.setdefault('acknowledgement_token_cache_size', 10000),
+            on_evict=self._forget_delivery
+        )
         self.acknowledgment_queue = Queue()
+        # the delivery tags on 'delivery_channel' not yet acknowledged, in
+        # the order of delivery, which is the order of the tags.  Only the
+        # thread running 'new_crashes' touches them.
+        self.unacknowledged_delivery_tags = collections.OrderedDict()
+        self.delivery_channel = None
 
         self.rabbitmq = config.rabbitmq_class(config)
         self.transaction = config.transaction_executor_class(
@@ -140,8 +214,13 @@ class RabbitMQCrashStorage(CrashStorageBase):
         # only the thread that read the crash may acknowledge it.  'ack_crash'
         # queues the crash_id. The '_consume_acknowledgement_queue' function
         # is run to send acknowledgments back to RabbitMQ
+        if self.config.setdefault('use_basic_consume', False):
+            for crash_id in self._new_crashes_by_consuming():
+                yield crash_id
+            return
         self._consume_acknowledgement_queue()
         conn = self.rabbitmq.connection()
+        self._use_delivery_channel(conn.channel)
         queues = [
             self.rabbitmq.config.priority_queue_name,
             self.rabbitmq.config.standard_queue_name,
@@ -158,10 +237,116 @@ class RabbitMQCrashStorage(CrashStorageBase):
             if not method_frame:
                 return
             self._consume_acknowledgement_queue()
-            self.acknowledgement_token_cache[body] = method_frame
+            self._remember_delivery(body, method_frame)
             yield body
             queues.reverse()
 
+    #--------------------------------------------------------------------------
+    def _new_crashes_by_consuming(self):
+        """have RabbitMQ push crash_ids from all the queues, at most
+        'prefetch_count' of them ahead of their acknowledgement.  They wait
+        in a buffer for each queue and are yielded in the proportions of
+        'queue_weights'.  This generator does not end when the queues are
+        empty: it waits for more crashes, sending acknowledgements and
+        running the quit check in the meantime."""
+        conn = self.rabbitmq.connection()
+        queue_names = {
+            'priority': self.rabbitmq.config.priority_queue_name,
+            'standard': self.rabbitmq.config.standard_queue_name,
+            'reprocessing': self.rabbitmq.config.reprocessing_queue_name,
+        }
+        buffers = dict((name, collections.deque()) for name in queue_names)
+        self._use_delivery_channel(conn.channel)
+        conn.channel.basic_qos(prefetch_count=self.config.prefetch_count)
+        consumer_tags = []
+        for name, queue in queue_names.iteritems():
+            def on_message(channel, method_frame, header_frame, body,
+                           a_buffer=buffers[name]):
+                # a delivered tag holds back the 'multiple' acks of the
+                # later tags even before it is yielded
+                delivery_tag = method_frame.delivery_tag
+                self.unacknowledged_delivery_tags[delivery_tag] = None
+                a_buffer.append((method_frame, body))
+            consumer_tags.append(
+                conn.channel.basic_consume(on_message, queue=queue)
+            )
+        schedule = weighted_schedule(self.config.queue_weights)
+        position = 0
+        try:
+            while True:
+                self._consume_acknowledgement_queue()
+                for i in range(len(schedule)):
+                    a_buffer = buffers[schedule[(position + i) % len(schedule)]]
+                    if a_buffer:
+                        position = (position + i + 1) % len(schedule)
+                        method_frame, body = a_buffer.popleft()
+                        self._remember_delivery(body, method_frame)
+                        yield body
+                        break
+                else:
+                    # nothing buffered, wait for RabbitMQ a moment
+                    self.quit_check()
+                    conn.connection.process_data_events()
+        finally:
+            for a_consumer_tag in consumer_tags:
+                try:
+                    conn.channel.basic_cancel(a_consumer_tag)
+                except Exception:
+                    self.config.logger.warning(
+                        'RabbitMQCrashStorage failed to cancel consumer %s',
+                        a_consumer_tag,
+                        exc_info=True
+                    )
+            # the crashes still in the buffers go back to their queues now,
+            # rather than wait for a 'multiple' ack to cover them or for the
+            # channel to close
+            for a_buffer in buffers.itervalues():
+                for method_frame, body in a_buffer:
+                    self.unacknowledged_delivery_tags.pop(
+                        method_frame.delivery_tag,
+                        None
+                    )
+                    try:
+                        conn.channel.basic_reject(
+                            delivery_tag=method_frame.delivery_tag,
+                            requeue=True
+                        )
+                    except Exception:
+                        self.config.logger.warning(
+                            'RabbitMQCrashStorage failed to requeue crash %s',
+                            body,
+                            exc_info=True
+                        )
+                a_buffer.clear()
+
+    #--------------------------------------------------------------------------
+    def _remember_delivery(self, crash_id, method_frame):
+        method_frames = self.acknowledgement_token_cache.get(crash_id, [])
+        method_frames.append(method_frame)
+        self.acknowledgement_token_cache.put(crash_id, method_frames)
+        self.unacknowledged_delivery_tags[method_frame.delivery_tag] = None
+
+    #--------------------------------------------------------------------------
+    def _forget_delivery(self, crash_id, method_frames):
+        """called when a crash waiting for its acknowledgement is pushed out
+        of the cache.  It can no longer be acknowledged on its own, so its
+        tags stop holding back the 'multiple' acks of the later tags."""
+        for a_method_frame in method_frames:
+            self.unacknowledged_delivery_tags.pop(
+                a_method_frame.delivery_tag,
+                None
+            )
+
+    #--------------------------------------------------------------------------
+    def _use_delivery_channel(self, channel):
+        """delivery tags are numbered per channel.  If crashes now come from,
+        or are acknowledged on, a channel other than the one that delivered
+        the tags waiting for their acknowledgement, those tags are
+        meaningless and are dropped."""
+        if channel is not self.delivery_channel:
+            self.unacknowledged_delivery_tags.clear()
+            self.delivery_channel = channel
+
     #--------------------------------------------------------------------------
     def ack_crash(self, crash_id):
         self.acknowledgment_queue.put(crash_id)
@@ -171,27 +356,22 @@ class RabbitMQCrashStorage(CrashStorageBase):
         """The acknowledgement of the processing of each crash_id yielded
         from the 'new_crashes' method must take place on the same connection
         that the crash_id came from.  The crash_ids are queued in the
-        'acknowledgment_queue'.  That queue is consumed by the QueuingThread"""
+        'acknowledgment_queue'.  That queue is consumed by the QueuingThread.
+        All the crash_ids waiting in the queue are acknowledged together."""
+        delivery_tags = []
         try:
             while True:
                 crash_id_to_be_acknowledged = \
                     self.acknowledgment_queue.get_nowait()
-                #self.config.logger.debug(
-                    #'RabbitMQCrashStorage set to acknowledge %s',
-                    #crash_id_to_be_acknowledged
-                #)
                 try:
-                    acknowledgement_token = \
-                        self.acknowledgement_token_cache[
-                            crash_id_to_be_acknowledged
-                        ]
-                    self.transaction(
-                        self._transaction_ack_crash,
-                        acknowledgement_token
-                    )
-                    del self.acknowledgement_token_cache[
+                    method_frames = self.acknowledgement_token_cache.pop(
                         crash_id_to_be_acknowledged
-                    ]
+                    )
+                    if method_frames is None:
+                        raise KeyError(crash_id_to_be_acknowledged)
+                    delivery_tags.extend(
+                        x.delivery_tag for x in method_frames
+                    )
                 except KeyError:
                     self.config.logger.warning(
                         'RabbitMQCrashStorage tried to acknowledge crash %s'
@@ -199,25 +379,59 @@ class RabbitMQCrashStorage(CrashStorageBase):
                         crash_id_to_be_acknowledged,
                         exc_info=True
                     )
-                except Exception as x:
-                    self.config.logger.error(
-                        'RabbitMQCrashStorage unexpected failure on %s',
-                        crash_id_to_be_acknowledged,
-                        exc_info=True
-                    )
-
         except Empty:
-            pass  # nothing to do with an empty queue
+            pass  # nothing more to do with an empty queue
+        if not delivery_tags:
+            return
+        try:
+            self.transaction(self._transaction_ack_crashes, delivery_tags)
+        except Exception:
+            self.config.logger.error(
+                'RabbitMQCrashStorage unexpected failure acknowledging '
+                'delivery tags %s',
+                delivery_tags,
+                exc_info=True
+            )
 
     #--------------------------------------------------------------------------
-    def _transaction_ack_crash(self, connection, acknowledgement_token):
+    def _transaction_ack_crashes(self, connection, delivery_tags):
+        """acknowledge the delivery tags.  The oldest unacknowledged tags are
+        acknowledged with a single 'multiple' ack, up to the first tag still
+        being worked on.  The others are acknowledged one by one."""
+        self._use_delivery_channel(connection.channel)
+        to_acknowledge = set(delivery_tags)
+        last_of_run = None
+        run_length = 0
+        for a_delivery_tag in self.unacknowledged_delivery_tags:
+            if a_delivery_tag not in to_acknowledge:
+                break
+            last_of_run = a_delivery_tag
+            run_length += 1
+        if run_length > 1:
+            self.config.logger.debug(
+                'RabbitMQCrashStorage acking %d crashes up to delivery_tag '
+                '%s',
+                run_length,
+                last_of_run
+            )
+            connection.channel.basic_ack(
+                delivery_tag=last_of_run,
+                multiple=True
+            )
+        elif run_length == 1:
+            self._ack_one(connection, last_of_run)
+        for a_delivery_tag in sorted(to_acknowledge):
+            if last_of_run is None or a_delivery_tag > last_of_run:
+                self._ack_one(connection, a_delivery_tag)
+            self.unacknowledged_delivery_tags.pop(a_delivery_tag, None)
+
+    #--------------------------------------------------------------------------
+    def _ack_one(self, connection, delivery_tag):
         self.config.logger.debug(
             'RabbitMQCrashStorage acking with delivery_tag %s',
-            acknowledgement_token.delivery_tag
-        )
-        connection.channel.basic_ack(
-            delivery_tag=acknowledgement_token.delivery_tag
+            delivery_tag
         )
+        connection.channel.basic_ack(delivery_tag=delivery_tag)
 
 
 #==============================================================================
@@ -3,6 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
+import tempfile
 
 from contextlib import contextmanager
 from socorro.lib.util import FakeLogger
@@ -28,3 +29,40 @@ def temp_file_context(raw_dump_path, logger=None):
                     raw_dump_path,
                     exc_info=True
                 )
+
+
+#--------------------------------------------------------------------------
+@contextmanager
+def memory_file_context(contents, directory, logger=None):
+    """this contextmanager writes 'contents' to a new file in 'directory',
+    ideally a memory backed file system like /dev/shm, and yields a pathname
+    from which any process of the same user can read it.  Where /proc
+    allows, the file is unlinked right away and the pathname names the open
+    descriptor of this process, so nothing is left behind even if this
+    process dies.  Either way, the file is gone at the end of the
+    context."""
+    fd, pathname = tempfile.mkstemp(dir=directory, prefix='socorro-handoff-')
+    try:
+        offset = 0
+        while offset < len(contents):
+            offset += os.write(fd, buffer(contents, offset))
+        descriptor_pathname = '/proc/%d/fd/%d' % (os.getpid(), fd)
+        if os.path.exists(descriptor_pathname):
+            os.unlink(pathname)
+            pathname = None
+            yield descriptor_pathname
+        else:
+            yield pathname
+    finally:
+        os.close(fd)
+        if pathname is not None:
+            try:
+                os.unlink(pathname)
+            except OSError:
+                if logger is None:
+                    logger = FakeLogger()
+                logger.warning(
+                    'unable to delete %s. manual deletion is required.',
+                    pathname,
+                    exc_info=True
+                )
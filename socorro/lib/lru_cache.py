@@ -0,0 +1,95 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""a small, thread safe, size bounded cache that discards the least recently
+used entries first"""
+
+import threading
+
+from collections import OrderedDict
+
+
+#==============================================================================
+class LRUCache(object):
+    """a mapping of a bounded size.  When full, adding a new key discards the
+    key that was least recently read or written.  A single lock protects the
+    whole structure, so one instance may be shared by many threads.  The
+    'hits' and 'misses' counters tally the results of 'get'.
+
+    If given, 'on_evict' is called with the key and the value of each entry
+    discarded to make room, after the lock is released.
+
+    A cache with a 'maximum_size' of zero never holds anything."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, maximum_size, on_evict=None):
+        self.maximum_size = maximum_size
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #--------------------------------------------------------------------------
+    def get(self, key, default=None):
+        """return the value for 'key' and mark it as the most recently used.
+        If 'key' is not in the cache, return 'default'."""
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    #--------------------------------------------------------------------------
+    def put(self, key, value):
+        evicted = []
+        with self._lock:
+            if not self.maximum_size:
+                return
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maximum_size:
+                evicted.append(self._data.popitem(last=False))
+        if self.on_evict is not None:
+            for an_evicted_key, an_evicted_value in evicted:
+                self.on_evict(an_evicted_key, an_evicted_value)
+
+    #--------------------------------------------------------------------------
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    #--------------------------------------------------------------------------
+    def clear(self):
+        """discard all the entries.  The counters are left alone."""
+        with self._lock:
+            self._data.clear()
+
+    #--------------------------------------------------------------------------
+    def stats(self):
+        """returns a mapping of the size and hit/miss counters, suitable for
+        logging"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maximum_size': self.maximum_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+    #--------------------------------------------------------------------------
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    #--------------------------------------------------------------------------
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
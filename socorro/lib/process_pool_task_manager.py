@@ -0,0 +1,526 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""This module defines a producer/consumer system where the consumers are
+separate processes rather than threads.  A single iterator thread in the
+parent process pushes jobs into a bounded interprocess queue while a flock of
+worker processes do the jobs.  Because each worker is its own Python
+interpreter, CPU bound task functions are not serialized by the GIL.
+
+The worker processes are forked from the parent when the task manager is
+started, so the task function and everything that it refers to are inherited
+rather than pickled.  Only the job parameters cross the process boundary.
+Callables in a job's kwargs (like the 'finished_func' that acknowledges a
+crash to RabbitMQ) cannot be meaningfully run in a child process.  They are
+held back in the parent and replaced in the child by proxies.  When the task
+ends, the worker reports which proxies were called and the parent calls the
+corresponding original callables.
+
+A worker that dies in the middle of a job (a segfault in a C extension, the
+OOM killer) never reports it.  The parent learns which job each worker holds
+through shared memory, fails the job of a dead worker and calls all of its
+held back callables, just as a task that raised an exception would have
+called its 'finished_func' on the way out."""
+
+import os
+import signal
+import threading
+import time
+import Queue
+import multiprocessing
+
+from configman import Namespace
+
+from socorro.lib.task_manager import (
+    default_task_func,
+    default_iterator,
+    TaskManager
+)
+
+
+#==============================================================================
+class ProcessPoolTaskManager(TaskManager):
+    """Given an iterator over a sequence of job parameters and a function,
+    this class will execute the function in a set of worker processes."""
+    required_config = Namespace()
+    required_config.add_option(
+      'idle_delay',
+      default=7,
+      doc='the delay in seconds if no job is found'
+    )
+    # unlike threads, worker processes are not limited by the GIL.  For a
+    # compute bound application, setting this to the number of processor
+    # cores is a reasonable starting point.
+    required_config.add_option(
+      'number_of_processes',
+      default=multiprocessing.cpu_count(),
+      doc='the number of worker processes'
+    )
+    # as with the ThreadedTaskManager, anything sitting in the queue when
+    # disaster strikes may be lost.  Keep this small.
+    required_config.add_option(
+      'maximum_queue_size',
+      default=8,
+      doc='the maximum size of the internal queue'
+    )
+    required_config.add_option(
+      'worker_stop_timeout',
+      default=60,
+      doc='the longest time, in seconds, to wait for the worker processes to '
+          'take their death tokens from a full queue before terminating them'
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config,
+                 job_source_iterator=default_iterator,
+                 task_func=default_task_func,
+                 worker_setup_func=None,
+                 worker_cleanup_func=None):
+        """the constructor accepts the function that will serve as the data
+        source iterator and the function that the worker processes will
+        execute on consuming the data.
+
+        parameters:
+            job_source_iterator - an iterator to serve as the source of data.
+                                  see the TaskManager class for the forms
+                                  that it may take.
+            task_func - a function that will accept the args and kwargs yielded
+                        by the job_source_iterator
+            worker_setup_func - an optional function, taking no parameters,
+                                that will be called once in each worker
+                                process before it starts taking jobs.  Use
+                                it to create resources that must not be
+                                shared between processes, like database
+                                connections.
+            worker_cleanup_func - an optional function, taking no parameters,
+                                  that will be called once in each worker
+                                  process after its last job."""
+        super(ProcessPoolTaskManager, self).__init__(
+            config,
+            job_source_iterator,
+            task_func
+        )
+        self.worker_setup_func = worker_setup_func
+        self.worker_cleanup_func = worker_cleanup_func
+        self.process_list = []  # the worker process objects
+        self.number_of_processes = config.number_of_processes
+        self.task_queue = multiprocessing.Queue(config.maximum_queue_size)
+        # the worker processes report the end of each job through this pipe.
+        # A multiprocessing.Queue hands what it is given to a feeder thread,
+        # which can die with the worker before sending it.  Once 'send'
+        # returns, the report is in the pipe.
+        self.completion_reader, self.completion_writer = \
+            multiprocessing.Pipe(duplex=False)
+        self.completion_writer_lock = multiprocessing.Lock()
+        # the quit flag of the parent is not visible to the children, this
+        # event is how they learn that it is time to quit
+        self.quit_event = multiprocessing.Event()
+        # callables held back from the jobs currently in the worker processes
+        # keyed by job number
+        self.pending_callbacks = {}
+        self.pending_callbacks_lock = threading.Lock()
+        self.job_counter = 0
+        # the number of the job that each worker process is doing, 0 when it
+        # is doing none.  The workers write it, the parent reads it when a
+        # worker has died.
+        self.worker_jobs = multiprocessing.Array(
+            'l',
+            self.number_of_processes,
+            lock=False
+        )
+        # the queuing and the completion threads both replace dead workers,
+        # and no worker must be replaced once the death tokens are sent
+        self.process_list_lock = threading.Lock()
+        self.stopping_workers = False
+
+    #--------------------------------------------------------------------------
+    def quit_check(self):
+        """in the parent process, this is the same as the TaskManager version.
+        In a worker process it also detects the quit event set by the
+        parent"""
+        if self.quit or self.quit_event.is_set():
+            raise KeyboardInterrupt
+
+    #--------------------------------------------------------------------------
+    def start(self):
+        """this function will start the worker processes, the queuing thread
+        that executes the iterator and feeds jobs into the queue and the
+        completion thread that runs the held back callables for finished
+        jobs.  This is a non blocking call."""
+        self.logger.debug('start')
+        for x in range(self.number_of_processes):
+            self._start_worker_process(x)
+        self.completion_thread = threading.Thread(
+          name="CompletionThread",
+          target=self._completion_thread_func
+        )
+        self.completion_thread.start()
+        self.queuing_thread = threading.Thread(
+          name="QueuingThread",
+          target=self._queuing_thread_func
+        )
+        self.queuing_thread.start()
+
+    #--------------------------------------------------------------------------
+    def _start_worker_process(self, worker_number):
+        new_process = multiprocessing.Process(
+            name="WorkerProcess-%d" % worker_number,
+            target=self._worker_process_func,
+            args=(worker_number,)
+        )
+        new_process.start()
+        if worker_number < len(self.process_list):
+            self.process_list[worker_number] = new_process
+        else:
+            self.process_list.append(new_process)
+
+    #--------------------------------------------------------------------------
+    def wait_for_completion(self, waiting_func=None):
+        """This is a blocking function call that will wait for the queuing
+        thread to complete.
+
+        parameters:
+            waiting_func - this function will be called every one second while
+                           waiting for the queuing thread to quit.  This allows
+                           for logging timers, status indicators, etc."""
+        self.logger.debug("waiting to join queuingThread")
+        self._responsive_join(self.queuing_thread, waiting_func)
+
+    #--------------------------------------------------------------------------
+    def stop(self):
+        """This function will tell the queuing thread and all the worker
+        processes to quit, then wait for the queuing thread to quit."""
+        self.quit = True
+        self.quit_event.set()
+        self.wait_for_completion()
+
+    #--------------------------------------------------------------------------
+    def blocking_start(self, waiting_func=None):
+        """this function is just a wrapper around the start and
+        wait_for_completion methods.  It starts the processes and threads and
+        then waits for them to complete.  If run by the main thread, it will
+        detect the KeyboardInterrupt exception (which is what SIGTERM and
+        SIGHUP have been translated to) and will order the workers to die."""
+        try:
+            self.start()
+            self.wait_for_completion(waiting_func)
+        except KeyboardInterrupt:
+            while True:
+                try:
+                    self.stop()
+                    break
+                except KeyboardInterrupt:
+                    self.logger.warning('We heard you the first time.  There '
+                                   'is no need for further keyboard or signal '
+                                   'interrupts.  We are waiting for the '
+                                   'worker processes to stop.  If this app '
+                                   'does not halt soon, you may have to send '
+                                   'SIGKILL (kill -9)')
+
+    #--------------------------------------------------------------------------
+    def _responsive_join(self, thread, waiting_func=None):
+        """wait for another thread while calling the waiting_func once every
+        second.  See the ThreadedTaskManager version of this method.
+
+        parameters:
+            thread - the thread to wait for
+            waiting_func - a function to call every second while waiting for
+                           the thread to die"""
+        while True:
+            try:
+                thread.join(1.0)
+                if not thread.isAlive():
+                    break
+                if waiting_func:
+                    waiting_func()
+            except KeyboardInterrupt:
+                self.logger.debug('quit detected by _responsive_join')
+                self.quit = True
+                self.quit_event.set()
+
+    #--------------------------------------------------------------------------
+    def _replace_dead_workers(self):
+        """a worker process that has died of something other than a death
+        token (a segfault in a C extension, the OOM killer) is replaced so
+        that the pool keeps its size.  The job it was doing has failed."""
+        with self.process_list_lock:
+            if self.stopping_workers:
+                return
+            for worker_number, a_process in enumerate(self.process_list):
+                if not a_process.is_alive():
+                    self.logger.warning(
+                        '%s died with exit code %s, replacing it',
+                        a_process.name,
+                        a_process.exitcode
+                    )
+                    self._fail_worker_job(worker_number)
+                    self._start_worker_process(worker_number)
+
+    #--------------------------------------------------------------------------
+    def _fail_worker_job(self, worker_number):
+        """the worker process is gone without reporting the end of the job
+        that it was doing.  That job has failed: all of its held back
+        callables are called so that, for example, its crash gets
+        acknowledged rather than held forever."""
+        job_number = self.worker_jobs[worker_number]
+        if not job_number:
+            return
+        self.worker_jobs[worker_number] = 0
+        with self.pending_callbacks_lock:
+            callbacks = self.pending_callbacks.pop(job_number, {})
+        self.logger.error(
+            'job %d failed, WorkerProcess-%d died while doing it',
+            job_number,
+            worker_number
+        )
+        for a_callback in callbacks.itervalues():
+            try:
+                a_callback()
+            except Exception:
+                self.logger.error(
+                    "Error in completing a failed job",
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    def _responsive_put(self, item):
+        """put an item into the bounded task queue.  While the queue is full,
+        this method blocks, but it wakes once a second to look for the quit
+        flag and for dead workers that would otherwise never drain the
+        queue."""
+        while True:
+            self.quit_check()
+            try:
+                self.task_queue.put(item, True, 1.0)
+                return
+            except Queue.Full:
+                self._replace_dead_workers()
+
+    #--------------------------------------------------------------------------
+    def _split_job_params(self, job_params):
+        """separate the picklable parts of a job from the callables in its
+        kwargs.  The callables stay in the parent process in the
+        'pending_callbacks' mapping under a new job number.
+
+        returns:
+            a tuple of (job_number, args, kwargs, callback_names)"""
+        try:
+            args, kwargs = job_params
+        except ValueError:
+            args = job_params
+            kwargs = {}
+        picklable_kwargs = {}
+        callbacks = {}
+        for key, value in kwargs.iteritems():
+            if callable(value):
+                callbacks[key] = value
+            else:
+                picklable_kwargs[key] = value
+        self.job_counter += 1
+        if callbacks:
+            with self.pending_callbacks_lock:
+                self.pending_callbacks[self.job_counter] = callbacks
+        return (
+            self.job_counter,
+            tuple(args),
+            picklable_kwargs,
+            tuple(callbacks.keys())
+        )
+
+    #--------------------------------------------------------------------------
+    def _queuing_thread_func(self):
+        """This is the function responsible for reading the iterator and
+        putting contents into the queue.  It loops as long as there are items
+        in the iterator.  Should something go wrong with this thread, or it
+        detects the quit flag, it will calmly kill its workers and then
+        quit itself."""
+        self.logger.debug('_queuing_thread_func start')
+        try:
+            for job_params in self._get_iterator():  # may never raise
+                                                     # StopIteration
+                if job_params is None:
+                    self.logger.info("there is nothing to do.  Sleeping "
+                                     "for %d seconds" %
+                                     self.config.idle_delay)
+                    self._responsive_sleep(self.config.idle_delay)
+                    continue
+                self.quit_check()
+                self._responsive_put(self._split_job_params(job_params))
+            else:
+                self.logger.debug("the loop didn't actually loop")
+        except Exception:
+            self.logger.error('queuing jobs has failed', exc_info=True)
+        except KeyboardInterrupt:
+            self.logger.debug('queuingThread gets quit request')
+        finally:
+            self.quit = True
+            self.logger.debug("we're quitting queuingThread")
+            self._kill_worker_processes()
+            self.logger.debug("all worker processes stopped")
+
+    #--------------------------------------------------------------------------
+    def _kill_worker_processes(self):
+        """This function coerces the worker processes to quit.  One death
+        token is placed on the queue for each process.  A worker that sees the
+        death token runs to completion without drawing anything more off the
+        queue.  If the tokens cannot be placed because the queue stays full,
+        the workers that are left are terminated.  Once the workers are gone,
+        the jobs that died with them have failed, and the completion thread
+        is told to quit, too.
+
+        This is a blocking call."""
+        with self.process_list_lock:
+            self.stopping_workers = True
+        if not self._put_death_tokens():
+            for a_process in self.process_list:
+                if a_process.is_alive():
+                    self.logger.warning('terminating %s', a_process.name)
+                    a_process.terminate()
+        self.logger.debug("waiting for worker processes to stop")
+        for worker_number, a_process in enumerate(self.process_list):
+            a_process.join()
+            self._fail_worker_job(worker_number)
+        self._report_completion(None, None)
+        self.completion_thread.join()
+
+    #--------------------------------------------------------------------------
+    def _put_death_tokens(self):
+        """place one death token per worker process on the task queue.  The
+        queue is bounded, so this waits for the workers to make room, but not
+        for longer than 'worker_stop_timeout' seconds, and not at all once
+        no worker is left to make room.
+
+        returns:
+            True if all the death tokens were placed"""
+        deadline = time.time() + self.config.worker_stop_timeout
+        for x in range(self.number_of_processes):
+            while True:
+                try:
+                    self.task_queue.put((None, None, None, None), True, 1.0)
+                    break
+                except Queue.Full:
+                    if not any(p.is_alive() for p in self.process_list):
+                        return False
+                    if time.time() >= deadline:
+                        self.logger.warning(
+                            'the worker processes did not take their death '
+                            'tokens within %s seconds',
+                            self.config.worker_stop_timeout
+                        )
+                        return False
+        return True
+
+    #--------------------------------------------------------------------------
+    def _completion_thread_func(self):
+        """This function runs in the parent process.  It reads reports of
+        finished jobs from the worker processes and calls the held back
+        callables that the task function called in the worker.  Once a
+        second, it also looks for workers that have died."""
+        next_check = time.time() + 1.0
+        while True:
+            if time.time() >= next_check:
+                self._replace_dead_workers()
+                next_check = time.time() + 1.0
+            if not self.completion_reader.poll(1.0):
+                continue
+            job_number, called_callback_names = self.completion_reader.recv()
+            if job_number is None:
+                break
+            with self.pending_callbacks_lock:
+                callbacks = self.pending_callbacks.pop(job_number, {})
+            for a_callback_name in called_callback_names:
+                if a_callback_name not in callbacks:
+                    # the job was failed already, its callables were called
+                    continue
+                try:
+                    callbacks[a_callback_name]()
+                except Exception:
+                    self.logger.error(
+                        "Error in completing a job",
+                        exc_info=True
+                    )
+
+    #--------------------------------------------------------------------------
+    def _report_completion(self, job_number, called_callback_names):
+        """tell the completion thread that a job is done and which of its
+        held back callables to call.  A job number of None tells it to
+        quit."""
+        with self.completion_writer_lock:
+            self.completion_writer.send((job_number, called_callback_names))
+
+    #--------------------------------------------------------------------------
+    def _worker_process_func(self, worker_number):
+        """The main routine of a worker process.
+
+        The worker pulls jobs from the task queue and executes them until it
+        encounters a death token.  While doing a job, it keeps its number in
+        the 'worker_jobs' shared array so that the parent knows which job
+        has failed should the worker die.  Signals are the business of the
+        parent process: the worker ignores them and learns of a shutdown from
+        the quit event and the death token."""
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        try:
+            if self.worker_setup_func is not None:
+                self.worker_setup_func()
+        except Exception:
+            self.config.logger.critical(
+                "Failure in worker process setup",
+                exc_info=True
+            )
+            return
+        try:
+            quit_request_detected = False
+            while True:
+                job_number, args, kwargs, callback_names = \
+                    self.task_queue.get()
+                if job_number is None:
+                    break
+                if quit_request_detected:
+                    continue
+                self.worker_jobs[worker_number] = job_number
+                called_callback_names = []
+                for a_callback_name in callback_names:
+                    kwargs[a_callback_name] = self._make_callback_proxy(
+                        a_callback_name,
+                        called_callback_names
+                    )
+                try:
+                    self.task_func(*args, **kwargs)  # execute the task
+                except Exception:
+                    self.config.logger.error("Error in processing a job",
+                                             exc_info=True)
+                except KeyboardInterrupt:
+                    self.config.logger.info('quit request detected')
+                    quit_request_detected = True
+                finally:
+                    self._report_completion(job_number, called_callback_names)
+                    self.worker_jobs[worker_number] = 0
+        except Exception:
+            self.config.logger.critical("Failure in task_queue", exc_info=True)
+        try:
+            if self.worker_cleanup_func is not None:
+                self.worker_cleanup_func()
+        except Exception:
+            self.config.logger.critical(
+                "Failure in worker process cleanup",
+                exc_info=True
+            )
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _make_callback_proxy(callback_name, called_callback_names):
+        """create a stand in for a callable held back in the parent process.
+        Calling it just records that the real one should be called."""
+        def callback_proxy(*args, **kwargs):
+            called_callback_names.append(callback_name)
+        return callback_proxy
+
+    #--------------------------------------------------------------------------
+    def executor_identity(self):
+        """the identity of the unit of execution used by pooled connection
+        contexts.  Worker processes each have their own pid, so the pid is
+        part of the identity."""
+        return "%s-%s" % (os.getpid(), threading.currentThread().getName())
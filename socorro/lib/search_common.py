@@ -91,9 +91,15 @@ class SearchBase(object):
             self.build_filters(fields)
 
     def build_filters(self, fields):
-        self.filters = []
+        self.filters = self.get_filters(fields)
+
+    @classmethod
+    def get_filters(cls, fields):
+        """Return the list of filters of a set of fields, followed by the
+        meta parameters. """
+        filters = []
         for field in fields.values():
-            self.filters.append(SearchFilter(
+            filters.append(SearchFilter(
                 field['name'],
                 default=field['default_value'],
                 data_type=field['data_validation_type'],
@@ -101,7 +107,8 @@ class SearchBase(object):
             ))
 
         # Add meta parameters.
-        self.filters.extend(self.meta_filters)
+        filters.extend(cls.meta_filters)
+        return filters
 
     def get_parameters(self, **kwargs):
         parameters = {}
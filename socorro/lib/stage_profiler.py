@@ -0,0 +1,250 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""latency histograms for the stages of a pipeline, like the fetch, the
+transformation rules and the save of the processor.  Only a sample of the
+jobs are timed: the decision is made once per job, so that all the stages of
+a sampled job are timed together and a job that is not sampled costs no more
+than a thread local lookup per stage."""
+
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from statsd import StatsClient
+
+from configman import RequiredConfig, Namespace
+
+
+#==============================================================================
+class LatencyHistogram(object):
+    """counts of durations in buckets of roughly logarithmic widths.  The
+    percentiles are the upper bounds of the buckets they fall into, which is
+    precise enough to tell a stage that takes milliseconds from one that
+    takes seconds."""
+
+    # the upper bounds of the buckets in seconds, a last bucket holds the rest
+    bounds = tuple(
+        a_multiplier * 10 ** an_exponent
+        for an_exponent in range(-4, 3)
+        for a_multiplier in (1, 2, 5)
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self):
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    #--------------------------------------------------------------------------
+    def record(self, elapsed):
+        self.buckets[bisect.bisect_left(self.bounds, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        self.maximum = max(self.maximum, elapsed)
+
+    #--------------------------------------------------------------------------
+    def percentile(self, fraction):
+        """the upper bound of the bucket holding the 'fraction' (0.0 to 1.0)
+        point of the durations.  The maximum stands in for the unbounded last
+        bucket and for a bound greater than any duration recorded."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for a_bound, a_count in zip(self.bounds, self.buckets):
+            seen += a_count
+            if seen >= rank and a_count:
+                return min(a_bound, self.maximum)
+        return self.maximum
+
+
+#==============================================================================
+class StageProfiler(RequiredConfig):
+    """a registry of the latency histograms of named stages.  A job is
+    sampled with a probability of 'sample_rate' by calling 'begin_sample'
+    in the thread that does the job; until 'end_sample', the durations
+    given to 'record' or measured by 'timing' in that thread are added to
+    the histograms.  The histograms are logged every 'log_interval' seconds
+    and, if a statsd host is configured, each duration is also sent to
+    statsd as a timer."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'sample_rate',
+        doc='the fraction of the jobs to time (0.0 for none, 1.0 for all)',
+        default=0.01,
+    )
+    required_config.add_option(
+        'log_interval',
+        doc='the seconds between logs of the latency histograms (0 for never)',
+        default=300,
+    )
+    required_config.add_option(
+        'statsd_host',
+        doc='the hostname of statsd (leave empty to not send timers)',
+        default='',
+        reference_value_from='resource.statsd',
+    )
+    required_config.add_option(
+        'statsd_port',
+        doc='the port number for statsd',
+        default=8125,
+        reference_value_from='resource.statsd',
+    )
+    required_config.add_option(
+        'statsd_prefix',
+        doc='a string to be used as the prefix for statsd names',
+        default='processor.stages',
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        self.config = config
+        self.histograms = {}
+        self.histograms_lock = threading.Lock()
+        self.histograms_logged_at = time.time()
+        self._local = threading.local()
+        if config.statsd_host:
+            self.statsd = StatsClient(
+                config.statsd_host,
+                config.statsd_port,
+                config.statsd_prefix
+            )
+        else:
+            self.statsd = None
+
+    #--------------------------------------------------------------------------
+    @property
+    def sampling(self):
+        """True if the job of the current thread is being timed"""
+        return getattr(self._local, 'sampling', False)
+
+    #--------------------------------------------------------------------------
+    def begin_sample(self):
+        """decide whether the job about to be done in this thread is timed"""
+        self._local.sampling = random.random() < self.config.sample_rate
+        return self._local.sampling
+
+    #--------------------------------------------------------------------------
+    def end_sample(self):
+        self._local.sampling = False
+        interval = self.config.log_interval
+        if not interval:
+            return
+        with self.histograms_lock:
+            if time.time() - self.histograms_logged_at < interval:
+                return
+            self.histograms_logged_at = time.time()
+        self._log_statistics()
+
+    #--------------------------------------------------------------------------
+    def record(self, stage_name, elapsed):
+        """add the duration 'elapsed', in seconds, of the stage to its
+        histogram if the job of this thread is sampled"""
+        if not self.sampling:
+            return
+        with self.histograms_lock:
+            try:
+                a_histogram = self.histograms[stage_name]
+            except KeyError:
+                a_histogram = self.histograms[stage_name] = LatencyHistogram()
+            a_histogram.record(elapsed)
+        if self.statsd is not None:
+            try:
+                self.statsd.timing(stage_name, elapsed * 1000.0)
+            except Exception:
+                # losing a timer is not worth failing a job over
+                self.config.logger.debug(
+                    'unable to send %s to statsd',
+                    stage_name,
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    @contextmanager
+    def timing(self, stage_name):
+        """a context for the code of a stage, timed if this thread's job is
+        sampled"""
+        if not self.sampling:
+            yield
+            return
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage_name, time.time() - start_time)
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        """returns a list of mappings of the number of samples of each stage
+        and their average, median, 90th and 99th percentile and longest
+        durations in seconds, the stage with the most time in total first"""
+        with self.histograms_lock:
+            statistics = [
+                {
+                    'stage': a_stage_name,
+                    'count': a_histogram.count,
+                    'total': a_histogram.total,
+                    'average': a_histogram.total / a_histogram.count,
+                    'p50': a_histogram.percentile(0.5),
+                    'p90': a_histogram.percentile(0.9),
+                    'p99': a_histogram.percentile(0.99),
+                    'maximum': a_histogram.maximum,
+                }
+                for a_stage_name, a_histogram in self.histograms.iteritems()
+            ]
+        statistics.sort(key=lambda x: x['total'], reverse=True)
+        return statistics
+
+    #--------------------------------------------------------------------------
+    def _log_statistics(self):
+        for a_stage in self.statistics():
+            self.config.logger.info(
+                'stage %(stage)s: %(count)d samples, '
+                'average %(average).4fs, p50 %(p50).4fs, p90 %(p90).4fs, '
+                'p99 %(p99).4fs, maximum %(maximum).4fs',
+                a_stage
+            )
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        if self.config.log_interval:
+            self._log_statistics()
+
+
+#==============================================================================
+class NullStageProfiler(object):
+    """stands in for a StageProfiler where none has been configured: no job
+    is ever sampled"""
+
+    sampling = False
+
+    #--------------------------------------------------------------------------
+    def begin_sample(self):
+        return False
+
+    #--------------------------------------------------------------------------
+    def end_sample(self):
+        pass
+
+    #--------------------------------------------------------------------------
+    def record(self, stage_name, elapsed):
+        pass
+
+    #--------------------------------------------------------------------------
+    @contextmanager
+    def timing(self, stage_name):
+        yield
+
+    #--------------------------------------------------------------------------
+    def statistics(self):
+        return []
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        pass
@@ -6,6 +6,7 @@ import re
 import configman
 import collections
 import inspect
+import time
 
 from configman import RequiredConfig, Namespace
 from configman.dotdict import DotDict
@@ -14,6 +15,7 @@ from configman.converters import to_str
 from socorro.lib.converters import (
     str_to_classes_in_namespaces_converter,
 )
+from socorro.lib.stage_profiler import NullStageProfiler
 
 #------------------------------------------------------------------------------
 # support methods
@@ -144,6 +146,13 @@ class Rule(RequiredConfig):
         else:
             return (False, None)
 
+    #--------------------------------------------------------------------------
+    def close(self):
+        """Rules that hold resources, like threads or connections, ought to
+        override this method to release them.  It is called once, when the
+        rule system that owns the rule is shut down."""
+        pass
+
 
 #==============================================================================
 class TransformRule(Rule):
@@ -302,6 +311,8 @@ class TransformRuleSystem(RequiredConfig):
     #--------------------------------------------------------------------------
     def __init__(self, config=None):
         self.rules = []
+        self.profiler = NullStageProfiler()
+        self.profiler_name = ''
         if not config:
             config = DotDict()
         if 'chatty_rules' not in config:
@@ -322,6 +333,40 @@ class TransformRuleSystem(RequiredConfig):
                         a_rule_class(config)
                     )
 
+    #--------------------------------------------------------------------------
+    def close(self):
+        """close all the rules, logging rather than raising failures so that
+        every rule gets its chance"""
+        for a_rule in self.rules:
+            try:
+                a_rule.close()
+            except Exception:
+                self.config.logger.error(
+                    'failed to close the rule %s',
+                    to_str(a_rule.__class__),
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    def attach_profiler(self, profiler, name):
+        """time each rule, in the jobs that 'profiler' samples, as the stage
+        'name.RuleClassName'"""
+        self.profiler = profiler
+        self.profiler_name = name
+
+    #--------------------------------------------------------------------------
+    def _act(self, a_rule, *args, **kwargs):
+        if not self.profiler.sampling:
+            return a_rule.act(*args, **kwargs)
+        start_time = time.time()
+        try:
+            return a_rule.act(*args, **kwargs)
+        finally:
+            self.profiler.record(
+                '%s.%s' % (self.profiler_name, a_rule.__class__.__name__),
+                time.time() - start_time
+            )
+
     #--------------------------------------------------------------------------
     def load_rules(self, an_iterable):
         """cycle through a collection of Transform rule tuples loading them
@@ -350,7 +395,7 @@ class TransformRuleSystem(RequiredConfig):
                     'apply_all_rules: %s',
                     to_str(x.__class__)
                 )
-            predicate_result, action_result = x.act(*args, **kwargs)
+            predicate_result, action_result = self._act(x, *args, **kwargs)
             if self.config.chatty_rules:
                 self.config.logger.debug(
                     '               : pred - %s; act - %s',
@@ -372,7 +417,7 @@ class TransformRuleSystem(RequiredConfig):
                     'apply_until_action_succeeds: %s',
                     to_str(x.__class__)
                 )
-            predicate_result, action_result = x.act(*args, **kwargs)
+            predicate_result, action_result = self._act(x, *args, **kwargs)
             if self.config.chatty_rules:
                 self.config.logger.debug(
                     '                           : pred - %s; act - %s',
@@ -396,7 +441,7 @@ class TransformRuleSystem(RequiredConfig):
                     'apply_until_action_fails: %s',
                     to_str(x.__class__)
                 )
-            predicate_result, action_result = x.act(*args, **kwargs)
+            predicate_result, action_result = self._act(x, *args, **kwargs)
             if self.config.chatty_rules:
                 self.config.logger.debug(
                     '                        : pred - %s; act - %s',
@@ -421,7 +466,7 @@ class TransformRuleSystem(RequiredConfig):
                     'apply_until_predicate_succeeds: %s',
                     to_str(x.__class__)
                 )
-            predicate_result, action_result = x.act(*args, **kwargs)
+            predicate_result, action_result = self._act(x, *args, **kwargs)
             if self.config.chatty_rules:
                 self.config.logger.debug(
                     '                              : pred - %s; act - %s',
@@ -445,7 +490,7 @@ class TransformRuleSystem(RequiredConfig):
                     'apply_until_predicate_fails: %s',
                     to_str(x.__class__)
                 )
-            predicate_result, action_result = x.act(*args, **kwargs)
+            predicate_result, action_result = self._act(x, *args, **kwargs)
             if self.config.chatty_rules:
                 self.config.logger.debug(
                     '                           : pred - %s; act - %s',
@@ -24,7 +24,8 @@ from socorro.external import (
     MissingArgumentError,
     BadArgumentError,
     ResourceNotFound,
-    ResourceUnavailable
+    ResourceUnavailable,
+    StreamedResult,
 )
 from socorro.webapi.webapiService import (
     JsonWebServiceBase,
@@ -55,6 +56,7 @@ SERVICES_LIST = (
     ),
     (r'/crashtrends/(.*)', 'crash_trends.CrashTrends'),
     (r'/crontabber_state/(.*)', 'crontabber_state.CrontabberState'),
+    (r'/database_pool/(.*)', 'database_pool.DatabasePool'),
     (r'/extensions/(.*)', 'extensions.Extensions'),
     (r'/field/(.*)', 'field.Field'),
     (r'/gccrashes/(.*)', 'gccrashes.GCCrashes'),
@@ -74,7 +76,7 @@ SERVICES_LIST = (
     (r'/signatureurls/(.*)', 'signature_urls.SignatureURLs'),
     (r'/skiplist/(.*)', 'skiplist.SkipList'),
     (
-        r'/supersearch/(field|fields|missing_fields)/(.*)',
+        r'/supersearch/(field|fields|missing_fields|export)/(.*)',
         'supersearch.SuperSearch'
     ),
     (r'/supersearch/(.*)', 'supersearch.SuperSearch'),
@@ -176,6 +178,29 @@ class MiddlewareApp(App):
                 'ConnectionContext',
         from_string_converter=class_converter
     )
+    required_config.database.add_option(
+        'database_pool_size',
+        default=10,
+        doc='the most connections that the services of this process keep '
+            'open to the database (0 to open one for every query)',
+    )
+    required_config.database.add_option(
+        'database_pool_idle_timeout',
+        default=300,
+        doc='the seconds after which an unused pooled connection is closed',
+    )
+    required_config.database.add_option(
+        'database_pool_health_check_interval',
+        default=30,
+        doc='the seconds after which an unused pooled connection is tested '
+            'before being used again',
+    )
+    required_config.database.add_option(
+        'database_pool_wait_timeout',
+        default=10,
+        doc='the seconds to wait for a pooled connection when all of them '
+            'are in use',
+    )
 
     #--------------------------------------------------------------------------
     # hbase namespace
@@ -286,6 +311,18 @@ class MiddlewareApp(App):
         default=50,
         doc='the maximum number of results a facet will return in search'
     )
+    required_config.webapi.add_option(
+        'supersearch_fields_cache_ttl',
+        default=300,
+        doc='the seconds for which Super Search reuses the fields it read '
+            'from elasticsearch (0 to read them for every search)',
+    )
+    required_config.webapi.add_option(
+        'elasticsearch_indices_cache_ttl',
+        default=60,
+        doc='the seconds for which Super Search reuses the list of existing '
+            'elasticsearch indices (0 to list them for every search)',
+    )
     required_config.webapi.add_option(
         'mapping_test_crash_number',
         default=100,
@@ -410,6 +447,19 @@ class MiddlewareApp(App):
         doc="Number of bytes that warrents a critial"
     )
     #--------------------------------------------------------------------------
+    # result_cache namespace
+    #     the namespace for the cache of the results of read only services
+    #--------------------------------------------------------------------------
+    required_config.namespace('result_cache')
+    required_config.result_cache.add_option(
+        'result_cache_class',
+        doc='a class caching the results of the read only services; the '
+            'matview jobs can only invalidate a MemcachedResultCache that '
+            'they are configured to share',
+        default='socorro.middleware.result_cache.NoResultCache',
+        from_string_converter=class_converter
+    )
+    #--------------------------------------------------------------------------
     # introspection namespace
     #     the namespace for things related to running middleware
     #--------------------------------------------------------------------------
@@ -465,6 +515,11 @@ class MiddlewareApp(App):
 
         implementation_class = self.config.introspection.implementation_class
 
+        # one cache of results shared by all the services
+        result_cache = self.config.result_cache.result_cache_class(
+            self.config.result_cache
+        )
+
         # 2 wrap each service class with the ImplementationWrapper class
         def wrap(cls, file_and_class):
             return type(
@@ -476,6 +531,7 @@ class MiddlewareApp(App):
                     # give lookup access of dependent services to all services
                     'all_services': all_services_mapping,
                     'config': self.config,
+                    'result_cache': result_cache,
                 }
             )
 
@@ -501,6 +557,9 @@ class MiddlewareApp(App):
 
 class ImplementationWrapper(JsonWebServiceBase):
 
+    # set by the middleware app, None for no caching
+    result_cache = None
+
     def GET(self, *args, **kwargs):
         # prepare parameters
         params = self._get_query_string_params()
@@ -585,7 +644,11 @@ class ImplementationWrapper(JsonWebServiceBase):
                 )
                 raise web.webapi.NoMethod(instance)
         try:
-            result = method(**params)
+            result = self._call_through_result_cache(
+                method,
+                default_method,
+                params
+            )
             if isinstance(result, tuple):
                 web.header('Content-Type', result[1])
                 return result[0]
@@ -621,6 +684,30 @@ class ImplementationWrapper(JsonWebServiceBase):
                 )
             raise
 
+    def _call_through_result_cache(self, method, default_method, params):
+        """Call the method of the service, unless the result cache holds its
+        result for these parameters already. Only GET requests to the
+        default implementation of a service are cached. """
+        if (
+            self.result_cache is None or
+            default_method != 'get' or
+            params.get('_force_api_impl')
+        ):
+            return method(**params)
+        service_name = self.cls.__name__
+        ttl = self.result_cache.ttl_for(service_name, method.__name__)
+        if not ttl:
+            return method(**params)
+        key = self.result_cache.key(service_name, method.__name__, params)
+        result = self.result_cache.get(key)
+        if result is None:
+            result = method(**params)
+            if isinstance(result, StreamedResult):
+                # a streamed result can only be read once
+                return result
+            self.result_cache.set(key, result, ttl)
+        return result
+
     def POST(self, *args, **kwargs):
         # this is necessary in case some other method (e.g PUT) overrides
         # this method.
@@ -0,0 +1,252 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""caches for the results of the read only middleware services.
+
+The ImplementationWrapper of the middleware asks its result cache for the
+result of a GET before calling the service.  Only the services and methods
+listed in 'service_ttls' are cached, each for its own number of seconds.
+
+Caching is opt-in: the middleware uses NoResultCache unless another class
+is configured.
+
+The crontabber jobs that refresh the matviews behind those services call
+'invalidate' when they finish, so that the next request sees the new data.
+That only works with MemcachedResultCache configured on both sides, as the
+'result_cache_class' of the middleware and of the matview jobs, with the same
+'memcached_servers' and 'key_prefix'.  A crontabber process can't reach the
+memory of a middleware process, so the results in an InProcessResultCache
+are stale for as long as their ttls after each refresh."""
+
+import hashlib
+import json
+import threading
+import time
+
+from configman import Namespace, RequiredConfig
+
+from socorro.lib.lru_cache import LRUCache
+
+
+#------------------------------------------------------------------------------
+def ttls_from_string(ttls_str):
+    """'Crashes.get_daily: 3600, CrashTrends: 600' becomes
+    {'Crashes.get_daily': 3600, 'CrashTrends': 600}"""
+    ttls = {}
+    for an_item in ttls_str.split(','):
+        if not an_item.strip():
+            continue
+        name, ttl = an_item.split(':')
+        ttls[name.strip()] = int(ttl)
+    return ttls
+
+
+#------------------------------------------------------------------------------
+def ttls_to_string(ttls):
+    return ', '.join('%s: %s' % (name, ttls[name]) for name in sorted(ttls))
+
+
+#==============================================================================
+class ResultCacheBase(RequiredConfig):
+    """the base of the result caches.  Derived classes store the results,
+    this class decides what is cached, for how long and under which key."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'service_ttls',
+        doc='the seconds to cache the results of a service ("Service") or of '
+            'one of its methods ("Service.method"); the results of services '
+            'not listed are not cached',
+        default='Crashes.get_daily: 3600, '
+                'Crashes.get_signatures: 3600, '
+                'Crashes.get_signature_history: 3600, '
+                'Crashes.get_exploitability: 3600, '
+                'Crashes.get_adu_by_signature: 3600, '
+                'CrashTrends: 3600, '
+                'SignatureSummary: 3600, '
+                'Correlations: 3600, '
+                'CorrelationsSignatures: 3600',
+        from_string_converter=ttls_from_string,
+        to_string_converter=ttls_to_string
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        self.config = config
+
+    #--------------------------------------------------------------------------
+    def ttl_for(self, service_name, method_name):
+        """return the seconds to cache the results of a method of a service,
+        zero if they are not to be cached"""
+        ttls = self.config.service_ttls
+        return ttls.get(
+            '%s.%s' % (service_name, method_name),
+            ttls.get(service_name, 0)
+        )
+
+    #--------------------------------------------------------------------------
+    def key(self, service_name, method_name, params):
+        """a key built from the service, the method and the parameters of a
+        call.  Calls with the same parameters in a different order share a
+        key.  The generation of the service is part of the key, so that
+        'invalidate' makes all the older keys of a service unreachable."""
+        normalized_params = json.dumps(params, sort_keys=True, default=str)
+        return '%s:%s:%s:%s' % (
+            service_name,
+            self._generation(service_name),
+            method_name,
+            hashlib.md5(normalized_params).hexdigest()
+        )
+
+    #--------------------------------------------------------------------------
+    def get(self, key):
+        """return the cached result for 'key' or None"""
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def set(self, key, result, ttl):
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def invalidate(self, service_names):
+        """forget all the cached results of the services named"""
+        raise NotImplementedError
+
+    #--------------------------------------------------------------------------
+    def _generation(self, service_name):
+        raise NotImplementedError
+
+
+#==============================================================================
+class NoResultCache(ResultCacheBase):
+    """a result cache that caches nothing"""
+
+    #--------------------------------------------------------------------------
+    def ttl_for(self, service_name, method_name):
+        return 0
+
+    #--------------------------------------------------------------------------
+    def get(self, key):
+        return None
+
+    #--------------------------------------------------------------------------
+    def set(self, key, result, ttl):
+        pass
+
+    #--------------------------------------------------------------------------
+    def invalidate(self, service_names):
+        pass
+
+    #--------------------------------------------------------------------------
+    def _generation(self, service_name):
+        return 0
+
+
+#==============================================================================
+class InProcessResultCache(ResultCacheBase):
+    """a result cache private to the process, dropping the least recently
+    used results when full"""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'maximum_size',
+        doc='the largest number of results to keep',
+        default=1000
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        super(InProcessResultCache, self).__init__(config)
+        self.cache = LRUCache(config.maximum_size)
+        self._generations = {}
+        self._generations_lock = threading.Lock()
+
+    #--------------------------------------------------------------------------
+    def get(self, key):
+        expires_and_result = self.cache.get(key)
+        if expires_and_result is None:
+            return None
+        expires, result = expires_and_result
+        if expires < time.time():
+            self.cache.pop(key)
+            return None
+        return result
+
+    #--------------------------------------------------------------------------
+    def set(self, key, result, ttl):
+        self.cache.put(key, (time.time() + ttl, result))
+
+    #--------------------------------------------------------------------------
+    def invalidate(self, service_names):
+        with self._generations_lock:
+            for a_service_name in service_names:
+                self._generations[a_service_name] = \
+                    self._generations.get(a_service_name, 0) + 1
+
+    #--------------------------------------------------------------------------
+    def _generation(self, service_name):
+        with self._generations_lock:
+            return self._generations.get(service_name, 0)
+
+
+#==============================================================================
+class MemcachedResultCache(ResultCacheBase):
+    """a result cache in memcached, shared by all the middleware processes
+    and invalidated by the crontabber jobs.  The generation of each service
+    is a memcached counter of its own."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'memcached_servers',
+        doc='a comma delimited list of memcached host:port',
+        default='127.0.0.1:11211',
+        from_string_converter=lambda x: [
+            y.strip() for y in x.split(',') if y.strip()
+        ],
+        to_string_converter=lambda x: ', '.join(x)
+    )
+    required_config.add_option(
+        'key_prefix',
+        doc='a prefix for all the keys, to share memcached with others',
+        default='socorro-middleware:'
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        super(MemcachedResultCache, self).__init__(config)
+        # python-memcached is only needed by those who choose this cache
+        import memcache
+        self.client = memcache.Client(config.memcached_servers)
+
+    #--------------------------------------------------------------------------
+    def _generation_key(self, service_name):
+        return '%sgeneration:%s' % (self.config.key_prefix, service_name)
+
+    #--------------------------------------------------------------------------
+    def get(self, key):
+        return self.client.get(self.config.key_prefix + key)
+
+    #--------------------------------------------------------------------------
+    def set(self, key, result, ttl):
+        self.client.set(self.config.key_prefix + key, result, time=ttl)
+
+    #--------------------------------------------------------------------------
+    def invalidate(self, service_names):
+        for a_service_name in service_names:
+            generation_key = self._generation_key(a_service_name)
+            if self.client.incr(generation_key) is None:
+                # the counter was never set or was evicted
+                self.client.set(generation_key, int(time.time()))
+
+    #--------------------------------------------------------------------------
+    def _generation(self, service_name):
+        generation_key = self._generation_key(service_name)
+        generation = self.client.get(generation_key)
+        if generation is None:
+            # a time is unlikely to repeat a generation used before an
+            # eviction
+            generation = int(time.time())
+            if not self.client.add(generation_key, generation):
+                generation = self.client.get(generation_key) or generation
+        return generation
@@ -5,6 +5,7 @@
 
 """the monitor_app manages the jobs queue and their processor assignments"""
 
+import heapq
 import signal
 import threading
 import time
@@ -155,6 +156,12 @@ class MonitorApp(App):
       doc="the frequency to check for new priority jobs (hh:mm:ss)",
       from_string_converter=timedelta_to_seconds_coverter
     )
+    required_config.job_manager.add_option(
+      'batch_size',
+      default=100,
+      doc="the number of new crashes to assign and insert into the jobs "
+          "table in a single transaction",
+    )
     required_config.job_manager.add_option(
       'job_cleanup_frequency',
       default='00:05:00',
@@ -538,20 +545,23 @@ class MonitorApp(App):
                       "Waiting for processors to come on line"
                     )
                     yield None
+            # a heap of (number_of_jobs, processor_id, processor_name) keeps
+            # the processor with the fewest jobs on top
+            heap_of_loads = [
+                (a_load, a_processor_id, a_processor_name)
+                for a_processor_id, a_load, a_processor_name
+                in list_of_processors_and_loads
+            ]
+            heapq.heapify(heap_of_loads)
             while True:
-                #self.config.logger.debug(
-                  #"sort the list of (processorId, numberOfAssignedJobs) pairs"
-                #)
-                list_of_processors_and_loads.sort(lambda x, y: cmp(x[1], y[1]))
+                load, processor_id, processor_name = heap_of_loads[0]
                 # the processor with the fewest jobs is about to be assigned a
                 # new job, so increment its count
-                list_of_processors_and_loads[0][1] += 1
-                #self.config.logger.debug(
-                  #"yield the processorId which had the fewest jobs: %d",
-                  #list_of_processors_and_loads[0][0]
-                #)
-                yield (list_of_processors_and_loads[0][0],
-                       list_of_processors_and_loads[0][2])
+                heapq.heapreplace(
+                  heap_of_loads,
+                  (load + 1, processor_id, processor_name)
+                )
+                yield (processor_id, processor_name)
         except NoProcessorsRegisteredError:
             self.quit = True
             self.config.logger.critical('there are no live processors')
@@ -633,6 +643,41 @@ class MonitorApp(App):
         )
         return processor_id
 
+    #--------------------------------------------------------------------------
+    def _queue_standard_jobs_transaction(self, connection, crash_ids,
+                                         candidate_processor_iter):
+        """the batch version of '_queue_standard_job_transaction': all the
+        crash_ids are assigned to processors and inserted into the 'jobs'
+        table with a single multi-row insert.  Returns the list of assigned
+        processor ids or None if there are no processors."""
+        assignments = []
+        for crash_id in crash_ids:
+            a_processor = candidate_processor_iter.next()
+            if a_processor is None:
+                return None
+            assignments.append(a_processor)
+        now = utc_now()
+        parameters = []
+        for crash_id, (processor_id, processor_name) in zip(crash_ids,
+                                                            assignments):
+            parameters.extend(('', crash_id, processor_id, 1, now))
+        execute_no_results(
+          connection,
+          "insert into jobs (pathname, uuid, owner, priority,"
+          "                  queuedDateTime) "
+          "values %s" % ', '.join(['(%s, %s, %s, %s, %s)'] * len(crash_ids)),
+          parameters
+        )
+        for crash_id, (processor_id, processor_name) in zip(crash_ids,
+                                                            assignments):
+            self.config.logger.info(
+              "%s assigned to processor %s (%d)",
+              crash_id,
+              processor_name,
+              processor_id
+            )
+        return [processor_id for processor_id, processor_name in assignments]
+
     #--------------------------------------------------------------------------
     def _queue_priorty_job_transaction(self, connection, crash_id,
                                        candidate_processor_iter):
@@ -660,6 +705,81 @@ class MonitorApp(App):
         )
         return assigned_processor
 
+    #--------------------------------------------------------------------------
+    def _batches_of_new_crashes(self):
+        """group the crash_ids from the 'new_crash_source' into lists of at
+        most 'batch_size'"""
+        batch_size = max(
+          self.config.job_manager.setdefault('batch_size', 100),
+          1
+        )
+        batch = []
+        for crash_id in self.new_crash_source():
+            batch.append(crash_id)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    #--------------------------------------------------------------------------
+    def _queue_standard_jobs(self, crash_ids, processor_iter):
+        """assign a batch of crashes to processors, retrying until there are
+        processors to assign them to.  If the batch cannot be inserted, each
+        crash is tried alone so that one bad crash_id costs only itself.
+        Returns the processor iterator to use for the next batch."""
+        try:
+            while True:
+                # retry until we succeed in assigning
+                self._quit_check()
+                if len(crash_ids) == 1:
+                    assigned_processor = self.job_manager_transaction(
+                      self._queue_standard_job_transaction,
+                      crash_ids[0],
+                      processor_iter
+                    )
+                else:
+                    assigned_processor = self.job_manager_transaction(
+                      self._queue_standard_jobs_transaction,
+                      crash_ids,
+                      processor_iter
+                    )
+                if assigned_processor is not None:
+                    break
+                self.config.logger.warning(
+                  'sleeping for %s, and then trying again',
+                  60
+                )
+                self._responsive_sleep(60)
+                processor_iter = self._balanced_processor_iter()
+        # if the monitor starts misbehaving and not quitting after
+        # a SIGTERM or ^C, uncomment the following two line.  It
+        # will help diagnose the problem.
+        #except KeyboardInterrupt:
+            #self.config.logger.debug("inner detects quit")
+            #self.quit = True
+            #raise
+        except Exception:
+            if len(crash_ids) == 1:
+                self.config.logger.error(
+                  'Unexpected exception while assigning jobs '
+                  'to processors',
+                  exc_info=True
+                )
+            else:
+                self.config.logger.warning(
+                  'failed to assign a batch of %d jobs, assigning them '
+                  'one at a time',
+                  len(crash_ids),
+                  exc_info=True
+                )
+                for a_crash_id in crash_ids:
+                    processor_iter = self._queue_standard_jobs(
+                      [a_crash_id],
+                      processor_iter
+                    )
+        return processor_iter
+
     #--------------------------------------------------------------------------
     def _standard_job_thread(self):
         """This is the main method for the 'standard_job_thread'.  It is
@@ -675,39 +795,11 @@ class MonitorApp(App):
                 self.config.logger.debug("getting _balanced_processor_iter")
                 processor_iter = self._balanced_processor_iter()
                 self.config.logger.debug("scanning for new crashes")
-                for crash_id in self.new_crash_source():
-                    try:
-                        #self.config.logger.debug("new job: %s", crash_id)
-                        while True:
-                            # retry until we succeed in assigning
-                            self._quit_check()
-                            assigned_processor = \
-                              self.job_manager_transaction(
-                                  self._queue_standard_job_transaction,
-                                  crash_id,
-                                  processor_iter
-                                )
-                            if assigned_processor is not None:
-                                break
-                            self.config.logger.warning(
-                              'sleeping for %s, and then trying again',
-                              60
-                            )
-                            self._responsive_sleep(60)
-                            processor_iter = self._balanced_processor_iter()
-                    # if the monitor starts misbehaving and not quitting after
-                    # a SIGTERM or ^C, uncomment the following two line.  It
-                    # will help diagnose the problem.
-                    #except KeyboardInterrupt:
-                        #self.config.logger.debug("inner detects quit")
-                        #self.quit = True
-                        #raise
-                    except Exception:
-                        self.config.logger.error(
-                          'Unexpected exception while assigning jobs '
-                          'to processors',
-                          exc_info=True
-                        )
+                for crash_ids in self._batches_of_new_crashes():
+                    processor_iter = self._queue_standard_jobs(
+                      crash_ids,
+                      processor_iter
+                    )
                 self.config.logger.info("end _standard_job_thread cycle")
                 self._responsive_sleep(
                   self.config.job_manager.standard_loop_frequency
@@ -1,7 +1,11 @@
 import re
 import os
+import shlex
+import signal
+import select
 import subprocess
-import threading
+import Queue
+import time
 import ujson
 
 from contextlib import contextmanager, closing
@@ -11,6 +15,8 @@ from configman import Namespace
 
 from socorro.lib.util import DotDict
 from socorro.lib.transform_rules import Rule
+from socorro.lib.context_tools import memory_file_context
+from socorro.external.crashstorage_base import MemoryDumpsMapping
 
 
 #------------------------------------------------------------------------------
@@ -21,6 +27,32 @@ def _create_symbol_path_str(input_str):
     return ' '.join(quoted_symbols_list)
 
 
+#------------------------------------------------------------------------------
+def _convert_command_line_template(template, config):
+    """the code in this section originally hales from 2008 ExternalProcessor
+    class.  It defines the template subsitution syntax used to spcecify
+    the shell command used to invoke the minidump stackwalker program.
+    The syntax was was requested to be of a Perl/shell style rather than
+    the original Pythonic syntax.  This code takes that foreign syntax
+    and converts it to a Pythonic syntax for later use.  The placeholders
+    $dumpfilePathname and $rawfilePathname become DUMPFILEPATHNAME and
+    RAWFILEPATHNAME to be replaced for each dump."""
+    strip_parens_re = re.compile(r'\$(\()(\w+)(\))')
+    convert_to_python_substitution_format_re = re.compile(r'\$(\w+)')
+
+    # Canonical form of $(param) is $param. Convert any that are needed
+    tmp = strip_parens_re.sub(
+        r'$\2',
+        template
+    )
+    # Convert canonical $dumpfilePathname and $rawfilePathname
+    tmp = tmp.replace('$dumpfilePathname', 'DUMPFILEPATHNAME')
+    tmp = tmp.replace('$rawfilePathname', 'RAWFILEPATHNAME')
+    # finally, convert any remaining $param to pythonic %(param)s
+    tmp = convert_to_python_substitution_format_re.sub(r'%(\1)s', tmp)
+    return tmp % config
+
+
 #==============================================================================
 class BreakpadStackwalkerRule(Rule):
 
@@ -72,47 +104,37 @@ class BreakpadStackwalkerRule(Rule):
     #--------------------------------------------------------------------------
     def __init__(self, config):
         super(BreakpadStackwalkerRule, self).__init__(config)
-        # the code in this section originally hales from 2008 ExternalProcessor
-        # class.  It defines the template subsitution syntax used to spcecify
-        # the shell command used to invoke the minidump stackwalker program.
-        # The syntax was was requested to be of a Perl/shell style rather than
-        # the original Pythonic syntax.  This code takes that foreign syntax
-        # and converts it to a Pythonic syntax for later use.
-        strip_parens_re = re.compile(r'\$(\()(\w+)(\))')
-        convert_to_python_substitution_format_re = re.compile(r'\$(\w+)')
-
-        # Canonical form of $(param) is $param. Convert any that are needed
-        tmp = strip_parens_re.sub(
-            r'$\2',
-            config.stackwalk_command_line
+        self.mdsw_command_line = _convert_command_line_template(
+            config.stackwalk_command_line,
+            config
         )
-        # Convert canonical $dumpfilePathname and $rawfilePathname
-        tmp = tmp.replace('$dumpfilePathname', 'DUMPFILEPATHNAME')
-        tmp = tmp.replace('$rawfilePathname', 'RAWFILEPATHNAME')
-        # finally, convert any remaining $param to pythonic %(param)s
-        tmp = convert_to_python_substitution_format_re.sub(r'%(\1)s', tmp)
-        self.mdsw_command_line = tmp % config
 
     #--------------------------------------------------------------------------
     def version(self):
         return '1.0'
 
     #--------------------------------------------------------------------------
-    @contextmanager
     def _temp_raw_crash_json_file(self, raw_crash, crash_id):
-        file_pathname = os.path.join(
+        return memory_file_context(
+            ujson.dumps(dict(raw_crash)),
             self.config.temporary_file_system_storage_path,
-            "%s.%s.TEMPORARY.json" % (
-                crash_id,
-                threading.currentThread().getName()
-            )
+            self.config.logger
         )
-        with open(file_pathname, "w") as f:
-            ujson.dump(dict(raw_crash), f)
-        try:
-            yield file_pathname
-        finally:
-            os.unlink(file_pathname)
+
+    #--------------------------------------------------------------------------
+    @contextmanager
+    def _dump_pathname_context(self, raw_dumps, dump_name):
+        """yield a pathname from which the stackwalker can read a dump.  A
+        dump held in memory is handed over with 'memory_file_context', a
+        dump in a file is left to '_temp_file_context'."""
+        if isinstance(raw_dumps, MemoryDumpsMapping):
+            with raw_dumps.as_file(
+                dump_name,
+                self.config.temporary_file_system_storage_path
+            ) as dump_pathname:
+                yield dump_pathname
+        else:
+            yield raw_dumps[dump_name]
 
     #--------------------------------------------------------------------------
     @contextmanager
@@ -179,6 +201,23 @@ class BreakpadStackwalkerRule(Rule):
 
             return_code = subprocess_handle.wait()
 
+        return self._stackwalker_data_from_output(
+            dump_name,
+            stackwalker_output,
+            return_code,
+            processor_notes
+        )
+
+    #--------------------------------------------------------------------------
+    def _stackwalker_data_from_output(
+        self,
+        dump_name,
+        stackwalker_output,
+        return_code,
+        processor_notes
+    ):
+        """interpret the parsed json output and the return code of a run of
+        the stackwalker"""
         if not isinstance(stackwalker_output, Mapping):
             processor_notes.append(
                 "MDSW produced unexpected output: %s..." %
@@ -219,7 +258,7 @@ class BreakpadStackwalkerRule(Rule):
             raw_crash,
             raw_crash.uuid
         ) as raw_crash_pathname:
-            for dump_name, dump_pathname in raw_dumps.iteritems():
+            for dump_name in raw_dumps.keys():
 
                 if processor_meta.quit_check:
                     processor_meta.quit_check()
@@ -234,20 +273,24 @@ class BreakpadStackwalkerRule(Rule):
                     # dumps not intended for the stackwalker are ignored
                     continue
 
-                if self.config.chatty:
-                    self.config.logger.debug(
-                        "BreakpadStackwalkerRule: %s, %s",
+                with self._dump_pathname_context(
+                    raw_dumps,
+                    dump_name
+                ) as dump_pathname:
+                    if self.config.chatty:
+                        self.config.logger.debug(
+                            "BreakpadStackwalkerRule: %s, %s",
+                            dump_name,
+                            dump_pathname
+                        )
+
+                    stackwalker_data = self._invoke_minidump_stackwalk(
                         dump_name,
-                        dump_pathname
+                        dump_pathname,
+                        raw_crash_pathname,
+                        processor_meta.processor_notes
                     )
 
-                stackwalker_data = self._invoke_minidump_stackwalk(
-                    dump_name,
-                    dump_pathname,
-                    raw_crash_pathname,
-                    processor_meta.processor_notes
-                )
-
                 if dump_name == self.config.dump_field:
                     processed_crash.update(stackwalker_data)
                 else:
@@ -257,6 +300,306 @@ class BreakpadStackwalkerRule(Rule):
         return True
 
 
+#==============================================================================
+class StackwalkerServerError(Exception):
+    """a stackwalker server could not be started"""
+    pass
+
+
+#==============================================================================
+class StackwalkerServer(object):
+    """a long lived minidump stackwalker process running in its '--server'
+    mode.  The process reads one job per line from its stdin in the form
+    'dump_pathname<TAB>raw_crash_pathname' and answers each with one line of
+    json on its stdout.  Because the process lives on from one dump to the
+    next, the symbols that it has loaded stay loaded."""
+
+    #--------------------------------------------------------------------------
+    def __init__(self, command_args, start_timeout):
+        try:
+            with open(os.devnull, 'w') as devnull:
+                self.process = subprocess.Popen(
+                    command_args,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=devnull,
+                    close_fds=True
+                )
+        except OSError, x:
+            raise StackwalkerServerError(
+                'unable to start %s: %s' % (command_args[0], x)
+            )
+        self.jobs_done = 0
+        # the server announces itself with a READY line.  A stackwalker that
+        # doesn't know about server mode just prints its usage to stderr and
+        # quits.
+        handshake, return_code = self._read_line(start_timeout)
+        if handshake != 'READY\n':
+            self.close()
+            raise StackwalkerServerError(
+                '%s failed to start in server mode (%s)' % (
+                    command_args[0],
+                    return_code
+                )
+            )
+
+    #--------------------------------------------------------------------------
+    def is_alive(self):
+        return self.process.poll() is None
+
+    #--------------------------------------------------------------------------
+    def _read_line(self, timeout):
+        """read a line from the server's stdout.
+
+        returns:
+            a tuple (output, return_code).  While the server is running,
+            return_code is 0.  If the server dies before finishing the line,
+            it is its exit code.  If the line doesn't come within 'timeout'
+            seconds, the server is killed and the return code is 124, just
+            like the 'timeout' command of the one-shot command line."""
+        fd = self.process.stdout.fileno()
+        deadline = time.time() + timeout
+        chunks = []
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.kill()
+                return ''.join(chunks), 124
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            a_chunk = os.read(fd, 65536)
+            if not a_chunk:
+                return ''.join(chunks), self.process.wait()
+            chunks.append(a_chunk)
+            if a_chunk.endswith('\n'):
+                return ''.join(chunks), 0
+
+    #--------------------------------------------------------------------------
+    def walk(self, dump_pathname, raw_crash_pathname, timeout):
+        """send one job to the server and wait for its answer.
+
+        returns:
+            a tuple (output, return_code), see '_read_line'"""
+        self.jobs_done += 1
+        try:
+            self.process.stdin.write(
+                '%s\t%s\n' % (dump_pathname, raw_crash_pathname)
+            )
+            self.process.stdin.flush()
+        except IOError:
+            # the server is gone
+            return '', self.process.wait()
+        return self._read_line(timeout)
+
+    #--------------------------------------------------------------------------
+    def kill(self):
+        try:
+            os.kill(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass  # already gone
+        self.process.wait()
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """ask the server to quit by closing its stdin.  Its stdout is closed,
+        too, so a server still busy with a job will die of SIGPIPE when it
+        tries to answer."""
+        for a_file in (self.process.stdin, self.process.stdout):
+            try:
+                a_file.close()
+            except IOError:
+                pass
+        if self.is_alive():
+            self.kill()
+
+
+#==============================================================================
+class StackwalkerServerPool(object):
+    """a thread safe pool of StackwalkerServers.  Servers are started
+    lazily, the first time a slot in the pool is used.  A server that has
+    done 'jobs_per_server' jobs is retired so that its memory, swollen by
+    loaded symbols, is returned to the system.  A server that has died or
+    timed out is replaced on the next checkout."""
+
+    #--------------------------------------------------------------------------
+    def __init__(
+        self,
+        command_args,
+        number_of_servers,
+        jobs_per_server,
+        start_timeout
+    ):
+        self.command_args = command_args
+        self.jobs_per_server = jobs_per_server
+        self.start_timeout = start_timeout
+        self.idle_servers = Queue.Queue()
+        # an empty slot is represented by None
+        for x in range(number_of_servers):
+            self.idle_servers.put(None)
+
+    #--------------------------------------------------------------------------
+    def checkout(self):
+        """get a running server from the pool, blocking until one is free.
+        raises StackwalkerServerError if a new server cannot be started"""
+        server = self.idle_servers.get()
+        try:
+            if server is not None and not server.is_alive():
+                server = None
+            if server is None:
+                server = StackwalkerServer(
+                    self.command_args,
+                    self.start_timeout
+                )
+        except Exception:
+            self.idle_servers.put(None)
+            raise
+        return server
+
+    #--------------------------------------------------------------------------
+    def checkin(self, server):
+        if server.jobs_done >= self.jobs_per_server or not server.is_alive():
+            server.close()
+            server = None
+        self.idle_servers.put(server)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the idle servers"""
+        while True:
+            try:
+                server = self.idle_servers.get_nowait()
+            except Queue.Empty:
+                break
+            if server is not None:
+                server.close()
+
+
+#==============================================================================
+class BreakpadStackwalkerServerRule(BreakpadStackwalkerRule):
+    """this version of the stackwalker rule keeps a pool of long lived
+    stackwalker processes rather than starting a new one through the shell for
+    every dump.  This saves the fork/exec of both the shell and the
+    stackwalker and lets the symbol files loaded for one crash serve the
+    next.  If the stackwalker cannot be started in server mode, the rule
+    falls back to running it one-shot with the 'stackwalk_command_line'."""
+
+    required_config = Namespace()
+    required_config.add_option(
+        'stackwalk_server_command_line',
+        doc='the template for the command to start the stackwalker in server '
+        'mode (no shell is involved)',
+        default=(
+            '$minidump_stackwalk_pathname --server '
+            '$processor_symbols_pathname_list'
+        ),
+    )
+    required_config.add_option(
+        'number_of_stackwalker_servers',
+        doc='the maximum number of stackwalker servers to run at once (set '
+        'to the number of processor threads)',
+        default=4,
+    )
+    required_config.add_option(
+        'stackwalker_server_jobs_before_recycle',
+        doc='the number of dumps a stackwalker server processes before it '
+        'is replaced by a fresh one',
+        default=1000,
+    )
+    required_config.add_option(
+        'stackwalker_server_timeout',
+        doc='the number of seconds that a stackwalker server may spend on '
+        'one dump before it is killed',
+        default=30,
+    )
+
+    #--------------------------------------------------------------------------
+    def __init__(self, config):
+        super(BreakpadStackwalkerServerRule, self).__init__(config)
+        self.server_pool = StackwalkerServerPool(
+            shlex.split(
+                _convert_command_line_template(
+                    config.stackwalk_server_command_line,
+                    config
+                ).replace(',', ' ')
+            ),
+            config.number_of_stackwalker_servers,
+            config.stackwalker_server_jobs_before_recycle,
+            config.stackwalker_server_timeout
+        )
+
+    #--------------------------------------------------------------------------
+    def _invoke_minidump_stackwalk(
+        self,
+        dump_name,
+        dump_pathname,
+        raw_crash_pathname,
+        processor_notes
+    ):
+        """run the dump through a stackwalker server from the pool.  The
+        results are interpreted exactly like those of the one-shot
+        version."""
+        server_pool = self.server_pool
+        server = None
+        if server_pool is not None:
+            try:
+                server = server_pool.checkout()
+            except StackwalkerServerError, x:
+                self.config.logger.error(
+                    'BreakpadStackwalkerServerRule: %s.  Falling back to '
+                    'one-shot stackwalking',
+                    x
+                )
+                self.server_pool = None
+                server_pool.close()
+        if server is None:
+            return super(
+                BreakpadStackwalkerServerRule,
+                self
+            )._invoke_minidump_stackwalk(
+                dump_name,
+                dump_pathname,
+                raw_crash_pathname,
+                processor_notes
+            )
+
+        try:
+            with self._temp_file_context(dump_pathname):
+                if self.config.chatty:
+                    self.config.logger.debug(
+                        "BreakpadStackwalkerServerRule: %s %s",
+                        dump_pathname,
+                        raw_crash_pathname
+                    )
+                output, return_code = server.walk(
+                    dump_pathname,
+                    raw_crash_pathname,
+                    self.config.stackwalker_server_timeout
+                )
+        finally:
+            server_pool.checkin(server)
+
+        try:
+            stackwalker_output = ujson.loads(output)
+        except Exception, x:
+            processor_notes.append(
+                "MDSW output failed in json: %s" % x
+            )
+            stackwalker_output = {}
+
+        return self._stackwalker_data_from_output(
+            dump_name,
+            stackwalker_output,
+            return_code,
+            processor_notes
+        )
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        if self.server_pool is not None:
+            self.server_pool.close()
+
+
 #==============================================================================
 class CrashingThreadRule(Rule):
 
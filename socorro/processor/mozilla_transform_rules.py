@@ -3,13 +3,15 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import datetime
+import threading
 import time
 import ujson
 import re
 
 from sys import maxint
 
-from gzip import open as gzip_open
+from cStringIO import StringIO
+from gzip import open as gzip_open, GzipFile
 from ujson import load as json_load
 from urllib import unquote_plus
 
@@ -22,7 +24,9 @@ from socorro.lib.ooid import dateFromOoid
 from socorro.lib.transform_rules import Rule
 from socorro.lib.datetimeutil import UTC, datetimeFromISOdateString
 from socorro.lib.context_tools import temp_file_context
+from socorro.lib.lru_cache import LRUCache
 
+from socorro.external.crashstorage_base import MemoryDumpsMapping
 from socorro.external.postgresql.dbapi2_util import (
         execute_query_fetchall,
         execute_no_results
@@ -369,10 +373,24 @@ class OutOfMemoryBinaryRule(Rule):
             error_message = "error in gzip for %s: %r" % (dump_pathname, x)
             processor_notes.append(error_message)
             return {"ERROR": error_message}
+        return OutOfMemoryBinaryRule._load_memory_info(
+            fd,
+            dump_pathname,
+            processor_notes
+        )
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _load_memory_info(fd, dump_description, processor_notes):
         try:
             memory_info = json_load(fd)
+        except IOError, x:
+            # gzip only finds out about bad data as it reads
+            error_message = "error in gzip for %s: %r" % (dump_description, x)
+            processor_notes.append(error_message)
+            return {"ERROR": error_message}
         except ValueError, x:
-            error_message = "error in json for %s: %r" % (dump_pathname, x)
+            error_message = "error in json for %s: %r" % (dump_description, x)
             processor_notes.append(error_message)
             return {"ERROR": error_message}
         finally:
@@ -382,6 +400,14 @@ class OutOfMemoryBinaryRule(Rule):
 
     #--------------------------------------------------------------------------
     def _action(self, raw_crash, raw_dumps, processed_crash, processor_meta):
+        if isinstance(raw_dumps, MemoryDumpsMapping):
+            # the report is decompressed straight from memory
+            processed_crash.memory_report = self._load_memory_info(
+                GzipFile(fileobj=StringIO(raw_dumps['memory_report'])),
+                'memory_report',
+                processor_meta.processor_notes
+            )
+            return True
         pathname = raw_dumps['memory_report']
         with temp_file_context(pathname):
             processed_crash.memory_report = self._extract_memory_info(
@@ -735,6 +761,106 @@ class TopMostFilesRule(Rule):
         return True
 
 
+#==============================================================================
+class MissingSymbolsRecorder(object):
+    """collects the (date, debug_file, debug_id) triples of modules with
+    missing symbols and writes them to the 'missing_symbols' table from a
+    thread of its own.  The processor threads only add a triple to a list.
+    A triple already recorded is dropped: the table holds one row per
+    module per day.
+
+    The pending triples are written in multi-row inserts every
+    'flush_interval' seconds, or sooner once 'flush_size' of them are
+    waiting.  'close' writes whatever is left."""
+
+    #--------------------------------------------------------------------------
+    def __init__(
+        self,
+        transaction,
+        logger,
+        flush_interval,
+        flush_size,
+        deduplication_cache_size
+    ):
+        self.transaction = transaction
+        self.logger = logger
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.recorded = LRUCache(deduplication_cache_size)
+        self.pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            name='MissingSymbolsRecorder',
+            target=self._flusher_loop
+        )
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    #--------------------------------------------------------------------------
+    def record(self, date_processed, debug_file, debug_id):
+        if isinstance(date_processed, datetime.datetime):
+            date_processed = date_processed.date()
+        key = (date_processed, debug_file, debug_id)
+        with self._pending_lock:
+            if key in self.recorded:
+                return
+            self.recorded.put(key, True)
+            self.pending.append(key)
+            if len(self.pending) >= self.flush_size:
+                self._flush_requested.set()
+
+    #--------------------------------------------------------------------------
+    def _flusher_loop(self):
+        while not self._stop.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            if self._stop.is_set():
+                # 'close' does the last flush
+                break
+            self.flush()
+
+    #--------------------------------------------------------------------------
+    def flush(self):
+        """write the pending triples, 'flush_size' to a statement"""
+        with self._pending_lock:
+            pending, self.pending = self.pending, []
+        for i in range(0, len(pending), self.flush_size):
+            rows = pending[i:i + self.flush_size]
+            try:
+                self.transaction(self._insert_missing_symbols, rows)
+            except Exception:
+                self.logger.error(
+                    'failed to record %d missing symbols',
+                    len(rows),
+                    exc_info=True
+                )
+                # let the next crash with these modules try again
+                for a_row in rows:
+                    self.recorded.pop(a_row)
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _insert_missing_symbols(connection, rows):
+        sql = (
+            "INSERT INTO missing_symbols(date_processed, debug_file, debug_id)"
+            " VALUES %s" % ', '.join(['(%s, %s, %s)'] * len(rows))
+        )
+        parameters = []
+        for a_row in rows:
+            parameters.extend(a_row)
+        execute_no_results(connection, sql, parameters)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the flusher thread and write what is left"""
+        self._stop.set()
+        self._flush_requested.set()
+        self._flusher.join()
+        self.flush()
+
+
 #==============================================================================
 class MissingSymbolsRule(Rule):
     required_config = Namespace()
@@ -754,6 +880,31 @@ class MissingSymbolsRule(Rule):
         from_string_converter=str_to_python_object,
         reference_value_from='resource.postgresql',
     )
+    required_config.add_option(
+        'record_in_background',
+        doc='write the missing symbols from a background thread, in bulk and '
+            'once per module per day, instead of one insert per module for '
+            'every crash',
+        default=True,
+    )
+    required_config.add_option(
+        'flush_interval',
+        doc='the seconds between writes of the missing symbols collected in '
+            'the background',
+        default=60,
+    )
+    required_config.add_option(
+        'flush_size',
+        doc='the number of collected missing symbols that triggers a write '
+            'before the flush_interval is up; also the most rows in an insert',
+        default=500,
+    )
+    required_config.add_option(
+        'deduplication_cache_size',
+        doc='the number of recently recorded missing symbols to remember in '
+            'order to not record them again',
+        default=100000,
+    )
 
     #--------------------------------------------------------------------------
     def __init__(self, config):
@@ -767,6 +918,15 @@ class MissingSymbolsRule(Rule):
             "INSERT INTO missing_symbols(date_processed, debug_file, debug_id)"
             " VALUES (%s, %s, %s)"
         )
+        self.recorder = None
+        if config.setdefault('record_in_background', True):
+            self.recorder = MissingSymbolsRecorder(
+                self.transaction,
+                config.logger,
+                config.setdefault('flush_interval', 60),
+                config.setdefault('flush_size', 500),
+                config.setdefault('deduplication_cache_size', 100000),
+            )
 
     #--------------------------------------------------------------------------
     def version(self):
@@ -787,6 +947,9 @@ class MissingSymbolsRule(Rule):
                 if 'missing_symbols' in module and module['missing_symbols']:
                     debug_file = module['debug_file']
                     debug_id = module['debug_id']
+                    if self.recorder is not None:
+                        self.recorder.record(date, debug_file, debug_id)
+                        continue
                     try:
                         self.transaction(execute_no_results, self.sql,
                                          (date, debug_file, debug_id))
@@ -801,3 +964,8 @@ class MissingSymbolsRule(Rule):
             return False
 
         return True
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
@@ -16,6 +16,7 @@ from configman.converters import (
 )
 from socorro.lib.converters import str_to_classes_in_namespaces_converter
 from socorro.lib.datetimeutil import utc_now
+from socorro.lib.stage_profiler import NullStageProfiler
 from socorro.lib.util import DotDict
 
 
@@ -162,6 +163,10 @@ class Processor2015(RequiredConfig):
         else:
             self.quit_check = lambda: False
 
+        # a profiler, attached by the app, times the rule sets and their
+        # rules in a sample of the crashes
+        self.profiler = NullStageProfiler()
+
         # here we instantiate the rule sets and their rules.
         self.rule_system = OrderedDotDict()
         for a_rule_set_name in config.rule_sets.names:
@@ -216,12 +221,13 @@ class Processor2015(RequiredConfig):
                 # for each rule set, invoke the 'act' method - this method
                 # will be the method specified in fourth element of the
                 # rule set configuration list.
-                a_rule_set.act(
-                    raw_crash,
-                    raw_dumps,
-                    processed_crash,
-                    processor_meta_data
-                )
+                with self.profiler.timing(a_rule_set_name):
+                    a_rule_set.act(
+                        raw_crash,
+                        raw_dumps,
+                        processed_crash,
+                        processor_meta_data
+                    )
                 self.quit_check()
 
             # the crash made it through the processor rules with no exceptions
@@ -255,6 +261,23 @@ class Processor2015(RequiredConfig):
         )
         return processed_crash
 
+    #--------------------------------------------------------------------------
+    def attach_profiler(self, profiler):
+        """time each rule set as a stage of its own name and each of its
+        rules as 'rule_set_name.RuleClassName'"""
+        self.profiler = profiler
+        for a_rule_set_name, a_rule_set in self.rule_system.iteritems():
+            attach = getattr(a_rule_set, 'attach_profiler', None)
+            if attach is not None:
+                attach(profiler, a_rule_set_name)
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """give the rules the chance to finish their work and release their
+        resources"""
+        for a_rule_set in self.rule_system.itervalues():
+            a_rule_set.close()
+
     #--------------------------------------------------------------------------
     def reject_raw_crash(self, crash_id, reason):
         self._log_job_start(crash_id)
@@ -13,6 +13,7 @@ from socorro.external.filesystem.crashstorage import FileSystemRawCrashStorage
 from socorro.external.crashstorage_base import (
   PolyCrashStorage,
   CrashIDNotFound,
+  MemoryDumpsMapping,
 )
 
 
@@ -40,6 +41,25 @@ class ProcessorApp(FetchTransformSaveApp):
       default='socorro.processor.hybrid_processor.HybridCrashProcessor',
       from_string_converter=class_converter
     )
+    required_config.processor.add_option(
+      'dumps_in_memory',
+      doc='fetch the dumps into memory rather than into temporary files. '
+          'The rules of the Processor2015 hand them to the stackwalker '
+          'through memory backed files; the older processors need files',
+      default=False
+    )
+    #--------------------------------------------------------------------------
+    # profiler namespace
+    #     this namespace is for config parameters having to do with timing
+    #     the fetch, the rules and the save of a sample of the crashes.
+    #--------------------------------------------------------------------------
+    required_config.namespace('profiler')
+    required_config.profiler.add_option(
+      'profiler_class',
+      doc='the class that keeps the latency histograms of the stages',
+      default='socorro.lib.stage_profiler.StageProfiler',
+      from_string_converter=class_converter
+    )
     #--------------------------------------------------------------------------
     # new_crash_source namespace
     #     this namespace is for config parameter having to do with the source
@@ -70,8 +90,9 @@ class ProcessorApp(FetchTransformSaveApp):
     ###########################################################################
     ### TODO: implement an __init__ and a waiting func.  The waiting func
     ### will take registrations of periodic things to do over some time
-    ### interval.  the first periodic thing is the rereading of the
-    ### signature generation stuff from the database.
+    ### interval.  (the rereading of the signature generation rules from the
+    ### database is not one of them: CSignatureToolDB has its own refresher
+    ### thread, so it works in the worker processes of a process pool, too)
     ###########################################################################
 
     #--------------------------------------------------------------------------
@@ -104,6 +125,22 @@ class ProcessorApp(FetchTransformSaveApp):
         propagate to any thread that loops."""
         self.task_manager.quit_check()
 
+    #--------------------------------------------------------------------------
+    def _get_raw_dumps(self, crash_id):
+        """the dumps as temporary files or, with 'dumps_in_memory', as a
+        MemoryDumpsMapping.  In memory, nothing is left on disk if the
+        processing of the crash fails before its dumps are used."""
+        if not self.config.processor.get('dumps_in_memory', False):
+            return self.source.get_raw_dumps_as_files(crash_id)
+        dumps = MemoryDumpsMapping()
+        for a_dump_name, a_dump in \
+                self.source.get_raw_dumps(crash_id).iteritems():
+            # some crash stores name the main dump 'dump'
+            if a_dump_name in (None, '', 'dump'):
+                a_dump_name = 'upload_file_minidump'
+            dumps[a_dump_name] = a_dump
+        return dumps
+
     #--------------------------------------------------------------------------
     def transform(
         self,
@@ -116,10 +153,12 @@ class ProcessorApp(FetchTransformSaveApp):
         implemented by the 'processor_class' is applied, the
         processed crash is saved to the 'destination', and then 'finished_func'
         is called."""
+        self.profiler.begin_sample()
         try:
             try:
-                raw_crash = self.source.get_raw_crash(crash_id)
-                dumps = self.source.get_raw_dumps_as_files(crash_id)
+                with self.profiler.timing('fetch'):
+                    raw_crash = self.source.get_raw_crash(crash_id)
+                    dumps = self._get_raw_dumps(crash_id)
             except CrashIDNotFound:
                 self.processor.reject_raw_crash(
                     crash_id,
@@ -140,12 +179,13 @@ class ProcessorApp(FetchTransformSaveApp):
 
             if 'uuid' not in raw_crash:
                 raw_crash.uuid = crash_id
-            processed_crash = (
-                self.processor.convert_raw_crash_to_processed_crash(
-                    raw_crash,
-                    dumps
+            with self.profiler.timing('processing'):
+                processed_crash = (
+                    self.processor.convert_raw_crash_to_processed_crash(
+                        raw_crash,
+                        dumps
+                    )
                 )
-            )
             """ bug 866973 - save_raw_and_processed() instead of just processed
                 We are doing this in lieu of a queuing solution that could
                 allow us to operate an independent crashmover. When the queuing
@@ -154,13 +194,15 @@ class ProcessorApp(FetchTransformSaveApp):
                 that's consuming crash_ids the same way that the processor
                 consumes them.
             """
-            self.destination.save_raw_and_processed(
-                raw_crash,
-                None,
-                processed_crash,
-                crash_id
-            )
+            with self.profiler.timing('save'):
+                self.destination.save_raw_and_processed(
+                    raw_crash,
+                    None,
+                    processed_crash,
+                    crash_id
+                )
         finally:
+            self.profiler.end_sample()
             # no matter what causes this method to end, we need to make sure
             # that the finished_func gets called. If the new crash source is
             # RabbitMQ, this is what removes the job from the queue.
@@ -187,16 +229,62 @@ class ProcessorApp(FetchTransformSaveApp):
         # while the threaded_task_manager processes crashes.
         self.waiting_func = self.registrar.checkin
 
+        self._setup_processor()
+
+    #--------------------------------------------------------------------------
+    def _setup_processor(self):
+        """instantiate the processor algorithm implementation and the
+        profiler that times its stages.  Not every processor algorithm
+        implementation can be profiled, those that cannot are timed only as
+        a whole."""
+        self.profiler = self.config.profiler.profiler_class(
+          self.config.profiler
+        )
         self.processor = self.config.processor.processor_class(
           self.config.processor,
           self.quit_check
         )
+        attach_profiler = getattr(self.processor, 'attach_profiler', None)
+        if attach_profiler is not None:
+            attach_profiler(self.profiler)
+
+    #--------------------------------------------------------------------------
+    def _setup_worker_process(self):
+        """in a worker process, the processor algorithm implementation gets
+        its own instance, too, and so does the profiler, whose histograms
+        are those of the worker.  The registrar stays with the parent."""
+        super(ProcessorApp, self)._setup_worker_process()
+        self._setup_processor()
+
+    #--------------------------------------------------------------------------
+    def _close_processor(self):
+        """not every processor algorithm implementation has resources to
+        release"""
+        close = getattr(self.processor, 'close', None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception:
+            self.config.logger.error(
+                'failed to close the processor',
+                exc_info=True
+            )
+
+    #--------------------------------------------------------------------------
+    def _cleanup_worker_process(self):
+        self._close_processor()
+        self.profiler.close()
+        super(ProcessorApp, self)._cleanup_worker_process()
 
     #--------------------------------------------------------------------------
     def _cleanup(self):
         """when  the processor shutsdown, this function cleans up"""
         self.registrar.unregister()
         self.iterator.close()
+        self._close_processor()
+        self.profiler.close()
+        super(ProcessorApp, self)._cleanup()
 
 
 if __name__ == '__main__':
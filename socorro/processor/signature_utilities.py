@@ -3,14 +3,206 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import re
+import threading
+import time
 
+from collections import namedtuple
 from itertools import islice
 
 from configman import Namespace, RequiredConfig
 from configman.converters import class_converter
 
 from socorro.lib.transform_rules import Rule
-from socorro.external.postgresql.dbapi2_util import execute_query_fetchall
+from socorro.lib.lru_cache import LRUCache
+from socorro.external.postgresql.dbapi2_util import (
+    execute_query_fetchall,
+    single_value_sql,
+)
+
+
+#------------------------------------------------------------------------------
+def split_alternation(pattern):
+    """split a regular expression into the branches of its outermost
+    alternation.  A '|' inside parentheses, inside a character class or
+    escaped with a backslash does not split."""
+    branches = []
+    current = []
+    depth = 0
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        a_char = pattern[index]
+        if a_char == '\\':
+            current.append(pattern[index:index + 2])
+            index += 2
+            continue
+        if in_class:
+            # a ']' immediately after the opening '[' or '[^' is a literal
+            if a_char == ']' and index > class_start:
+                in_class = False
+        elif a_char == '[':
+            in_class = True
+            class_start = index + 1
+            if pattern[class_start:class_start + 1] == '^':
+                class_start += 1
+        elif a_char == '(':
+            depth += 1
+        elif a_char == ')':
+            depth -= 1
+        elif a_char == '|' and depth == 0:
+            branches.append(''.join(current))
+            current = []
+            index += 1
+            continue
+        current.append(a_char)
+        index += 1
+    branches.append(''.join(current))
+    return branches
+
+
+#------------------------------------------------------------------------------
+_regex_metacharacters = frozenset('.^$*+?{}[]\\|()')
+
+
+#------------------------------------------------------------------------------
+def literal_prefix(a_regex):
+    """when a regular expression is used with 'match', a plain literal or a
+    literal followed by '.*' matches exactly the strings that start with that
+    literal.  For such a regular expression, return the literal with any
+    escaping backslashes removed.  For any other regular expression, return
+    None."""
+    literal = []
+    index = 0
+    while index < len(a_regex):
+        a_char = a_regex[index]
+        if a_char == '\\':
+            escaped = a_regex[index + 1:index + 2]
+            if not escaped or escaped.isalnum():
+                # \d, \w, back references, etc.
+                return None
+            literal.append(escaped)
+            index += 2
+            continue
+        if a_char in _regex_metacharacters:
+            if a_regex[index:] == '.*':
+                break
+            return None
+        literal.append(a_char)
+        index += 1
+    return ''.join(literal)
+
+
+#------------------------------------------------------------------------------
+def _trie_re(literals):
+    """return a regular expression matching any string that starts with one
+    of 'literals'.  The literals are merged into a trie first, so at each
+    position the regular expression engine chooses between branches that
+    begin with distinct characters instead of trying every literal in turn.
+    """
+    trie = {}
+    for a_literal in literals:
+        node = trie
+        for a_char in a_literal:
+            node = node.setdefault(a_char, {})
+        # a literal that is the prefix of a longer one makes the longer one
+        # redundant
+        node.clear()
+        node[None] = True
+
+    def emit(node):
+        if None in node:
+            return ''
+        branches = [
+            re.escape(a_char) + emit(child)
+            for a_char, child in sorted(node.items())
+        ]
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:%s)' % '|'.join(branches)
+
+    return emit(trie)
+
+
+#------------------------------------------------------------------------------
+# inline flags apply to the whole of a joined regular expression and back
+# references count groups across all of its branches, so a skip list with
+# either of these cannot be taken apart.
+_unsplittable_skip_list_re = re.compile(r'\(\?[iLmsux]+\)|\(\?P=|\\[1-9]')
+
+
+#------------------------------------------------------------------------------
+def compile_skip_list(skip_list):
+    """compile a skip list, given either as a string of '|' separated regular
+    expressions or as a list of regular expressions, into a single regular
+    expression for use with 'match'.  Its 'match' succeeds for exactly the
+    same strings as that of the plain '|'.join of the entries, but it does
+    much less work per call:
+
+        * entries that are literals, or literals followed by '.*', are
+          merged into a trie of prefixes;
+        * entries that are '.*' followed by a literal (and optionally by
+          another '.*') are merged into a single '.*' and trie, so the
+          string is scanned once rather than once per entry;
+        * everything else is kept as written.
+
+    An already compiled regular expression is returned unchanged."""
+    if not isinstance(skip_list, basestring) and hasattr(skip_list, 'match'):
+        return skip_list
+    if isinstance(skip_list, basestring):
+        entries = split_alternation(skip_list)
+    else:
+        entries = list(skip_list)
+    if any(_unsplittable_skip_list_re.search(x) for x in entries):
+        return re.compile('|'.join(entries))
+    prefixes = []
+    substrings = []
+    others = []
+    for an_entry in entries:
+        a_prefix = literal_prefix(an_entry)
+        if a_prefix is not None:
+            prefixes.append(a_prefix)
+            continue
+        if an_entry.startswith('.*'):
+            a_substring = literal_prefix(an_entry[2:])
+            if a_substring:
+                substrings.append(a_substring)
+                continue
+        others.append(an_entry)
+    branches = []
+    if prefixes:
+        branches.append(_trie_re(prefixes))
+    if substrings:
+        branches.append('.*' + _trie_re(substrings))
+    branches.extend(others)
+    return re.compile('|'.join(branches))
+
+
+#==============================================================================
+class SignatureRules(namedtuple('SignatureRules', (
+    'irrelevant_signature_re',
+    'prefix_signature_re',
+    'irrelevant_signature_matcher',
+    'prefix_signature_matcher',
+    'signatures_with_line_numbers_re',
+    'signature_sentinels',
+    'normalization_cache',
+))):
+    """one complete set of the rules of a C signature tool, together with the
+    cache of the frames normalized under them.  It is never changed once it is
+    made: new rules are built into a new instance that replaces the old one
+    with a single assignment.  A crash that reads the reference once sees one
+    consistent set of rules from start to finish without taking a lock."""
+    __slots__ = ()
+
+
+#------------------------------------------------------------------------------
+def _rule_property(name):
+    """a read only attribute of a signature tool that is taken from its
+    current rules"""
+    return property(
+        lambda self: getattr(self.rules, name),
+        doc='the %s of the current rules' % name
+    )
 
 
 #==============================================================================
@@ -36,13 +228,16 @@ class SignatureTool(RequiredConfig):
         source_list,
         hang_type=0,
         crashed_thread=None,
-        delimiter=' | '
+        delimiter=' | ',
+        **kwargs
     ):
+        """any extra keyword arguments are passed on to '_do_generate'"""
         signature, signature_notes = self._do_generate(
             source_list,
             hang_type,
             crashed_thread,
-            delimiter
+            delimiter,
+            **kwargs
         )
         if self.escape_single_quote:
             signature = signature.replace("'", "''")
@@ -62,6 +257,12 @@ class SignatureTool(RequiredConfig):
     ):
         raise NotImplementedError
 
+    #--------------------------------------------------------------------------
+    def close(self):
+        """derived classes that hold resources, like threads or connections,
+        ought to override this method to release them"""
+        pass
+
 
 #==============================================================================
 class CSignatureToolBase(SignatureTool):
@@ -69,23 +270,93 @@ class CSignatureToolBase(SignatureTool):
     breakpad C/C++ stacks.  It provides a method to normalize signatures
     and then defines its own '_do_generate' method."""
 
+    required_config = Namespace()
+    required_config.add_option(
+        'normalization_cache_size',
+        doc='the maximum number of normalized frame signatures to remember '
+            '(0 to disable the cache)',
+        default=50000,
+    )
+    required_config.add_option(
+        'normalization_cache_log_interval',
+        doc='the seconds between logs of the size and hit ratio of the '
+            'normalization cache (0 for never)',
+        default=300,
+    )
+
     hang_prefixes = {
         -1: "hang",
         1: "chromehang"
     }
 
+    irrelevant_signature_re = _rule_property('irrelevant_signature_re')
+    prefix_signature_re = _rule_property('prefix_signature_re')
+    irrelevant_signature_matcher = _rule_property(
+        'irrelevant_signature_matcher'
+    )
+    prefix_signature_matcher = _rule_property('prefix_signature_matcher')
+    signatures_with_line_numbers_re = _rule_property(
+        'signatures_with_line_numbers_re'
+    )
+    signature_sentinels = _rule_property('signature_sentinels')
+    normalization_cache = _rule_property('normalization_cache')
+
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
         super(CSignatureToolBase, self).__init__(config, quit_check_callback)
-        self.irrelevant_signature_re = None
-        self.prefix_signature_re = None
-        self.signatures_with_line_numbers_re = None
-        self.signature_sentinels = []
+        self.normalization_cache_size = config.setdefault(
+            'normalization_cache_size',
+            50000
+        )
+        self.normalization_cache_log_interval = config.setdefault(
+            'normalization_cache_log_interval',
+            300
+        )
+        self.normalization_cache_logged_at = time.time()
+        # replaced, never modified, by derived classes that load rules.  The
+        # normalization and generation methods accept the rules to use, so
+        # a caller that wants a whole crash done under one set of rules
+        # reads this once and passes it along.
+        self.rules = self._make_rules('', '', '', ())
 
         self.fixup_space = re.compile(r' (?=[\*&,])')
         self.fixup_comma = re.compile(r',(?! )')
         self.fixup_integer = re.compile(r'(<|, )(\d+)([uUlL]?)([^\w])')
 
+    #--------------------------------------------------------------------------
+    def _make_rules(
+        self,
+        irrelevant_skip_list,
+        prefix_skip_list,
+        line_number_skip_list,
+        signature_sentinels
+    ):
+        """build a SignatureRules from skip lists given either as strings of
+        '|' separated regular expressions or as lists of regular expressions.
+        The same frames turn up in crash after crash, so each set of rules
+        gets an empty cache, shared by all the threads using this instance,
+        of the frames normalized under it."""
+        def join(a_skip_list):
+            if isinstance(a_skip_list, (list, tuple)):
+                return '|'.join(a_skip_list)
+            return a_skip_list
+
+        return SignatureRules(
+            irrelevant_signature_re=re.compile(join(irrelevant_skip_list)),
+            prefix_signature_re=re.compile(join(prefix_skip_list)),
+            # equivalent, but faster, forms of the two regular expressions
+            # above.  These are used in '_do_generate'.
+            irrelevant_signature_matcher=compile_skip_list(
+                irrelevant_skip_list
+            ),
+            prefix_signature_matcher=compile_skip_list(prefix_skip_list),
+            signatures_with_line_numbers_re=re.compile(
+                join(line_number_skip_list)
+            ),
+            signature_sentinels=tuple(signature_sentinels),
+            normalization_cache=LRUCache(self.normalization_cache_size),
+        )
+
     #--------------------------------------------------------------------------
     def normalize_signature(
         self,
@@ -97,6 +368,7 @@ class CSignatureToolBase(SignatureTool):
         offset=None,
         function_offset=None,
         normalized=None,
+        rules=None,
         **kwargs  # eat any extra kwargs passed in
     ):
         """ returns a structured conglomeration of the input parameters to
@@ -104,12 +376,83 @@ class CSignatureToolBase(SignatureTool):
         exact names of the fields from the jsonMDSW frame output.  This allows
         this function to be invoked by passing a frame as **a_frame. Sometimes,
         a frame may already have a normalized version cached.  If that exsists,
-        return it instead.
+        return it instead.  'rules' is the SignatureRules to use, the current
+        ones if it is None.
         """
         if normalized is not None:
             return normalized
+        if rules is None:
+            rules = self.rules
+        cache_key = self._normalization_cache_key(
+            module,
+            function,
+            file,
+            line,
+            module_offset,
+            offset
+        )
+        normalized = rules.normalization_cache.get(cache_key)
+        if normalized is None:
+            normalized = self._normalize_signature(
+                rules,
+                module,
+                function,
+                file,
+                line,
+                module_offset,
+                offset
+            )
+            rules.normalization_cache.put(cache_key, normalized)
+        return normalized
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _normalization_cache_key(
+        module,
+        function,
+        file,
+        line,
+        module_offset,
+        offset
+    ):
+        """return the fields of a frame that '_normalize_signature' uses, in
+        the same order of precedence.  The absolute offsets differ from crash
+        to crash, so they are part of the key only when nothing else is."""
+        if function:
+            return ('function', function, line)
+        if file and line:
+            return ('file', file, line)
+        if not module and not module_offset and offset:
+            return ('offset', offset)
+        return ('module', module, module_offset)
+
+    #--------------------------------------------------------------------------
+    def _log_normalization_cache_stats(self):
+        stats = self.normalization_cache.stats()
+        self.config.logger.info(
+            'normalization cache: %(size)d of %(maximum_size)d frames, '
+            '%(hits)d hits, %(misses)d misses, hit ratio %(hit_ratio).3f',
+            stats
+        )
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        self._log_normalization_cache_stats()
+
+    #--------------------------------------------------------------------------
+    def _normalize_signature(
+        self,
+        rules,
+        module,
+        function,
+        file,
+        line,
+        module_offset,
+        offset
+    ):
+        """the uncached implementation of 'normalize_signature'"""
         if function:
-            if self.signatures_with_line_numbers_re.match(function):
+            if rules.signatures_with_line_numbers_re.match(function):
                 function = "%s:%s" % (function, line)
             # Remove spaces before all stars, ampersands, and commas
             function = self.fixup_space.sub('', function)
@@ -138,18 +481,29 @@ class CSignatureToolBase(SignatureTool):
                      source_list,
                      hang_type,
                      crashed_thread,
-                     delimiter=' | '):
+                     delimiter=' | ',
+                     rules=None):
         """
         each element of signatureList names a frame in the crash stack; and is:
           - a prefix of a relevant frame: Append this element to the signature
           - a relevant frame: Append this element and stop looking
           - irrelevant: Append this element only after seeing a prefix frame
-        The signature is a ' | ' separated string of frame names
+        The signature is a ' | ' separated string of frame names.  'rules' is
+        the SignatureRules to use, the current ones if it is None.
         """
+        if rules is None:
+            rules = self.rules
+        interval = self.normalization_cache_log_interval
+        if (
+            interval and
+            time.time() - self.normalization_cache_logged_at >= interval
+        ):
+            self.normalization_cache_logged_at = time.time()
+            self._log_normalization_cache_stats()
         signature_notes = []
         # shorten source_list to the first signatureSentinel
         sentinel_locations = []
-        for a_sentinel in self.signature_sentinels:
+        for a_sentinel in rules.signature_sentinels:
             if type(a_sentinel) == tuple:
                 a_sentinel, condition_fn = a_sentinel
                 if not condition_fn(source_list):
@@ -162,10 +516,10 @@ class CSignatureToolBase(SignatureTool):
             source_list = source_list[min(sentinel_locations):]
         new_signature_list = []
         for a_signature in source_list:
-            if self.irrelevant_signature_re.match(a_signature):
+            if rules.irrelevant_signature_matcher.match(a_signature):
                 continue
             new_signature_list.append(a_signature)
-            if not self.prefix_signature_re.match(a_signature):
+            if not rules.prefix_signature_matcher.match(a_signature):
                 break
         if hang_type:
             new_signature_list.insert(0, self.hang_prefixes[hang_type])
@@ -443,16 +797,12 @@ class CSignatureTool(CSignatureToolBase):
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
         super(CSignatureTool, self).__init__(config, quit_check_callback)
-        self.irrelevant_signature_re = re.compile(
-            self.config.irrelevant_signature_re
-        )
-        self.prefix_signature_re = re.compile(
-            self.config.prefix_signature_re
+        self.rules = self._make_rules(
+            self.config.irrelevant_signature_re,
+            self.config.prefix_signature_re,
+            self.config.signatures_with_line_numbers_re,
+            self.config.signature_sentinels
         )
-        self.signatures_with_line_numbers_re = re.compile(
-            self.config.signatures_with_line_numbers_re
-        )
-        self.signature_sentinels = config.signature_sentinels
 
 
 #==============================================================================
@@ -482,6 +832,12 @@ class CSignatureToolDB(CSignatureToolBase):
         doc='a class that will manage transactions',
         from_string_converter=class_converter
     )
+    required_config.add_option(
+        'rules_refresh_interval',
+        doc='the number of seconds between checks of the skiplist and '
+            'csignature_rules tables for changes (0 to never check)',
+        default=300,
+    )
 
     #--------------------------------------------------------------------------
     def __init__(self, config, quit_check_callback=None):
@@ -493,16 +849,88 @@ class CSignatureToolDB(CSignatureToolBase):
                 self.database,
                 quit_check_callback
             )
-        self.transaction(self._read_signature_rules_from_database)
+        self.rules_version = None
+        self.transaction(self._refresh_signature_rules)
+
+        self._refresher_stop = threading.Event()
+        self._refresher = None
+        if config.setdefault('rules_refresh_interval', 300):
+            self._refresher = threading.Thread(
+                name='SignatureRulesRefresher',
+                target=self._refresher_loop
+            )
+            self._refresher.daemon = True
+            self._refresher.start()
 
     #--------------------------------------------------------------------------
-    def _read_signature_rules_from_database(self, connection):
-        for category, category_re in (
-            ('prefix', 'prefix_signature_re'),
-            ('irrelevant', 'irrelevant_signature_re'),
-            ('line_number', 'signatures_with_line_numbers_re')
+    def _read_signature_rules_version(self, connection):
+        """return a checksum of the contents of the skiplist and
+        csignature_rules tables.  Both are small, so this is cheap."""
+        return single_value_sql(
+            connection,
+            "select md5("
+            "    coalesce((select string_agg(category || E'\\t' || rule, "
+            "                                E'\\n' order by category, rule) "
+            "              from skiplist), '') "
+            "    || E'\\f' || "
+            "    coalesce((select string_agg(category || E'\\t' || rule, "
+            "                                E'\\n' order by category, rule) "
+            "              from csignature_rules), '')"
+            ")"
+        )
+
+    #--------------------------------------------------------------------------
+    def _refresh_signature_rules(self, connection):
+        """reload the rules if the tables have changed since they were last
+        read.  The version is read before the rules, so a change made in
+        between is picked up on the next check.  Returns True if the rules
+        were reloaded."""
+        version = self._read_signature_rules_version(connection)
+        if version == self.rules_version:
+            return False
+        self._read_signature_rules_from_database(connection)
+        self.rules_version = version
+        return True
+
+    #--------------------------------------------------------------------------
+    def _refresher_loop(self):
+        """the target of the refresher thread.  All the reading of the
+        database and compiling of regular expressions happens here, away
+        from the threads that are generating signatures."""
+        while not self._refresher_stop.wait(
+            self.config.rules_refresh_interval
         ):
-            rule_element_list = [
+            try:
+                if self.transaction(self._refresh_signature_rules):
+                    self.config.logger.info(
+                        'signature generation rules reloaded, version %s',
+                        self.rules_version
+                    )
+            except KeyboardInterrupt:
+                # the quit_check_callback says that the app is shutting down
+                break
+            except Exception:
+                self.config.logger.error(
+                    'failed to refresh the signature generation rules',
+                    exc_info=True
+                )
+
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop the refresher thread"""
+        self._refresher_stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        super(CSignatureToolDB, self).close()
+
+    #--------------------------------------------------------------------------
+    def _read_signature_rules_from_database(self, connection):
+        """build the rules from the database and swap them in.  Crashes in
+        flight keep the rules that they started with."""
+        skip_lists = {}
+        for category in ('prefix', 'irrelevant', 'line_number'):
+            skip_lists[category] = [
                 a_rule
                 for (a_rule,) in execute_query_fetchall(
                     connection,
@@ -511,14 +939,9 @@ class CSignatureToolDB(CSignatureToolBase):
                     (category, )
                 )
             ]
-            setattr(
-                self,
-                category_re,
-                re.compile('|'.join(rule_element_list))
-            )
 
         # get sentinel rules
-        self.signature_sentinels = [
+        signature_sentinels = [
             eval(sentinel_rule)  # eval quoted strings and tuples
             if sentinel_rule[0] in "'\"(" else
             sentinel_rule  # already a string, don't need to eval
@@ -527,6 +950,12 @@ class CSignatureToolDB(CSignatureToolBase):
                 "select rule from csignature_rules where category = 'sentinel'"
             )
         ]
+        self.rules = self._make_rules(
+            skip_lists['irrelevant'],
+            skip_lists['prefix'],
+            skip_lists['line_number'],
+            signature_sentinels
+        )
 
 
 #==============================================================================
@@ -664,7 +1093,8 @@ class SignatureGenerationRule(Rule):
     def _create_frame_list(
         self,
         crashing_thread_mapping,
-        make_modules_lower_case=False
+        make_modules_lower_case=False,
+        rules=None
     ):
         frame_signatures_list = []
         for a_frame in islice(
@@ -675,6 +1105,7 @@ class SignatureGenerationRule(Rule):
                 a_frame['module'] = a_frame['module'].lower()
 
             normalized_signature = self.c_signature_tool.normalize_signature(
+                rules=rules,
                 **a_frame
             )
             if 'normalized' not in a_frame:
@@ -695,6 +1126,9 @@ class SignatureGenerationRule(Rule):
                 processor_meta.processor_notes.extend(signature_notes)
             return True
 
+        # the normalization of the frames and the generation of the signature
+        # must see the same rules, even if they are reloaded meanwhile
+        c_signature_rules = self.c_signature_tool.rules
         try:
             crashed_thread = (
                 processed_crash.json_dump['crash_info']['crashing_thread']
@@ -707,13 +1141,15 @@ class SignatureGenerationRule(Rule):
                 signature_list = self._create_frame_list(
                     processed_crash.json_dump["threads"][0],
                     processed_crash.json_dump['system_info']['os'] in
-                    "Windows NT"
+                    "Windows NT",
+                    c_signature_rules
                 )
             elif crashed_thread is not None:
                 signature_list = self._create_frame_list(
                     processed_crash.json_dump["threads"][crashed_thread],
                     processed_crash.json_dump['system_info']['os'] in
-                    "Windows NT"
+                    "Windows NT",
+                    c_signature_rules
                 )
             else:
                 signature_list = []
@@ -727,12 +1163,20 @@ class SignatureGenerationRule(Rule):
             signature_list,
             processed_crash.get('hang_type', ''),
             crashed_thread,
+            rules=c_signature_rules
         )
         processed_crash.signature = signature
         if signature_notes:
             processor_meta.processor_notes.extend(signature_notes)
         return True
 
+    #--------------------------------------------------------------------------
+    def close(self):
+        """stop anything, like the rules refresher thread of CSignatureToolDB,
+        that the signature tools are running"""
+        self.c_signature_tool.close()
+        self.java_signature_tool.close()
+
 
 #==============================================================================
 class OOMSignature(Rule):
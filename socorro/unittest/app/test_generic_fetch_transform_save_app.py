@@ -94,6 +94,9 @@ class TestFetchTransformSaveApp(TestCase):
                 self.store[crash_id] = raw_crash
                 self.dumps[crash_id] = dump
 
+            def close(self):
+                self.closed = True
+
         logger = SilentFakeLogger()
         config = DotDict({
           'logger': logger,
@@ -121,6 +124,9 @@ class TestFetchTransformSaveApp(TestCase):
         eq_(len(destination.dumps), 4)
         eq_(destination.dumps['1237'],
                          source.get_raw_dumps('1237'))
+        # the destination is closed at shutdown.  The source has no close
+        # method, which is logged but not fatal.
+        ok_(destination.closed)
 
     def test_source_iterator(self):
 
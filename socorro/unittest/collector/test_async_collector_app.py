@@ -0,0 +1,64 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import mock
+from nose.tools import eq_
+
+from socorro.collector.async_collector_app import AsyncCollectorApp
+from socorro.unittest.testbase import TestCase
+from configman.dotdict import DotDict
+
+
+class TestAsyncCollectorApp(TestCase):
+
+    def get_standard_config(self):
+        config = DotDict()
+
+        config.logger = mock.MagicMock()
+
+        config.collector = DotDict()
+        self.mocked_collector = mock.MagicMock()
+        self.mocked_collector.uri = '/submit'
+        config.collector.collector_class = mock.MagicMock(
+          return_value=self.mocked_collector
+        )
+
+        config.throttler = DotDict()
+        self.mocked_throttler = mock.MagicMock()
+        config.throttler.throttler_class = mock.MagicMock(
+          return_value=self.mocked_throttler)
+
+        config.storage = mock.MagicMock()
+        self.mocked_crash_storage = mock.MagicMock()
+        config.storage.crashstorage_class = mock.MagicMock(
+          return_value=self.mocked_crash_storage
+        )
+
+        config.server = mock.MagicMock()
+        self.mocked_server = mock.MagicMock()
+        config.server.server_class = mock.MagicMock(
+          return_value=self.mocked_server
+        )
+
+        return config
+
+    def test_main(self):
+        config = self.get_standard_config()
+        self.mocked_server.serve.side_effect = KeyboardInterrupt
+        c = AsyncCollectorApp(config)
+        c.main()
+
+        eq_(config.crash_storage, self.mocked_crash_storage)
+        eq_(config.throttler, self.mocked_throttler)
+        eq_(c.server, self.mocked_server)
+
+        config.collector.collector_class.assert_called_with(config)
+        config.server.server_class.assert_called_with(
+          config.server,
+          self.mocked_collector,
+          '/submit'
+        )
+        self.mocked_server.serve.assert_called_once_with()
+        self.mocked_server.close.assert_called_once_with()
+        self.mocked_crash_storage.close.assert_called_once_with()
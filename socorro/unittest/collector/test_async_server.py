@@ -0,0 +1,218 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import socket
+import threading
+import time
+
+import mock
+from nose.tools import eq_, ok_
+
+from configman.dotdict import DotDict
+
+from socorro.collector.async_server import AsyncCollectorServer
+from socorro.unittest.collector.test_multipart import multipart_body
+from socorro.unittest.testbase import TestCase
+
+
+#==============================================================================
+class TestAsyncCollectorServer(TestCase):
+
+    boundary = 'aBoUnDaRy'
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+        super(TestAsyncCollectorServer, self).setUp()
+        self.servers = []
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+        super(TestAsyncCollectorServer, self).tearDown()
+        for a_server, a_thread in self.servers:
+            a_server.stop()
+            a_thread.join()
+            a_server.close()
+
+    #--------------------------------------------------------------------------
+    def _start_server(self, collect=None, **options):
+        config = DotDict()
+        config.logger = mock.Mock()
+        config.ip_address = '127.0.0.1'
+        config.port = 0
+        config.listen_backlog = 128
+        config.maximum_connections = 1000
+        config.connection_timeout = 300
+        config.maximum_header_size = 16384
+        config.maximum_content_length = 1000000
+        config.body_spool_size = 100
+        config.temporary_file_system_storage_path = '/tmp'
+        config.number_of_workers = 2
+        config.worker_queue_size = 10
+        config.update(options)
+        collector = mock.Mock()
+        self.submissions = []
+
+        def collect_multipart(stream, boundary, content_length):
+            self.submissions.append((stream.read(), boundary, content_length))
+            return 'CrashID=bp-%d\n' % len(self.submissions)
+
+        collector.collect_multipart.side_effect = collect or collect_multipart
+        server = AsyncCollectorServer(config, collector)
+        a_thread = threading.Thread(target=server.serve)
+        a_thread.start()
+        self.servers.append((server, a_thread))
+        return server
+
+    #--------------------------------------------------------------------------
+    def _connect(self, server):
+        a_socket = socket.create_connection(server.socket.getsockname())
+        a_socket.settimeout(10)
+        return a_socket
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def _receive(a_socket):
+        received = []
+        while True:
+            data = a_socket.recv(4096)
+            if not data:
+                break
+            received.append(data)
+        a_socket.close()
+        headers, body = ''.join(received).split('\r\n\r\n', 1)
+        return int(headers.split()[1]), body
+
+    #--------------------------------------------------------------------------
+    def _body(self):
+        return multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid'), ('Version', '99')],
+            [('upload_file_minidump', 'a.dmp', 'x' * 1000)]
+        )
+
+    #--------------------------------------------------------------------------
+    def _headers(self, body, **extra_headers):
+        headers = [
+            'POST /submit HTTP/1.1',
+            'Host: localhost',
+            'Content-Type: multipart/form-data; boundary=%s' % self.boundary,
+            'Content-Length: %d' % len(body),
+        ]
+        headers.extend('%s: %s' % x for x in extra_headers.items())
+        return '\r\n'.join(headers) + '\r\n\r\n'
+
+    #--------------------------------------------------------------------------
+    def _post(self, server, request):
+        a_socket = self._connect(server)
+        a_socket.sendall(request)
+        return self._receive(a_socket)
+
+    #--------------------------------------------------------------------------
+    def test_submission(self):
+        server = self._start_server()
+        body = self._body()
+        eq_(
+            self._post(server, self._headers(body) + body),
+            (200, 'CrashID=bp-1\n')
+        )
+        eq_(self.submissions, [(body, self.boundary, len(body))])
+
+    #--------------------------------------------------------------------------
+    def test_expect_continue(self):
+        server = self._start_server()
+        body = self._body()
+        a_socket = self._connect(server)
+        a_socket.sendall(self._headers(body, Expect='100-continue'))
+        eq_(a_socket.recv(4096), 'HTTP/1.1 100 Continue\r\n\r\n')
+        a_socket.sendall(body)
+        eq_(self._receive(a_socket), (200, 'CrashID=bp-1\n'))
+
+    #--------------------------------------------------------------------------
+    def test_slow_uploads_are_received_concurrently(self):
+        server = self._start_server(number_of_workers=1)
+        body = self._body()
+        request = self._headers(body) + body
+        sockets = []
+        for x in range(50):
+            a_socket = self._connect(server)
+            a_socket.sendall(request[:len(request) / 2])
+            sockets.append(a_socket)
+        for a_socket in sockets:
+            a_socket.sendall(request[len(request) / 2:])
+        responses = [self._receive(a_socket) for a_socket in sockets]
+        eq_(
+            sorted(responses),
+            sorted((200, 'CrashID=bp-%d\n' % x) for x in range(1, 51))
+        )
+        eq_(self.submissions, [(body, self.boundary, len(body))] * 50)
+
+    #--------------------------------------------------------------------------
+    def test_bad_requests(self):
+        server = self._start_server(maximum_content_length=100)
+        body = self._body()
+        requests_and_statuses = [
+            ('GET /submit HTTP/1.1\r\n\r\n', 405),
+            ('POST /elsewhere HTTP/1.1\r\n\r\n', 404),
+            ('POST /submit HTTP/1.1\r\n\r\n', 411),
+            ('POST /submit HTTP/1.1\r\n'
+             'Transfer-Encoding: chunked\r\n\r\n', 411),
+            ('POST /submit HTTP/1.1\r\n'
+             'Content-Length: 10\r\n\r\n0123456789', 400),
+            (self._headers(body) + body, 413),
+            ('nonsense\r\n\r\n', 400),
+        ]
+        for request, status in requests_and_statuses:
+            eq_(self._post(server, request)[0], status, request)
+        eq_(self.submissions, [])
+
+    #--------------------------------------------------------------------------
+    def test_collector_failure(self):
+        def collect_multipart(stream, boundary, content_length):
+            raise Exception('storage is down')
+
+        server = self._start_server(collect=collect_multipart)
+        body = self._body()
+        eq_(self._post(server, self._headers(body) + body)[0], 500)
+        ok_(server.config.logger.error.called)
+
+    #--------------------------------------------------------------------------
+    def test_idle_connections_are_closed(self):
+        server = self._start_server(connection_timeout=0)
+        a_socket = self._connect(server)
+        a_socket.sendall('POST /submit HTTP/1.1\r\n')
+        eq_(self._receive(a_socket)[0], 408)
+
+    #--------------------------------------------------------------------------
+    def test_back_pressure(self):
+        release = threading.Event()
+
+        def collect_multipart(stream, boundary, content_length):
+            release.wait()
+            return 'CrashID=bp-x\n'
+
+        server = self._start_server(
+            collect=collect_multipart,
+            number_of_workers=1,
+            worker_queue_size=1
+        )
+        body = self._body()
+        sockets = []
+        for x in range(4):
+            a_socket = self._connect(server)
+            a_socket.sendall(self._headers(body) + body)
+            sockets.append(a_socket)
+        # one submission is being saved, one is queued and the rest wait in
+        # the server, which stops accepting connections
+        for x in range(100):
+            if len(server.waiting) == 2:
+                break
+            time.sleep(0.05)
+        eq_(len(server.waiting), 2)
+        ok_(not server.readable())
+
+        release.set()
+        for a_socket in sockets:
+            eq_(self._receive(a_socket), (200, 'CrashID=bp-x\n'))
+        eq_(len(server.waiting), 0)
+        ok_(server.readable())
@@ -0,0 +1,138 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from StringIO import StringIO
+
+from nose.tools import eq_, ok_, assert_raises
+
+from socorro.collector.multipart import (
+    MultipartReader,
+    MultipartParseError,
+)
+from socorro.unittest.testbase import TestCase
+
+
+#------------------------------------------------------------------------------
+def multipart_body(boundary, fields, files):
+    lines = ['a preamble to be ignored']
+    for name, value in fields:
+        lines.extend([
+            '--' + boundary,
+            'Content-Disposition: form-data; name="%s"' % name,
+            '',
+            value,
+        ])
+    for name, filename, contents in files:
+        lines.extend([
+            '--' + boundary,
+            'Content-Disposition: form-data; name="%s"; filename="%s"' % (
+                name,
+                filename
+            ),
+            'Content-Type: application/octet-stream',
+            '',
+            contents,
+        ])
+    lines.append('--%s--' % boundary)
+    lines.append('an epilogue to be ignored')
+    return '\r\n'.join(lines)
+
+
+#==============================================================================
+class TestMultipartReader(TestCase):
+
+    boundary = '----------aBoUnDaRy'
+    # contents that look like the start of a delimiter
+    tricky_dump = 'MDMP' + '\r\n--' + '-' * 10 + 'aBoUnD' + 'x' * 300
+
+    #--------------------------------------------------------------------------
+    def _body(self):
+        return multipart_body(
+            self.boundary,
+            [('ProductName', 'Firefox'), ('Version', '30.0'), ('Empty', '')],
+            [
+                ('upload_file_minidump', 'a.dmp', self.tricky_dump),
+                ('flash1', 'b.dmp', 'flash dump'),
+            ]
+        )
+
+    #--------------------------------------------------------------------------
+    def test_parts(self):
+        body = self._body()
+        for block_size in (1, 2, 7, 64, 65536):
+            reader = MultipartReader(
+                StringIO(body),
+                self.boundary,
+                len(body),
+                block_size=block_size
+            )
+            parts = [
+                (a_part.name, a_part.filename, a_part.read())
+                for a_part in reader.parts()
+            ]
+            eq_(
+                parts,
+                [
+                    ('ProductName', None, 'Firefox'),
+                    ('Version', None, '30.0'),
+                    ('Empty', None, ''),
+                    ('upload_file_minidump', 'a.dmp', self.tricky_dump),
+                    ('flash1', 'b.dmp', 'flash dump'),
+                ]
+            )
+
+    #--------------------------------------------------------------------------
+    def test_contents_are_read_in_blocks(self):
+        body = self._body()
+        reader = MultipartReader(StringIO(body), self.boundary, block_size=16)
+        for a_part in reader.parts():
+            if a_part.name == 'upload_file_minidump':
+                blocks = list(a_part.iter_contents())
+                ok_(len(blocks) > 1)
+                ok_(max(len(x) for x in blocks) <= 16)
+                eq_(''.join(blocks), self.tricky_dump)
+                eq_(a_part.read(), '')
+                eq_(a_part.content_type, 'application/octet-stream')
+
+    #--------------------------------------------------------------------------
+    def test_unread_parts_are_skipped(self):
+        body = self._body()
+        reader = MultipartReader(StringIO(body), self.boundary, block_size=5)
+        eq_(
+            [a_part.name for a_part in reader.parts()],
+            ['ProductName', 'Version', 'Empty', 'upload_file_minidump',
+             'flash1']
+        )
+
+    #--------------------------------------------------------------------------
+    def test_content_length_is_respected(self):
+        body = self._body()
+        stream = StringIO(body + 'more than the content length')
+        reader = MultipartReader(stream, self.boundary, len(body))
+        eq_(len(list(reader.parts())), 5)
+        ok_(stream.tell() <= len(body))
+
+    #--------------------------------------------------------------------------
+    def test_reading_stops_early(self):
+        body = self._body()
+        stream = StringIO(body)
+        reader = MultipartReader(stream, self.boundary, block_size=32)
+        for a_part in reader.parts():
+            if a_part.filename:
+                break
+        # the dump was not read
+        ok_(stream.tell() < body.index(self.tricky_dump) + 32)
+
+    #--------------------------------------------------------------------------
+    def test_truncated_body(self):
+        body = self._body()
+        truncated_body = body[:body.index('flash dump')]
+        reader = MultipartReader(StringIO(truncated_body), self.boundary)
+        assert_raises(
+            MultipartParseError,
+            lambda: [a_part.read() for a_part in reader.parts()]
+        )
+
+        reader = MultipartReader(StringIO('no delimiter at all'), 'xyz')
+        assert_raises(MultipartParseError, list, reader.parts())
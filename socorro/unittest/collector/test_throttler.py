@@ -2,12 +2,17 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import itertools
+import random
 import re
 import mock
 
+from nose.tools import eq_
+
 from socorro.lib.util import DotDict
 from socorro.collector.throttler import (
   LegacyThrottler,
+  CompiledThrottler,
   ACCEPT,
   DEFER,
   DISCARD,
@@ -192,3 +197,142 @@ def testLegacyThrottler():
       "ACCEPT expected %d, but got %d instead" % \
       (expected, actual)
 
+
+
+#------------------------------------------------------------------------------
+def _throttler_config(throttle_conditions, never_discard=False):
+    config = DotDict()
+    config.throttle_conditions = throttle_conditions
+    config.minimal_version_for_understanding_refusal = {
+      'Firefox': '3.5.4',
+      'Fennec': '30.0',
+    }
+    config.never_discard = never_discard
+    config.hit_log_interval = 0
+    config.logger = mock.Mock()
+    return config
+
+
+#------------------------------------------------------------------------------
+def _raw_crashes():
+    fields = [
+      ('ProductName', ['Firefox', 'Fennec', 'Thunderbird', 'Camino', '']),
+      ('Version', ['30.0', '31.0a1', '3.0']),
+      ('ReleaseChannel', ['release', 'beta', 'nightly-ux', '', ['esr']]),
+      ('Comments', ['', 'it crashed']),
+      ('HangID', ['a-hang-id']),
+      ('ProcessType', ['browser', 'plugin']),
+    ]
+    # each field may also be missing
+    choices = [
+      [(name, value) for value in values] + [None]
+      for name, values in fields
+    ]
+    for combination in itertools.product(*choices):
+        yield DotDict(x for x in combination if x is not None)
+
+
+#------------------------------------------------------------------------------
+def _outcome(function, raw_crash, seed):
+    random.seed(seed)
+    try:
+        return function(raw_crash)
+    except Exception, x:
+        return x.__class__
+
+
+#------------------------------------------------------------------------------
+def testCompiledThrottlerMatchesLegacyThrottler():
+    default_conditions = \
+      LegacyThrottler.required_config.throttle_conditions.default
+    other_conditions = [
+      ('ProductName', 'Camino', None),
+      ('ProductName', 'Thunderbird', 50),
+      ('ProductName', 'Camino', 100),  # never reached
+      ('ReleaseChannel', 'beta', 75),
+      ('ReleaseChannel', ['esr'], 100),  # an unhashable literal
+      ('ReleaseChannel', re.compile('nightly'), 100),
+      ('ReleaseChannel', 'release', 25),
+      ('*', lambda d: d['Comments'], 100),
+      ('Version', 'lambda x: x[4] == "a"', 100),
+      ('ProductName', '', 0),
+      (None, False, 100),
+      ('Comments', '', 50),
+    ]
+    for throttle_conditions in (default_conditions, other_conditions):
+        for never_discard in (True, False):
+            legacy = LegacyThrottler(
+              _throttler_config(throttle_conditions, never_discard)
+            )
+            compiled = CompiledThrottler(
+              _throttler_config(throttle_conditions, never_discard)
+            )
+            for seed, raw_crash in enumerate(_raw_crashes()):
+                for method_name in ('apply_throttle_conditions', 'throttle'):
+                    eq_(
+                      _outcome(getattr(compiled, method_name), raw_crash, seed),
+                      _outcome(getattr(legacy, method_name), raw_crash, seed),
+                      '%s of %r' % (method_name, raw_crash)
+                    )
+
+
+#------------------------------------------------------------------------------
+def testCompiledThrottlerDecisionTable():
+    config = _throttler_config([
+      ('ProductName', 'Firefox', 10),
+      ('ProductName', 'Fennec', 100),
+      ('ProductName', 'Firefox', 100),
+      ('Version', 'Fennec', 100),
+      ('ProductName', '''lambda x: x[0] in "TSC"''', 100),
+      ('ProductName', 'SeaMonkey', 100),
+      (None, True, 0),
+    ])
+    thr = CompiledThrottler(config)
+    eq_(len(thr.processed_throttle_conditions), 7)
+    eq_(
+      [(key, table) for key, table, rules in thr.decision_table],
+      [
+        ('ProductName', {'Firefox': 0, 'Fennec': 1}),
+        ('Version', {'Fennec': 3}),
+        ('ProductName', None),
+        ('ProductName', {'SeaMonkey': 5}),
+        (None, None),
+      ]
+    )
+
+
+#------------------------------------------------------------------------------
+def testCompiledThrottlerHitStatistics():
+    config = _throttler_config([
+      ('ProductName', 'Firefox', 100),
+      ('ProductName', 'Fennec', 100),
+      ('Comments', 'lambda x: x', 0),
+    ])
+    thr = CompiledThrottler(config)
+    for product_name in ('Firefox', 'Fennec', 'Firefox', 'Camino'):
+        thr.throttle(DotDict({'ProductName': product_name, 'Version': '1'}))
+    thr.throttle(
+      DotDict({'ProductName': 'Camino', 'Version': '1', 'Comments': 'x'})
+    )
+    eq_(
+      [(x['key'], x['condition'], x['hits']) for x in thr.hit_statistics()],
+      [
+        ('ProductName', 'Firefox', 2),
+        ('ProductName', 'Fennec', 1),
+        ('Comments', 'lambda x: x', 1),
+        (None, '(no match)', 1),
+      ]
+    )
+
+    def logged_hits():
+        return [
+          x for x in config.logger.info.call_args_list
+          if 'hits' in x[0][0]
+        ]
+
+    # with an interval of zero, the hits are never logged
+    eq_(logged_hits(), [])
+    config.hit_log_interval = 1
+    thr.hits_logged_at = 0
+    thr.throttle(DotDict({'ProductName': 'Firefox', 'Version': '1'}))
+    eq_(len(logged_hits()), 4)
@@ -2,14 +2,23 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import os
+import shutil
+import tempfile
+
 import mock
 from nose.tools import eq_, ok_
 from datetime import datetime
+from StringIO import StringIO
 
 from configman.dotdict import DotDict
 
-from socorro.collector.wsgi_breakpad_collector import BreakpadCollector
-from socorro.collector.throttler import ACCEPT, IGNORE, DEFER
+from socorro.collector.wsgi_breakpad_collector import (
+    BreakpadCollector,
+    StreamingBreakpadCollector,
+)
+from socorro.collector.throttler import ACCEPT, IGNORE, DEFER, DISCARD
+from socorro.unittest.collector.test_multipart import multipart_body
 from socorro.unittest.testbase import TestCase
 
 
@@ -368,3 +377,191 @@ class TestCollectorApp(TestCase):
                           {'dump':'fake dump', 'aux_dump':'aux_dump contents'},
                           r[11:-1]
                         )
+
+
+class TestStreamingBreakpadCollector(TestCase):
+
+    boundary = 'aBoUnDaRy'
+
+    def setUp(self):
+        super(TestStreamingBreakpadCollector, self).setUp()
+        self.temporary_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestStreamingBreakpadCollector, self).tearDown()
+        shutil.rmtree(self.temporary_directory)
+
+    def get_standard_config(self):
+        config = DotDict()
+        config.logger = mock.MagicMock()
+        config.throttler = mock.MagicMock()
+        config.collector = DotDict()
+        config.collector.collector_class = StreamingBreakpadCollector
+        config.collector.dump_id_prefix = 'bp-'
+        config.collector.dump_field = 'dump'
+        config.collector.accept_submitted_crash_id = False
+        config.collector.accept_submitted_legacy_processing = False
+        config.collector.dump_spool_size = 100
+        config.collector.temporary_file_system_storage_path = \
+            self.temporary_directory
+        config.collector.read_block_size = 16
+        config.crash_storage = mock.MagicMock()
+        return config
+
+    def _post(self, collector, body, throttle_result=(ACCEPT, 100)):
+        stream = StringIO(body)
+        with mock.patch(
+            'socorro.collector.wsgi_breakpad_collector.web'
+        ) as mocked_web:
+            mocked_web.ctx.env = {
+                'CONTENT_TYPE':
+                    'multipart/form-data; boundary=%s' % self.boundary,
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': stream,
+            }
+            with mock.patch(
+                'socorro.collector.wsgi_breakpad_collector.utc_now'
+            ) as mocked_utc_now:
+                mocked_utc_now.return_value = datetime(2012, 5, 4, 15, 10)
+                with mock.patch(
+                    'socorro.collector.wsgi_breakpad_collector.time'
+                ) as mocked_time:
+                    mocked_time.time.return_value = 3.0
+                    collector.throttler.throttle.return_value = \
+                        throttle_result
+                    return collector.POST(), stream
+
+    def _expected_raw_crash(self, crash_id):
+        return {
+            'ProductName': 'FireSquid',
+            'Version': '99',
+            'legacy_processing': ACCEPT,
+            'throttle_rate': 100,
+            'timestamp': 3.0,
+            'submitted_timestamp': '2012-05-04T15:10:00',
+            'uuid': crash_id,
+        }
+
+    def test_POST_small_dumps(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        body = multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid'), ('Version', '99')],
+            [('dump', 'a.dmp', 'fake dump'), ('aux_dump', 'b.dmp', 'aux')]
+        )
+        r, stream = self._post(c, body)
+        ok_(r.startswith('CrashID=bp-'))
+        ok_(r.endswith('120504\n'))
+        crash_id = r[11:-1]
+        c.crash_storage.save_raw_crash.assert_called_once_with(
+            self._expected_raw_crash(crash_id),
+            {'dump': 'fake dump', 'aux_dump': 'aux'},
+            crash_id
+        )
+        ok_(not c.crash_storage.save_raw_crash_with_file_dumps.called)
+        eq_(os.listdir(self.temporary_directory), [])
+
+    def test_POST_large_dump(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        large_dump = 'MDMP' + 'x' * 1000
+        body = multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid'), ('Version', '99')],
+            [('dump', 'a.dmp', large_dump), ('aux_dump', 'b.dmp', 'aux')]
+        )
+        saved = {}
+
+        def save_raw_crash_with_file_dumps(raw_crash, dumps, crash_id):
+            saved['raw_crash'] = raw_crash
+            saved['dumps'] = dumps.as_memory_dumps_mapping()
+            for a_pathname in dumps.values():
+                eq_(os.path.dirname(a_pathname), self.temporary_directory)
+
+        c.crash_storage.save_raw_crash_with_file_dumps.side_effect = \
+            save_raw_crash_with_file_dumps
+        r, stream = self._post(c, body)
+        crash_id = r[11:-1]
+        eq_(saved['raw_crash'], self._expected_raw_crash(crash_id))
+        eq_(saved['dumps'], {'dump': large_dump, 'aux_dump': 'aux'})
+        ok_(not c.crash_storage.save_raw_crash.called)
+        # the temporary files are gone
+        eq_(os.listdir(self.temporary_directory), [])
+
+    def test_POST_storage_failure_removes_the_files(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        body = multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid')],
+            [('dump', 'a.dmp', 'x' * 1000)]
+        )
+        c.crash_storage.save_raw_crash_with_file_dumps.side_effect = \
+            IOError('disk full')
+        try:
+            self._post(c, body)
+            raise AssertionError('IOError expected')
+        except IOError:
+            pass
+        eq_(os.listdir(self.temporary_directory), [])
+
+    def test_POST_throttled_before_reading_the_dump(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        large_dump = 'MDMP' + 'x' * 1000
+        body = multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid'), ('Version', '99')],
+            [('dump', 'a.dmp', large_dump)]
+        )
+        for throttle_result, response in (
+            ((DISCARD, None), 'Discarded=1\n'),
+            ((IGNORE, None), 'Unsupported=1\n'),
+        ):
+            r, stream = self._post(c, body, throttle_result)
+            eq_(r, response)
+            ok_(stream.tell() < body.index(large_dump) + 100)
+            throttled_raw_crash = c.throttler.throttle.call_args[0][0]
+            eq_(throttled_raw_crash.ProductName, 'FireSquid')
+            eq_(throttled_raw_crash.Version, '99')
+        ok_(not c.crash_storage.save_raw_crash.called)
+        ok_(not c.crash_storage.save_raw_crash_with_file_dumps.called)
+        eq_(os.listdir(self.temporary_directory), [])
+
+    def test_POST_without_dumps(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        body = multipart_body(
+            self.boundary,
+            [('ProductName', 'FireSquid'), ('Version', '99')],
+            []
+        )
+        r, stream = self._post(c, body)
+        crash_id = r[11:-1]
+        c.crash_storage.save_raw_crash.assert_called_once_with(
+            self._expected_raw_crash(crash_id),
+            {},
+            crash_id
+        )
+
+    def test_POST_not_multipart(self):
+        config = self.get_standard_config()
+        c = StreamingBreakpadCollector(config)
+        rawform = DotDict()
+        rawform.ProductName = 'FireSquid'
+        rawform.dump = DotDict({'value': 'fake dump', 'file': 'faked file'})
+        with mock.patch(
+            'socorro.collector.wsgi_breakpad_collector.web'
+        ) as mocked_web:
+            mocked_web.ctx.env = {
+                'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            }
+            mocked_web.webapi.rawinput.return_value = rawform
+            c.throttler.throttle.return_value = (ACCEPT, 100)
+            r = c.POST()
+        ok_(r.startswith('CrashID=bp-'))
+        eq_(
+            c.crash_storage.save_raw_crash.call_args[0][1],
+            {'dump': 'fake dump'}
+        )
@@ -14,6 +14,7 @@ from socorro.cron.jobs import automatic_emails
 from socorro.external.exacttarget import exacttarget
 from socorro.external.elasticsearch.crashstorage import \
     ElasticSearchCrashStorage
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.external.elasticsearch.supersearch import SuperS
 from socorro.lib.datetimeutil import string_to_datetime, utc_now
 from crontabber.tests.base import TestCaseBase
@@ -140,8 +141,8 @@ class IntegrationTestAutomaticEmails(IntegrationTestBase):
         config_manager = self._setup_storage_config()
         with config_manager.context() as config:
             storage = ElasticSearchCrashStorage(config)
-            # clear the indices cache so the index is created on every test
-            storage.indices_cache = set()
+            # clear the index registry so the index is created on every test
+            IndexRegistry._registries.clear()
 
             storage.save_processed({
                 'uuid': '1',
@@ -1115,3 +1116,33 @@ class IntegrationTestAutomaticEmails(IntegrationTestBase):
             et_mock = exacttarget_mock.return_value
             # Verify that we have the default 4 results + the 21 we added.
             eq_(et_mock.trigger_send.call_count, 25)
+
+    @mock.patch('socorro.external.exacttarget.exacttarget.ExactTarget')
+    def test_emails_sent_after_scroll(self, exacttarget_mock):
+        """Sending the emails must not keep the scroll waiting. """
+        scrolling = []
+        original_scroll = SuperS.scroll
+
+        def scroll(search, *args, **kwargs):
+            scrolling.append(True)
+            try:
+                for hit in original_scroll(search, *args, **kwargs):
+                    yield hit
+            finally:
+                scrolling.pop()
+
+        sent_during_scroll = []
+
+        def trigger_send(template, fields):
+            sent_during_scroll.append(bool(scrolling))
+
+        et_mock = exacttarget_mock.return_value
+        et_mock.trigger_send.side_effect = trigger_send
+
+        config_manager = self._setup_simple_config()
+        with config_manager.context() as config:
+            job = automatic_emails.AutomaticEmailsCronApp(config, '')
+            with mock.patch.object(SuperS, 'scroll', scroll):
+                job.run(utc_now())
+
+        eq_(sent_during_scroll, [False] * 4)
@@ -17,6 +17,7 @@ from socorro.unittest.cron.jobs.base import IntegrationTestBase
 
 from socorro.external.elasticsearch.crashstorage import \
     ElasticSearchCrashStorage
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.lib.datetimeutil import utc_now
 from socorro.unittest.cron.setup_configman import (
     get_config_manager_for_crontabber,
@@ -69,8 +70,8 @@ class IntegrationTestElasticsearchCleanup(IntegrationTestBase):
     def test_right_indices_are_deleted(self):
         config_manager = self._setup_config_manager()
         with config_manager.context() as config:
-            # clear the indices cache so the index is created on every test
-            self.storage.indices_cache = set()
+            # clear the index registry so the index is created on every test
+            IndexRegistry._registries.clear()
 
             es = self.storage.es
 
@@ -151,8 +152,8 @@ class IntegrationTestElasticsearchCleanup(IntegrationTestBase):
         """
         config_manager = self._setup_config_manager()
         with config_manager.context() as config:
-            # clear the indices cache so the index is created on every test
-            self.storage.indices_cache = set()
+            # clear the index registry so the index is created on every test
+            IndexRegistry._registries.clear()
 
             es = self.storage.es
 
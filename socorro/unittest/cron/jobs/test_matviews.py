@@ -4,12 +4,15 @@
 
 import mock
 from nose.plugins.attrib import attr
-from nose.tools import ok_
+from nose.tools import assert_raises, eq_, ok_
+from psycopg2 import ProgrammingError
 
 from crontabber.app import CronTabber
 from crontabber import base
 from socorro.lib.datetimeutil import utc_now
+from socorro.middleware import middleware_app
 from socorro.unittest.cron.jobs.base import IntegrationTestBase
+from socorro.unittest.testbase import TestCase
 
 from socorro.cron.jobs import matviews
 from socorro.unittest.cron.setup_configman import (
@@ -224,3 +227,50 @@ class ReportsCleanJob(_Job):
 
 class FTPScraperJob(_Job):
     app_name = 'ftpscraper'
+
+
+class InvalidatingMatViewJob(matviews._MatViewBase):
+    proc_name = 'harmless'
+    app_name = 'invalidating-matview'
+    invalidates = ('Crashes', 'CrashTrends')
+
+
+class TestMatviewsResultCache(TestCase):
+
+    def _get_app(self):
+        config = mock.MagicMock()
+        return InvalidatingMatViewJob(config, {}), config
+
+    @mock.patch.object(matviews._MatViewProcBase, '_run_proxy')
+    def test_successful_run_invalidates(self, run_proxy):
+        app, config = self._get_app()
+        run_proxy.return_value = 'result'
+        eq_(app._run_proxy(), 'result')
+
+        result_cache_class = config.result_cache.result_cache_class
+        result_cache_class.assert_called_once_with(config.result_cache)
+        result_cache_class.return_value.invalidate.assert_called_once_with(
+            ('Crashes', 'CrashTrends')
+        )
+
+    @mock.patch.object(matviews._MatViewProcBase, '_run_proxy')
+    def test_failed_run_does_not_invalidate(self, run_proxy):
+        app, config = self._get_app()
+        run_proxy.side_effect = ProgrammingError('no such function')
+        assert_raises(ProgrammingError, app._run_proxy)
+
+        result_cache_class = config.result_cache.result_cache_class
+        ok_(not result_cache_class.return_value.invalidate.called)
+
+    def test_invalidates_name_middleware_services(self):
+        service_names = set(
+            x[1].split('.')[-1] for x in middleware_app.SERVICES_LIST
+        )
+        jobs = [
+            getattr(matviews, x) for x in dir(matviews)
+            if getattr(getattr(matviews, x), 'invalidates', None)
+        ]
+        ok_(jobs)
+        for a_job in jobs:
+            for a_service_name in a_job.invalidates:
+                ok_(a_service_name in service_names, a_service_name)
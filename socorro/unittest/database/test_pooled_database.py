@@ -0,0 +1,191 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+
+import mock
+import psycopg2
+from nose.tools import eq_, ok_, assert_raises
+
+import socorro.database.database as db
+from socorro.lib.util import DotDict, SilentFakeLogger
+from socorro.unittest.testbase import TestCase
+
+
+#==============================================================================
+class TestPooledDatabase(TestCase):
+
+    #--------------------------------------------------------------------------
+    def _get_config(self, **extra):
+        config = DotDict({
+            'database_hostname': 'somewhere',
+            'database_port': 5432,
+            'database_name': 'somename',
+            'database_username': 'someuser',
+            'database_password': 'somepasswd',
+            'logger': SilentFakeLogger(),
+        })
+        config.update(extra)
+        return config
+
+    #--------------------------------------------------------------------------
+    def _get_pool(self, **kwargs):
+        pool = db.PooledDatabase(self._get_config(), **kwargs)
+        self.opened = []
+
+        def connect(dsn):
+            a_connection = mock.Mock()
+            a_connection.closed = 0
+            self.opened.append(a_connection)
+            return a_connection
+
+        self.database_module = mock.Mock()
+        self.database_module.connect.side_effect = connect
+        return pool
+
+    #--------------------------------------------------------------------------
+    def test_connections_are_reused(self):
+        pool = self._get_pool()
+        connection = pool.connection(self.database_module)
+        connection.cursor().execute('select 1')
+        connection.close()
+        connection.close()  # closing twice gives it back only once
+
+        connection = pool.connection(self.database_module)
+        eq_(len(self.opened), 1)
+        ok_(self.opened[0].rollback.called)
+        ok_(not self.opened[0].close.called)
+        connection.close()
+        assert_raises(psycopg2.InterfaceError, getattr, connection, 'cursor')
+
+        statistics = pool.statistics()
+        eq_(statistics['checkouts'], 2)
+        eq_(statistics['size'], 1)
+        eq_(statistics['idle'], 1)
+        eq_(statistics['in_use'], 0)
+        eq_(statistics['connections_opened'], 1)
+
+    #--------------------------------------------------------------------------
+    def test_maximum_size_and_wait_timeout(self):
+        pool = self._get_pool(maximumSize=2, waitTimeout=0.1)
+        first = pool.connection(self.database_module)
+        second = pool.connection(self.database_module)
+        assert_raises(
+            db.CannotConnectToDatabase,
+            pool.connection,
+            self.database_module
+        )
+        eq_(len(self.opened), 2)
+        eq_(pool.statistics()['timeouts'], 1)
+
+        # a waiting thread gets the first connection that is given back
+        got = []
+        waiter = threading.Thread(
+            target=lambda: got.append(pool.connection(self.database_module))
+        )
+        pool.waitTimeout = 10
+        waiter.start()
+        time.sleep(0.1)
+        first.close()
+        waiter.join(10)
+        eq_(len(got), 1)
+        eq_(got[0]._connection, self.opened[0])
+        eq_(len(self.opened), 2)
+
+        statistics = pool.statistics()
+        eq_(statistics['waits'], 1)
+        ok_(statistics['wait_seconds_maximum'] > 0)
+        ok_(statistics['wait_seconds_average'] > 0)
+        second.close()
+        got[0].close()
+
+    #--------------------------------------------------------------------------
+    def test_broken_connections_are_discarded(self):
+        pool = self._get_pool(maximumSize=1)
+        connection = pool.connection(self.database_module)
+        self.opened[0].closed = 1
+        connection.close()
+        eq_(pool.statistics()['size'], 0)
+
+        connection = pool.connection(self.database_module)
+        self.opened[1].rollback.side_effect = psycopg2.OperationalError
+        connection.close()
+        eq_(pool.statistics()['size'], 0)
+        eq_(pool.statistics()['connections_discarded'], 2)
+        eq_(len(self.opened), 2)
+
+    #--------------------------------------------------------------------------
+    def test_health_check(self):
+        pool = self._get_pool(healthCheckInterval=0)
+        pool.connection(self.database_module).close()
+        self.opened[0].cursor.return_value.execute.side_effect = \
+            psycopg2.OperationalError
+        connection = pool.connection(self.database_module)
+        # the broken connection was replaced by a new one
+        eq_(len(self.opened), 2)
+        eq_(connection._connection, self.opened[1])
+        ok_(self.opened[0].close.called)
+        eq_(pool.statistics()['size'], 1)
+
+        connection.close()
+        connection = pool.connection(self.database_module)
+        eq_(connection._connection, self.opened[1])
+        self.opened[1].cursor.return_value.execute.assert_called_with(
+            'select 1'
+        )
+
+    #--------------------------------------------------------------------------
+    def test_idle_eviction(self):
+        pool = self._get_pool(idleTimeout=0.05)
+        pool.connection(self.database_module).close()
+        time.sleep(0.1)
+        connection = pool.connection(self.database_module)
+        ok_(self.opened[0].close.called)
+        eq_(connection._connection, self.opened[1])
+        eq_(pool.statistics()['size'], 1)
+
+    #--------------------------------------------------------------------------
+    def test_failed_connect_frees_its_place(self):
+        pool = self._get_pool(maximumSize=1)
+        self.database_module.connect.side_effect = psycopg2.OperationalError
+        assert_raises(
+            db.CannotConnectToDatabase,
+            pool.connection,
+            self.database_module
+        )
+        eq_(pool.statistics()['size'], 0)
+
+    #--------------------------------------------------------------------------
+    def test_cleanup(self):
+        pool = self._get_pool()
+        first = pool.connection(self.database_module)
+        pool.connection(self.database_module).close()
+        pool.cleanup()
+        ok_(self.opened[1].close.called)
+        ok_(not self.opened[0].close.called)
+        eq_(pool.statistics()['size'], 1)
+        first.close()
+
+    #--------------------------------------------------------------------------
+    def test_get_pooled_database(self):
+        config = self._get_config(
+            database_name='pooled_%s' % id(self),
+            database_pool_size=3,
+            database_pool_wait_timeout=1,
+        )
+        pool = db.getPooledDatabase(config)
+        try:
+            ok_(isinstance(pool, db.PooledDatabase))
+            eq_(pool.maximumSize, 3)
+            eq_(pool.waitTimeout, 1)
+            eq_(pool.idleTimeout, 300)
+            ok_(db.getPooledDatabase(DotDict(config)) is pool)
+            # the pool of a known database is not built again
+            with mock.patch.object(db, 'PooledDatabase') as mocked_pool:
+                ok_(db.getPooledDatabase(config) is pool)
+                ok_(not mocked_pool.called)
+            ok_(pool.description in db.pooledDatabaseStatistics())
+        finally:
+            db._pooledDatabases.pop(pool.dsn)
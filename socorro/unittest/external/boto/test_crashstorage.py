@@ -32,6 +32,89 @@ class ABadDeal(Exception):
 BotoS3CrashStorage.operational_exceptions = (ABadDeal, )
 
 
+class FakeS3(object):
+    """a stand-in for S3 holding the objects of its buckets in a dict"""
+
+    def __init__(self):
+        self.objects = {}
+        self.multipart_uploads = []
+        self.connections = []
+        self.failing_keys = set()
+
+    def connect(self, **kwargs):
+        self.connections.append(kwargs)
+        return FakeS3Connection(self)
+
+
+class FakeS3Connection(object):
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def get_bucket(self, bucket_name, validate=True):
+        return FakeS3Bucket(self.s3, bucket_name)
+
+    create_bucket = get_bucket
+
+
+class FakeS3Bucket(object):
+
+    def __init__(self, s3, name):
+        self.s3 = s3
+        self.name = name
+
+    def new_key(self, key):
+        return FakeS3Key(self, key)
+
+    def get_key(self, key):
+        if (self.name, key) not in self.s3.objects:
+            return None
+        return FakeS3Key(self, key)
+
+    def initiate_multipart_upload(self, key):
+        multipart_upload = FakeS3MultipartUpload(self, key)
+        self.s3.multipart_uploads.append(multipart_upload)
+        return multipart_upload
+
+
+class FakeS3Key(object):
+
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+
+    def set_contents_from_string(self, thing):
+        if self.key in self.bucket.s3.failing_keys:
+            raise ABadDeal(self.key)
+        self.bucket.s3.objects[(self.bucket.name, self.key)] = thing
+
+    def get_contents_as_string(self):
+        return self.bucket.s3.objects[(self.bucket.name, self.key)]
+
+
+class FakeS3MultipartUpload(object):
+
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+        self.parts = {}
+        self.state = 'open'
+
+    def upload_part_from_file(self, a_file, part_number):
+        if self.key in self.bucket.s3.failing_keys:
+            raise ABadDeal(self.key)
+        self.parts[part_number] = a_file.read()
+
+    def complete_upload(self):
+        self.state = 'complete'
+        self.bucket.s3.objects[(self.bucket.name, self.key)] = ''.join(
+            self.parts[x] for x in sorted(self.parts)
+        )
+
+    def cancel_upload(self):
+        self.state = 'cancelled'
+
+
 class TestCase(socorro.unittest.testbase.TestCase):
 
     def _fake_processed_crash(self):
@@ -93,7 +176,8 @@ class TestCase(socorro.unittest.testbase.TestCase):
             executor=TransactionExecutor,
             storage_class='BotoS3CrashStorage',
             host='',
-            port=0):
+            port=0,
+            options=None):
 
         config = DotDict({
             'source': {
@@ -115,6 +199,7 @@ class TestCase(socorro.unittest.testbase.TestCase):
             'prefix': 'dev',
             'calling_format': mock.Mock()
         })
+        config.update(options or {})
         if storage_class == 'BotoS3CrashStorage':
             config.bucket_name = 'crash_storage'
             s3 = BotoS3CrashStorage(config)
@@ -974,3 +1059,111 @@ class TestCase(socorro.unittest.testbase.TestCase):
         crash_id = 'fff13cf0-5671-4496-ab89-47a922141114'
         good = boto_s3_store.build_s3_dirs(prefix, name_of_thing, crash_id)
         self.assertEqual("dev/v1/dump/fff13cf0-5671-4496-ab89-47a922141114", good)
+
+    def setup_fake_s3_storage(self, **options):
+        boto_s3_store = self.setup_mocked_s3_storage(options=options)
+        fake_s3 = FakeS3()
+        boto_s3_store._connect_to_endpoint = fake_s3.connect
+        return boto_s3_store, fake_s3
+
+    def test_save_raw_crash_with_upload_threads(self):
+        boto_s3_store, fake_s3 = self.setup_fake_s3_storage(
+            number_of_upload_threads=3,
+            secure=False,
+        )
+        try:
+            dumps = dict(
+                ('dump_%d' % x, 'fake dump %d' % x) for x in range(10)
+            )
+            dumps['upload_file_minidump'] = 'fake dump'
+            for crash_id in ('0bba929f-8721-460c-dead-a43c20071027',
+                             '0bba929f-8721-460c-dead-a43c20071028'):
+                boto_s3_store.save_raw_crash(
+                    {"submitted_timestamp": crash_id},
+                    dumps,
+                    crash_id
+                )
+                self.assertEqual(
+                    boto_s3_store.get_raw_crash(crash_id),
+                    {"submitted_timestamp": crash_id}
+                )
+                expected_dumps = dict(dumps)
+                expected_dumps['dump'] = expected_dumps.pop(
+                    'upload_file_minidump'
+                )
+                self.assertEqual(
+                    boto_s3_store.get_raw_dumps(crash_id),
+                    expected_dumps
+                )
+            self.assertEqual(len(fake_s3.objects), 2 * 13)
+            # a connection for the store and one for each thread
+            self.assertTrue(len(fake_s3.connections) <= 4)
+            self.assertFalse(fake_s3.connections[0]['is_secure'])
+        finally:
+            boto_s3_store.close()
+
+    def test_save_raw_crash_with_upload_threads_failing(self):
+        boto_s3_store, fake_s3 = self.setup_fake_s3_storage(
+            number_of_upload_threads=3,
+        )
+        try:
+            crash_id = '0bba929f-8721-460c-dead-a43c20071027'
+            fake_s3.failing_keys.add('dev/v1/flash_dump/%s' % crash_id)
+            self.assertRaises(
+                ABadDeal,
+                boto_s3_store.save_raw_crash,
+                {"submitted_timestamp": crash_id},
+                {'dump': 'fake dump', 'flash_dump': 'fake flash dump'},
+                crash_id
+            )
+            # the other uploads were not abandoned
+            self.assertEqual(len(fake_s3.objects), 3)
+        finally:
+            boto_s3_store.close()
+
+    def test_multipart_upload(self):
+        boto_s3_store, fake_s3 = self.setup_fake_s3_storage(
+            multipart_threshold=20,
+            multipart_chunk_size=4,
+        )
+        crash_id = '0bba929f-8721-460c-dead-a43c20071027'
+        boto_s3_store.save_raw_crash(
+            {},
+            {'dump': 'a dump larger than the threshold', 'small': 'small'},
+            crash_id
+        )
+        self.assertEqual(
+            boto_s3_store.get_raw_dumps(crash_id),
+            {'dump': 'a dump larger than the threshold', 'small': 'small'}
+        )
+        # only the large dump is sent in parts
+        self.assertEqual(len(fake_s3.multipart_uploads), 1)
+        multipart_upload = fake_s3.multipart_uploads[0]
+        self.assertEqual(multipart_upload.key, 'dev/v1/dump/%s' % crash_id)
+        self.assertEqual(len(multipart_upload.parts), 8)
+        self.assertEqual(multipart_upload.parts[1], 'a du')
+
+        fake_s3.failing_keys.add('dev/v1/dump/%s' % crash_id)
+        self.assertRaises(
+            ABadDeal,
+            boto_s3_store.save_raw_crash,
+            {},
+            {'dump': 'a dump larger than the threshold'},
+            crash_id
+        )
+        self.assertEqual(fake_s3.multipart_uploads[-1].state, 'cancelled')
+
+    def test_force_reconnect_drops_the_bucket(self):
+        boto_s3_store, fake_s3 = self.setup_fake_s3_storage(
+            number_of_upload_threads=1,
+        )
+        try:
+            crash_id = '0bba929f-8721-460c-dead-a43c20071027'
+            boto_s3_store.save_raw_crash({}, {}, crash_id)
+            self.assertEqual(len(fake_s3.connections), 2)
+            boto_s3_store.force_reconnect()
+            boto_s3_store.save_raw_crash({}, {}, crash_id)
+            # both the store and the upload thread connected again
+            self.assertEqual(len(fake_s3.connections), 4)
+        finally:
+            boto_s3_store.close()
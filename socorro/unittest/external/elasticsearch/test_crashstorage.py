@@ -2,17 +2,22 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
 import mock
 import pyelasticsearch
+import threading
 from pyelasticsearch.exceptions import IndexAlreadyExistsError
 from nose.tools import eq_, ok_, assert_raises
 
 from configman import ConfigurationManager
 
 from socorro.external.elasticsearch.crashstorage import (
-    ElasticSearchCrashStorage
+    ElasticSearchCrashStorage,
+    ElasticSearchBulkCrashStorage,
 )
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.database.transaction_executor import (
+    TransactionExecutorWithInfiniteBackoff,
     TransactionExecutorWithLimitedBackoff
 )
 from socorro.unittest.testbase import TestCase
@@ -72,11 +77,16 @@ a_raw_crash = {
 
 class TestElasticsearchCrashStorage(TestCase):
 
+    def setUp(self):
+        super(TestElasticsearchCrashStorage, self).setUp()
+        IndexRegistry._registries.clear()
+
     @mock.patch('socorro.external.elasticsearch.crashstorage.SuperSearch')
     @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
     def test_indexing(self, pyes_mock, search_mock):
         mock_logging = mock.Mock()
         mock_es = mock.Mock()
+        mock_es.aliases.return_value = {}
         pyes_mock.exceptions.ElasticHttpNotFoundError = \
             pyelasticsearch.exceptions.ElasticHttpNotFoundError
 
@@ -137,6 +147,7 @@ class TestElasticsearchCrashStorage(TestCase):
     def test_success(self, pyes_mock, search_mock):
         mock_logging = mock.Mock()
         mock_es = mock.Mock()
+        mock_es.aliases.return_value = {}
 
         pyes_mock.ElasticSearch.return_value = mock_es
         required_config = ElasticSearchCrashStorage.get_required_config()
@@ -190,6 +201,7 @@ class TestElasticsearchCrashStorage(TestCase):
     def test_failure_no_retry(self, pyes_mock, search_mock):
         mock_logging = mock.Mock()
         mock_es = mock.Mock()
+        mock_es.aliases.return_value = {}
 
         pyes_mock.ElasticSearch.return_value = mock_es
         required_config = ElasticSearchCrashStorage.get_required_config()
@@ -249,6 +261,7 @@ class TestElasticsearchCrashStorage(TestCase):
     def test_failure_limited_retry(self, pyes_mock, search_mock):
         mock_logging = mock.Mock()
         mock_es = mock.Mock()
+        mock_es.aliases.return_value = {}
 
         pyes_mock.ElasticSearch.return_value = mock_es
         required_config = ElasticSearchCrashStorage.get_required_config()
@@ -312,6 +325,7 @@ class TestElasticsearchCrashStorage(TestCase):
     def test_success_after_limited_retry(self, pyes_mock, search_mock):
         mock_logging = mock.Mock()
         mock_es = mock.Mock()
+        mock_es.aliases.return_value = {}
 
         pyes_mock.ElasticSearch.return_value = mock_es
         required_config = ElasticSearchCrashStorage.get_required_config()
@@ -376,3 +390,378 @@ class TestElasticsearchCrashStorage(TestCase):
                 *expected_request_args,
                 **expected_request_kwargs
             )
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_upcoming_indices(self, pyes_mock):
+        mock_logging = mock.Mock()
+        mock_es = mock.Mock()
+        mock_es.aliases.return_value = {'socorro': {}}
+        pyes_mock.ElasticSearch.return_value = mock_es
+        required_config = ElasticSearchCrashStorage.get_required_config()
+        required_config.add_option('logger', default=mock_logging)
+
+        config_manager = ConfigurationManager(
+            [required_config],
+            app_name='testapp',
+            app_version='1.0',
+            app_description='app description',
+            values_source_list=[{
+                'logger': mock_logging,
+                'elasticsearch_urls': 'http://elasticsearch_host:9200',
+            }],
+            argv_source=[]
+        )
+
+        with config_manager.context() as config:
+            es_storage = ElasticSearchCrashStorage(config)
+            crash_report = a_processed_crash.copy()
+
+            # the last day of a week, the index of the next week is created
+            # along with the index of the crash
+            crash_report['date_processed'] = '2013-01-06 10:56:41.558922'
+            es_storage.save_processed(crash_report)
+            eq_(
+                [x[0][0] for x in mock_es.create_index.call_args_list],
+                ['socorro201300', 'socorro201301']
+            )
+            # the mapping file was read once
+            settings = [
+                x[1]['settings'] for x in mock_es.create_index.call_args_list
+            ]
+            ok_(settings[0] is settings[1])
+
+            # the indices are known to all the crash storages of the process
+            es_storage = ElasticSearchCrashStorage(config)
+            crash_report['date_processed'] = '2013-01-07 10:56:41.558922'
+            es_storage.save_processed(crash_report)
+            eq_(mock_es.create_index.call_count, 2)
+            eq_(mock_es.aliases.call_count, 1)
+            eq_(mock_es.index.call_count, 2)
+
+            # failing to create an upcoming index does not fail the crash
+            def create_index_fn(index, **kwargs):
+                if index == 'socorro201302':
+                    raise pyelasticsearch.exceptions.ElasticHttpError(
+                        400,
+                        'horrors'
+                    )
+
+            mock_es.create_index.side_effect = create_index_fn
+            crash_report['date_processed'] = '2013-01-13 10:56:41.558922'
+            es_storage.save_processed(crash_report)
+            eq_(mock_es.index.call_count, 3)
+            ok_(mock_logging.warning.called)
+            eq_(
+                mock_logging.warning.call_args[0][1],
+                'socorro201302'
+            )
+
+
+class TestElasticsearchBulkCrashStorage(TestCase):
+
+    def setUp(self):
+        super(TestElasticsearchBulkCrashStorage, self).setUp()
+        IndexRegistry._registries.clear()
+
+    def _get_config_manager(self, mock_logging, **values):
+        required_config = ElasticSearchBulkCrashStorage.get_required_config()
+        required_config.add_option('logger', default=mock_logging)
+        values_source = {
+            'logger': mock_logging,
+            'elasticsearch_urls': 'http://elasticsearch_host:9200',
+            'bulk_max_latency': 60,
+            'backoff_delays': [0, 0, 0],
+            'transaction_executor_class':
+                TransactionExecutorWithLimitedBackoff
+        }
+        values_source.update(values)
+        return ConfigurationManager(
+            [required_config],
+            app_name='testapp',
+            app_version='1.0',
+            app_description='app description',
+            values_source_list=[values_source],
+            argv_source=[]
+        )
+
+    @staticmethod
+    def _crash(crash_id):
+        processed_crash = a_processed_crash.copy()
+        processed_crash['uuid'] = crash_id
+        return processed_crash
+
+    @staticmethod
+    def _ids_in_bulk_request(a_call):
+        args, kwargs = a_call
+        eq_(args[:2], ('POST', ['_bulk']))
+        ok_(kwargs['encode_body'] is False)
+        lines = args[2].splitlines()
+        eq_(len(lines), 2 * (len(lines) / 2))
+        actions = [json.loads(x)['index'] for x in lines[::2]]
+        documents = [json.loads(x) for x in lines[1::2]]
+        for an_action, a_document in zip(actions, documents):
+            eq_(an_action['_index'], 'socorro201214')
+            eq_(an_action['_type'], 'crash_reports')
+            eq_(an_action['_id'], a_document['crash_id'])
+        return [x['_id'] for x in actions]
+
+    @staticmethod
+    def _response(*statuses):
+        items = []
+        for status in statuses:
+            result = {'_id': 'x', 'status': status}
+            if status >= 300:
+                result['error'] = 'EsRejectedExecutionException[horrors]'
+            items.append({'index': result})
+        return {'took': 1, 'errors': any('error' in x['index'] for x in items),
+                'items': items}
+
+    def _get_storage(self, pyes_mock, mock_logging, **values):
+        mock_es = mock.Mock()
+        mock_es.aliases.return_value = {'socorro201214': {}}
+        mock_es._encode_json.side_effect = json.dumps
+        pyes_mock.ElasticSearch.return_value = mock_es
+        config_manager = self._get_config_manager(mock_logging, **values)
+        with config_manager.context() as config:
+            es_storage = ElasticSearchBulkCrashStorage(config)
+        return es_storage, mock_es
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_flush_by_count(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_documents=3
+        )
+        mock_es.send_request.return_value = self._response(201, 201, 201)
+
+        es_storage.save_processed(self._crash('crash1'))
+        es_storage.save_raw_and_processed(
+            a_raw_crash,
+            None,
+            self._crash('crash2'),
+            'crash2'
+        )
+        ok_(not mock_es.send_request.called)
+        es_storage.save_processed(self._crash('crash3'))
+        eq_(mock_es.send_request.call_count, 1)
+        eq_(
+            self._ids_in_bulk_request(mock_es.send_request.call_args),
+            ['crash1', 'crash2', 'crash3']
+        )
+        ok_(not mock_es.index.called)
+
+        es_storage.save_processed(self._crash('crash4'))
+        eq_(mock_es.send_request.call_count, 1)
+        es_storage.close()
+        eq_(mock_es.send_request.call_count, 2)
+        eq_(
+            self._ids_in_bulk_request(mock_es.send_request.call_args),
+            ['crash4']
+        )
+        ok_(not es_storage._flusher.is_alive())
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_flush_by_size(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_bytes=100
+        )
+        mock_es.send_request.return_value = self._response(201)
+        es_storage.save_processed(self._crash('crash1'))
+        eq_(mock_es.send_request.call_count, 1)
+        es_storage.close()
+        eq_(mock_es.send_request.call_count, 1)
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_flush_by_latency(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_latency=0.01
+        )
+        sent = threading.Event()
+
+        def send_request(*args, **kwargs):
+            sent.set()
+            return self._response(201)
+
+        mock_es.send_request.side_effect = send_request
+        es_storage.save_processed(self._crash('crash1'))
+        ok_(sent.wait(5))
+        es_storage.close()
+        eq_(
+            self._ids_in_bulk_request(mock_es.send_request.call_args),
+            ['crash1']
+        )
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_retry_only_failed_documents(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_documents=4
+        )
+        mock_es.send_request.side_effect = [
+            self._response(201, 429, 400, 503),
+            self._response(201, 201),
+        ]
+        for crash_id in ('crash1', 'crash2', 'crash3', 'crash4'):
+            es_storage.save_processed(self._crash(crash_id))
+
+        eq_(mock_es.send_request.call_count, 2)
+        first_call, second_call = mock_es.send_request.call_args_list
+        eq_(
+            self._ids_in_bulk_request(first_call),
+            ['crash1', 'crash2', 'crash3', 'crash4']
+        )
+        # crash3 was refused and is not retried
+        eq_(self._ids_in_bulk_request(second_call), ['crash2', 'crash4'])
+        critical_args = [
+            args for args, kwargs in mock_logging.critical.call_args_list
+        ]
+        ok_(
+            ('%s was refused by elasticsearch: %s', 'crash3',
+             'EsRejectedExecutionException[horrors]') in critical_args
+        )
+        es_storage.close()
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_retry_errors_without_status(self, pyes_mock):
+        # elasticsearch 0.90 gives no status with the error of an item
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_documents=3
+        )
+        first_response = self._response(201, 500, 500)
+        first_response['items'][1]['index'] = {
+            '_id': 'x',
+            'error': 'RemoteTransportException[[node][inet[/10.0.0.1:9300]]'
+                     '[index]]; nested: EsRejectedExecutionException[rejected '
+                     'execution of [TransportShardBulkAction]]',
+        }
+        first_response['items'][2]['index'] = {
+            '_id': 'x',
+            'error': 'MapperParsingException[failed to parse [date]]',
+        }
+        mock_es.send_request.side_effect = [
+            first_response,
+            self._response(201),
+        ]
+        for crash_id in ('crash1', 'crash2', 'crash3'):
+            es_storage.save_processed(self._crash(crash_id))
+
+        eq_(mock_es.send_request.call_count, 2)
+        # the rejected execution is retried, the parse error is not
+        eq_(
+            self._ids_in_bulk_request(mock_es.send_request.call_args),
+            ['crash2']
+        )
+        critical_args = [
+            args for args, kwargs in mock_logging.critical.call_args_list
+        ]
+        ok_(
+            ('%s was refused by elasticsearch: %s', 'crash3',
+             'MapperParsingException[failed to parse [date]]')
+            in critical_args
+        )
+        es_storage.close()
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_retries_exhausted(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_documents=2
+        )
+        mock_es.send_request.side_effect = [
+            self._response(201, 503),
+            self._response(503),
+            self._response(503),
+        ]
+        es_storage.save_processed(self._crash('crash1'))
+        # the failure is logged, not raised to the caller
+        es_storage.save_processed(self._crash('crash2'))
+
+        # one try for each of the three backoff delays
+        eq_(mock_es.send_request.call_count, 3)
+        for a_call in mock_es.send_request.call_args_list[1:]:
+            eq_(self._ids_in_bulk_request(a_call), ['crash2'])
+        critical_args = [
+            args for args, kwargs in mock_logging.critical.call_args_list
+        ]
+        ok_(
+            ('%s was not submitted to elasticsearch', 'crash2')
+            in critical_args
+        )
+        ok_(
+            ('%s was not submitted to elasticsearch', 'crash1')
+            not in critical_args
+        )
+        es_storage.close()
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_close_interrupted_by_quit_check(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            transaction_executor_class=TransactionExecutorWithInfiniteBackoff,
+            backoff_delays=[1],
+        )
+        mock_es.send_request.return_value = self._response(201, 503)
+        es_storage.save_processed(self._crash('crash1'))
+        es_storage.save_processed(self._crash('crash2'))
+        # the sleep before a retry checks for quitting even while closing
+        es_storage.transaction.quit_check = mock.Mock(
+            side_effect=KeyboardInterrupt
+        )
+        es_storage.close()
+        eq_(mock_es.send_request.call_count, 1)
+        critical_args = [
+            args for args, kwargs in mock_logging.critical.call_args_list
+        ]
+        ok_(
+            ('the app is shutting down, %d crashes were not submitted to '
+             'elasticsearch: %s', 1, 'crash2') in critical_args
+        )
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_no_urls(self, pyes_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            elasticsearch_urls=''
+        )
+        ok_(es_storage._flusher is None)
+        es_storage.save_processed(self._crash('crash1'))
+        es_storage.close()
+        ok_(not mock_es.send_request.called)
+
+    @mock.patch('socorro.external.elasticsearch.crashstorage.SuperSearch')
+    @mock.patch('socorro.external.elasticsearch.crashstorage.pyelasticsearch')
+    def test_index_creation(self, pyes_mock, search_mock):
+        mock_logging = mock.Mock()
+        es_storage, mock_es = self._get_storage(
+            pyes_mock,
+            mock_logging,
+            bulk_max_documents=1
+        )
+        mock_es.send_request.return_value = self._response(201)
+        crash = self._crash('crash1')
+        crash['date_processed'] = '2013-01-01 10:56:41.558922'
+        es_storage.save_processed(crash)
+        eq_(mock_es.create_index.call_count, 1)
+        eq_(mock_es.create_index.call_args[0][0], 'socorro201300')
+        es_storage.save_processed(crash)
+        eq_(mock_es.create_index.call_count, 1)
+        es_storage.close()
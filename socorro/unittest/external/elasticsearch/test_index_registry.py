@@ -0,0 +1,174 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import mock
+import threading
+import time
+from nose.tools import eq_, ok_
+
+from socorro.external.elasticsearch.index_registry import IndexRegistry
+from socorro.unittest.testbase import TestCase
+
+
+class TestIndexRegistry(TestCase):
+
+    def setUp(self):
+        super(TestIndexRegistry, self).setUp()
+        IndexRegistry._registries.clear()
+
+    def test_for_cluster(self):
+        registry = IndexRegistry.for_cluster(['http://localhost:9200'])
+        ok_(IndexRegistry.for_cluster(('http://localhost:9200',)) is registry)
+        ok_(IndexRegistry.for_cluster(['http://elsewhere:9200']) is not
+            registry)
+
+    def test_existing_indices(self):
+        registry = IndexRegistry()
+        list_indices = mock.Mock(return_value=['socorro', 'socorro201501'])
+        eq_(
+            registry.existing_indices(list_indices, 60),
+            frozenset(['socorro', 'socorro201501'])
+        )
+        registry.add('socorro201502')
+        registry.discard('socorro201501')
+        eq_(
+            registry.existing_indices(list_indices, 60),
+            frozenset(['socorro', 'socorro201502'])
+        )
+        eq_(list_indices.call_count, 1)
+
+        # once the list is too old, the indices are listed again
+        registry.listed_at -= 61
+        eq_(
+            registry.existing_indices(list_indices, 60),
+            frozenset(['socorro', 'socorro201501'])
+        )
+        eq_(list_indices.call_count, 2)
+
+        registry.existing_indices(list_indices, 0)
+        eq_(list_indices.call_count, 3)
+
+    def test_existing_indices_expected(self):
+        registry = IndexRegistry()
+        list_indices = mock.Mock(return_value=['socorro201501'])
+        eq_(
+            registry.existing_indices(list_indices, 60, ['socorro201501']),
+            frozenset(['socorro201501'])
+        )
+        eq_(list_indices.call_count, 1)
+
+        # a new index is found before the ttl passes
+        list_indices.return_value = ['socorro201501', 'socorro201502']
+        eq_(
+            registry.existing_indices(
+                list_indices,
+                60,
+                ['socorro201501', 'socorro201502']
+            ),
+            frozenset(['socorro201501', 'socorro201502'])
+        )
+        eq_(list_indices.call_count, 2)
+
+        # an index that is still missing is looked for once
+        for x in range(3):
+            eq_(
+                registry.existing_indices(
+                    list_indices,
+                    60,
+                    ['socorro201502', 'socorro201503']
+                ),
+                frozenset(['socorro201501', 'socorro201502'])
+            )
+        eq_(list_indices.call_count, 3)
+
+        # ... until the ttl passes
+        registry.listed_at -= 61
+        registry.existing_indices(list_indices, 60, ['socorro201503'])
+        eq_(list_indices.call_count, 4)
+        registry.existing_indices(list_indices, 60, ['socorro201503'])
+        eq_(list_indices.call_count, 4)
+
+        # or the index is created
+        registry.add('socorro201503')
+        ok_('socorro201503' not in registry.missing)
+        registry.discard('socorro201503')
+        registry.existing_indices(list_indices, 60, ['socorro201503'])
+        eq_(list_indices.call_count, 4)
+
+    def test_ensure_index(self):
+        registry = IndexRegistry()
+        list_indices = mock.Mock(return_value=['socorro'])
+        created = []
+        creating = threading.Event()
+
+        def create_index(index):
+            creating.set()
+            # give the other threads time to find the index missing
+            time.sleep(0.05)
+            created.append(index)
+
+        threads = [
+            threading.Thread(
+                target=registry.ensure_index,
+                args=('socorro201501', create_index, list_indices, 60)
+            )
+            for x in range(10)
+        ]
+        for a_thread in threads:
+            a_thread.start()
+        for a_thread in threads:
+            a_thread.join()
+        ok_(creating.is_set())
+        eq_(created, ['socorro201501'])
+        eq_(list_indices.call_count, 1)
+
+        ok_(not registry.ensure_index('socorro', create_index,
+                                      list_indices, 60))
+        ok_(registry.ensure_index('socorro201502', create_index,
+                                  list_indices, 60))
+        eq_(created, ['socorro201501', 'socorro201502'])
+
+    def test_index_settings(self):
+        registry = IndexRegistry()
+        build_settings = mock.Mock(side_effect=lambda: {'mappings': {}})
+        settings = registry.index_settings('file', build_settings, 600)
+        eq_(settings, {'mappings': {}})
+        ok_(registry.index_settings('file', build_settings, 600) is settings)
+        eq_(build_settings.call_count, 1)
+
+        # once the settings are too old, they are built again
+        registry.settings['file'] = (settings, time.time() - 601)
+        ok_(
+            registry.index_settings('file', build_settings, 600)
+            is not settings
+        )
+        eq_(build_settings.call_count, 2)
+
+    def test_index_settings_by_source(self):
+        registry = IndexRegistry()
+        from_file = registry.index_settings(
+            ('mapping file', 'settings.json', 'crash_reports'),
+            lambda: {'from': 'file'},
+            600
+        )
+        from_fields = registry.index_settings(
+            ('supersearch fields', 'socorro', 'crash_reports'),
+            lambda: {'from': 'fields'},
+            600
+        )
+        other_doctype = registry.index_settings(
+            ('mapping file', 'settings.json', 'other_doctype'),
+            lambda: {'from': 'file', 'doctype': 'other_doctype'},
+            600
+        )
+        eq_(from_file, {'from': 'file'})
+        eq_(from_fields, {'from': 'fields'})
+        eq_(other_doctype, {'from': 'file', 'doctype': 'other_doctype'})
+        ok_(
+            registry.index_settings(
+                ('mapping file', 'settings.json', 'crash_reports'),
+                mock.Mock(),
+                600
+            ) is from_file
+        )
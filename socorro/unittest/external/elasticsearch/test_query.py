@@ -47,9 +47,6 @@ class IntegrationTestQuery(ElasticSearchTestCase):
         self.storage = crashstorage.ElasticSearchCrashStorage(config)
         self.api = Query(config=config)
 
-        # clear the indices cache so the index is created on every test
-        self.storage.indices_cache = set()
-
         # Create the supersearch fields.
         self.storage.es.bulk_index(
             index=config.webapi.elasticsearch_default_index,
@@ -177,9 +177,6 @@ class IntegrationElasticsearchSearch(ElasticSearchTestCase):
         self.api = Search(config=config)
         self.storage = crashstorage.ElasticSearchCrashStorage(config)
 
-        # clear the indices cache so the index is created on every test
-        self.storage.indices_cache = set()
-
         # Create the supersearch fields.
         self.storage.es.bulk_index(
             index=config.webapi.elasticsearch_default_index,
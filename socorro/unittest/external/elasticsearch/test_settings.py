@@ -39,9 +39,6 @@ class IntegrationTestSettings(ElasticSearchTestCase):
         config = self.get_config_context()
         self.storage = crashstorage.ElasticSearchCrashStorage(config)
 
-        # clear the indices cache so the index is created on every test
-        self.storage.indices_cache = set()
-
         self.now = utc_now()
 
         # Create the supersearch fields.
@@ -16,7 +16,7 @@ from socorro.external import (
     ResourceNotFound,
 )
 from socorro.external.elasticsearch import crashstorage
-from socorro.external.elasticsearch.supersearch import SuperSearch
+from socorro.external.elasticsearch.supersearch import SuperS, SuperSearch
 from socorro.lib import datetimeutil, search_common
 from .unittestbase import ElasticSearchTestCase
 
@@ -766,6 +766,303 @@ class TestSuperSearch(ElasticSearchTestCase):
             ]
         )
 
+    @mock.patch.object(SuperSearch, 'get_fields')
+    def test_fields_are_cached(self, mocked_get_fields):
+        mocked_get_fields.return_value = SUPERSEARCH_FIELDS
+        config = self.get_config_context()
+
+        api = SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 1)
+        eq_(api.all_fields, SUPERSEARCH_FIELDS)
+        eq_(
+            api.database_name_to_field_name_map['fake_field'],
+            'fake_field'
+        )
+        eq_(
+            sorted(api.returned_fields),
+            sorted(
+                '%s.%s' % (x['namespace'], x['in_database_name'])
+                for x in SUPERSEARCH_FIELDS.values()
+                if x['is_returned']
+            )
+        )
+        ok_('raw_crash.fake_field' in api.returned_fields)
+        ok_('fake_field' in [x.name for x in api.filters])
+        ok_('_facets' in [x.name for x in api.filters])
+
+        # Another search, as for another request, reads nothing.
+        api = SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 1)
+
+        # Unless the fields are too old.
+        api.get_fields_cache().definitions.loaded_at -= 301
+        api = SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 2)
+
+        # Or there is no caching at all.
+        config.webapi.supersearch_fields_cache_ttl = 0
+        api = SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 3)
+
+    @mock.patch.object(SuperSearch, 'test_mapping')
+    @mock.patch.object(SuperSearch, 'get_connection')
+    @mock.patch.object(SuperSearch, 'get_fields')
+    def test_field_changes_invalidate_the_cache(
+        self,
+        mocked_get_fields,
+        mocked_get_connection,
+        mocked_test_mapping
+    ):
+        mocked_get_fields.return_value = SUPERSEARCH_FIELDS
+        config = self.get_config_context()
+
+        api = SuperSearch(config=config)
+        # Each change reads the fields once to check the new mapping, and
+        # the next search reads them again.
+        api.create_field(name='new_field', in_database_name='new_field')
+        eq_(mocked_get_fields.call_count, 2)
+        api = SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 3)
+
+        api.update_field(name='new_field', description='a new field')
+        SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 5)
+
+        api.delete_field(name='new_field')
+        SuperSearch(config=config)
+        eq_(mocked_get_fields.call_count, 6)
+
+        # Only the cache of the same index is invalidated.
+        other_config = self.get_config_context()
+        other_config.webapi.elasticsearch_default_index = 'another_index'
+        SuperSearch(config=other_config)
+        eq_(mocked_get_fields.call_count, 7)
+        api.delete_field(name='new_field')
+        SuperSearch(config=other_config)
+        eq_(mocked_get_fields.call_count, 7)
+
+    @mock.patch.object(SuperSearch, 'get_connection')
+    @mock.patch.object(SuperSearch, 'get_fields')
+    def test_get_in_one_request(self, mocked_get_fields, mocked_connection):
+        mocked_get_fields.return_value = SUPERSEARCH_FIELDS
+        es = mock.Mock()
+        es.aliases.return_value = {
+            'socorro_200004': {'aliases': {}},
+            'socorro_200005': {'aliases': {}},
+            'socorro': {'aliases': {}},
+        }
+        es.search.return_value = {
+            'took': 1,
+            'hits': {
+                'total': 42,
+                'hits': [
+                    {'fields': {'processed_crash.signature': 'js::break'}},
+                ],
+            },
+            'facets': {
+                'signature': {
+                    '_type': 'terms',
+                    'terms': [{'term': 'js::break', 'count': 42}],
+                },
+            },
+        }
+
+        class FakeS(SuperS):
+            def get_es(self, default_builder=None):
+                return es
+
+        mocked_connection.side_effect = FakeS
+        config = self.get_config_context(es_index='socorro_%Y%W')
+        api = SuperSearch(config=config)
+
+        res = api.get(date=['>=2000-01-20', '<2000-02-01'])
+        eq_(
+            res,
+            {
+                'hits': [{'signature': 'js::break'}],
+                'total': 42,
+                'facets': {
+                    'signature': [{'term': 'js::break', 'count': 42}],
+                },
+            }
+        )
+        # The missing index was never sent to elasticsearch.
+        eq_(es.search.call_count, 1)
+        eq_(
+            es.search.call_args[1]['index'],
+            ['socorro_200004', 'socorro_200005']
+        )
+
+        # The list of indices is reused by the next searches, an index that
+        # turns out to be missing is removed from it.
+        es.search.side_effect = [
+            pyelasticsearch.exceptions.ElasticHttpNotFoundError(
+                404,
+                'IndexMissingException[[socorro_200005] missing]'
+            ),
+            es.search.return_value,
+        ]
+        res = api.get(date=['>=2000-01-20', '<2000-02-01'])
+        eq_(res['total'], 42)
+        eq_(es.search.call_args[1]['index'], ['socorro_200004'])
+        eq_(es.aliases.call_count, 1)
+
+        res = api.get(date=['>=2000-01-31', '<2000-02-01'])
+        eq_(res, {'hits': [], 'total': 0, 'facets': {}})
+        eq_(es.search.call_count, 3)
+
+        # An empty page of results is still a single request.
+        es.search.side_effect = None
+        es.search.return_value = {
+            'took': 1,
+            'hits': {'total': 0, 'hits': []},
+            'facets': {},
+        }
+        res = api.get(date=['>=2000-01-20', '<2000-01-25'])
+        eq_(res, {'hits': [], 'total': 0, 'facets': {}})
+        eq_(es.search.call_count, 4)
+
+    @mock.patch.object(SuperSearch, 'get_connection')
+    @mock.patch.object(SuperSearch, 'get_fields')
+    def test_export(self, mocked_get_fields, mocked_connection):
+        mocked_get_fields.return_value = SUPERSEARCH_FIELDS
+        es = mock.Mock()
+        es.aliases.return_value = {'socorro_200004': {'aliases': {}}}
+        es.search.return_value = {
+            '_scroll_id': 'scroll-0',
+            'hits': {'total': 3, 'hits': []},
+        }
+        batches = [
+            [
+                {'_id': '1', 'fields': {'processed_crash.signature': 'a'}},
+                {'_id': '2', 'fields': {'processed_crash.signature': 'b'}},
+            ],
+            [
+                {'_id': '3', 'fields': {'processed_crash.signature': 'c'}},
+            ],
+            [],
+        ]
+
+        def send_request(method, path, body, **kwargs):
+            if method == 'DELETE':
+                return {}
+            return {
+                '_scroll_id': 'scroll-%d' % (4 - len(batches)),
+                'hits': {'total': 3, 'hits': batches.pop(0)},
+            }
+
+        es.send_request.side_effect = send_request
+
+        class FakeS(SuperS):
+            def get_es(self, default_builder=None):
+                return es
+
+        mocked_connection.side_effect = FakeS
+        config = self.get_config_context(es_index='socorro_%Y%W')
+        api = SuperSearch(config=config)
+
+        lines, content_type = api.get_export(
+            date=['>=2000-01-24', '<2000-01-31'],
+            signature='~js',
+        )
+        eq_(content_type, 'application/x-ndjson')
+        # Nothing is read before the first line is asked for.
+        ok_(not es.search.called)
+        eq_(
+            list(lines),
+            [
+                '{"signature":"a"}\n',
+                '{"signature":"b"}\n',
+                '{"signature":"c"}\n',
+            ]
+        )
+
+        query = es.search.call_args[0][0]
+        ok_('processed_crash.signature' in query['fields'])
+        ok_('query' in query)
+        ok_('size' not in query and 'facets' not in query)
+        eq_(es.search.call_args[1]['index'], ['socorro_200004'])
+        eq_(es.search.call_args[1]['es_search_type'], 'scan')
+        eq_(
+            [x[0][:3] for x in es.send_request.call_args_list],
+            [
+                ('GET', ['_search', 'scroll'], 'scroll-0'),
+                ('GET', ['_search', 'scroll'], 'scroll-1'),
+                ('GET', ['_search', 'scroll'], 'scroll-2'),
+                ('DELETE', ['_search', 'scroll'], 'scroll-3'),
+            ]
+        )
+
+        # Bad parameters are reported before anything is streamed.
+        assert_raises(
+            BadArgumentError,
+            api.get_export,
+            date='not a date',
+        )
+
+    @mock.patch.object(SuperSearch, 'get_connection')
+    @mock.patch.object(SuperSearch, 'get_fields')
+    def test_export_missing_index(self, mocked_get_fields, mocked_connection):
+        mocked_get_fields.return_value = SUPERSEARCH_FIELDS
+        es = mock.Mock()
+        # The index was deleted after the indices were listed.
+        es.aliases.return_value = {
+            'socorro_200004': {'aliases': {}},
+            'socorro_200005': {'aliases': {}},
+        }
+        es.search.side_effect = [
+            pyelasticsearch.exceptions.ElasticHttpNotFoundError(
+                404,
+                'IndexMissingException[[socorro_200005] missing]'
+            ),
+            {'_scroll_id': 'scroll-0', 'hits': {'total': 1, 'hits': []}},
+        ]
+        batches = [
+            [{'_id': '1', 'fields': {'processed_crash.signature': 'a'}}],
+            [],
+        ]
+
+        def send_request(method, path, body, **kwargs):
+            if method == 'DELETE':
+                return {}
+            return {
+                '_scroll_id': 'scroll-1',
+                'hits': {'total': 1, 'hits': batches.pop(0)},
+            }
+
+        es.send_request.side_effect = send_request
+
+        class FakeS(SuperS):
+            def get_es(self, default_builder=None):
+                return es
+
+        mocked_connection.side_effect = FakeS
+        config = self.get_config_context(es_index='socorro_%Y%W')
+        api = SuperSearch(config=config)
+
+        lines, content_type = api.get_export(
+            date=['>=2000-01-24', '<2000-02-07'],
+        )
+        eq_(list(lines), ['{"signature":"a"}\n'])
+        eq_(es.search.call_count, 2)
+        eq_(
+            es.search.call_args_list[0][1]['index'],
+            ['socorro_200004', 'socorro_200005']
+        )
+        eq_(es.search.call_args[1]['index'], ['socorro_200004'])
+
+        # When every index is missing, nothing is exported.
+        es.search.side_effect = [
+            pyelasticsearch.exceptions.ElasticHttpNotFoundError(
+                404,
+                'IndexMissingException[[socorro_200004] missing]'
+            ),
+        ]
+        lines, content_type = api.get_export(
+            date=['>=2000-01-24', '<2000-01-31'],
+        )
+        eq_(list(lines), [])
+
 
 @attr(integration='elasticsearch')  # for nosetests
 class IntegrationTestSuperSearch(ElasticSearchTestCase):
@@ -778,9 +1075,6 @@ class IntegrationTestSuperSearch(ElasticSearchTestCase):
         config = self.get_config_context()
         self.storage = crashstorage.ElasticSearchCrashStorage(config)
 
-        # clear the indices cache so the index is created on every test
-        self.storage.indices_cache = set()
-
         # Create the supersearch fields.
         self.storage.es.bulk_index(
             index=config.webapi.elasticsearch_default_index,
@@ -1608,6 +1902,8 @@ class IntegrationTestSuperSearch(ElasticSearchTestCase):
         ok_('filter' in query)
         ok_('facets' in query)
         ok_('size' in query)
+        # The returned query is the one of the search, not of its hits.
+        ok_('fields' not in query)
 
     def test_create_field(self):
         es = self.storage.es
@@ -8,6 +8,8 @@ import os
 from configman import ConfigurationManager
 
 from socorro.external.elasticsearch import crashstorage
+from socorro.external.elasticsearch.index_registry import IndexRegistry
+from socorro.external.elasticsearch.supersearch import SuperSearchFieldsCache
 from socorro.middleware.middleware_app import MiddlewareApp
 from socorro.unittest.testbase import TestCase
 
@@ -15,6 +17,15 @@ from socorro.unittest.testbase import TestCase
 class ElasticSearchTestCase(TestCase):
     """Base class for Elastic Search related unit tests. """
 
+    def setUp(self):
+        super(ElasticSearchTestCase, self).setUp()
+        # Super Search caches its fields for the whole process, but each
+        # test creates fields of its own.
+        SuperSearchFieldsCache._caches.clear()
+        # So are the existing indices and the mapping of new indices, and
+        # each test creates indices.
+        IndexRegistry._registries.clear()
+
     def get_config_context(self, es_index=None):
         mock_logging = mock.Mock()
 
@@ -9,6 +9,7 @@ from elasticsearch.helpers import bulk
 
 from configman import ConfigurationManager
 
+from socorro.external.elasticsearch.index_registry import IndexRegistry
 from socorro.middleware.middleware_app import MiddlewareApp
 from socorro.unittest.testbase import TestCase
 
@@ -732,6 +733,12 @@ class ElasticsearchTestCase(TestCase):
                 self.connection
             )
 
+    def setUp(self):
+        super(ElasticsearchTestCase, self).setUp()
+        # The mapping of new indices is cached for the whole process, but
+        # each test indexes fields of its own.
+        IndexRegistry._registries.clear()
+
     def get_tuned_config(self, sources, extra_values=None):
         if not isinstance(sources, (list, tuple)):
             sources = [sources]
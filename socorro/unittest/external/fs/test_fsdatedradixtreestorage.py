@@ -1,11 +1,15 @@
 import os
 import shutil
+import tempfile
 from mock import Mock
 from configman import ConfigurationManager
 from nose.tools import eq_, ok_, assert_raises
 
 from socorro.external.fs.crashstorage import FSDatedRadixTreeStorage
-from socorro.external.crashstorage_base import CrashIDNotFound
+from socorro.external.crashstorage_base import (
+    CrashIDNotFound,
+    FileDumpsMapping,
+)
 from socorro.unittest.testbase import TestCase
 
 
@@ -59,6 +63,37 @@ class TestFSDatedRadixTreeStorage(TestCase):
               self.fsrts._get_date_root_name(self.CRASH_ID_1),
               self.CRASH_ID_1)))
 
+    def test_save_raw_crash_with_file_dumps(self):
+        temporary_directory = tempfile.mkdtemp()
+        try:
+            dumps = FileDumpsMapping()
+            for a_dump_name, contents in (
+                ('foo', 'bar'),
+                (self.fsrts.config.dump_field, 'baz')
+            ):
+                dumps[a_dump_name] = os.path.join(
+                    temporary_directory,
+                    a_dump_name
+                )
+                with open(dumps[a_dump_name], 'wb') as f:
+                    f.write(contents)
+            self.fsrts.save_raw_crash_with_file_dumps(
+                {"test": "TEST"},
+                dumps,
+                self.CRASH_ID_1
+            )
+            # the files of the caller are left in place
+            ok_(all(os.path.exists(x) for x in dumps.values()))
+        finally:
+            shutil.rmtree(temporary_directory)
+
+        eq_(self.fsrts.get_raw_crash(self.CRASH_ID_1)['test'], "TEST")
+        eq_(self.fsrts.get_raw_dumps(self.CRASH_ID_1), {
+            'foo': 'bar',
+            self.fsrts.config.dump_field: 'baz'
+        })
+        eq_(list(self.fsrts.new_crashes()), [self.CRASH_ID_1])
+
     def test_get_raw_crash(self):
         self._make_test_crash()
         eq_(self.fsrts.get_raw_crash(self.CRASH_ID_1)['test'],
@@ -2,6 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import threading
 import time
 
 import mock
@@ -15,7 +16,11 @@ from configman import ConfigurationManager
 from socorro.database.transaction_executor import (
     TransactionExecutorWithLimitedBackoff
 )
-from socorro.external.postgresql.crashstorage import PostgreSQLCrashStorage
+from socorro.external.postgresql.crashstorage import (
+    PostgreSQLCrashStorage,
+    PostgreSQLBatchingCrashStorage,
+    BatchWriterStopped,
+)
 from socorro.unittest.testbase import TestCase
 
 empty_tuple = ()
@@ -479,10 +484,13 @@ class TestPostgresCrashStorage(TestCase):
             m.__enter__.return_value = m
             database = crashstorage.database.return_value = m
             m.cursor.return_value.fetchall.side_effect = fetch_all_func
+            # the first save cached the plugin id that it got from the
+            # MagicMock, forget it so that the id is looked up again
+            crashstorage.plugin_id_cache.clear()
             crashstorage.save_processed(a_processed_crash)
-            eq_(m.cursor.call_count, 7)
+            eq_(m.cursor.call_count, 5)
             eq_(m.cursor().fetchall.call_count, 2)
-            eq_(m.cursor().execute.call_count, 7)
+            eq_(m.cursor().execute.call_count, 5)
 
             expected_execute_args = (
                 (('WITH update_report AS (UPDATE reports_20120402 SET addons_checked=%s, address=%s, app_notes=%s, build=%s, client_crash_date=%s, completed_datetime=%s, cpu_info=%s, cpu_name=%s, date_processed=%s, distributor=%s, distributor_version=%s, email=%s, exploitability=%s, flash_version=%s, hangid=%s, install_age=%s, last_crash=%s, os_name=%s, os_version=%s, processor_notes=%s, process_type=%s, product=%s, productid=%s, reason=%s, release_channel=%s, signature=%s, started_datetime=%s, success=%s, topmost_filenames=%s, truncated=%s, uptime=%s, user_comments=%s, user_id=%s, url=%s, uuid=%s, version=%s WHERE uuid=%s RETURNING id), insert_report AS (INSERT INTO reports_20120402(addons_checked, address, app_notes, build, client_crash_date, completed_datetime, cpu_info, cpu_name, date_processed, distributor, distributor_version, email, exploitability, flash_version, hangid, install_age, last_crash, os_name, os_version, processor_notes, process_type, product, productid, reason, release_channel, signature, started_datetime, success, topmost_filenames, truncated, uptime, user_comments, user_id, url, uuid, version)(SELECT%s as addons_checked, %s as address, %s as app_notes, %s as build, %s as client_crash_date, %s as completed_datetime, %s as cpu_info, %s as cpu_name, %s as date_processed, %s as distributor, %s as distributor_version, %s as email, %s as exploitability, %s as flash_version, %s as hangid, %s as install_age, %s as last_crash, %s as os_name, %s as os_version, %s as processor_notes, %s as process_type, %s as product, %s as productid, %s as reason, %s as release_channel, %s as signature, %s as started_datetime, %s as success, %s as topmost_filenames, %s as truncated, %s as uptime, %s as user_comments, %s as user_id, %s as url, %s as uuid, %s as version WHERE NOT EXISTS(SELECT uuid from reports_20120402 WHERE uuid=%s LIMIT 1)) RETURNING id) SELECT * from update_report UNION ALL SELECT * from insert_report',
@@ -490,14 +498,10 @@ class TestPostgresCrashStorage(TestCase):
                     None, '0x1c', '...', '20120309050057', '2012-04-08 10:52:42.0', '2012-04-08 10:56:50.902884', 'None | 0', 'arm', '2012-04-08 10:56:41.558922', None, None, 'bogus@bogus.com', 'high', '[blank]', None, 22385, None, 'Linux', '0.0.0 Linux 2.6.35.7-perf-CL727859 #1 ', 'SignatureTool: signature truncated due to length', 'plugin', 'FennecAndroid', 'FA-888888', 'SIGSEGV', 'default', 'libxul.so@0x117441c', '2012-04-08 10:56:50.440752', True, [], False, 170, None, None, 'http://embarrassing.porn.com', '936ce666-ff3b-4c7a-9674-367fe2120408', '13.0a1', '936ce666-ff3b-4c7a-9674-367fe2120408']),),
                 (('select id from plugins where filename = %s and name = %s',
                     ('dwight.txt', 'wilma')),),
-                (('delete from  plugins_reports_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
-                    (666, 23, '2012-04-08 10:56:41.558922', '69')),),
-                (('delete from  extensions_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
-                    (666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1')),),
+                (('delete from plugins_reports_20120402 where report_id = %s; insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
+                    (666, 666, 23, '2012-04-08 10:56:41.558922', '69')),),
+                (('delete from extensions_20120402 where report_id = %s; insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
+                    [666, 666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1']),),
                 (("""WITH update_processed_crash AS ( UPDATE processed_crashes_20120402 SET processed_crash = %(processed_json)s, date_processed = %(date_processed)s WHERE uuid = %(uuid)s RETURNING 1), insert_processed_crash AS ( INSERT INTO processed_crashes_20120402 (uuid, processed_crash, date_processed) ( SELECT %(uuid)s as uuid, %(processed_json)s as processed_crash, %(date_processed)s as date_processed WHERE NOT EXISTS ( SELECT uuid from processed_crashes_20120402 WHERE uuid = %(uuid)s LIMIT 1)) RETURNING 2) SELECT * from update_processed_crash UNION ALL SELECT * from insert_processed_crash """,
                     {'uuid': '936ce666-ff3b-4c7a-9674-367fe2120408', 'processed_json': '{"startedDateTime": "2012-04-08 10:56:50.440752", "crashedThread": 8, "cpu_info": "None | 0", "PluginName": "wilma", "install_age": 22385, "topmost_filenames": [], "user_comments": null, "user_id": null, "uuid": "936ce666-ff3b-4c7a-9674-367fe2120408", "flash_version": "[blank]", "os_version": "0.0.0 Linux 2.6.35.7-perf-CL727859 #1 ", "PluginVersion": "69", "addons_checked": null, "completeddatetime": "2012-04-08 10:56:50.902884", "productid": "FA-888888", "success": true, "exploitability": "high", "client_crash_date": "2012-04-08 10:52:42.0", "PluginFilename": "dwight.txt", "dump": "...", "truncated": false, "product": "FennecAndroid", "distributor": null, "processor_notes": "SignatureTool: signature truncated due to length", "uptime": 170, "release_channel": "default", "distributor_version": null, "process_type": "plugin", "id": 361399767, "hangid": null, "version": "13.0a1", "build": "20120309050057", "ReleaseChannel": "default", "email": "bogus@bogus.com", "app_notes": "...", "os_name": "Linux", "last_crash": null, "date_processed": "2012-04-08 10:56:41.558922", "cpu_name": "arm", "reason": "SIGSEGV", "address": "0x1c", "url": "http://embarrassing.porn.com", "signature": "libxul.so@0x117441c", "addons": [["{1a5dabbd-0e74-41da-b532-a364bb552cab}", "1.0.4.1"]]}', 'date_processed': '2012-04-08 10:56:41.558922'}),),
             )
@@ -547,9 +551,9 @@ class TestPostgresCrashStorage(TestCase):
             database = crashstorage.database.return_value = m
             m.cursor.return_value.fetchall.side_effect = fetch_all_func
             crashstorage.save_processed(a_processed_crash)
-            eq_(m.cursor.call_count, 8)
+            eq_(m.cursor.call_count, 6)
             eq_(m.cursor().fetchall.call_count, 3)
-            eq_(m.cursor().execute.call_count, 8)
+            eq_(m.cursor().execute.call_count, 6)
 
             expected_execute_args = (
                 (('WITH update_report AS (UPDATE reports_20120402 SET addons_checked=%s, address=%s, app_notes=%s, build=%s, client_crash_date=%s, completed_datetime=%s, cpu_info=%s, cpu_name=%s, date_processed=%s, distributor=%s, distributor_version=%s, email=%s, exploitability=%s, flash_version=%s, hangid=%s, install_age=%s, last_crash=%s, os_name=%s, os_version=%s, processor_notes=%s, process_type=%s, product=%s, productid=%s, reason=%s, release_channel=%s, signature=%s, started_datetime=%s, success=%s, topmost_filenames=%s, truncated=%s, uptime=%s, user_comments=%s, user_id=%s, url=%s, uuid=%s, version=%s WHERE uuid=%s RETURNING id), insert_report AS (INSERT INTO reports_20120402(addons_checked, address, app_notes, build, client_crash_date, completed_datetime, cpu_info, cpu_name, date_processed, distributor, distributor_version, email, exploitability, flash_version, hangid, install_age, last_crash, os_name, os_version, processor_notes, process_type, product, productid, reason, release_channel, signature, started_datetime, success, topmost_filenames, truncated, uptime, user_comments, user_id, url, uuid, version)(SELECT%s as addons_checked, %s as address, %s as app_notes, %s as build, %s as client_crash_date, %s as completed_datetime, %s as cpu_info, %s as cpu_name, %s as date_processed, %s as distributor, %s as distributor_version, %s as email, %s as exploitability, %s as flash_version, %s as hangid, %s as install_age, %s as last_crash, %s as os_name, %s as os_version, %s as processor_notes, %s as process_type, %s as product, %s as productid, %s as reason, %s as release_channel, %s as signature, %s as started_datetime, %s as success, %s as topmost_filenames, %s as truncated, %s as uptime, %s as user_comments, %s as user_id, %s as url, %s as uuid, %s as version WHERE NOT EXISTS(SELECT uuid from reports_20120402 WHERE uuid=%s LIMIT 1)) RETURNING id) SELECT * from update_report UNION ALL SELECT * from insert_report',
@@ -559,14 +563,10 @@ class TestPostgresCrashStorage(TestCase):
                     ('dwight.txt', 'wilma')),),
                 (('insert into plugins (filename, name) values (%s, %s) returning id',
                     ('dwight.txt', 'wilma')),),
-                (('delete from  plugins_reports_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
-                    (666, 23, '2012-04-08 10:56:41.558922', '69')),),
-                (('delete from  extensions_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
-                    (666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1')),),
+                (('delete from plugins_reports_20120402 where report_id = %s; insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
+                    (666, 666, 23, '2012-04-08 10:56:41.558922', '69')),),
+                (('delete from extensions_20120402 where report_id = %s; insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
+                    [666, 666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1']),),
                 (("""WITH update_processed_crash AS ( UPDATE processed_crashes_20120402 SET processed_crash = %(processed_json)s, date_processed = %(date_processed)s WHERE uuid = %(uuid)s RETURNING 1), insert_processed_crash AS ( INSERT INTO processed_crashes_20120402 (uuid, processed_crash, date_processed) ( SELECT %(uuid)s as uuid, %(processed_json)s as processed_crash, %(date_processed)s as date_processed WHERE NOT EXISTS ( SELECT uuid from processed_crashes_20120402 WHERE uuid = %(uuid)s LIMIT 1)) RETURNING 2) SELECT * from update_processed_crash UNION ALL SELECT * from insert_processed_crash """,
                     {'uuid': '936ce666-ff3b-4c7a-9674-367fe2120408', 'processed_json': '{"startedDateTime": "2012-04-08 10:56:50.440752", "crashedThread": 8, "cpu_info": "None | 0", "PluginName": "wilma", "install_age": 22385, "topmost_filenames": [], "user_comments": null, "user_id": null, "uuid": "936ce666-ff3b-4c7a-9674-367fe2120408", "flash_version": "[blank]", "os_version": "0.0.0 Linux 2.6.35.7-perf-CL727859 #1 ", "PluginVersion": "69", "addons_checked": null, "completeddatetime": "2012-04-08 10:56:50.902884", "productid": "FA-888888", "success": true, "exploitability": "high", "client_crash_date": "2012-04-08 10:52:42.0", "PluginFilename": "dwight.txt", "dump": "...", "truncated": false, "product": "FennecAndroid", "distributor": null, "processor_notes": "SignatureTool: signature truncated due to length", "uptime": 170, "release_channel": "default", "distributor_version": null, "process_type": "plugin", "id": 361399767, "hangid": null, "version": "13.0a1", "build": "20120309050057", "ReleaseChannel": "default", "email": "bogus@bogus.com", "app_notes": "...", "os_name": "Linux", "last_crash": null, "date_processed": "2012-04-08 10:56:41.558922", "cpu_name": "arm", "reason": "SIGSEGV", "address": "0x1c", "url": "http://embarrassing.porn.com", "signature": "libxul.so@0x117441c", "addons": [["{1a5dabbd-0e74-41da-b532-a364bb552cab}", "1.0.4.1"]]}', 'date_processed': '2012-04-08 10:56:41.558922'}),),
             )
@@ -711,9 +711,9 @@ class TestPostgresCrashStorage(TestCase):
             database = crashstorage.database.return_value = m
             m.cursor.side_effect = broken_connection
             crashstorage.save_processed(a_processed_crash)
-            eq_(m.cursor.call_count, 10)
+            eq_(m.cursor.call_count, 8)
             eq_(m.cursor().fetchall.call_count, 3)
-            eq_(m.cursor().execute.call_count, 8)
+            eq_(m.cursor().execute.call_count, 6)
 
             expected_execute_args = (
                 (('WITH update_report AS (UPDATE reports_20120402 SET addons_checked=%s, address=%s, app_notes=%s, build=%s, client_crash_date=%s, completed_datetime=%s, cpu_info=%s, cpu_name=%s, date_processed=%s, distributor=%s, distributor_version=%s, email=%s, exploitability=%s, flash_version=%s, hangid=%s, install_age=%s, last_crash=%s, os_name=%s, os_version=%s, processor_notes=%s, process_type=%s, product=%s, productid=%s, reason=%s, release_channel=%s, signature=%s, started_datetime=%s, success=%s, topmost_filenames=%s, truncated=%s, uptime=%s, user_comments=%s, user_id=%s, url=%s, uuid=%s, version=%s WHERE uuid=%s RETURNING id), insert_report AS (INSERT INTO reports_20120402(addons_checked, address, app_notes, build, client_crash_date, completed_datetime, cpu_info, cpu_name, date_processed, distributor, distributor_version, email, exploitability, flash_version, hangid, install_age, last_crash, os_name, os_version, processor_notes, process_type, product, productid, reason, release_channel, signature, started_datetime, success, topmost_filenames, truncated, uptime, user_comments, user_id, url, uuid, version)(SELECT%s as addons_checked, %s as address, %s as app_notes, %s as build, %s as client_crash_date, %s as completed_datetime, %s as cpu_info, %s as cpu_name, %s as date_processed, %s as distributor, %s as distributor_version, %s as email, %s as exploitability, %s as flash_version, %s as hangid, %s as install_age, %s as last_crash, %s as os_name, %s as os_version, %s as processor_notes, %s as process_type, %s as product, %s as productid, %s as reason, %s as release_channel, %s as signature, %s as started_datetime, %s as success, %s as topmost_filenames, %s as truncated, %s as uptime, %s as user_comments, %s as user_id, %s as url, %s as uuid, %s as version WHERE NOT EXISTS(SELECT uuid from reports_20120402 WHERE uuid=%s LIMIT 1)) RETURNING id) SELECT * from update_report UNION ALL SELECT * from insert_report',
@@ -723,14 +723,10 @@ class TestPostgresCrashStorage(TestCase):
                     ('dwight.txt', 'wilma')),),
                 (('insert into plugins (filename, name) values (%s, %s) returning id',
                     ('dwight.txt', 'wilma')),),
-                (('delete from  plugins_reports_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
-                    (666, 23, '2012-04-08 10:56:41.558922', '69')),),
-                (('delete from extensions_20120402 where report_id = %s',
-                    (666, )),),
-                (('insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
-                    (666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1')),),
+                (('delete from plugins_reports_20120402 where report_id = %s; insert into plugins_reports_20120402     (report_id, plugin_id, date_processed, version) values     (%s, %s, %s, %s)',
+                    (666, 666, 23, '2012-04-08 10:56:41.558922', '69')),),
+                (('delete from extensions_20120402 where report_id = %s; insert into extensions_20120402     (report_id, date_processed, extension_key, extension_id,      extension_version)values (%s, %s, %s, %s, %s)',
+                    [666, 666, '2012-04-08 10:56:41.558922', 0, '{1a5dabbd-0e74-41da-b532-a364bb552cab}', '1.0.4.1']),),
                 (("""WITH update_processed_crash AS ( UPDATE processed_crashes_20120402 SET processed_crash = %(processed_json)s, date_processed = %(date_processed)s WHERE uuid = %(uuid)s RETURNING 1), insert_processed_crash AS ( INSERT INTO processed_crashes_20120402 (uuid, processed_crash, date_processed) ( SELECT %(uuid)s as uuid, %(processed_json)s as processed_crash, %(date_processed)s as date_processed WHERE NOT EXISTS ( SELECT uuid from processed_crashes_20120402 WHERE uuid = %(uuid)s LIMIT 1)) RETURNING 2) SELECT * from update_processed_crash UNION ALL SELECT * from insert_processed_crash """,
                     {'uuid': '936ce666-ff3b-4c7a-9674-367fe2120408', 'processed_json': '{"startedDateTime": "2012-04-08 10:56:50.440752", "crashedThread": 8, "cpu_info": "None | 0", "PluginName": "wilma", "install_age": 22385, "topmost_filenames": [], "user_comments": null, "user_id": null, "uuid": "936ce666-ff3b-4c7a-9674-367fe2120408", "flash_version": "[blank]", "os_version": "0.0.0 Linux 2.6.35.7-perf-CL727859 #1 ", "PluginVersion": "69", "addons_checked": null, "completeddatetime": "2012-04-08 10:56:50.902884", "productid": "FA-888888", "success": true, "exploitability": "high", "client_crash_date": "2012-04-08 10:52:42.0", "PluginFilename": "dwight.txt", "dump": "...", "truncated": false, "product": "FennecAndroid", "distributor": null, "processor_notes": "SignatureTool: signature truncated due to length", "uptime": 170, "release_channel": "default", "distributor_version": null, "process_type": "plugin", "id": 361399767, "hangid": null, "version": "13.0a1", "build": "20120309050057", "ReleaseChannel": "default", "email": "bogus@bogus.com", "app_notes": "...", "os_name": "Linux", "last_crash": null, "date_processed": "2012-04-08 10:56:41.558922", "cpu_name": "arm", "reason": "SIGSEGV", "address": "0x1c", "url": "http://embarrassing.porn.com", "signature": "libxul.so@0x117441c", "addons": [["{1a5dabbd-0e74-41da-b532-a364bb552cab}", "1.0.4.1"]]}', 'date_processed': '2012-04-08 10:56:41.558922'}),),
             )
@@ -786,3 +782,353 @@ class TestPostgresCrashStorage(TestCase):
                     'select raw_crash from raw_crash_20120402 where uuid = %s',
                     ('936ce666-ff3b-4c7a-9674-367fe2120408',)
                 )
+
+    def _get_mocked_crashstorage(self):
+        mock_logging = mock.Mock()
+        required_config = PostgreSQLCrashStorage.get_required_config()
+        required_config.add_option('logger', default=mock_logging)
+
+        config_manager = ConfigurationManager(
+            [required_config],
+            app_name='testapp',
+            app_version='1.0',
+            app_description='app description',
+            values_source_list=[{
+                'logger': mock_logging,
+                'database_class': mock.Mock()
+            }],
+            argv_source=[]
+        )
+        with config_manager.context() as config:
+            crashstorage = PostgreSQLCrashStorage(config)
+        connection = mock.MagicMock()
+        connection.__enter__.return_value = connection
+        crashstorage.database.return_value = connection
+        return crashstorage, connection, mock_logging
+
+    def test_plugin_id_cache(self):
+        crashstorage, connection, mock_logging = \
+            self._get_mocked_crashstorage()
+        fetch_all_returns = [
+            ((666,),), ((23,),),  # the plugin is found
+            ((667,),),  # the plugin id comes from the cache
+            ((668,),), None, ((24,),),  # a new plugin is inserted
+            ((669,),), ((24,),),  # the new plugin is found
+        ]
+        connection.cursor.return_value.fetchall.side_effect = \
+            lambda: fetch_all_returns.pop(0)
+
+        def plugin_sql_and_params():
+            return [
+                (args[0], args[1])
+                for args, kwargs in
+                connection.cursor.return_value.execute.call_args_list
+                if 'plugin' in args[0]
+            ]
+
+        crashstorage.save_processed(a_processed_crash)
+        crashstorage.save_processed(a_processed_crash)
+        eq_(
+            plugin_sql_and_params()[-1][1],
+            (667, 667, 23, '2012-04-08 10:56:41.558922', '69')
+        )
+        eq_(
+            [sql for sql, params in plugin_sql_and_params()].count(
+                'select id from plugins where filename = %s and name = %s'
+            ),
+            1
+        )
+
+        a_new_plugin_crash = dict(a_processed_crash, PluginName='fred')
+        crashstorage.save_processed(a_new_plugin_crash)
+        crashstorage.save_processed(a_new_plugin_crash)
+        eq_(
+            [params for sql, params in plugin_sql_and_params()][-5:],
+            [
+                ('dwight.txt', 'fred'),
+                ('dwight.txt', 'fred'),
+                (668, 668, 24, '2012-04-08 10:56:41.558922', '69'),
+                ('dwight.txt', 'fred'),
+                (669, 669, 24, '2012-04-08 10:56:41.558922', '69'),
+            ]
+        )
+        ok_(fetch_all_returns == [])
+        eq_(crashstorage.plugin_id_cache.get(('dwight.txt', 'fred')), 24)
+
+    def test_save_extensions_in_one_statement(self):
+        crashstorage, connection, mock_logging = \
+            self._get_mocked_crashstorage()
+        processed_crash = dict(
+            a_processed_crash,
+            addons=[
+                ['addon1', '1.0'],
+                ['deficient'],
+                ['addon3', '3.0'],
+            ]
+        )
+        crashstorage._save_extensions(connection, processed_crash, 666)
+        eq_(connection.cursor.return_value.execute.call_count, 1)
+        sql, params = connection.cursor.return_value.execute.call_args[0]
+        eq_(
+            remove_whitespace(sql),
+            remove_whitespace(
+                'delete from extensions_20120402 where report_id = %s; '
+                'insert into extensions_20120402 (report_id, date_processed, '
+                'extension_key, extension_id, extension_version) '
+                'values (%s, %s, %s, %s, %s), (%s, %s, %s, %s, %s)'
+            )
+        )
+        eq_(
+            params,
+            [666,
+             666, '2012-04-08 10:56:41.558922', 0, 'addon1', '1.0',
+             666, '2012-04-08 10:56:41.558922', 2, 'addon3', '3.0']
+        )
+        ok_(mock_logging.warning.called)
+
+        # with nothing to insert, only the delete is left
+        processed_crash['addons'] = [['deficient']]
+        crashstorage._save_extensions(connection, processed_crash, 666)
+        eq_(
+            connection.cursor.return_value.execute.call_args[0],
+            ('delete from extensions_20120402 where report_id = %s', [666])
+        )
+
+
+class TestPostgreSQLBatchingCrashStorage(TestCase):
+    """the database work is replaced by a function that records which
+    crashes were saved together"""
+
+    def _get_batching_crashstorage(self, batch_max_crashes=50,
+                                   batch_max_wait=0.1):
+        mock_logging = mock.Mock()
+        required_config = PostgreSQLBatchingCrashStorage.get_required_config()
+        required_config.add_option('logger', default=mock_logging)
+
+        config_manager = ConfigurationManager(
+            [required_config],
+            app_name='testapp',
+            app_version='1.0',
+            app_description='app description',
+            values_source_list=[{
+                'logger': mock_logging,
+                'database_class': mock.Mock(),
+                'batch_max_crashes': batch_max_crashes,
+                'batch_max_wait': batch_max_wait,
+            }],
+            argv_source=[]
+        )
+        with config_manager.context() as config:
+            crashstorage = PostgreSQLBatchingCrashStorage(config)
+        self.transactions = []
+
+        def fake_transaction(function, processed_crashes):
+            crash_ids = [x['uuid'] for x in processed_crashes]
+            self.transactions.append(crash_ids)
+            for a_crash_id in crash_ids:
+                if a_crash_id.startswith('bad'):
+                    raise psycopg2.DataError(a_crash_id)
+
+        crashstorage.transaction = fake_transaction
+        return crashstorage, mock_logging
+
+    def _save_in_threads(self, crashstorage, crash_ids):
+        """save each crash from a thread of its own.  The threads first
+        save a crash each, and wait for each other, so that the storage
+        knows all of them by the time the crashes of the test are saved."""
+        results = {}
+        warmed_up = []
+        all_warmed_up = threading.Event()
+
+        def save(a_crash_id):
+            crashstorage.save_processed(
+                dict(a_processed_crash, uuid='warmup-%s' % a_crash_id)
+            )
+            warmed_up.append(a_crash_id)
+            if len(warmed_up) == len(crash_ids):
+                self.transactions[:] = []
+                self.warmed_up_at = time.time()
+                all_warmed_up.set()
+            all_warmed_up.wait(10)
+            try:
+                crashstorage.save_processed(
+                    dict(a_processed_crash, uuid=a_crash_id)
+                )
+                results[a_crash_id] = 'saved'
+            except Exception, x:
+                results[a_crash_id] = x.__class__.__name__
+
+        threads = [
+            threading.Thread(target=save, args=(x,)) for x in crash_ids
+        ]
+        for a_thread in threads:
+            a_thread.start()
+        for a_thread in threads:
+            a_thread.join(10)
+        return results
+
+    def test_one_transaction_per_partition(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage(
+            batch_max_wait=1.0
+        )
+        try:
+            crash_ids = (
+                ['%03d-week1-120408' % x for x in range(4)] +
+                ['%03d-week2-120415' % x for x in range(3)]
+            )
+            results = self._save_in_threads(crashstorage, crash_ids)
+            eq_(results, dict((x, 'saved') for x in crash_ids))
+            eq_(len(self.transactions), 2)
+            eq_(
+                sorted(sorted(x) for x in self.transactions),
+                [sorted(crash_ids[:4]), sorted(crash_ids[4:])]
+            )
+        finally:
+            crashstorage.close()
+
+    def test_batch_max_crashes(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage(
+            batch_max_crashes=2,
+            batch_max_wait=1.0
+        )
+        try:
+            crash_ids = ['%03d-120408' % x for x in range(5)]
+            results = self._save_in_threads(crashstorage, crash_ids)
+            eq_(results, dict((x, 'saved') for x in crash_ids))
+            ok_(all(len(x) <= 2 for x in self.transactions))
+            eq_(
+                sorted(sum(self.transactions, [])),
+                sorted(crash_ids)
+            )
+        finally:
+            crashstorage.close()
+
+    def test_batch_closed_when_every_thread_is_waiting(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage(
+            batch_max_wait=3.0
+        )
+        try:
+            crash_ids = ['%03d-120408' % x for x in range(4)]
+            results = self._save_in_threads(crashstorage, crash_ids)
+            eq_(results, dict((x, 'saved') for x in crash_ids))
+            eq_([sorted(x) for x in self.transactions], [sorted(crash_ids)])
+            # the batch did not wait for more crashes than there are threads
+            ok_(time.time() - self.warmed_up_at < 2.0)
+        finally:
+            crashstorage.close()
+
+    def test_single_thread_does_not_wait(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage(
+            batch_max_wait=5.0
+        )
+        try:
+            started_at = time.time()
+            for x in range(3):
+                crashstorage.save_processed(
+                    dict(a_processed_crash, uuid='%03d-120408' % x)
+                )
+            ok_(time.time() - started_at < 4.0)
+            eq_(
+                self.transactions,
+                [['%03d-120408' % x] for x in range(3)]
+            )
+        finally:
+            crashstorage.close()
+
+    def test_save_waits_for_commit(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage()
+        committed = threading.Event()
+        in_transaction = threading.Event()
+
+        def slow_transaction(function, processed_crashes):
+            in_transaction.set()
+            committed.wait(10)
+
+        crashstorage.transaction = slow_transaction
+        try:
+            saver = threading.Thread(
+                target=crashstorage.save_processed,
+                args=(a_processed_crash,)
+            )
+            saver.start()
+            ok_(in_transaction.wait(10))
+            saver.join(0.2)
+            ok_(saver.is_alive())
+            committed.set()
+            saver.join(10)
+            ok_(not saver.is_alive())
+        finally:
+            committed.set()
+            crashstorage.close()
+
+    def test_failed_crash_split_from_batch(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage(
+            batch_max_wait=1.0
+        )
+        try:
+            crash_ids = ['%03d-120408' % x for x in range(5)]
+            crash_ids.insert(2, 'bad-120408')
+            results = self._save_in_threads(crashstorage, crash_ids)
+            expected = dict((x, 'saved') for x in crash_ids)
+            expected['bad-120408'] = 'DataError'
+            eq_(results, expected)
+            # the bad crash was eventually tried by itself
+            ok_(['bad-120408'] in self.transactions)
+            ok_(mock_logging.warning.called)
+        finally:
+            crashstorage.close()
+
+    def test_bad_crash_id(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage()
+        try:
+            assert_raises(
+                KeyError,
+                crashstorage.save_processed,
+                {}
+            )
+        finally:
+            crashstorage.close()
+
+    def test_save_with_dead_writer(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage()
+        # the writer thread is gone, but the storage was not closed
+        crashstorage._writer_stop.set()
+        crashstorage._writer.join()
+        crashstorage._writer_stop.clear()
+        assert_raises(
+            BatchWriterStopped,
+            crashstorage.save_processed,
+            a_processed_crash
+        )
+        eq_(self.transactions, [])
+
+    def test_quit_check_while_waiting(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage()
+        committed = threading.Event()
+
+        def slow_transaction(function, processed_crashes):
+            committed.wait(10)
+
+        crashstorage.transaction = slow_transaction
+        crashstorage.quit_check = mock.Mock(side_effect=KeyboardInterrupt)
+        try:
+            assert_raises(
+                KeyboardInterrupt,
+                crashstorage.save_processed,
+                a_processed_crash
+            )
+            eq_(crashstorage.quit_check.call_count, 1)
+        finally:
+            committed.set()
+            crashstorage.close()
+
+    def test_close(self):
+        crashstorage, mock_logging = self._get_batching_crashstorage()
+        crashstorage.save_processed(a_processed_crash)
+        crashstorage.close()
+        ok_(not crashstorage._writer.is_alive())
+        eq_(self.transactions, [[a_processed_crash['uuid']]])
+        # once closed, crashes are saved directly
+        crashstorage.transaction = mock.Mock()
+        crashstorage.save_processed(a_processed_crash)
+        eq_(crashstorage.transaction.call_count, 1)
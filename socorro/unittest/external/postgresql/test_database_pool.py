@@ -0,0 +1,58 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nose.tools import eq_, ok_
+
+import socorro.database.database as db
+from socorro.external.postgresql.database_pool import DatabasePool
+from socorro.lib import util
+from socorro.unittest.testbase import TestCase
+
+
+#==============================================================================
+class TestDatabasePool(TestCase):
+    """Test the DatabasePool service. """
+
+    #--------------------------------------------------------------------------
+    def get_dummy_context(self, **pool_options):
+        context = util.DotDict()
+        context.database = util.DotDict({
+            'database_hostname': 'somewhere',
+            'database_port': '8888',
+            'database_name': 'test_database_pool',
+            'database_username': 'someuser',
+            'database_password': 'somepasswd',
+        })
+        context.database.update(pool_options)
+        return context
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+        db._pooledDatabases.clear()
+        super(TestDatabasePool, self).tearDown()
+
+    #--------------------------------------------------------------------------
+    def test_services_share_a_pool(self):
+        context = self.get_dummy_context(database_pool_size=5)
+        first = DatabasePool(config=context)
+        second = DatabasePool(config=context)
+        ok_(isinstance(first.database, db.PooledDatabase))
+        ok_(first.database is second.database)
+
+        # without a pool size, connections are not pooled
+        unpooled = DatabasePool(config=self.get_dummy_context())
+        ok_(not isinstance(unpooled.database, db.PooledDatabase))
+
+    #--------------------------------------------------------------------------
+    def test_get(self):
+        service = DatabasePool(
+            config=self.get_dummy_context(database_pool_size=5)
+        )
+        res = service.get()
+        eq_(res['total'], 1)
+        pool = res['hits'][0]
+        eq_(pool['database'], 'somewhere:8888/test_database_pool as someuser')
+        eq_(pool['maximum_size'], 5)
+        eq_(pool['size'], 0)
+        eq_(pool['waits'], 0)
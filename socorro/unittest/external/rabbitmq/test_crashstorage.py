@@ -1,15 +1,44 @@
+from collections import OrderedDict
+
 from mock import Mock, MagicMock
 
 from nose.tools import eq_, ok_
 
 from socorro.external.rabbitmq.crashstorage import (
     RabbitMQCrashStorage,
+    weighted_schedule,
+    weights_from_string,
 )
 from socorro.lib.util import DotDict
 from socorro.external.crashstorage_base import Redactor
 from socorro.unittest.testbase import TestCase
 
 
+def method_frame(delivery_tag):
+    a_method_frame = DotDict()
+    a_method_frame.delivery_tag = delivery_tag
+    return a_method_frame
+
+
+class TestWeightedSchedule(TestCase):
+
+    def test_weights_from_string(self):
+        eq_(
+            weights_from_string('priority: 4, standard: 2, reprocessing: 1'),
+            [('priority', 4), ('standard', 2), ('reprocessing', 1)]
+        )
+
+    def test_weighted_schedule(self):
+        eq_(weighted_schedule([('a', 3), ('b', 1)]), ['a', 'a', 'b', 'a'])
+        eq_(weighted_schedule([('a', 1), ('b', 1)]), ['a', 'b'])
+        schedule = weighted_schedule(
+            [('priority', 4), ('standard', 2), ('reprocessing', 1)]
+        )
+        eq_(schedule.count('priority'), 4)
+        eq_(schedule.count('standard'), 2)
+        eq_(schedule.count('reprocessing'), 1)
+
+
 class TestCrashStorage(TestCase):
 
     def _setup_config(self):
@@ -140,16 +169,85 @@ class TestCrashStorage(TestCase):
             properties=crash_store._basic_properties
         )
 
-    def test_transaction_ack_crash(self):
+    def test_transaction_ack_crashes(self):
         config = self._setup_config()
         connection = Mock()
-        ack_token = DotDict()
-        ack_token.delivery_tag = 1
+        crash_store = RabbitMQCrashStorage(config)
+        crash_store.delivery_channel = connection.channel
+        crash_store.unacknowledged_delivery_tags = OrderedDict(
+            (x, None) for x in [1, 2, 3, 4, 5, 7]
+        )
 
+        # the oldest tags are acknowledged together, the rest one by one
+        crash_store._transaction_ack_crashes(connection, [3, 1, 2, 5, 7])
+        eq_(
+            connection.channel.basic_ack.call_args_list,
+            [
+                ((), {'delivery_tag': 3, 'multiple': True}),
+                ((), {'delivery_tag': 5}),
+                ((), {'delivery_tag': 7}),
+            ]
+        )
+        eq_(list(crash_store.unacknowledged_delivery_tags), [4])
+
+        connection.reset_mock()
+        crash_store._transaction_ack_crashes(connection, [4])
+        connection.channel.basic_ack.assert_called_once_with(delivery_tag=4)
+        eq_(list(crash_store.unacknowledged_delivery_tags), [])
+
+    def test_tags_of_another_channel_are_dropped(self):
+        config = self._setup_config()
         crash_store = RabbitMQCrashStorage(config)
-        crash_store._transaction_ack_crash(connection, ack_token)
+        old_connection = Mock()
+        crash_store.delivery_channel = old_connection.channel
+        crash_store.unacknowledged_delivery_tags = OrderedDict(
+            (x, None) for x in [1, 2, 3]
+        )
+
+        # the channel was re-created, its numbering starts over
+        connection = Mock()
+        crash_store._transaction_ack_crashes(connection, [1, 2])
+        eq_(
+            connection.channel.basic_ack.call_args_list,
+            [
+                ((), {'delivery_tag': 1}),
+                ((), {'delivery_tag': 2}),
+            ]
+        )
+        eq_(list(crash_store.unacknowledged_delivery_tags), [])
+        ok_(crash_store.delivery_channel is connection.channel)
+
+    def test_consume_acknowledgement_queue(self):
+        config = self._setup_config()
+        crash_store = RabbitMQCrashStorage(config)
+        crash_store._remember_delivery('a1', method_frame(1))
+        crash_store._remember_delivery('b2', method_frame(2))
+        # the same crash from two queues
+        crash_store._remember_delivery('a1', method_frame(3))
+        crash_store.ack_crash('a1')
+        crash_store.ack_crash('b2')
+        crash_store._consume_acknowledgement_queue()
+        crash_store.transaction.assert_called_once_with(
+            crash_store._transaction_ack_crashes,
+            [1, 3, 2]
+        )
+        eq_(len(crash_store.acknowledgement_token_cache), 0)
+
+        # nothing to acknowledge, nothing sent
+        crash_store.transaction.reset_mock()
+        crash_store._consume_acknowledgement_queue()
+        ok_(not crash_store.transaction.called)
 
-        connection.channel.basic_ack.assert_called_once_with(delivery_tag=1)
+    def test_acknowledgement_token_cache_is_bounded(self):
+        config = self._setup_config()
+        config.acknowledgement_token_cache_size = 2
+        crash_store = RabbitMQCrashStorage(config)
+        for i in range(5):
+            crash_store._remember_delivery('crash%d' % i, method_frame(i))
+        eq_(len(crash_store.acknowledgement_token_cache), 2)
+        ok_('crash4' in crash_store.acknowledgement_token_cache)
+        # the tags of forgotten crashes do not hold back 'multiple' acks
+        eq_(list(crash_store.unacknowledged_delivery_tags), [3, 4])
 
     def test_transaction_ack_crash_fails_gracefully(self):
         config = self._setup_config()
@@ -180,7 +278,7 @@ class TestCrashStorage(TestCase):
         config = self._setup_config()
         crash_store = RabbitMQCrashStorage(config)
 
-        iterable = (('1', '1', 'crash_id'),)
+        iterable = ((method_frame(1), '1', 'crash_id'),)
         crash_store.rabbitmq.connection.return_value.channel.basic_get = \
             MagicMock(side_effect=iterable)
 
@@ -199,7 +297,7 @@ class TestCrashStorage(TestCase):
         crash_store.rabbitmq.config.priority_queue_name = 'socorro.priority'
 
         test_queue = [
-            ('1', '1', 'normal_crash_id'),
+            (method_frame(1), '1', 'normal_crash_id'),
             (None, None, None),
             (None, None, None),
         ]
@@ -233,9 +331,9 @@ class TestCrashStorage(TestCase):
 
         test_queue = [
             (None, None, None),
-            ('1', '1', 'normal_crash_id'),
+            (method_frame(1), '1', 'normal_crash_id'),
             (None, None, None),
-            ('1', '1', 'reprocessing_crash_id'),
+            (method_frame(2), '1', 'reprocessing_crash_id'),
             (None, None, None),
         ]
 
@@ -255,3 +353,120 @@ class TestCrashStorage(TestCase):
         expected = ['normal_crash_id', 'reprocessing_crash_id']
         for result in crash_store.new_crashes():
             eq_(expected.pop(), result)
+
+    def test_new_crashes_by_consuming(self):
+        config = self._setup_config()
+        config.use_basic_consume = True
+        config.prefetch_count = 10
+        config.queue_weights = [
+            ('priority', 2),
+            ('standard', 1),
+            ('reprocessing', 1)
+        ]
+        crash_store = RabbitMQCrashStorage(config)
+        crash_store.rabbitmq.config.standard_queue_name = 'socorro.normal'
+        crash_store.rabbitmq.config.reprocessing_queue_name = \
+            'socorro.reprocessing'
+        crash_store.rabbitmq.config.priority_queue_name = 'socorro.priority'
+        crash_store.quit_check = Mock()
+        channel = crash_store.rabbitmq.connection.return_value.channel
+        callbacks = {}
+
+        def basic_consume(consumer_callback, queue):
+            callbacks[queue] = consumer_callback
+            return 'ctag-%s' % queue
+
+        channel.basic_consume.side_effect = basic_consume
+        delivery_tags = iter(range(1, 100))
+
+        def deliver(queue, count):
+            for i in range(count):
+                callbacks[queue](
+                    channel,
+                    method_frame(next(delivery_tags)),
+                    None,
+                    '%s-%d' % (queue.split('.')[1], i)
+                )
+
+        process_data_events = \
+            crash_store.rabbitmq.connection.return_value.connection \
+            .process_data_events
+
+        def first_delivery():
+            deliver('socorro.normal', 3)
+            deliver('socorro.priority', 4)
+            deliver('socorro.reprocessing', 1)
+            process_data_events.side_effect = second_wait
+
+        def second_wait():
+            # the queues are empty, the generator keeps waiting
+            process_data_events.side_effect = KeyboardInterrupt
+
+        process_data_events.side_effect = first_delivery
+
+        results = []
+        try:
+            for crash_id in crash_store.new_crashes():
+                results.append(crash_id)
+                crash_store.ack_crash(crash_id)
+        except KeyboardInterrupt:
+            pass
+
+        channel.basic_qos.assert_called_once_with(prefetch_count=10)
+        eq_(
+            results,
+            [
+                'priority-0', 'normal-0', 'reprocessing-0', 'priority-1',
+                'priority-2', 'normal-1', 'priority-3', 'normal-2',
+            ]
+        )
+        # the acknowledgements were sent while waiting for more crashes
+        eq_(crash_store.transaction.call_count, len(results))
+        eq_(
+            sorted(
+                args[0][1][0] for args in crash_store.transaction.call_args_list
+            ),
+            range(1, 9)
+        )
+        eq_(
+            sorted(x[0][0] for x in channel.basic_cancel.call_args_list),
+            ['ctag-socorro.normal', 'ctag-socorro.priority',
+             'ctag-socorro.reprocessing']
+        )
+        eq_(crash_store.quit_check.call_count, 3)
+        eq_(list(crash_store.unacknowledged_delivery_tags), range(1, 9))
+
+    def test_buffered_crashes_are_requeued(self):
+        config = self._setup_config()
+        config.use_basic_consume = True
+        config.prefetch_count = 10
+        config.queue_weights = [('priority', 1), ('standard', 1)]
+        crash_store = RabbitMQCrashStorage(config)
+        crash_store.quit_check = Mock()
+        channel = crash_store.rabbitmq.connection.return_value.channel
+        callbacks = []
+
+        def basic_consume(consumer_callback, queue):
+            callbacks.append(consumer_callback)
+            return 'ctag-%d' % len(callbacks)
+
+        channel.basic_consume.side_effect = basic_consume
+
+        def deliver():
+            for i in range(1, 4):
+                callbacks[0](channel, method_frame(i), None, 'crash%d' % i)
+
+        crash_store.rabbitmq.connection.return_value.connection \
+            .process_data_events.side_effect = deliver
+
+        crashes = crash_store.new_crashes()
+        eq_(next(crashes), 'crash1')
+        crashes.close()
+        eq_(
+            channel.basic_reject.call_args_list,
+            [
+                ((), {'delivery_tag': 2, 'requeue': True}),
+                ((), {'delivery_tag': 3, 'requeue': True}),
+            ]
+        )
+        eq_(list(crash_store.unacknowledged_delivery_tags), [1])
@@ -2,11 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+
 import mock
 from nose.tools import eq_, ok_, assert_raises
 
 from socorro.external.crashstorage_base import (
     CrashStorageBase,
+    FileDumpsMapping,
     PolyStorageError,
     PolyCrashStorage,
     FallbackCrashStorage,
@@ -92,6 +99,52 @@ class TestBase(TestCase):
             eq_(crashstorage.new_crashes(), [])
             crashstorage.close()
 
+    def test_save_raw_crash_with_file_dumps(self):
+        temporary_directory = tempfile.mkdtemp()
+        try:
+            dumps = FileDumpsMapping()
+            for a_dump_name in ('upload_file_minidump', 'flash1'):
+                dumps[a_dump_name] = os.path.join(
+                    temporary_directory,
+                    a_dump_name
+                )
+                with open(dumps[a_dump_name], 'wb') as f:
+                    f.write('%s contents' % a_dump_name)
+            eq_(
+                dumps.as_memory_dumps_mapping(),
+                {
+                    'upload_file_minidump': 'upload_file_minidump contents',
+                    'flash1': 'flash1 contents',
+                }
+            )
+
+            # by default, the dumps are read into memory for save_raw_crash
+            config = DotDict()
+            config.logger = Mock()
+            config.redactor_class = Mock()
+            crashstorage = CrashStorageBase(config)
+            crashstorage.save_raw_crash = Mock()
+            crashstorage.save_raw_crash_with_file_dumps({}, dumps, 'ooid')
+            crashstorage.save_raw_crash.assert_called_once_with(
+                {},
+                dumps.as_memory_dumps_mapping(),
+                'ooid'
+            )
+
+            # the poly store lets each of its stores deal with the files
+            poly_store = self._get_poly_store()
+            for v in poly_store.stores.itervalues():
+                v.save_raw_crash_with_file_dumps = Mock()
+            poly_store.save_raw_crash_with_file_dumps({}, dumps, 'ooid')
+            for v in poly_store.stores.itervalues():
+                v.save_raw_crash_with_file_dumps.assert_called_once_with(
+                    {},
+                    dumps,
+                    'ooid'
+                )
+        finally:
+            shutil.rmtree(temporary_directory)
+
     def test_polyerror(self):
         p = PolyStorageError('hell')
         try:
@@ -215,6 +268,185 @@ class TestBase(TestCase):
             for v in poly_store.stores.itervalues():
                 v.close.assert_called_with()
 
+    def _get_poly_store(self, **extra_values):
+        n = Namespace()
+        n.add_option(
+          'storage',
+          default=PolyCrashStorage,
+        )
+        n.add_option(
+          'logger',
+          default=mock.Mock(),
+        )
+        value = {'storage_classes':
+                    'socorro.unittest.external.test_crashstorage_base.A,'
+                    'socorro.unittest.external.test_crashstorage_base.B',
+                }
+        value.update(extra_values)
+        cm = ConfigurationManager(n, values_source_list=[value])
+        with cm.context() as config:
+            return config.storage(config)
+
+    def test_poly_crash_storage_concurrent_saves(self):
+        poly_store = self._get_poly_store(
+            concurrent_saves=True,
+            number_of_threads_per_store=2
+        )
+        try:
+            eq_(sorted(poly_store.executors), ['storage0', 'storage1'])
+            # each save waits until the other store is saving, too
+            saving_threads = []
+            both_saving = threading.Event()
+            overlapped = []
+
+            def save_processed(processed_crash):
+                saving_threads.append(threading.current_thread().name)
+                if len(saving_threads) == 2:
+                    both_saving.set()
+                overlapped.append(both_saving.wait(5))
+
+            for v in poly_store.stores.itervalues():
+                v.save_processed = Mock(side_effect=save_processed)
+            processed_crash = {'ooid': 'aoeu'}
+            poly_store.save_processed(processed_crash)
+            for v in poly_store.stores.itervalues():
+                v.save_processed.assert_called_once_with(processed_crash)
+            eq_(overlapped, [True, True])
+            eq_(
+                sorted(x.rsplit('-', 1)[0] for x in saving_threads),
+                ['PolyCrashStorage-storage0', 'PolyCrashStorage-storage1']
+            )
+
+            # the failures of all the stores are gathered
+            for v in poly_store.stores.itervalues():
+                v.save_raw_crash = Mock(side_effect=Exception('broken'))
+            try:
+                poly_store.save_raw_crash({}, {}, 'aoeu')
+                raise AssertionError('PolyStorageError expected')
+            except PolyStorageError, x:
+                eq_(len(x), 2)
+                eq_([str(y[1]) for y in x], ['broken', 'broken'])
+            for v in poly_store.stores.itervalues():
+                v.save_raw_crash.assert_called_once_with({}, {}, 'aoeu')
+
+            # a quit check raising in a store stops everything
+            poly_store.stores.storage1.save_raw_and_processed = Mock(
+                side_effect=KeyboardInterrupt
+            )
+            poly_store.stores.storage0.save_raw_and_processed = Mock()
+            assert_raises(
+                KeyboardInterrupt,
+                poly_store.save_raw_and_processed,
+                {}, {}, processed_crash, 'aoeu'
+            )
+        finally:
+            poly_store.close()
+        ok_(not any(
+            t.is_alive()
+            for e in poly_store.executors.itervalues()
+            for t in e.threads
+        ))
+
+    def test_poly_crash_storage_concurrent_saves_copies(self):
+        poly_store = self._get_poly_store(concurrent_saves=True)
+        mutated = threading.Event()
+        seen = []
+
+        def mutating_save(raw_crash, dumps, processed_crash, crash_id):
+            # like the boto store, turns the dates into strings in place
+            processed_crash['date_processed'] = str(
+                processed_crash['date_processed']
+            )
+            processed_crash['json_dump']['added'] = True
+            raw_crash['added'] = True
+            mutated.set()
+
+        def reading_save(raw_crash, dumps, processed_crash, crash_id):
+            ok_(mutated.wait(5))
+            seen.append((
+                processed_crash['date_processed'],
+                dict(processed_crash['json_dump']),
+                dict(raw_crash),
+            ))
+
+        poly_store.stores.storage0.save_raw_and_processed = Mock(
+            side_effect=mutating_save
+        )
+        poly_store.stores.storage1.save_raw_and_processed = Mock(
+            side_effect=reading_save
+        )
+        date_processed = datetime.datetime(2015, 1, 1)
+        raw_crash = DotDict({'ProductName': 'Firefox'})
+        processed_crash = {
+            'date_processed': date_processed,
+            'json_dump': {'threads': []},
+        }
+        try:
+            poly_store.save_raw_and_processed(
+                raw_crash,
+                {},
+                processed_crash,
+                'aoeu'
+            )
+        finally:
+            poly_store.close()
+        eq_(
+            seen,
+            [(date_processed, {'threads': []}, {'ProductName': 'Firefox'})]
+        )
+        # the first store was given a copy of its own
+        eq_(processed_crash['date_processed'], date_processed)
+        ok_('added' not in processed_crash['json_dump'])
+        (copied_raw_crash, dumps, copied_processed_crash, crash_id), kw = \
+            poly_store.stores.storage0.save_raw_and_processed.call_args
+        ok_(isinstance(copied_raw_crash, DotDict))
+        ok_(copied_processed_crash is not processed_crash)
+
+    def test_poly_crash_storage_quit_check(self):
+        poly_store = self._get_poly_store(concurrent_saves=True)
+        poly_store.quit_check = Mock(side_effect=KeyboardInterrupt)
+        for v in poly_store.stores.itervalues():
+            v.save_processed = Mock()
+        try:
+            assert_raises(
+                KeyboardInterrupt,
+                poly_store.save_processed,
+                {}
+            )
+            for v in poly_store.stores.itervalues():
+                ok_(not v.save_processed.called)
+        finally:
+            poly_store.close()
+
+    def test_poly_crash_storage_latencies(self):
+        poly_store = self._get_poly_store(latency_log_interval=0)
+        times = iter([10.0, 10.5, 20.0, 20.1, 30.0, 31.5, 40.0, 40.1])
+        with mock.patch(
+            'socorro.external.crashstorage_base.time.time',
+            side_effect=lambda: next(times)
+        ):
+            for v in poly_store.stores.itervalues():
+                v.save_processed = Mock()
+            poly_store.save_processed({})
+            poly_store.save_processed({})
+        eq_(
+            [
+                (x['namespace'], x['store'], x['count'],
+                 round(x['average'], 2), round(x['maximum'], 2))
+                for x in poly_store.latency_statistics()
+            ],
+            [
+                ('storage0', 'A', 2, 1.0, 1.5),
+                ('storage1', 'B', 2, 0.1, 0.1),
+            ]
+        )
+        poly_store.close()
+        poly_store.logger.info.assert_any_call(
+            '%(namespace)s (%(store)s): %(count)d saves, '
+            'average %(average).3fs, maximum %(maximum).3fs',
+            poly_store.latency_statistics()[0]
+        )
+
     def test_fallback_crash_storage(self):
         n = Namespace()
         n.add_option(
@@ -0,0 +1,47 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from socorro.lib.context_tools import memory_file_context
+from socorro.unittest.testbase import TestCase
+
+
+class TestMemoryFileContext(TestCase):
+
+    def setUp(self):
+        super(TestMemoryFileContext, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestMemoryFileContext, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def test_another_process_can_read_the_contents(self):
+        contents = 'MDMP' + '\x00\xff' * 100000
+        with memory_file_context(contents, self.directory) as pathname:
+            read = subprocess.check_output([
+                sys.executable,
+                '-c',
+                'import sys; sys.stdout.write(open(sys.argv[1], "rb").read())',
+                pathname
+            ])
+            eq_(read, contents)
+        eq_(os.listdir(self.directory), [])
+
+    def test_nothing_is_left_behind(self):
+        try:
+            with memory_file_context('contents', self.directory) as pathname:
+                ok_(os.path.exists(pathname))
+                raise KeyError('the processing failed')
+        except KeyError:
+            pass
+        eq_(os.listdir(self.directory), [])
+        ok_(not os.path.exists(pathname))
@@ -0,0 +1,78 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from nose.tools import eq_, ok_
+
+from socorro.lib.lru_cache import LRUCache
+from socorro.unittest.testbase import TestCase
+
+
+class TestLRUCache(TestCase):
+
+    def test_get_and_put(self):
+        cache = LRUCache(3)
+        eq_(cache.get('a'), None)
+        eq_(cache.get('a', 17), 17)
+        cache.put('a', 1)
+        eq_(cache.get('a'), 1)
+        eq_(cache.hits, 1)
+        eq_(cache.misses, 2)
+        ok_('a' in cache)
+        eq_(len(cache), 1)
+
+    def test_least_recently_used_goes_first(self):
+        cache = LRUCache(3)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        # reading 'a' makes 'b' the least recently used
+        cache.get('a')
+        cache.put('d', 4)
+        ok_('b' not in cache)
+        ok_('a' in cache)
+        eq_(len(cache), 3)
+        # rewriting 'c' makes 'a' the least recently used
+        cache.put('c', 33)
+        cache.put('e', 5)
+        ok_('a' not in cache)
+        eq_(cache.get('c'), 33)
+
+    def test_on_evict(self):
+        evicted = []
+        cache = LRUCache(2, on_evict=lambda k, v: evicted.append((k, v)))
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.pop('b')
+        cache.put('c', 3)
+        eq_(evicted, [])
+        cache.put('d', 4)
+        eq_(evicted, [('a', 1)])
+
+    def test_zero_size(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        eq_(len(cache), 0)
+        eq_(cache.get('a'), None)
+
+    def test_pop_clear_and_stats(self):
+        cache = LRUCache(10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        eq_(cache.pop('a'), 1)
+        eq_(cache.pop('a', 'gone'), 'gone')
+        cache.get('b')
+        cache.get('a')
+        eq_(
+            cache.stats(),
+            {
+                'size': 1,
+                'maximum_size': 10,
+                'hits': 1,
+                'misses': 1,
+                'hit_ratio': 0.5,
+            }
+        )
+        cache.clear()
+        eq_(len(cache), 0)
+        eq_(cache.hits, 1)
@@ -0,0 +1,299 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import os
+import multiprocessing
+import signal
+import time
+import Queue
+
+from nose.tools import eq_, ok_
+
+from socorro.lib.process_pool_task_manager import ProcessPoolTaskManager
+from socorro.lib.task_manager import default_task_func
+from socorro.lib.util import DotDict, SilentFakeLogger
+from socorro.unittest.testbase import TestCase
+
+
+#------------------------------------------------------------------------------
+def drain(a_queue):
+    """read everything from a multiprocessing queue that the worker processes
+    wrote into it"""
+    results = []
+    while True:
+        try:
+            results.append(a_queue.get(True, 1.0))
+        except Queue.Empty:
+            return results
+
+
+class TestProcessPoolTaskManager(TestCase):
+
+    def setUp(self):
+        super(TestProcessPoolTaskManager, self).setUp()
+        self.logger = SilentFakeLogger()
+
+    def _get_config(self, number_of_processes=1, maximum_queue_size=1):
+        config = DotDict()
+        config.logger = self.logger
+        config.idle_delay = 1
+        config.number_of_processes = number_of_processes
+        config.maximum_queue_size = maximum_queue_size
+        config.worker_stop_timeout = 1
+        return config
+
+    def test_constuctor1(self):
+        config = self._get_config()
+        pptm = ProcessPoolTaskManager(config)
+        ok_(pptm.config == config)
+        ok_(pptm.logger == self.logger)
+        ok_(pptm.task_func == default_task_func)
+        ok_(pptm.quit == False)
+        ok_(pptm.worker_setup_func is None)
+        ok_(pptm.worker_cleanup_func is None)
+        eq_(pptm.process_list, [])
+
+    def test_doing_work_with_two_workers(self):
+        config = self._get_config(2, 2)
+        results = multiprocessing.Queue()
+
+        def insert_into_queue(an_item):
+            results.put((an_item, os.getpid()))
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=insert_into_queue,
+            job_source_iterator=(((x,), {}) for x in xrange(10))
+        )
+        pptm.blocking_start()
+        eq_(len(pptm.process_list), 2)
+        ok_(not any(p.is_alive() for p in pptm.process_list))
+        done = drain(results)
+        eq_(sorted(x for x, pid in done), range(10))
+        ok_(all(pid != os.getpid() for x, pid in done))
+
+    def test_callables_are_called_in_parent(self):
+        config = self._get_config(2, 2)
+        finished = []
+
+        def a_task(an_item, finished_func, multiplier=1):
+            if an_item != 3:
+                finished_func()
+
+        def job_iter():
+            for x in xrange(6):
+                yield (
+                    (x,),
+                    {
+                        'finished_func': lambda x=x: finished.append(x),
+                        'multiplier': 2,
+                    }
+                )
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=a_task,
+            job_source_iterator=job_iter
+        )
+        pptm.blocking_start()
+        eq_(sorted(finished), [0, 1, 2, 4, 5])
+        eq_(pptm.pending_callbacks, {})
+
+    def test_worker_setup_func(self):
+        config = self._get_config(2, 2)
+        setups = multiprocessing.Queue()
+
+        def setup():
+            setups.put(os.getpid())
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            job_source_iterator=(((x,), {}) for x in xrange(4)),
+            worker_setup_func=setup
+        )
+        pptm.blocking_start()
+        worker_pids = drain(setups)
+        eq_(
+            sorted(worker_pids),
+            sorted(p.pid for p in pptm.process_list)
+        )
+
+    def test_worker_cleanup_func(self):
+        config = self._get_config(2, 2)
+        events = multiprocessing.Queue()
+
+        def a_task(an_item):
+            events.put(('job', os.getpid()))
+
+        def cleanup():
+            events.put(('cleanup', os.getpid()))
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=a_task,
+            job_source_iterator=(((x,), {}) for x in xrange(4)),
+            worker_cleanup_func=cleanup
+        )
+        pptm.blocking_start()
+        done = drain(events)
+        cleanups = [pid for event, pid in done if event == 'cleanup']
+        eq_(sorted(cleanups), sorted(p.pid for p in pptm.process_list))
+        # each worker cleans up after its last job
+        for a_pid in cleanups:
+            events_of_worker = [x for x, pid in done if pid == a_pid]
+            eq_(events_of_worker[-1], 'cleanup')
+            eq_(events_of_worker.count('cleanup'), 1)
+
+    def test_task_raises_unexpected_exception(self):
+        config = self._get_config()
+        results = multiprocessing.Queue()
+
+        def insert_into_queue(an_item):
+            if an_item == 3:
+                raise Exception('Unexpected')
+            results.put(an_item)
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=insert_into_queue,
+            job_source_iterator=((x,) for x in xrange(10))
+        )
+        pptm.blocking_start()
+        eq_(sorted(drain(results)), [0, 1, 2, 4, 5, 6, 7, 8, 9])
+
+    def test_quit_event_stops_everything(self):
+        config = self._get_config()
+        results = multiprocessing.Queue()
+
+        def a_task(an_item):
+            try:
+                pptm.quit_check()
+                results.put('running')
+            except KeyboardInterrupt:
+                results.put('quit')
+                raise
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=a_task,
+            job_source_iterator=((x,) for x in xrange(1))
+        )
+        pptm.quit_event.set()
+        pptm.start()
+        pptm.wait_for_completion()
+        eq_(drain(results), [])
+
+    def test_replace_dead_workers(self):
+        config = self._get_config(2, 2)
+        pptm = ProcessPoolTaskManager(config)
+        pptm.process_list = [
+            DotDict({'is_alive': lambda: True}),
+            DotDict({
+                'is_alive': lambda: False,
+                'name': 'WorkerProcess-1',
+                'exitcode': -11,
+            }),
+        ]
+        started = []
+        pptm._start_worker_process = started.append
+        pptm._replace_dead_workers()
+        eq_(started, [1])
+
+    def test_dead_worker_job_fails(self):
+        config = self._get_config(2, 2)
+        finished = []
+
+        def a_task(an_item, finished_func):
+            if an_item == 3:
+                # die without a word, like a segfault would
+                os._exit(1)
+            finished_func()
+
+        def job_iter():
+            for x in xrange(6):
+                yield (
+                    (x,),
+                    {'finished_func': lambda x=x: finished.append(x)}
+                )
+
+        pptm = ProcessPoolTaskManager(
+            config,
+            task_func=a_task,
+            job_source_iterator=job_iter
+        )
+        pptm.blocking_start()
+        # the job of the dead worker has failed, its callable was called
+        eq_(sorted(finished), range(6))
+        eq_(pptm.pending_callbacks, {})
+
+    def test_replace_dead_workers_fails_their_jobs(self):
+        config = self._get_config(2, 2)
+        pptm = ProcessPoolTaskManager(config)
+        pptm.process_list = [
+            DotDict({'is_alive': lambda: True}),
+            DotDict({
+                'is_alive': lambda: False,
+                'name': 'WorkerProcess-1',
+                'exitcode': -9,
+            }),
+        ]
+        finished = []
+        pptm.pending_callbacks = {
+            4: {'finished_func': lambda: finished.append(4)},
+            5: {'finished_func': lambda: finished.append(5)},
+        }
+        pptm.worker_jobs[0] = 5
+        pptm.worker_jobs[1] = 4
+        started = []
+        pptm._start_worker_process = started.append
+        pptm._replace_dead_workers()
+        eq_(started, [1])
+        eq_(finished, [4])
+        eq_(pptm.pending_callbacks.keys(), [5])
+        eq_(list(pptm.worker_jobs), [5, 0])
+
+        # once the workers are being stopped, none is replaced
+        pptm.stopping_workers = True
+        pptm.worker_jobs[1] = 5
+        pptm._replace_dead_workers()
+        eq_(started, [1])
+        eq_(finished, [4])
+
+    def test_kill_worker_processes_with_full_queue(self):
+        config = self._get_config(1, 1)
+        pptm = ProcessPoolTaskManager(config)
+        pptm.task_queue.put((1, (), {}, ()))
+        # a worker that will never take anything off the queue
+        def stuck():
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            time.sleep(60)
+        stuck_process = multiprocessing.Process(target=stuck)
+        stuck_process.start()
+        pptm.process_list = [stuck_process]
+        pptm.completion_thread = DotDict({'join': lambda: None})
+        started_at = time.time()
+        pptm._kill_worker_processes()
+        ok_(time.time() - started_at < 10)
+        ok_(not stuck_process.is_alive())
+        eq_(stuck_process.exitcode, -signal.SIGTERM)
+
+    def test_kill_worker_processes_all_dead(self):
+        config = self._get_config(1, 1)
+        config.worker_stop_timeout = 60
+        pptm = ProcessPoolTaskManager(config)
+        pptm.task_queue.put((1, (), {}, ()))
+        dead_process = multiprocessing.Process(target=lambda: None)
+        dead_process.start()
+        dead_process.join()
+        pptm.process_list = [dead_process]
+        pptm.completion_thread = DotDict({'join': lambda: None})
+        started_at = time.time()
+        pptm._kill_worker_processes()
+        # no waiting for the timeout when no worker is left
+        ok_(time.time() - started_at < 10)
+
+    def test_executor_identity(self):
+        config = self._get_config()
+        pptm = ProcessPoolTaskManager(config)
+        eq_(pptm.executor_identity(), '%s-MainThread' % os.getpid())
@@ -0,0 +1,128 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+
+import mock
+from nose.tools import eq_, ok_
+
+from configman.dotdict import DotDict
+
+from socorro.lib.stage_profiler import LatencyHistogram, StageProfiler
+from socorro.unittest.testbase import TestCase
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        eq_(histogram.percentile(0.5), 0.0)
+        for x in range(90):
+            histogram.record(0.003)
+        for x in range(9):
+            histogram.record(0.15)
+        histogram.record(1000.0)
+        eq_(histogram.count, 100)
+        eq_(histogram.maximum, 1000.0)
+        eq_(histogram.percentile(0.5), 0.005)
+        eq_(histogram.percentile(0.9), 0.005)
+        eq_(histogram.percentile(0.95), 0.2)
+        # beyond the last bound, the maximum is all there is
+        eq_(histogram.percentile(1.0), 1000.0)
+
+    def test_percentiles_are_no_more_than_the_maximum(self):
+        histogram = LatencyHistogram()
+        histogram.record(0.3)
+        eq_(histogram.percentile(0.5), 0.3)
+
+
+class TestStageProfiler(TestCase):
+
+    def _profiler(self, **options):
+        config = DotDict()
+        config.logger = mock.Mock()
+        config.sample_rate = 1.0
+        config.log_interval = 0
+        config.statsd_host = ''
+        config.statsd_port = 8125
+        config.statsd_prefix = 'processor.stages'
+        config.update(options)
+        return StageProfiler(config)
+
+    def test_only_sampled_jobs_are_recorded(self):
+        profiler = self._profiler(sample_rate=0.0)
+        ok_(not profiler.begin_sample())
+        with profiler.timing('fetch'):
+            pass
+        profiler.end_sample()
+        eq_(profiler.statistics(), [])
+
+        profiler.config.sample_rate = 1.0
+        ok_(profiler.begin_sample())
+        ok_(profiler.sampling)
+        with profiler.timing('fetch'):
+            pass
+        profiler.record('save', 2.0)
+        profiler.end_sample()
+        ok_(not profiler.sampling)
+        profiler.record('save', 3.0)
+        statistics = profiler.statistics()
+        eq_([x['stage'] for x in statistics], ['save', 'fetch'])
+        eq_(statistics[0]['count'], 1)
+        eq_(statistics[0]['maximum'], 2.0)
+
+    def test_sampling_is_per_thread(self):
+        profiler = self._profiler()
+        profiler.begin_sample()
+        sampling_in_another_thread = []
+        a_thread = threading.Thread(
+            target=lambda: sampling_in_another_thread.append(
+                profiler.sampling
+            )
+        )
+        a_thread.start()
+        a_thread.join()
+        eq_(sampling_in_another_thread, [False])
+        ok_(profiler.sampling)
+
+    def test_exceptions_are_timed(self):
+        profiler = self._profiler()
+        profiler.begin_sample()
+        try:
+            with profiler.timing('processing'):
+                raise KeyError('boom')
+        except KeyError:
+            pass
+        eq_(profiler.statistics()[0]['stage'], 'processing')
+
+    @mock.patch('socorro.lib.stage_profiler.StatsClient')
+    def test_statsd(self, mocked_statsd_client):
+        profiler = self._profiler(statsd_host='localhost')
+        mocked_statsd_client.assert_called_once_with(
+            'localhost',
+            8125,
+            'processor.stages'
+        )
+        profiler.begin_sample()
+        profiler.record('fetch', 0.25)
+        mocked_statsd_client.return_value.timing.assert_called_once_with(
+            'fetch',
+            250.0
+        )
+
+    def test_logging(self):
+        profiler = self._profiler(log_interval=60)
+        profiler.begin_sample()
+        profiler.record('fetch', 0.25)
+        profiler.end_sample()
+        ok_(not profiler.config.logger.info.called)
+
+        profiler.histograms_logged_at -= 61
+        profiler.begin_sample()
+        profiler.end_sample()
+        eq_(profiler.config.logger.info.call_count, 1)
+        eq_(profiler.config.logger.info.call_args[0][1]['stage'], 'fetch')
+
+        profiler.close()
+        eq_(profiler.config.logger.info.call_count, 2)
@@ -287,6 +287,25 @@ class TestTransformRules(TestCase):
                                                     False, (), {}))]
         assert_expected_same(rules.rules, expected)
 
+    def test_TransformRuleSystem_close(self):
+        config = DotDict()
+        config.logger = Mock()
+        rules = transform_rules.TransformRuleSystem(config)
+        a_rule = Mock()
+        a_failing_rule = Mock()
+        a_failing_rule.close.side_effect = Exception('boom')
+        another_rule = Mock()
+        rules.rules = [a_rule, a_failing_rule, another_rule]
+        rules.close()
+        a_rule.close.assert_called_once_with()
+        a_failing_rule.close.assert_called_once_with()
+        another_rule.close.assert_called_once_with()
+        eq_(config.logger.error.call_count, 1)
+
+        # the base rule has nothing to release
+        rules.rules = [TestRuleTestLaughable(config)]
+        rules.close()
+
     def test_TransformRuleSystem_apply_all_rules(self):
 
         def assign_1(s, d):
@@ -312,6 +331,30 @@ class TestTransformRules(TestCase):
         rules.apply_all_rules(s, d)
         assert_expected(d, {'one': 2})
 
+    def test_TransformRuleSystem_profiler(self):
+        config = DotDict()
+        config.logger = Mock()
+        rules = transform_rules.TransformRuleSystem(config)
+        rules.rules = [
+            TestRuleTestLaughable(config),
+            TestRuleTestDangerous(config)
+        ]
+        profiler = Mock()
+        profiler.sampling = False
+        rules.attach_profiler(profiler, 'a_rule_set')
+        rules.apply_all_rules({}, {})
+        ok_(not profiler.record.called)
+
+        profiler.sampling = True
+        rules.apply_all_rules({}, {})
+        eq_(
+            [x[0][0] for x in profiler.record.call_args_list],
+            [
+                'a_rule_set.TestRuleTestLaughable',
+                'a_rule_set.TestRuleTestDangerous'
+            ]
+        )
+
     def test_TransformRuleSystem_apply_all_until_action_succeeds(self):
 
         def assign_1(s, d):
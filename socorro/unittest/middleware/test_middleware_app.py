@@ -26,8 +26,10 @@ from socorro.external import (
     ResourceNotFound,
     ResourceUnavailable
 )
+from socorro.external.elasticsearch.supersearch import SuperSearch
 from socorro.lib import datetimeutil
 from socorro.middleware import middleware_app
+from socorro.middleware import result_cache as result_cache_module
 from socorro.unittest.config.commonconfig import (
     databaseHost,
     databaseName,
@@ -424,6 +426,116 @@ class ImplementationWrapperTestCase(TestCase):
         )])
 
 
+    @mock.patch('logging.info')
+    def test_result_cache(self, logging_info):
+        calls = []
+
+        class CountingImplementation(_AuxImplementation):
+
+            def get(self, **kwargs):
+                calls.append(kwargs)
+                return {'calls': len(calls)}
+
+            def post(self, **kwargs):
+                calls.append(kwargs)
+                return {'calls': len(calls)}
+
+        result_cache = result_cache_module.InProcessResultCache(DotDict(
+            service_ttls={'CountingImplementation': 60},
+            maximum_size=10
+        ))
+
+        class MadeUp(middleware_app.ImplementationWrapper):
+            cls = CountingImplementation
+            all_services = {}
+
+        MadeUp.result_cache = result_cache
+
+        config = DotDict(
+            logger=logging,
+            web_server=DotDict(
+                ip_address='127.0.0.1',
+                port='88888'
+            )
+        )
+        server = CherryPy(config, (
+            ('/aux/(.*)', MadeUp),
+        ))
+
+        testapp = TestApp(server._wsgi_func)
+        response = testapp.get('/aux/', params={'a': 1, 'b': 2})
+        eq_(json.loads(response.body), {'calls': 1})
+        # the same parameters in a different order come from the cache
+        response = testapp.get('/aux/?b=2&a=1')
+        eq_(json.loads(response.body), {'calls': 1})
+        response = testapp.get('/aux/', params={'a': 2})
+        eq_(json.loads(response.body), {'calls': 2})
+
+        # POSTs are never cached
+        response = testapp.post('/aux/', params={'a': 2})
+        eq_(json.loads(response.body), {'calls': 3})
+
+        result_cache.invalidate(['CountingImplementation'])
+        response = testapp.get('/aux/', params={'a': 1, 'b': 2})
+        eq_(json.loads(response.body), {'calls': 4})
+
+        # services without a ttl are not cached
+        result_cache.config.service_ttls = {}
+        response = testapp.get('/aux/', params={'a': 1, 'b': 2})
+        eq_(json.loads(response.body), {'calls': 5})
+
+
+    @mock.patch('logging.info')
+    def test_streamed_result(self, logging_info):
+
+        class StubbedSuperSearch(SuperSearch):
+
+            def __init__(self, *args, **kwargs):
+                self.config = kwargs.get('config')
+
+            def get_parameters(self, **kwargs):
+                return kwargs
+
+            def _export_hits(self, **kwargs):
+                for x in range(int(kwargs['number'])):
+                    yield {'uuid': str(x)}
+
+        result_cache = result_cache_module.InProcessResultCache(DotDict(
+            service_ttls={'StubbedSuperSearch': 60},
+            maximum_size=10
+        ))
+
+        class MadeUp(middleware_app.ImplementationWrapper):
+            cls = StubbedSuperSearch
+            all_services = {}
+
+        MadeUp.result_cache = result_cache
+
+        config = DotDict(
+            logger=logging,
+            web_server=DotDict(
+                ip_address='127.0.0.1',
+                port='88888'
+            )
+        )
+        route = [
+            x for x, y in middleware_app.SERVICES_LIST
+            if y == 'supersearch.SuperSearch' and 'export' in x
+        ][0]
+        server = CherryPy(config, (
+            (route, MadeUp),
+        ))
+
+        testapp = TestApp(server._wsgi_func)
+        for x in range(2):
+            # the stream is never cached, it is produced every time
+            response = testapp.get('/supersearch/export/', params={
+                'number': 2
+            })
+            eq_(response.header('Content-Type'), 'application/x-ndjson')
+            eq_(response.body, '{"uuid":"0"}\n{"uuid":"1"}\n')
+
+
 class MeasuringImplementationWrapperTestCase(TestCase):
 
     @mock.patch('logging.info')
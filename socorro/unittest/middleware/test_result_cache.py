@@ -0,0 +1,127 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import time
+
+import mock
+from nose.tools import eq_, ok_
+
+from socorro.lib.util import DotDict
+from socorro.middleware.result_cache import (
+    InProcessResultCache,
+    MemcachedResultCache,
+    NoResultCache,
+    ttls_from_string,
+    ttls_to_string,
+)
+from socorro.unittest.testbase import TestCase
+
+
+#==============================================================================
+class TestResultCache(TestCase):
+
+    #--------------------------------------------------------------------------
+    def _get_config(self, **extra):
+        config = DotDict({
+            'service_ttls': {
+                'Crashes.get_daily': 3600,
+                'CrashTrends': 600,
+            },
+            'maximum_size': 10,
+        })
+        config.update(extra)
+        return config
+
+    #--------------------------------------------------------------------------
+    def test_ttls_converters(self):
+        ttls = ttls_from_string('Crashes.get_daily: 3600, CrashTrends:600, ')
+        eq_(ttls, {'Crashes.get_daily': 3600, 'CrashTrends': 600})
+        eq_(ttls_to_string(ttls), 'CrashTrends: 600, Crashes.get_daily: 3600')
+
+    #--------------------------------------------------------------------------
+    def test_ttl_for(self):
+        result_cache = InProcessResultCache(self._get_config())
+        eq_(result_cache.ttl_for('Crashes', 'get_daily'), 3600)
+        eq_(result_cache.ttl_for('Crashes', 'get_comments'), 0)
+        eq_(result_cache.ttl_for('CrashTrends', 'get'), 600)
+        eq_(result_cache.ttl_for('Products', 'get'), 0)
+        eq_(NoResultCache(self._get_config()).ttl_for('CrashTrends', 'get'), 0)
+
+    #--------------------------------------------------------------------------
+    def test_key(self):
+        result_cache = InProcessResultCache(self._get_config())
+        key = result_cache.key('Crashes', 'get_daily', {'a': 1, 'b': [1, 2]})
+        eq_(
+            key,
+            result_cache.key('Crashes', 'get_daily', {'b': [1, 2], 'a': 1})
+        )
+        ok_(key.startswith('Crashes:0:get_daily:'))
+        ok_(key != result_cache.key('Crashes', 'get_daily', {'a': 1}))
+        ok_(key != result_cache.key('Crashes', 'get_signatures', {'a': 1}))
+
+    #--------------------------------------------------------------------------
+    def test_in_process_ttl_and_invalidate(self):
+        result_cache = InProcessResultCache(self._get_config())
+        params = {'product': 'Firefox'}
+        key = result_cache.key('CrashTrends', 'get', params)
+        eq_(result_cache.get(key), None)
+        result_cache.set(key, {'hits': []}, 600)
+        eq_(result_cache.get(key), {'hits': []})
+
+        result_cache.set(key, {'hits': []}, -1)
+        eq_(result_cache.get(key), None)
+        ok_(key not in result_cache.cache)
+
+        result_cache.set(key, {'hits': []}, 600)
+        other_key = result_cache.key('Crashes', 'get_daily', params)
+        result_cache.set(other_key, {'hits': [1]}, 600)
+        result_cache.invalidate(['CrashTrends'])
+        eq_(result_cache.get(result_cache.key('CrashTrends', 'get', params)),
+            None)
+        eq_(result_cache.get(result_cache.key('Crashes', 'get_daily', params)),
+            {'hits': [1]})
+
+    #--------------------------------------------------------------------------
+    @mock.patch('memcache.Client')
+    def test_memcached(self, client_class):
+        memcached = {}
+        client = client_class.return_value
+        client.get.side_effect = memcached.get
+
+        def add(key, value):
+            if key in memcached:
+                return False
+            memcached[key] = value
+            return True
+
+        def incr(key):
+            if key not in memcached:
+                return None
+            memcached[key] += 1
+            return memcached[key]
+
+        client.add.side_effect = add
+        client.incr.side_effect = incr
+        client.set.side_effect = \
+            lambda key, value, time=0: memcached.__setitem__(key, value)
+
+        result_cache = MemcachedResultCache(self._get_config(
+            memcached_servers=['somewhere:11211'],
+            key_prefix='test:'
+        ))
+        client_class.assert_called_with(['somewhere:11211'])
+
+        key = result_cache.key('CrashTrends', 'get', {})
+        generation = memcached['test:generation:CrashTrends']
+        ok_(generation >= int(time.time()) - 1)
+        result_cache.set(key, {'hits': []}, 600)
+        client.set.assert_called_with('test:' + key, {'hits': []}, time=600)
+        eq_(result_cache.get(key), {'hits': []})
+
+        result_cache.invalidate(['CrashTrends', 'Crashes'])
+        eq_(memcached['test:generation:CrashTrends'], generation + 1)
+        ok_(memcached['test:generation:Crashes'])
+        new_key = result_cache.key('CrashTrends', 'get', {})
+        ok_(new_key != key)
+        eq_(result_cache.get(new_key), None)
@@ -0,0 +1,148 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import datetime
+
+from mock import Mock, patch
+from nose.tools import eq_, ok_
+
+from socorro.lib.util import DotDict
+from socorro.monitor.monitor_app import MonitorApp
+from socorro.unittest.testbase import TestCase
+
+
+#==============================================================================
+class TestMonitorApp(TestCase):
+
+    #--------------------------------------------------------------------------
+    def _get_monitor(self, batch_size=100, crash_ids=()):
+        config = DotDict()
+        config.logger = Mock()
+        config.registrar = DotDict()
+        config.registrar.database_class = Mock()
+        config.registrar.transaction_executor_class = Mock()
+        config.registrar.quit_if_no_processors = False
+        config.job_manager = DotDict()
+        config.job_manager.database_class = Mock()
+        config.job_manager.transaction_executor_class = Mock()
+        config.job_manager.batch_size = batch_size
+        config.new_crash_source = DotDict()
+        config.new_crash_source.new_crash_source_class = Mock(
+            return_value=lambda: iter(crash_ids)
+        )
+        with patch('socorro.monitor.monitor_app.signal'):
+            return MonitorApp(config)
+
+    #--------------------------------------------------------------------------
+    def test_balanced_processor_iter(self):
+        monitor = self._get_monitor()
+        monitor.job_manager_transaction.return_value = [
+            [1, 5, 'one'],
+            [2, 0, 'two'],
+            [3, 2, 'three'],
+        ]
+        processor_iter = monitor._balanced_processor_iter()
+        assignments = [processor_iter.next() for x in range(10)]
+        eq_(
+            [processor_id for processor_id, processor_name in assignments],
+            [2, 2, 2, 3, 2, 3, 2, 3, 1, 2]
+        )
+        eq_(assignments[-2], (1, 'one'))
+
+        # the loads stay balanced
+        loads = {1: 5, 2: 0, 3: 2}
+        for processor_id, processor_name in assignments:
+            loads[processor_id] += 1
+        for x in range(1000):
+            loads[processor_iter.next()[0]] += 1
+        ok_(max(loads.values()) - min(loads.values()) <= 1)
+
+    #--------------------------------------------------------------------------
+    def test_balanced_processor_iter_without_processors(self):
+        monitor = self._get_monitor()
+        monitor.job_manager_transaction.return_value = []
+        eq_(monitor._balanced_processor_iter().next(), None)
+
+    #--------------------------------------------------------------------------
+    def test_batches_of_new_crashes(self):
+        crash_ids = ['crash%d' % x for x in range(5)]
+        monitor = self._get_monitor(batch_size=2, crash_ids=crash_ids)
+        eq_(
+            list(monitor._batches_of_new_crashes()),
+            [['crash0', 'crash1'], ['crash2', 'crash3'], ['crash4']]
+        )
+        monitor = self._get_monitor(batch_size=0, crash_ids=crash_ids)
+        eq_(
+            list(monitor._batches_of_new_crashes()),
+            [[x] for x in crash_ids]
+        )
+
+    #--------------------------------------------------------------------------
+    def test_queue_standard_jobs_transaction(self):
+        monitor = self._get_monitor()
+        connection = Mock()
+        processor_iter = iter([(1, 'one'), (2, 'two'), (1, 'one')])
+        now = datetime.datetime(2015, 1, 1)
+        with patch('socorro.monitor.monitor_app.utc_now', return_value=now):
+            assigned = monitor._queue_standard_jobs_transaction(
+                connection,
+                ['a', 'b', 'c'],
+                processor_iter
+            )
+        eq_(assigned, [1, 2, 1])
+        connection.cursor.return_value.execute.assert_called_once_with(
+            "insert into jobs (pathname, uuid, owner, priority,"
+            "                  queuedDateTime) "
+            "values (%s, %s, %s, %s, %s), (%s, %s, %s, %s, %s), "
+            "(%s, %s, %s, %s, %s)",
+            [
+                '', 'a', 1, 1, now,
+                '', 'b', 2, 1, now,
+                '', 'c', 1, 1, now,
+            ]
+        )
+
+    #--------------------------------------------------------------------------
+    def test_queue_standard_jobs_transaction_without_processors(self):
+        monitor = self._get_monitor()
+        connection = Mock()
+        assigned = monitor._queue_standard_jobs_transaction(
+            connection,
+            ['a', 'b'],
+            iter([None])
+        )
+        eq_(assigned, None)
+        ok_(not connection.cursor.called)
+
+    #--------------------------------------------------------------------------
+    def test_queue_standard_jobs(self):
+        monitor = self._get_monitor()
+        processor_iter = Mock()
+        monitor.job_manager_transaction.return_value = [1, 2]
+        eq_(monitor._queue_standard_jobs(['a', 'b'], processor_iter),
+            processor_iter)
+        monitor.job_manager_transaction.assert_called_once_with(
+            monitor._queue_standard_jobs_transaction,
+            ['a', 'b'],
+            processor_iter
+        )
+
+    #--------------------------------------------------------------------------
+    def test_queue_standard_jobs_falls_back_to_one_at_a_time(self):
+        monitor = self._get_monitor()
+        processor_iter = Mock()
+        queued = []
+
+        def a_transaction(function, crash_ids, candidate_processor_iter):
+            if function == monitor._queue_standard_jobs_transaction:
+                raise Exception('duplicate key value')
+            if crash_ids == 'bad':
+                raise Exception('duplicate key value')
+            queued.append(crash_ids)
+            return 1
+
+        monitor.job_manager_transaction.side_effect = a_transaction
+        monitor._queue_standard_jobs(['a', 'bad', 'c'], processor_iter)
+        eq_(queued, ['a', 'c'])
+        eq_(monitor.config.logger.error.call_count, 1)
@@ -3,6 +3,10 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import copy
+import os
+import shutil
+import sys
+import tempfile
 import ujson
 
 from mock import Mock, patch
@@ -13,8 +17,10 @@ from configman.dotdict import DotDict as CDotDict
 
 from socorro.unittest.testbase import TestCase
 from socorro.lib.util import DotDict
+from socorro.external.crashstorage_base import MemoryDumpsMapping
 from socorro.processor.breakpad_transform_rules import (
     BreakpadStackwalkerRule,
+    BreakpadStackwalkerServerRule,
     CrashingThreadRule
 )
 
@@ -256,6 +262,54 @@ class TestBreakpadTransformRule(TestCase):
         eq_(processed_crash.mdsw_status_string, "OK")
         ok_(processed_crash.success)
 
+    #--------------------------------------------------------------------------
+    def test_dumps_in_memory(self):
+        config = self.get_basic_config()
+        temporary_directory = tempfile.mkdtemp()
+        try:
+            config.temporary_file_system_storage_path = temporary_directory
+            # a stackwalker that echoes what it could read
+            config.stackwalk_command_line = (
+                sys.executable + ' -c "import sys, json; print json.dumps({'
+                '\'status\': \'OK\', '
+                '\'dump\': open(sys.argv[1]).read(), '
+                '\'uuid\': json.load(open(sys.argv[2]))[\'uuid\']})" '
+                '$dumpfilePathname $rawfilePathname'
+            )
+
+            raw_crash = copy.copy(canonical_standard_raw_crash)
+            raw_dumps = MemoryDumpsMapping({
+                config.dump_field: 'a fake dump',
+                config.dump_field + '_flash1': 'a fake flash dump',
+            })
+            processed_crash = DotDict()
+            processor_meta = self.get_basic_processor_meta()
+
+            def left_behind(*args):
+                eq_(os.listdir(temporary_directory), [])
+                return original_invoke(*args)
+
+            rule = BreakpadStackwalkerRule(config)
+            original_invoke = rule._invoke_minidump_stackwalk
+            rule._invoke_minidump_stackwalk = left_behind
+
+            # the call to be tested
+            rule.act(raw_crash, raw_dumps, processed_crash, processor_meta)
+
+            eq_(processed_crash.json_dump, {
+                'status': 'OK',
+                'dump': 'a fake dump',
+                'uuid': raw_crash.uuid,
+            })
+            eq_(
+                processed_crash.upload_file_minidump_flash1.json_dump['dump'],
+                'a fake flash dump'
+            )
+            ok_(processed_crash.success)
+            eq_(os.listdir(temporary_directory), [])
+        finally:
+            shutil.rmtree(temporary_directory)
+
     #--------------------------------------------------------------------------
     @patch('socorro.processor.breakpad_transform_rules.subprocess')
     def test_stackwalker_fails(self, mocked_subprocess_module):
@@ -350,6 +404,194 @@ class TestBreakpadTransformRule(TestCase):
         eq_(mocked_unlink.call_count, 0)
 
 
+#==============================================================================
+# a stand in for the stackwalker in '--server' mode.  It answers according
+# to the name of the dump it is given.
+fake_stackwalker_server_source = """
+import sys, time
+sys.stdout.write('READY\\n')
+sys.stdout.flush()
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    dump_pathname, raw_crash_pathname = line.rstrip('\\n').split('\\t')
+    if dump_pathname.startswith('hang'):
+        time.sleep(60)
+    if dump_pathname.startswith('die'):
+        sys.exit(11)
+    sys.stdout.write(%r + '\\n')
+    sys.stdout.flush()
+""" % cannonical_stackwalker_output_str
+
+
+#==============================================================================
+class MyBreakpadStackwalkerServerRule(BreakpadStackwalkerServerRule):
+    @contextmanager
+    def _temp_raw_crash_json_file(self, raw_crash, crash_id):
+        yield "%s.json" % raw_crash.uuid
+
+
+#==============================================================================
+class TestBreakpadStackwalkerServerRule(TestCase):
+
+    #--------------------------------------------------------------------------
+    def setUp(self):
+        super(TestBreakpadStackwalkerServerRule, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.fake_server_pathname = os.path.join(
+            self.tempdir,
+            'fake_stackwalker.py'
+        )
+        with open(self.fake_server_pathname, 'w') as f:
+            f.write(fake_stackwalker_server_source)
+
+    #--------------------------------------------------------------------------
+    def tearDown(self):
+        super(TestBreakpadStackwalkerServerRule, self).tearDown()
+        shutil.rmtree(self.tempdir)
+
+    #--------------------------------------------------------------------------
+    def get_basic_config(self):
+        config = CDotDict()
+        config.logger = Mock()
+        config.chatty = False
+        config.dump_field = 'upload_file_minidump'
+        config.stackwalk_command_line = (
+            'timeout -s KILL 30 $minidump_stackwalk_pathname '
+            '--raw-json $rawfilePathname $dumpfilePathname '
+            '$processor_symbols_pathname_list 2>/dev/null'
+        )
+        config.minidump_stackwalk_pathname = '/bin/stackwalker'
+        config.processor_symbols_pathname_list = (
+            '/mnt/socorro/symbols/symbols_ffx,'
+            '/mnt/socorro/symbols/symbols_os'
+        )
+        config.symbol_cache_path = '/mnt/socorro/symbols'
+        config.stackwalk_server_command_line = '%s %s' % (
+            sys.executable,
+            self.fake_server_pathname
+        )
+        config.number_of_stackwalker_servers = 1
+        config.stackwalker_server_jobs_before_recycle = 2
+        config.stackwalker_server_timeout = 5
+        return config
+
+    #--------------------------------------------------------------------------
+    def get_basic_processor_meta(self):
+        processor_meta = DotDict()
+        processor_meta.processor_notes = []
+        processor_meta.quit_check = lambda: False
+        return processor_meta
+
+    #--------------------------------------------------------------------------
+    def _walk(self, rule, dump_pathname):
+        config = rule.config
+        raw_crash = copy.copy(canonical_standard_raw_crash)
+        raw_dumps = {config.dump_field: dump_pathname}
+        processed_crash = DotDict()
+        processor_meta = self.get_basic_processor_meta()
+        rule.act(raw_crash, raw_dumps, processed_crash, processor_meta)
+        return processed_crash, processor_meta
+
+    #--------------------------------------------------------------------------
+    def test_everything_we_hoped_for(self):
+        config = self.get_basic_config()
+        rule = MyBreakpadStackwalkerServerRule(config)
+        try:
+            processed_crash, processor_meta = self._walk(
+                rule,
+                'a_fake_dump.dump'
+            )
+            eq_(processed_crash.json_dump, cannonical_stackwalker_output)
+            eq_(processed_crash.mdsw_return_code, 0)
+            eq_(processed_crash.mdsw_status_string, "OK")
+            ok_(processed_crash.success)
+            eq_(processor_meta.processor_notes, [])
+
+            # the same server process serves the second dump
+            server = rule.server_pool.idle_servers.queue[0]
+            first_pid = server.process.pid
+            processed_crash, processor_meta = self._walk(
+                rule,
+                'a_fake_dump.dump'
+            )
+            ok_(processed_crash.success)
+            eq_(server.jobs_done, 2)
+            # and then it is recycled
+            ok_(rule.server_pool.idle_servers.queue[0] is None)
+
+            self._walk(rule, 'a_fake_dump.dump')
+            server = rule.server_pool.idle_servers.queue[0]
+            ok_(server.process.pid != first_pid)
+        finally:
+            rule.close()
+
+    #--------------------------------------------------------------------------
+    def test_timeout(self):
+        config = self.get_basic_config()
+        config.stackwalker_server_timeout = 1
+        rule = MyBreakpadStackwalkerServerRule(config)
+        try:
+            processed_crash, processor_meta = self._walk(rule, 'hang.dump')
+            eq_(processed_crash.json_dump, {})
+            eq_(processed_crash.mdsw_return_code, 124)
+            ok_(not processed_crash.success)
+            eq_(
+                processor_meta.processor_notes[-1],
+                "MDSW terminated with SIGKILL due to timeout"
+            )
+            # the killed server is replaced
+            ok_(rule.server_pool.idle_servers.queue[0] is None)
+            processed_crash, processor_meta = self._walk(
+                rule,
+                'a_fake_dump.dump'
+            )
+            ok_(processed_crash.success)
+        finally:
+            rule.close()
+
+    #--------------------------------------------------------------------------
+    def test_server_dies(self):
+        config = self.get_basic_config()
+        rule = MyBreakpadStackwalkerServerRule(config)
+        try:
+            processed_crash, processor_meta = self._walk(rule, 'die.dump')
+            eq_(processed_crash.json_dump, {})
+            eq_(processed_crash.mdsw_return_code, 11)
+            ok_(not processed_crash.success)
+            eq_(
+                processor_meta.processor_notes[-1],
+                "MDSW failed on 'upload_file_minidump': unknown error"
+            )
+            processed_crash, processor_meta = self._walk(
+                rule,
+                'a_fake_dump.dump'
+            )
+            ok_(processed_crash.success)
+        finally:
+            rule.close()
+
+    #--------------------------------------------------------------------------
+    @patch.object(BreakpadStackwalkerRule, '_invoke_minidump_stackwalk')
+    def test_fall_back_to_one_shot(self, mocked_one_shot):
+        config = self.get_basic_config()
+        # a stackwalker that knows nothing of server mode
+        config.stackwalk_server_command_line = '%s -c "import sys; ' \
+            'sys.exit(1)"' % sys.executable
+        mocked_one_shot.return_value = DotDict({'mdsw_return_code': 0})
+        rule = MyBreakpadStackwalkerServerRule(config)
+
+        processed_crash, processor_meta = self._walk(rule, 'a_fake_dump.dump')
+        eq_(processed_crash.mdsw_return_code, 0)
+        eq_(mocked_one_shot.call_count, 1)
+        ok_(rule.server_pool is None)
+        ok_(config.logger.error.called)
+
+        self._walk(rule, 'a_fake_dump.dump')
+        eq_(mocked_one_shot.call_count, 2)
+
+
 #==============================================================================
 class TestCrashingThreadRule(TestCase):
 
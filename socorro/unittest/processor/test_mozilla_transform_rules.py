@@ -3,7 +3,12 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import copy
+import datetime
+import gzip
 import re
+import threading
+
+from cStringIO import StringIO
 
 from mock import Mock, patch
 from nose.tools import eq_, ok_
@@ -13,6 +18,7 @@ from configman.dotdict import DotDict as CDotDict
 from socorro.unittest.testbase import TestCase
 from socorro.lib.util import DotDict
 from socorro.lib.datetimeutil import datetimeFromISOdateString
+from socorro.external.crashstorage_base import MemoryDumpsMapping
 from socorro.processor.mozilla_transform_rules import (
     ProductRule,
     UserDataRule,
@@ -32,6 +38,7 @@ from socorro.processor.mozilla_transform_rules import (
     FlashVersionRule,
     Winsock_LSPRule,
     TopMostFilesRule,
+    MissingSymbolsRecorder,
     MissingSymbolsRule,
 )
 
@@ -1084,6 +1091,38 @@ class TestOutOfMemoryBinaryRule(TestCase):
 
             eq_(processed_crash.memory_report, 'mysterious-awesome-memory')
 
+    #--------------------------------------------------------------------------
+    def test_memory_report_in_memory(self):
+        config = self.get_basic_config()
+
+        compressed = StringIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+            f.write('{"explicit": 1024}')
+        raw_crash = copy.copy(canonical_standard_raw_crash)
+        raw_dumps = MemoryDumpsMapping(memory_report=compressed.getvalue())
+        processed_crash = DotDict()
+        processor_meta = self.get_basic_processor_meta()
+
+        rule = OutOfMemoryBinaryRule(config)
+
+        # the call to be tested
+        rule.act(raw_crash, raw_dumps, processed_crash, processor_meta)
+
+        eq_(processed_crash.memory_report, {'explicit': 1024})
+
+        raw_dumps = MemoryDumpsMapping(memory_report='not gzipped')
+        processed_crash = DotDict()
+        rule.act(raw_crash, raw_dumps, processed_crash, processor_meta)
+        eq_(
+            processor_meta.processor_notes,
+            ["error in gzip for memory_report: "
+             "IOError('Not a gzipped file',)"]
+        )
+        eq_(
+            processed_crash.memory_report,
+            {"ERROR": processor_meta.processor_notes[0]}
+        )
+
     #--------------------------------------------------------------------------
     def test_this_is_not_the_crash_you_are_looking_for(self):
         config = self.get_basic_config()
@@ -1862,6 +1901,7 @@ class TestMissingSymbols(TestCase):
         config = self.get_basic_config()
         config.database_class = Mock()
         config.transaction_executor_class = Mock()
+        config.record_in_background = False
 
         raw_crash = copy.copy(canonical_standard_raw_crash)
         raw_dumps = {}
@@ -1888,3 +1928,129 @@ class TestMissingSymbols(TestCase):
         config.transaction_executor_class.return_value.assert_called_with(
             execute_no_results, rule.sql, ('now', 'some-file.pdb', 'ABCDEFG')
         )
+
+    #--------------------------------------------------------------------------
+    def _processed_crash(self, date_processed, *debug_ids):
+        processed_crash = DotDict()
+        processed_crash.date_processed = date_processed
+        processed_crash.json_dump = {
+            'modules': [
+                {
+                    "debug_id": a_debug_id,
+                    "debug_file": "some-file.pdb",
+                    "missing_symbols": True,
+                }
+                for a_debug_id in debug_ids
+            ]
+        }
+        return processed_crash
+
+    #--------------------------------------------------------------------------
+    def test_recorded_in_the_background(self):
+        config = self.get_basic_config()
+        config.database_class = Mock()
+        config.transaction_executor_class = Mock()
+        config.flush_interval = 3600
+        config.flush_size = 500
+        config.deduplication_cache_size = 100
+
+        raw_crash = copy.copy(canonical_standard_raw_crash)
+        a_day = datetime.datetime(2015, 1, 1, 10, 0, 0)
+        the_same_day = datetime.datetime(2015, 1, 1, 22, 0, 0)
+        the_next_day = datetime.datetime(2015, 1, 2, 10, 0, 0)
+
+        rule = MissingSymbolsRule(config)
+        transaction = config.transaction_executor_class.return_value
+        for a_processed_crash in (
+            self._processed_crash(a_day, 'ABC', 'DEF'),
+            self._processed_crash(the_same_day, 'ABC'),
+            self._processed_crash(the_next_day, 'ABC'),
+        ):
+            rule.act(
+                raw_crash,
+                {},
+                a_processed_crash,
+                self.get_basic_processor_meta()
+            )
+        # the processor threads don't wait for the database
+        ok_(not transaction.called)
+
+        rule.close()
+        transaction.assert_called_once_with(
+            MissingSymbolsRecorder._insert_missing_symbols,
+            [
+                (a_day.date(), 'some-file.pdb', 'ABC'),
+                (a_day.date(), 'some-file.pdb', 'DEF'),
+                (the_next_day.date(), 'some-file.pdb', 'ABC'),
+            ]
+        )
+        ok_(not rule.recorder._flusher.is_alive())
+
+
+#==============================================================================
+class TestMissingSymbolsRecorder(TestCase):
+
+    #--------------------------------------------------------------------------
+    def test_flush_size(self):
+        flushed = threading.Event()
+        transaction = Mock(side_effect=lambda *args: flushed.set())
+        recorder = MissingSymbolsRecorder(transaction, Mock(), 3600, 2, 100)
+        try:
+            recorder.record('2015-01-01', 'a.pdb', 'A')
+            recorder.record('2015-01-01', 'a.pdb', 'A')
+            ok_(not flushed.wait(0.1))
+            recorder.record('2015-01-01', 'b.pdb', 'B')
+            ok_(flushed.wait(5))
+            transaction.assert_called_once_with(
+                MissingSymbolsRecorder._insert_missing_symbols,
+                [('2015-01-01', 'a.pdb', 'A'), ('2015-01-01', 'b.pdb', 'B')]
+            )
+        finally:
+            recorder.close()
+        eq_(transaction.call_count, 1)
+
+    #--------------------------------------------------------------------------
+    def test_large_flushes_are_split(self):
+        transaction = Mock()
+        recorder = MissingSymbolsRecorder(transaction, Mock(), 3600, 2, 100)
+        recorder._stop.set()
+        recorder._flush_requested.set()
+        recorder._flusher.join()
+        recorder.pending = [('d', 'f', str(x)) for x in range(5)]
+        recorder.flush()
+        eq_(
+            [x[0][1] for x in transaction.call_args_list],
+            [
+                [('d', 'f', '0'), ('d', 'f', '1')],
+                [('d', 'f', '2'), ('d', 'f', '3')],
+                [('d', 'f', '4')],
+            ]
+        )
+
+    #--------------------------------------------------------------------------
+    def test_failed_flush_forgets_the_rows(self):
+        transaction = Mock(side_effect=Exception('database is down'))
+        logger = Mock()
+        recorder = MissingSymbolsRecorder(transaction, logger, 3600, 10, 100)
+        recorder.record('2015-01-01', 'a.pdb', 'A')
+        recorder.close()
+        eq_(logger.error.call_count, 1)
+        eq_(len(recorder.recorded), 0)
+
+        # the next crash with the module records it again
+        recorder.record('2015-01-01', 'a.pdb', 'A')
+        eq_(recorder.pending, [('2015-01-01', 'a.pdb', 'A')])
+
+    #--------------------------------------------------------------------------
+    def test_insert_missing_symbols(self):
+        connection = Mock()
+        MissingSymbolsRecorder._insert_missing_symbols(
+            connection,
+            [('2015-01-01', 'a.pdb', 'A'), ('2015-01-01', 'b.pdb', 'B')]
+        )
+        cursor = connection.cursor.return_value
+        cursor.execute.assert_called_once_with(
+            "INSERT INTO missing_symbols(date_processed, debug_file, debug_id)"
+            " VALUES (%s, %s, %s), (%s, %s, %s)",
+            ['2015-01-01', 'a.pdb', 'A', '2015-01-01', 'b.pdb', 'B']
+        )
@@ -11,6 +11,7 @@ from socorro.processor.processor_2015 import (
     Processor2015,
     rule_sets_from_string
 )
+from socorro.lib.stage_profiler import StageProfiler
 from socorro.lib.util import DotDict as SDotDict
 from socorro.lib.transform_rules import TransformRuleSystem
 from socorro.processor.support_classifiers import (
@@ -130,6 +131,58 @@ class TestProcessor2015(TestCase):
         ok_(isinstance(trs.rules[0], SetWindowPos))
         ok_(isinstance(trs.rules[1], UpdateWindowAttributes))
 
+    def test_close(self):
+        cm = ConfigurationManager(
+            definition_source=Processor2015.get_required_config(),
+            values_source_list=[{'rule_sets': rule_set_02_str}],
+        )
+        config = cm.get_config()
+        config.logger = Mock()
+
+        p = Processor2015(config)
+        rules = []
+        for a_rule_set in p.rule_system.itervalues():
+            for a_rule in a_rule_set.rules:
+                a_rule.close = Mock()
+                rules.append(a_rule)
+        eq_(len(rules), 4)
+
+        p.close()
+        for a_rule in rules:
+            a_rule.close.assert_called_once_with()
+
+    def test_profiled(self):
+        cm = ConfigurationManager(
+            definition_source=Processor2015.get_required_config(),
+            values_source_list=[{'rule_sets': rule_set_02_str}],
+        )
+        config = cm.get_config()
+        config.logger = Mock()
+        config.processor_name = 'dwight'
+
+        p = Processor2015(config)
+        profiler = StageProfiler(DotDict({
+            'sample_rate': 1.0,
+            'log_interval': 0,
+            'statsd_host': '',
+            'logger': config.logger,
+        }))
+        p.attach_profiler(profiler)
+        profiler.begin_sample()
+        p.convert_raw_crash_to_processed_crash(SDotDict(), {})
+        stages = sorted(x['stage'] for x in profiler.statistics())
+        eq_(
+            stages,
+            [
+                'ruleset01',
+                'ruleset01.BitguardClassifier',
+                'ruleset01.OutOfDateClassifier',
+                'ruleset02',
+                'ruleset02.SetWindowPos',
+                'ruleset02.UpdateWindowAttributes',
+            ]
+        )
+
     def test_convert_raw_crash_to_processed_crash_no_rules(self):
         cm = ConfigurationManager(
             definition_source=Processor2015.get_required_config(),
@@ -3,12 +3,16 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import mock
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 from configman.dotdict import DotDict
 
+from socorro.lib.stage_profiler import NullStageProfiler, StageProfiler
 from socorro.processor.processor_app import ProcessorApp
-from socorro.external.crashstorage_base import CrashIDNotFound
+from socorro.external.crashstorage_base import (
+    CrashIDNotFound,
+    MemoryDumpsMapping,
+)
 from socorro.unittest.testbase import TestCase
 
 
@@ -66,6 +70,11 @@ class TestProcessorApp(TestCase):
           return_value=mocked_registrar
         )
 
+        config.profiler = DotDict()
+        config.profiler.profiler_class = mock.Mock(
+          return_value=NullStageProfiler()
+        )
+
         config.logger = mock.MagicMock()
 
         return config
@@ -115,6 +124,62 @@ class TestProcessorApp(TestCase):
         pa.destination.save_raw_and_processed.assert_called_with(fake_raw_crash, None, 7, 17)
         eq_(finished_func.call_count, 1)
 
+    def test_transform_dumps_in_memory(self):
+        config = self.get_standard_config()
+        config.processor.dumps_in_memory = True
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        fake_raw_crash = DotDict()
+        pa.source.get_raw_crash = mock.Mock(return_value=fake_raw_crash)
+        pa.source.get_raw_dumps = mock.Mock(
+            return_value={'dump': 'fake dump', 'flash1': 'fake flash dump'}
+        )
+        pa.processor.convert_raw_crash_to_processed_crash = mock.Mock(
+            return_value=7
+        )
+        pa.destination.save_processed = mock.Mock()
+        finished_func = mock.Mock()
+        # the call being tested
+        pa.transform(17, finished_func)
+        # test results
+        pa.source.get_raw_dumps.assert_called_with(17)
+        ok_(not pa.source.get_raw_dumps_as_files.called)
+        args = pa.processor.convert_raw_crash_to_processed_crash.call_args[0]
+        ok_(args[0] is fake_raw_crash)
+        ok_(isinstance(args[1], MemoryDumpsMapping))
+        eq_(
+            args[1],
+            {
+                'upload_file_minidump': 'fake dump',
+                'flash1': 'fake flash dump'
+            }
+        )
+        eq_(finished_func.call_count, 1)
+
+    def test_transform_profiled(self):
+        config = self.get_standard_config()
+        profiler_config = DotDict()
+        profiler_config.sample_rate = 1.0
+        profiler_config.log_interval = 0
+        profiler_config.statsd_host = ''
+        profiler_config.logger = config.logger
+        profiler = StageProfiler(profiler_config)
+        config.profiler.profiler_class = mock.Mock(return_value=profiler)
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.processor.attach_profiler.assert_called_once_with(profiler)
+        pa.source.get_raw_crash = mock.Mock(return_value=DotDict())
+        pa.source.get_raw_dumps_as_files = mock.Mock(return_value={})
+        pa.processor.convert_raw_crash_to_processed_crash = mock.Mock(
+            return_value=7
+        )
+        pa.transform(17)
+        eq_(
+            sorted(x['stage'] for x in profiler.statistics()),
+            ['fetch', 'processing', 'save']
+        )
+        ok_(not profiler.sampling)
+
     def test_transform_crash_id_missing(self):
         config = self.get_standard_config()
         pa = ProcessorApp(config)
@@ -146,3 +211,19 @@ class TestProcessorApp(TestCase):
           'error in loading: bummer'
         )
         eq_(finished_func.call_count, 1)
+
+    def test_cleanup_closes_the_processor(self):
+        config = self.get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.iterator = mock.Mock()
+        pa._cleanup()
+        pa.processor.close.assert_called_once_with()
+        pa.registrar.unregister.assert_called_once_with()
+        pa.source.close.assert_called_once_with()
+        pa.destination.close.assert_called_once_with()
+
+        # a failure to close the processor does not stop the cleanup
+        pa.processor.close.side_effect = Exception('boom')
+        pa._cleanup()
+        eq_(pa.destination.close.call_count, 2)
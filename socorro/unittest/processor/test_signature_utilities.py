@@ -19,11 +19,16 @@ from socorro.processor.signature_utilities import (
     OOMSignature,
     SigTrunc,
     StackwalkerErrorSignatureRule,
+    compile_skip_list,
+    literal_prefix,
+    split_alternation,
 )
 from socorro.unittest.testbase import TestCase
 
 import re
 import copy
+import random
+import threading
 
 from mock import Mock, patch
 
@@ -71,6 +76,7 @@ class TestCSignatureTool(BaseTestClass):
         config.logger = sutil.FakeLogger()
         config.database_class = mock.MagicMock()
         config.transaction_executor_class = TransactionExecutor
+        config.rules_refresh_interval = 0
         patch_target = 'socorro.processor.signature_utilities.' \
                        'execute_query_fetchall'
         with mock.patch(patch_target) as mocked_query:
@@ -183,6 +189,104 @@ class TestCSignatureTool(BaseTestClass):
             r = s.normalize_signature(*args)
             self.assert_equal_with_nicer_output(e, r)
 
+    #--------------------------------------------------------------------------
+    def test_normalize_cache(self):
+        s, c = self.setup_config_C_sig_tool()
+        frame = {
+            'module': 'module',
+            'function': 'f( *s , &n)',
+            'file': 's',
+            'line': 23,
+            'module_offset': '0xFFF',
+            'offset': '0x1234FFF',
+        }
+        eq_(s.normalize_signature(**frame), 'f(*s, &n)')
+        eq_(s.normalization_cache.misses, 1)
+        eq_(s.normalization_cache.hits, 0)
+        eq_(s.normalize_signature(**frame), 'f(*s, &n)')
+        eq_(s.normalization_cache.misses, 1)
+        eq_(s.normalization_cache.hits, 1)
+
+        # a frame that differs in a field that matters is a different entry
+        frame['function'] = 'fnNeedNumber'
+        eq_(s.normalize_signature(**frame), 'fnNeedNumber:23')
+        frame['line'] = 24
+        eq_(s.normalize_signature(**frame), 'fnNeedNumber:24')
+        eq_(s.normalization_cache.misses, 3)
+
+        # an already normalized frame doesn't touch the cache at all
+        eq_(s.normalize_signature(normalized='hello', **frame), 'hello')
+        eq_(s.normalization_cache.misses, 3)
+        eq_(s.normalization_cache.hits, 1)
+
+    #--------------------------------------------------------------------------
+    def test_normalize_cache_ignores_unused_fields(self):
+        s, c = self.setup_config_C_sig_tool()
+        frame = {
+            'module': 'module',
+            'function': 'f( *s , &n)',
+            'file': 's',
+            'line': 23,
+            'module_offset': '0xFFF',
+            'offset': '0x1234FFF',
+        }
+        eq_(s.normalize_signature(**frame), 'f(*s, &n)')
+        # the same function, loaded somewhere else in another crash
+        frame['module_offset'] = '0xAAA'
+        frame['offset'] = '0x5678AAA'
+        eq_(s.normalize_signature(**frame), 'f(*s, &n)')
+        eq_(s.normalization_cache.hits, 1)
+
+        # without a function or a source file, the module offset counts, but
+        # not the absolute offset
+        del frame['function']
+        del frame['file']
+        eq_(s.normalize_signature(**frame), 'module@0xAAA')
+        frame['offset'] = '0x9999AAA'
+        eq_(s.normalize_signature(**frame), 'module@0xAAA')
+        eq_(s.normalization_cache.hits, 2)
+        frame['module_offset'] = '0xBBB'
+        eq_(s.normalize_signature(**frame), 'module@0xBBB')
+        eq_(s.normalization_cache.misses, 3)
+
+        # only the absolute offset is left
+        eq_(s.normalize_signature(offset='0x1'), '@0x1')
+        eq_(s.normalize_signature(offset='0x2'), '@0x2')
+        eq_(s.normalization_cache.misses, 5)
+
+    #--------------------------------------------------------------------------
+    def test_normalize_cache_stats_logged(self):
+        s, c = self.setup_config_C_sig_tool()
+        s.config.logger = Mock()
+        s.normalize_signature('module', 'f3(s,t,u)')
+        s.generate(['a'])
+        ok_(not s.config.logger.info.called)
+        s.normalization_cache_logged_at -= 301
+        s.generate(['a'])
+        eq_(s.config.logger.info.call_count, 1)
+        stats = s.config.logger.info.call_args[0][1]
+        eq_(stats['misses'], 1)
+        eq_(stats['size'], 1)
+        s.generate(['a'])
+        eq_(s.config.logger.info.call_count, 1)
+        s.close()
+        eq_(s.config.logger.info.call_count, 2)
+
+    #--------------------------------------------------------------------------
+    def test_normalize_cache_disabled(self):
+        config = sutil.DotDict()
+        config.logger = sutil.FakeLogger()
+        config.irrelevant_signature_re = 'ignored1'
+        config.prefix_signature_re = 'pre1|pre2'
+        config.signatures_with_line_numbers_re = 'fnNeedNumber'
+        config.signature_sentinels = ('sentinel',)
+        config.normalization_cache_size = 0
+        s = CSignatureTool(config)
+        for x in range(2):
+            eq_(s.normalize_signature('module', 'f3(s,t,u)'), 'f3(s, t, u)')
+        eq_(len(s.normalization_cache), 0)
+        eq_(s.normalization_cache.misses, 2)
+
     #--------------------------------------------------------------------------
     def test_generate_1(self):
         """test_generate_1: simple"""
@@ -307,6 +411,7 @@ class TestCSignatureToolDB(BaseTestClass):
         config.logger = sutil.FakeLogger()
         config.database_class = Mock()
         config.transaction_executor_class = Mock()
+        config.rules_refresh_interval = 0
         return config
 
     #--------------------------------------------------------------------------
@@ -363,6 +468,11 @@ class TestCSignatureToolDB(BaseTestClass):
                 c_sig_tool.prefix_signature_re.pattern,
                 expected_re_dict['prefix_signature_re']
             )
+            ok_(c_sig_tool.prefix_signature_matcher.match('xul.dll@0x1f'))
+            ok_(c_sig_tool.prefix_signature_matcher.match('x abort'))
+            ok_(not c_sig_tool.prefix_signature_matcher.match('xul.dll'))
+            ok_(c_sig_tool.irrelevant_signature_matcher.match('@0x1f'))
+            ok_(not c_sig_tool.irrelevant_signature_matcher.match('@0x1'))
             eq_(len(c_sig_tool.signature_sentinels), 3)
             eq_(
                 c_sig_tool.signature_sentinels[0],
@@ -386,6 +496,274 @@ class TestCSignatureToolDB(BaseTestClass):
                 not actual_fn(['x', 'y', 'z', 'i', 'j', 'k'])
             )
 
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def rule_rows(prefix, irrelevant, line_number, sentinels):
+        """the results of the four queries made by
+        '_read_signature_rules_from_database', in order"""
+        return [
+            [(x,) for x in prefix],
+            [(x,) for x in irrelevant],
+            [(x,) for x in line_number],
+            [(x,) for x in sentinels],
+        ]
+
+    #--------------------------------------------------------------------------
+    def test_refresh_signature_rules(self):
+        config = self.setup_config()
+        with patch(
+            'socorro.processor.signature_utilities.execute_query_fetchall'
+        ) as execute_query_mock:
+            with patch(
+                'socorro.processor.signature_utilities.single_value_sql'
+            ) as version_mock:
+                c_sig_tool = CSignatureToolDB(config)
+                ok_(c_sig_tool._refresher is None)
+                # the transaction executor is a Mock, so nothing is loaded
+                # until the refresh method is called directly
+                version_mock.return_value = 'v1'
+                execute_query_mock.side_effect = self.rule_rows(
+                    ['pre1', 'pre2'], ['ign1'], ['js_Interpret'], ['_purecall']
+                )
+                ok_(c_sig_tool._refresh_signature_rules(Mock()))
+                eq_(c_sig_tool.rules_version, 'v1')
+                eq_(c_sig_tool.prefix_signature_re.pattern, 'pre1|pre2')
+                eq_(c_sig_tool.signature_sentinels, ('_purecall',))
+                eq_(
+                    c_sig_tool.generate(['ign1', 'pre2', 'a', 'b']),
+                    ('pre2 | a', [])
+                )
+                c_sig_tool.normalize_signature(function='js_Interpret', line=3)
+                eq_(len(c_sig_tool.normalization_cache), 1)
+
+                # no change in the version, so the rules are not read again
+                ok_(not c_sig_tool._refresh_signature_rules(Mock()))
+                eq_(execute_query_mock.call_count, 4)
+                eq_(len(c_sig_tool.normalization_cache), 1)
+
+                version_mock.return_value = 'v2'
+                execute_query_mock.side_effect = self.rule_rows(
+                    ['a'], ['pre2'], ['nothing'], []
+                )
+                ok_(c_sig_tool._refresh_signature_rules(Mock()))
+                eq_(c_sig_tool.rules_version, 'v2')
+                eq_(execute_query_mock.call_count, 8)
+                eq_(
+                    c_sig_tool.generate(['ign1', 'pre2', 'a', 'b']),
+                    ('ign1', [])
+                )
+                eq_(len(c_sig_tool.normalization_cache), 0)
+                eq_(
+                    c_sig_tool.normalize_signature(
+                        function='js_Interpret',
+                        line=3
+                    ),
+                    'js_Interpret'
+                )
+
+    #--------------------------------------------------------------------------
+    def test_refresher_thread(self):
+        config = self.setup_config()
+        config.logger = Mock()
+        config.rules_refresh_interval = 0.01
+        refreshed = threading.Event()
+        calls = []
+
+        def transaction(function):
+            calls.append(function.__name__)
+            if len(calls) == 1:
+                return True  # the load from the constructor
+            refreshed.set()
+            raise Exception('the database is down')
+
+        config.transaction_executor_class.return_value.side_effect = \
+            transaction
+        c_sig_tool = CSignatureToolDB(config)
+        ok_(c_sig_tool._refresher.daemon)
+        ok_(refreshed.wait(5))
+        # a failure to refresh does not stop the refresher
+        refreshed.clear()
+        ok_(refreshed.wait(5))
+        c_sig_tool.close()
+        ok_(c_sig_tool._refresher is None)
+        ok_(config.logger.error.called)
+        ok_(all(x == '_refresh_signature_rules' for x in calls))
+
+
+#==============================================================================
+class TestCompileSkipList(BaseTestClass):
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def default_skip_lists():
+        return (
+            eval(CSignatureTool.required_config.irrelevant_signature_re
+                 .default),
+            eval(CSignatureTool.required_config.prefix_signature_re.default),
+        )
+
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def stack_corpus(skip_lists, number_of_frames=20000):
+        """frame signatures built from the skip list entries themselves, with
+        perturbations near the boundaries of the literal prefixes, mixed with
+        ordinary looking function names"""
+        rng = random.Random(1234)
+        pieces = [
+            '', '@0x', '@0x0', '@0x1f', '@0xdeadbeef', '(', ')', '::',
+            '<T>', ' ', 'Abort', 'abort', '_', 'nsAString', 'dll', '.so',
+            'libxul.so', 'XUL', 'KiFastSystemCallRet', '?', '*', '.',
+            'mozilla::ipc::RPCChannel::Call', 'JS_', 'Rtl', 'msvcr100.dll',
+            '\n',
+        ]
+        seeds = []
+        for a_skip_list in skip_lists:
+            for an_entry in split_alternation(a_skip_list):
+                a_prefix = literal_prefix(an_entry)
+                if a_prefix is not None:
+                    seeds.extend((a_prefix, a_prefix[:-1], a_prefix[1:]))
+                seeds.append(an_entry)
+                seeds.append(re.sub(r'[\\.*+?^$]', '', an_entry))
+        corpus = []
+        for x in range(number_of_frames):
+            a_seed = rng.choice(seeds)
+            choice = rng.randint(0, 4)
+            if choice == 0:
+                corpus.append(a_seed)
+            elif choice == 1:
+                corpus.append(a_seed + rng.choice(pieces))
+            elif choice == 2:
+                corpus.append(rng.choice(pieces) + a_seed)
+            elif choice == 3 and a_seed:
+                index = rng.randint(0, len(a_seed) - 1)
+                corpus.append(
+                    a_seed[:index] + rng.choice(pieces) + a_seed[index + 1:]
+                )
+            else:
+                corpus.append(
+                    ''.join(rng.choice(pieces) for y in range(3))
+                )
+        return corpus
+
+    #--------------------------------------------------------------------------
+    def test_split_alternation(self):
+        eq_(split_alternation(''), [''])
+        eq_(split_alternation('a|b|c'), ['a', 'b', 'c'])
+        eq_(split_alternation('a||b'), ['a', '', 'b'])
+        eq_(
+            split_alternation('(libxul\\.so|xul\\.dll|XUL)@0x.*|@0x0'),
+            ['(libxul\\.so|xul\\.dll|XUL)@0x.*', '@0x0']
+        )
+        eq_(split_alternation('a\\|b|[|]|[]|]|[^]|]'),
+            ['a\\|b', '[|]', '[]|]', '[^]|]'])
+
+    #--------------------------------------------------------------------------
+    def test_literal_prefix(self):
+        eq_(literal_prefix(''), '')
+        eq_(literal_prefix('abort'), 'abort')
+        eq_(literal_prefix('_purecall'), '_purecall')
+        eq_(literal_prefix('RaiseException'), 'RaiseException')
+        eq_(literal_prefix('kernel32\\.dll@0x.*'), 'kernel32.dll@0x')
+        eq_(literal_prefix('operator new\\(.*'), 'operator new(')
+        eq_(literal_prefix('.*'), '')
+        eq_(literal_prefix('.*abort'), None)
+        eq_(literal_prefix('@0x[0-9a-fA-F]{2,}'), None)
+        eq_(literal_prefix('a.*b'), None)
+        eq_(literal_prefix('ab?'), None)
+        eq_(literal_prefix('a\\.*'), None)
+        eq_(literal_prefix('\\w+'), None)
+        eq_(literal_prefix('abc$'), None)
+
+    #--------------------------------------------------------------------------
+    def test_compile(self):
+        r = compile_skip_list(
+            ['abc', 'abcd', 'ab\\.d.*', '[0-9]+x', 'zz', '.*foo', '.*bar.*']
+        )
+        eq_(r.pattern, '(?:ab(?:\\.d|c)|zz)|.*(?:bar|foo)|[0-9]+x')
+        ok_(r.match('abc'))
+        ok_(r.match('abcdef'))
+        ok_(r.match('ab.d'))
+        ok_(r.match('zzz'))
+        ok_(r.match('123x'))
+        ok_(r.match('a foo'))
+        ok_(r.match('a bar b'))
+        ok_(not r.match('ab'))
+        ok_(not r.match('abd'))
+        ok_(not r.match('x123x'))
+        ok_(not r.match('a\nfoo'))
+        ok_(not r.match(''))
+
+        r = compile_skip_list('abc|')
+        ok_(r.match('anything'))
+        ok_(r.match(''))
+
+        r = compile_skip_list('')
+        ok_(r.match('anything'))
+
+    #--------------------------------------------------------------------------
+    def test_unsplittable(self):
+        for entries in (['(?i)abc', 'def'], ['(a)\\1', 'b']):
+            eq_(compile_skip_list(entries).pattern, '|'.join(entries))
+        ok_(compile_skip_list(['(?i)abc', 'def']).match('DEF'))
+
+    #--------------------------------------------------------------------------
+    def test_already_compiled(self):
+        compiled = re.compile('abc|d.f', re.IGNORECASE)
+        ok_(compile_skip_list(compiled) is compiled)
+
+    #--------------------------------------------------------------------------
+    def test_differential_match(self):
+        """every frame of the corpus must get the same answer from the
+        compiled skip list as from the original regular expression"""
+        skip_lists = self.default_skip_lists()
+        corpus = self.stack_corpus(skip_lists)
+        for a_skip_list in skip_lists:
+            a_regex = re.compile(a_skip_list)
+            a_skip_list_re = compile_skip_list(a_skip_list)
+            for a_frame in corpus:
+                eq_(
+                    bool(a_regex.match(a_frame)),
+                    bool(a_skip_list_re.match(a_frame)),
+                    a_frame
+                )
+
+    #--------------------------------------------------------------------------
+    def test_differential_generate(self):
+        """signatures generated with the compiled skip lists must be
+        identical to those generated with the original regular expressions,
+        both for the cases of TestCSignatureTool and for a large corpus of
+        stacks"""
+        skip_lists = self.default_skip_lists()
+        corpus = self.stack_corpus(skip_lists)
+        rng = random.Random(4321)
+        stacks = [
+            [x for x in 'abcdefghijklmnopqrstuvwxyz'],
+            [x for x in 'abcdaeafagahijklmnopqrstuvwxyz'],
+            [x for x in 'abcdefghabcfaeabdijklmnopqrstuvwxyz'],
+        ]
+        for x in range(2000):
+            stacks.append(
+                [rng.choice(corpus) for y in range(rng.randint(1, 40))]
+            )
+        for ig, pr in (
+            ('a|b|c', 'd|e|f'),
+            ('a|b|c|sentinel', 'd|e|f'),
+            ('', ''),
+            skip_lists,
+        ):
+            s, c = TestCSignatureTool.setup_config_C_sig_tool(ig, pr)
+            reference, c = TestCSignatureTool.setup_config_C_sig_tool(ig, pr)
+            reference.rules = reference.rules._replace(
+                irrelevant_signature_matcher=reference.irrelevant_signature_re,
+                prefix_signature_matcher=reference.prefix_signature_re,
+            )
+            for a_stack in stacks:
+                for hang_type in (0, -1):
+                    eq_(
+                        s.generate(a_stack, hang_type=hang_type),
+                        reference.generate(a_stack, hang_type=hang_type),
+                    )
+
 
 #==============================================================================
 class TestJavaSignatureTool(BaseTestClass):
@@ -1084,6 +1462,65 @@ class TestSignatureGeneration(TestCase):
         )
         eq_(processor_meta.processor_notes, [])
 
+    #--------------------------------------------------------------------------
+    def test_action_rules_swapped_in_flight(self):
+        def a_crash():
+            processed_crash = CDotDict(copy.deepcopy(sample_json_dump))
+            # other tests leave the frames already normalized
+            for a_frame in processed_crash.json_dump.threads[0]['frames']:
+                a_frame.pop('normalized', None)
+            return processed_crash
+
+        config = self.get_config()
+        expected = a_crash()
+        SignatureGenerationRule(config)._action(
+            CDotDict(),
+            {},
+            expected,
+            CDotDict({'processor_notes': []})
+        )
+
+        sgr = SignatureGenerationRule(config)
+        c_sig_tool = sgr.c_signature_tool
+        original_rules = c_sig_tool.rules
+        original_normalize = c_sig_tool._normalize_signature
+
+        def normalize_and_swap(rules, *args):
+            # rules that make every frame irrelevant arrive part way
+            # through the crash
+            c_sig_tool.rules = c_sig_tool._make_rules('.*', '', '', ())
+            return original_normalize(rules, *args)
+
+        c_sig_tool._normalize_signature = normalize_and_swap
+
+        processed_crash = a_crash()
+        processor_meta = CDotDict({
+            'processor_notes': []
+        })
+        ok_(sgr._action(CDotDict(), {}, processed_crash, processor_meta))
+
+        # the whole crash was done with the rules that it started with
+        eq_(
+            processed_crash.signature,
+            'WaitForMultipleObjectsEx | RealMsgWaitForMultipleObjectsEx | '
+            'MsgWaitForMultipleObjects | '
+            'F_1152915508__________________________________'
+        )
+        eq_(processed_crash.signature, expected.signature)
+        ok_(c_sig_tool.rules is not original_rules)
+        eq_(len(original_rules.normalization_cache), 10)
+        eq_(len(c_sig_tool.normalization_cache), 0)
+
+    #--------------------------------------------------------------------------
+    def test_close(self):
+        config = self.get_config()
+        sgr = SignatureGenerationRule(config)
+        sgr.c_signature_tool = Mock()
+        sgr.java_signature_tool = Mock()
+        sgr.close()
+        sgr.c_signature_tool.close.assert_called_once_with()
+        sgr.java_signature_tool.close.assert_called_once_with()
+
 
 #==============================================================================
 class TestOOMSignature(TestCase):
@@ -2,6 +2,7 @@
 Remember! Every new model you introduce here automatically gets exposed
 in the public API in the `api` app.
 """
+import cookielib
 import datetime
 import functools
 import hashlib
@@ -11,6 +12,7 @@ import json
 import logging
 import requests
 import stat
+import threading
 import time
 
 import ujson
@@ -124,11 +126,7 @@ def measure_fetches(method):
     @functools.wraps(method)
     def inner(*args, **kwargs):
         t0 = time.time()
-        result = method(*args, **kwargs)
-        if not (isinstance(result, tuple) and len(result) == 2):
-            # happens when fetch() is used recursively
-            return result
-        result, hit_or_miss = result
+        result, hit_or_miss = method(*args, **kwargs)
         if not getattr(settings, 'ANALYZE_MODEL_FETCHES', False):
             return result
         t1 = time.time()
@@ -153,6 +151,12 @@ def measure_fetches(method):
                         cache.incr(key, incr)
                     except ValueError:
                         cache.set(key, incr, 60 * 60 * 24)
+                # the average hides the odd slow fetch, so keep the slowest
+                # too (two concurrent fetches may both think they are)
+                key = ('slowest_%s_%s' % (hit_or_miss, value))[:240]
+                slowest = cache.get(key)
+                if slowest is None or msecs > slowest:
+                    cache.set(key, msecs, 60 * 60 * 24)
         except Exception:
             logger.error('Unable to collect model fetches data', exc_info=True)
         finally:
@@ -161,6 +165,61 @@ def measure_fetches(method):
     return inner
 
 
+class _NoCookiesPolicy(cookielib.DefaultCookiePolicy):
+    """the session is shared by all the users of the site, so it must not
+    keep the cookies it receives"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class SessionPool(object):
+    """A `requests.Session` shared by all the threads of the process, so
+    that the connections to the middleware and the other services models
+    talk to are kept alive and reused from one fetch to the next, instead
+    of being opened for every fetch.
+
+    Up to `settings.MIDDLEWARE_POOL_SIZE` connections are kept alive per
+    host. With a size of 0, every fetch opens a new connection like the
+    module level functions of `requests` do.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+
+    def get_session(self):
+        """return something with the `get`, `post`, `put` and `delete`
+        methods of a `requests.Session`"""
+        pool_size = settings.MIDDLEWARE_POOL_SIZE
+        if not pool_size:
+            return requests
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.cookies.set_policy(_NoCookiesPolicy())
+                for prefix in ('http://', 'https://'):
+                    session.mount(
+                        prefix,
+                        requests.adapters.HTTPAdapter(
+                            pool_connections=pool_size,
+                            pool_maxsize=pool_size
+                        )
+                    )
+                self._session = session
+            return self._session
+
+    def close(self):
+        """close the connections kept alive, the next fetch opens new ones"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+session_pool = SessionPool()
+
+
 class SocorroCommon(object):
 
     # by default, we don't need username and password
@@ -271,45 +330,44 @@ class SocorroCommon(object):
                             else:
                                 return open(cache_file).read(), True
 
+        session = session_pool.get_session()
         if method == 'post':
-            request_method = requests.post
+            request_method = session.post
             logger.info("POSTING TO %s" % url)
         elif method == 'get':
-            request_method = requests.get
+            request_method = session.get
             logger.info("FETCHING %s" % url)
         elif method == 'put':
-            request_method = requests.put
+            request_method = session.put
             logger.info("PUTTING TO %s" % url)
         elif method == 'delete':
-            request_method = requests.delete
+            request_method = session.delete
             logger.info("DELETING ON %s" % url)
         else:
             raise ValueError(method)
 
-        try:
-            resp = request_method(
-                url=url,
-                auth=auth,
-                headers=headers,
-                data=data,
-                params=params,
-            )
-        except requests.ConnectionError:
-            if not retries:
-                raise
-            # https://bugzilla.mozilla.org/show_bug.cgi?id=916886
-            time.sleep(retry_sleeptime)
-            return self.fetch(
-                url,
-                headers=headers,
-                method=method,
-                data=data,
-                params=params,
-                expect_json=expect_json,
-                dont_cache=dont_cache,
-                retry_sleeptime=retry_sleeptime,
-                retries=retries - 1
-            )
+        while True:
+            try:
+                resp = request_method(
+                    url=url,
+                    auth=auth,
+                    headers=headers,
+                    data=data,
+                    params=params,
+                    timeout=settings.MIDDLEWARE_TIMEOUT,
+                )
+                break
+            except requests.ConnectionError:
+                if not retries:
+                    raise
+                # https://bugzilla.mozilla.org/show_bug.cgi?id=916886
+                logger.warning(
+                    'Unable to connect to %s, %d retries left',
+                    url,
+                    retries
+                )
+                time.sleep(retry_sleeptime)
+                retries -= 1
 
         if resp.status_code >= 400 and resp.status_code < 500:
             raise BadStatusCodeError(resp.status_code, resp.content)
@@ -1833,3 +1833,78 @@ class TestModelsWithFileCaching(TestCase):
         )
         ok_(len(calls) > 3)  # had to attempt more than 3 times
         ok_(len(sleeps) > 2)  # had to sleep more than 2 times
+
+
+class TestModelsWithSessionPool(TestCase):
+
+    def setUp(self):
+        super(TestModelsWithSessionPool, self).setUp()
+        # settings_test.py turns the pool off for the other tests
+        self._pool_size = settings.MIDDLEWARE_POOL_SIZE
+        self._analyze_model_fetches = settings.ANALYZE_MODEL_FETCHES
+        settings.MIDDLEWARE_POOL_SIZE = 2
+        models.session_pool.close()
+        cache.clear()
+
+    def tearDown(self):
+        super(TestModelsWithSessionPool, self).tearDown()
+        settings.MIDDLEWARE_POOL_SIZE = self._pool_size
+        settings.ANALYZE_MODEL_FETCHES = self._analyze_model_fetches
+        models.session_pool.close()
+
+    @mock.patch('requests.Session.request', autospec=True)
+    def test_fetches_share_a_session(self, rrequest):
+        sessions = []
+
+        def mocked_request(session, method, url, **options):
+            sessions.append(session)
+            eq_(method, 'GET')
+            eq_(options['timeout'], settings.MIDDLEWARE_TIMEOUT)
+            return Response('{"bugs": [{"product": "mozilla.org"}]}')
+
+        rrequest.side_effect = mocked_request
+        api = models.BugzillaBugInfo()
+        api.get('747237', 'product')
+        api.get('747238', 'product')
+        eq_(len(sessions), 2)
+        ok_(sessions[0] is sessions[1])
+        adapter = sessions[0].get_adapter(models.BugzillaAPI.base_url)
+        eq_(adapter._pool_maxsize, 2)
+
+    @mock.patch('crashstats.crashstats.models.time')
+    @mock.patch('requests.Session.request')
+    def test_retry_on_connectionerror(self, rrequest, mocked_time):
+        sleeps = []
+        mocked_time.sleep = sleeps.append
+        mocked_time.time.return_value = 0
+        calls = []
+
+        def mocked_request(method, url, **options):
+            calls.append(url)
+            if len(calls) < 3:
+                raise requests.ConnectionError('unable to connect')
+            return Response('{"bugs": [{"product": "mozilla.org"}]}')
+
+        rrequest.side_effect = mocked_request
+        info = models.BugzillaBugInfo().get(['987654'], 'product')
+        ok_(info['bugs'])
+        eq_(len(calls), 3)
+        eq_(len(sleeps), 2)
+
+    @mock.patch('requests.Session.request')
+    def test_measure_fetches(self, rrequest):
+        settings.ANALYZE_MODEL_FETCHES = True
+
+        def mocked_request(method, url, **options):
+            return Response('{"bugs": [{"product": "mozilla.org"}]}')
+
+        rrequest.side_effect = mocked_request
+        models.BugzillaBugInfo().get(['987654'], 'product')
+        models.BugzillaBugInfo().get(['987654'], 'product')
+        eq_(cache.get('uses_MISS_BugzillaBugInfo'), 1)
+        eq_(cache.get('uses_HIT_BugzillaBugInfo'), 1)
+        # a single fetch is the slowest of its kind
+        eq_(
+            cache.get('slowest_MISS_BugzillaBugInfo'),
+            cache.get('times_MISS_BugzillaBugInfo')
+        )
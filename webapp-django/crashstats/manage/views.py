@@ -420,6 +420,12 @@ def analyze_model_fetches(request):
             data['uses']['both'] = (
                 data['uses']['hits'] + data['uses']['misses']
             )
+            data['slowest'] = {}
+            data['slowest']['hits'] = cache.get('slowest_HIT_%s' % item, 0)
+            data['slowest']['misses'] = cache.get('slowest_MISS_%s' % item, 0)
+            data['slowest']['both'] = max(
+                data['slowest']['hits'], data['slowest']['misses']
+            )
             records.append((item, data))
         measurements.append([label, value_type, records])
     context['measurements'] = measurements
@@ -313,6 +313,14 @@ MIDDLEWARE_RETRY_SLEEPTIME = 3
 # how many times to re-attempt on ConnectionError after some sleep
 MIDDLEWARE_RETRIES = 10
 
+# how many connections to the middleware (and to the other services models
+# fetch from) are kept alive for reuse, 0 to open one for every fetch
+MIDDLEWARE_POOL_SIZE = 10
+
+# how many seconds to wait for the middleware to respond before giving up,
+# longer than its slowest searches
+MIDDLEWARE_TIMEOUT = 180
+
 # Overridden so we can control the redirects better
 BROWSERID_VERIFY_CLASS = '%s.auth.views.CustomBrowserIDVerify' % PROJECT_MODULE
 
@@ -17,6 +17,10 @@ BZAPI_BASE_URL = 'https://bugzilla.testrunner/rest'
 # actually go out on the internet when `request.get` should always be mocked
 MWARE_BASE_URL = 'http://shouldnotactuallybeused'
 
+# the tests mock `requests.get` and friends, which the shared session of
+# the models would not use
+MIDDLEWARE_POOL_SIZE = 0
+
 STATSD_CLIENT = 'django_statsd.clients.null'
 
 DATABASES = {